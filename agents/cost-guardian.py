@@ -2,7 +2,7 @@
 Cost Guardian -- Budget watchdog for multi-agent orchestration.
 
 Zero token cost (plain Python, no LLM calls).
-Monitors usage_log.json and enforces budget limits.
+Monitors the usage event store (usage.db) and enforces budget limits.
 Writes PAUSE/STOP signals to agents/BULLETIN.md when limits are approached/exceeded.
 
 Usage:
@@ -26,6 +26,7 @@ from pathlib import Path
 
 REPO_ROOT = Path(__file__).parent.parent
 USAGE_LOG = REPO_ROOT / "usage_log.json"
+USAGE_DB = REPO_ROOT / "usage.db"
 BULLETIN = REPO_ROOT / "agents" / "BULLETIN.md"
 AGENTS_DIR = REPO_ROOT / "agents"
 
@@ -37,30 +38,26 @@ MONTHLY_LIMIT = 50.00    # Stop at $50/month
 PER_AGENT_LIMIT = 5.00   # Per-agent session budget
 
 
-def load_usage_log() -> dict | None:
-    """Load usage_log.json, return None on failure."""
+def load_usage_store():
+    """Open the usage event store (usage.db), return None on failure."""
     try:
-        return json.loads(USAGE_LOG.read_text(encoding="utf-8"))
+        sys.path.insert(0, str(REPO_ROOT))
+        from usage_store import get_store
+        return get_store(USAGE_DB, USAGE_LOG)
     except Exception:
         return None
 
 
-def get_today_spend(usage: dict) -> float:
-    """Get today's total spend from usage log."""
-    summary = usage.get("summary", {})
-    daily = summary.get("daily", {})
-    today_key = datetime.now().strftime("%Y-%m-%d")
-    today_data = daily.get(today_key, {})
-    return today_data.get("cost_usd", 0.0)
+def get_today_spend(usage) -> float:
+    """Get today's total spend from the usage store."""
+    import usage_analytics
+    return usage_analytics.spend_today(usage)
 
 
-def get_month_spend(usage: dict) -> float:
-    """Get current month's total spend from usage log."""
-    summary = usage.get("summary", {})
-    monthly = summary.get("monthly", {})
-    month_key = datetime.now().strftime("%Y-%m")
-    month_data = monthly.get(month_key, {})
-    return month_data.get("cost_usd", 0.0)
+def get_month_spend(usage) -> float:
+    """Get current month's total spend from the usage store."""
+    import usage_analytics
+    return usage_analytics.spend_this_month(usage)
 
 
 def get_agent_session_costs() -> dict[str, float]:
@@ -97,7 +94,7 @@ def update_bulletin_signal(signal: str, reason: str) -> None:
     # Update budget status section
     today_spend = 0.0
     month_spend = 0.0
-    usage = load_usage_log()
+    usage = load_usage_store()
     if usage:
         today_spend = get_today_spend(usage)
         month_spend = get_month_spend(usage)
@@ -137,9 +134,9 @@ def check_budgets() -> str:
     - "PAUSE" = daily limit reached
     - "STOP" = monthly limit reached
     """
-    usage = load_usage_log()
+    usage = load_usage_store()
     if not usage:
-        print("  [!] Cannot read usage_log.json -- skipping budget check")
+        print("  [!] Cannot read usage.db -- skipping budget check")
         return "NONE"
 
     today_spend = get_today_spend(usage)
@@ -204,7 +201,7 @@ def run_check():
 
     if signal in ("PAUSE", "STOP"):
         reason = "budget limit reached"
-        usage = load_usage_log()
+        usage = load_usage_store()
         if usage:
             today = get_today_spend(usage)
             month = get_month_spend(usage)
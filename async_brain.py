@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Async Orchestration for Automation Machine
+AsyncAutomationBrain runs independent queries concurrently, with per-tool
+concurrency limits so fan-out never overloads a backend (one ComfyUI job on
+the GPU, two Ollama generations, more for cloud APIs).
+
+Ollama, Claude and Perplexity calls use an httpx.AsyncClient; other tools
+(ComfyUI, GitHub, Supabase, ...) run their sync delegates in worker
+threads. Without httpx every tool runs in a worker thread.
+
+Routing, cache and usage bookkeeping run serially on one worker thread, so
+the SQLite-backed stores are never used concurrently.
+
+Usage:
+    brain = AsyncAutomationBrain()
+    results = brain.run_many([("summarize X", None), ("a candle photo", "comfyui")])
+    brain.run_batch_file(Path("queries.jsonl"), Path("results.jsonl"))
+"""
+
+import asyncio
+import contextvars
+import json
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+import tracing
+from automation_brain import AutomationBrain, STREAMING_TOOLS
+
+# Concurrent delegations per backend group (config.yaml `concurrency` overrides)
+DEFAULT_CONCURRENCY = {
+    "ollama": 2,
+    "comfyui": 1,
+    "claude": 4,
+    "perplexity": 4,
+    "default": 4,
+}
+
+
+def concurrency_group(tool: str) -> str:
+    """Backend a tool's work lands on; tools sharing a backend share a limit."""
+    if tool.startswith("local-"):
+        return "ollama"
+    if tool.startswith("comfyui"):
+        return "comfyui"
+    return tool
+
+
+class AsyncAutomationBrain(AutomationBrain):
+    """
+    AutomationBrain with an async pipeline (aprocess). Routing, caching and
+    usage logging are the shared sync helpers, run off the event loop.
+    """
+
+    def __init__(self, verbose: bool = False):
+        super().__init__(verbose)
+        self.limits = dict(DEFAULT_CONCURRENCY, **self.config.get("concurrency", {}))
+        self._loop = None
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        self._client = None
+        self._bookkeeping = ThreadPoolExecutor(max_workers=1, thread_name_prefix="brain-bookkeeping")
+
+    # =========================================================================
+    # LOOP-BOUND RESOURCES
+    # =========================================================================
+
+    def _bind_loop(self) -> None:
+        """Semaphores and the async client belong to one event loop; reset on a new one."""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._semaphores = {}
+            self._client = None
+
+    def _semaphore(self, tool: str) -> asyncio.Semaphore:
+        self._bind_loop()
+        group = concurrency_group(tool)
+        if group not in self._semaphores:
+            limit = self.limits.get(group, self.limits["default"])
+            self._semaphores[group] = asyncio.Semaphore(limit)
+        return self._semaphores[group]
+
+    def _get_client(self):
+        self._bind_loop()
+        if self._client is None:
+            http_config = self.config.get("http", {})
+            self._client = httpx.AsyncClient(limits=httpx.Limits(
+                max_connections=http_config.get("pool_maxsize", 16) * 2,
+                max_keepalive_connections=http_config.get("pool_maxsize", 16),
+            ))
+        return self._client
+
+    async def _serial(self, fn, *args):
+        """Run a sync pipeline step on the bookkeeping thread (in this task's trace context)."""
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self._bookkeeping, context.run, fn, *args)
+
+    async def aclose(self) -> None:
+        """Close the async HTTP client, if one was opened."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # =========================================================================
+    # ASYNC DELEGATION
+    # =========================================================================
+
+    async def _apost(self, url: str, timeout: int, **kwargs) -> dict:
+        response = await self._get_client().post(url, timeout=timeout, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    async def _adelegate_llm(self, tool: str, query: str) -> dict:
+        """Non-streaming Ollama/Claude/Perplexity call over httpx."""
+        try:
+            if tool == "perplexity":
+                url, headers, payload = self._perplexity_request(query, stream=False)
+                self._log(f"Querying Perplexity: {payload['model']}")
+                data = await self._apost(url, 60, headers=headers, json=payload)
+                return self._perplexity_result(
+                    query, data["choices"][0]["message"]["content"], data.get("usage", {})
+                )
+            if tool == "claude":
+                url, headers, payload = self._claude_request(query, stream=False)
+                self._log(f"Querying Claude: {payload['model']}")
+                data = await self._apost(url, 120, headers=headers, json=payload)
+                return self._claude_result(
+                    data["content"][0]["text"],
+                    data["usage"]["input_tokens"], data["usage"]["output_tokens"]
+                )
+            model = "qwen" if tool == "local-qwen" else "deepseek"
+            url, payload, model_config = self._local_request(query, model, stream=False)
+            self._log(f"Querying local {model}: {model_config['name']}")
+            data = await self._apost(url, 180, json=payload)
+            return self._local_result(query, model_config, data.get("response", ""), data)
+        except httpx.HTTPError as e:
+            raise ConnectionError(f"{tool} request failed: {e}")
+
+    async def _adispatch(self, tool: str, query: str, enhanced_query: str) -> tuple[dict, float]:
+        """
+        Run a tool's delegation under its backend's concurrency limit.
+        Returns (result, start); start is when the slot was acquired, so
+        latency excludes time spent queued behind other requests.
+        """
+        async with self._semaphore(tool):
+            start = time.perf_counter()
+            if httpx is not None and tool in STREAMING_TOOLS:
+                with tracing.span("delegate", tool=tool, transport="httpx") as span:
+                    await asyncio.to_thread(self._check_circuit, tool)
+                    try:
+                        result = await self._adelegate_llm(tool, enhanced_query)
+                    except ConnectionError as e:
+                        self._record_health(tool, e)
+                        raise
+                    self._record_health(tool)
+                    span.set(tokens_in=result["tokens_in"], tokens_out=result["tokens_out"])
+                return result, start
+            return await asyncio.to_thread(self._dispatch, tool, query, enhanced_query), start
+
+    # =========================================================================
+    # PIPELINE
+    # =========================================================================
+
+    async def _aexecute(self, ctx: dict, latency_critical: bool = False) -> dict:
+        """Pipeline steps 4-5 for a prepared request context."""
+        if ctx["cached"] is not None:
+            return await self._serial(self._serve_cached, ctx)
+
+        query, tool = ctx["query"], ctx["tool"]
+        fell_back = False
+        delay = self._hedge_delay(tool, latency_critical)
+        if delay is not None:
+            # Hedged attempts run on their own threads; the slot covers the primary
+            async with self._semaphore(tool):
+                start = time.perf_counter()
+                result, fell_back = await asyncio.to_thread(
+                    self._drain, self._hedged_stream(ctx, delay))
+            await self._serial(self._finish, ctx, result, start, fell_back)
+            return result
+
+        try:
+            result, start = await self._adispatch(tool, query, ctx["enhanced_query"])
+        except (ConnectionError, ValueError) as e:
+            fallback = self._fallback_tool(tool)
+            if fallback is None:
+                raise
+            self._log(f"Error with {tool}: {e}. Falling back to {fallback}...")
+            fell_back = True
+            result, start = await self._adispatch(fallback, query, ctx["enhanced_query"])
+
+        await self._serial(self._finish, ctx, result, start, fell_back)
+        return result
+
+    async def aprocess_result(self, query: str, force_tool: Optional[str] = None,
+                              latency_critical: bool = False) -> dict:
+        """Async pipeline; returns the full result dict (response, tokens, cost, latency)."""
+        with tracing.span("process", latency_critical=latency_critical) as span:
+            ctx = await self._serial(self._prepare, query, force_tool)
+            span.set(tool=ctx["tool"], routed_by=ctx["routed_by"], cache_hit=ctx["cached"] is not None)
+            return await self._aexecute(ctx, latency_critical)
+
+    async def aprocess(self, query: str, force_tool: Optional[str] = None,
+                       latency_critical: bool = False) -> str:
+        """Async equivalent of process()."""
+        return (await self.aprocess_result(query, force_tool, latency_critical))["response"]
+
+    async def aprocess_many(self, items: list[tuple[str, Optional[str]]]) -> list:
+        """
+        Run (query, force_tool) pairs concurrently within the per-tool limits.
+        Returns result dicts in input order; failures are returned as exceptions.
+        """
+        return await asyncio.gather(
+            *(self.aprocess_result(query, tool) for query, tool in items),
+            return_exceptions=True
+        )
+
+    async def arun_batch(self, items: list[dict]) -> list:
+        """
+        Route every {"query", "tool"?, "latency_critical"?} item, then run them grouped by target
+        tool within the per-tool limits. Usage events are buffered and written
+        in one transaction at the end. Returns results (or exceptions) in input order.
+        """
+        results: list = [None] * len(items)
+        self.begin_usage_batch()
+        with tracing.span("batch", queries=len(items)):
+            try:
+                groups: dict[str, list] = defaultdict(list)
+                with tracing.span("route"):
+                    for i, item in enumerate(items):
+                        try:
+                            ctx = await self._serial(self._prepare, item["query"], item.get("tool"))
+                        except Exception as e:
+                            results[i] = e
+                            continue
+                        groups[ctx["tool"]].append((i, ctx, item.get("latency_critical", False)))
+                self._log("Batch routing: " + ", ".join(
+                    f"{tool}={len(group)}" for tool, group in groups.items()))
+
+                async def run(i: int, ctx: dict, latency_critical: bool) -> None:
+                    try:
+                        with tracing.span("execute", tool=ctx["tool"]):
+                            results[i] = await self._aexecute(ctx, latency_critical)
+                    except Exception as e:
+                        results[i] = e
+
+                await asyncio.gather(*(run(*entry) for group in groups.values() for entry in group))
+            finally:
+                with tracing.span("usage_flush"):
+                    flushed = await self._serial(self.flush_usage)
+                self._log(f"Flushed {flushed} usage events")
+        return results
+
+    # =========================================================================
+    # SYNC WRAPPERS
+    # =========================================================================
+
+    async def _run(self, coro):
+        try:
+            return await coro
+        finally:
+            await self.aclose()
+
+    def process(self, query: str, force_tool: Optional[str] = None,
+                latency_critical: bool = False) -> str:
+        """Sync entry point: runs aprocess() on a fresh event loop."""
+        return asyncio.run(self._run(self.aprocess(query, force_tool, latency_critical)))
+
+    def run_many(self, items: list[tuple[str, Optional[str]]]) -> list:
+        """Sync entry point for aprocess_many()."""
+        return asyncio.run(self._run(self.aprocess_many(items)))
+
+    def run_batch_file(self, input_path: Path, output_path: Path) -> dict:
+        """
+        Process a JSONL file of {"query", "tool"?, "id"?} lines and write one
+        JSONL result per line, in input order. Returns batch totals.
+        """
+        items = []
+        with open(input_path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    items.append(json.loads(line))
+
+        start = time.perf_counter()
+        results = asyncio.run(self._run(self.arun_batch(items)))
+        totals = {"queries": len(items), "errors": 0, "cost_usd": 0.0,
+                  "elapsed_ms": round((time.perf_counter() - start) * 1000)}
+
+        with open(output_path, "w", encoding="utf-8") as f:
+            for i, (item, result) in enumerate(zip(items, results)):
+                record = {"id": item.get("id", i), "query": item.get("query")}
+                if isinstance(result, Exception):
+                    totals["errors"] += 1
+                    record["error"] = f"{type(result).__name__}: {result}"
+                else:
+                    totals["cost_usd"] += result["cost"]
+                    record.update({
+                        "tool": result.get("tool"),
+                        "model": result.get("model"),
+                        "response": result["response"],
+                        "tokens_in": result["tokens_in"],
+                        "tokens_out": result["tokens_out"],
+                        "cost_usd": result["cost"],
+                        "latency_ms": result.get("latency_ms"),
+                        "cache_hit": result.get("cache_hit", False),
+                    })
+                f.write(json.dumps(record) + "\n")
+        return totals
@@ -17,6 +17,7 @@ from typing import Optional
 BASE_DIR = Path("C:/automation-machine")
 KNOWLEDGE_BASE = BASE_DIR / "knowledge-base"
 USAGE_LOG = BASE_DIR / "usage_log.json"
+USAGE_DB = BASE_DIR / "usage.db"
 AUTO_DOC_STATE = BASE_DIR / "auto_doc_state.json"
 
 # Documentation paths
@@ -117,6 +118,9 @@ class AutoDoc:
         path = Path(file_path)
         if KNOWLEDGE_BASE in path.parents or path.parent == KNOWLEDGE_BASE:
             self._update_index(path)
+            if path.suffix == ".md":
+                import kb_index
+                kb_index.get_index(KNOWLEDGE_BASE, BASE_DIR / "kb_index.db").index_file(path)
             self.state["files_indexed"].append(str(path))
             self._save_state()
 
@@ -314,10 +318,12 @@ This pattern was detected {data['count']} times in queries.
 
     def _update_daily_stats(self):
         """Update PROJECT-RECAP with daily stats."""
-        usage = self._load_usage_log()
-        today = datetime.now().strftime("%Y-%m-%d")
+        import usage_analytics
+        from usage_store import get_store
 
-        daily = usage.get("summary", {}).get("daily", {}).get(today, {})
+        today = datetime.now().strftime("%Y-%m-%d")
+        store = get_store(USAGE_DB, USAGE_LOG)
+        daily = usage_analytics.spend_by_day(store, today, today).get(today)
         if not daily:
             return
 
@@ -446,11 +452,9 @@ This pattern was detected {data['count']} times in queries.
     # =========================================================================
 
     def _load_usage_log(self) -> dict:
-        """Load usage log."""
-        if USAGE_LOG.exists():
-            with open(USAGE_LOG, "r") as f:
-                return json.load(f)
-        return {}
+        """Load usage log (usage_log.json shape) from the event store."""
+        from usage_store import get_store
+        return get_store(USAGE_DB, USAGE_LOG).usage_log()
 
     # =========================================================================
     # CLI COMMANDS
@@ -699,22 +703,18 @@ This pattern was detected {data['count']} times in queries.
             return False
 
     def _query_local_llm(self, brain, query: str):
-        """Query the local LLM through automation_brain."""
+        """Query the local LLM through automation_brain, printing tokens live."""
         print("\n[Querying local LLM...]")
         print("-" * 40)
 
         try:
-            # Force local tool (qwen or deepseek)
-            response = brain.process(query, force_tool="local-qwen")
-            print(response)
+            # Force local qwen; process_stream falls back to deepseek on failure
+            for token in brain.process_stream(query, force_tool="local-qwen"):
+                print(token, end="", flush=True)
+            print()
         except Exception as e:
-            # Try fallback to deepseek
-            try:
-                response = brain.process(query, force_tool="local-deepseek")
-                print(response)
-            except Exception as e2:
-                print(f"[ERROR] Could not query local LLM: {e2}")
-                print("Make sure Ollama is running with qwen or deepseek model.")
+            print(f"\n[ERROR] Could not query local LLM: {e}")
+            print("Make sure Ollama is running with qwen or deepseek model.")
 
         print("-" * 40)
 
@@ -1023,10 +1023,10 @@ def wrap_brain():
     def hooked_process(query: str, force_tool: Optional[str] = None) -> str:
         response = original_process(query, force_tool)
 
-        # Get last result from usage log
-        usage = auto_doc._load_usage_log()
-        if usage.get("history"):
-            last_entry = usage["history"][-1]
+        # Get last result from the usage store (one row, not a full rollup)
+        history = brain.usage.history(limit=1)
+        if history:
+            last_entry = history[-1]
             result = {
                 "tool": last_entry.get("tool", "unknown"),
                 "model": last_entry.get("model", "unknown"),
@@ -9,50 +9,187 @@ import argparse
 import json
 import os
 import re
+import queue
+import socket
+import sqlite3
 import sys
-from datetime import datetime
+import contextvars
+import threading
+import time
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Optional, Literal
+from typing import Generator, Iterator, Optional, Literal
 
-import requests
-import yaml
+import context_budget
+import kb_index
+from backend_health import BackendHealth
+from response_cache import ResponseCache
+from startup import lazy_import, load_json, load_yaml
+from task_router import TaskRouter
+import tracing
+from usage_store import get_store
+import usage_analytics
+
+# Loaded on first HTTP call; a one-shot CLI start should not pay for it
+requests = lazy_import("requests")
 
 # Paths
 BASE_DIR = Path("C:/automation-machine")
 CONFIG_PATH = BASE_DIR / "config.yaml"
 TOOLS_CONFIG_PATH = BASE_DIR / "tools_config.json"
 USAGE_LOG_PATH = BASE_DIR / "usage_log.json"
+USAGE_DB_PATH = BASE_DIR / "usage.db"
 KNOWLEDGE_BASE_PATH = BASE_DIR / "knowledge-base"
 CONVERSATION_LOG_PATH = KNOWLEDGE_BASE_PATH / "research" / "conversation-log.md"
 PROJECTS_REGISTRY_PATH = BASE_DIR / "projects" / "registry.json"
+KB_INDEX_PATH = BASE_DIR / "kb_index.db"
+KB_VECTORS_DIR = BASE_DIR / "kb_vectors"
+RESPONSE_CACHE_PATH = BASE_DIR / "response_cache.db"
+ROUTE_MODEL_PATH = BASE_DIR / "route_model.npz"
+BACKEND_HEALTH_PATH = BASE_DIR / "backend_health.json"
+TRACES_PATH = BASE_DIR / "traces.jsonl"
+DAEMON_PATH = BASE_DIR / "daemon.json"
+
+# Tools whose delegates can stream tokens (see process_stream)
+STREAMING_TOOLS = {"local-deepseek", "local-qwen", "perplexity", "claude"}
+
+# Tools whose delegates get the raw query, so KB context would be wasted
+NO_CONTEXT_TOOLS = {"comfyui", "comfyui-video", "comfyui-video-talking-head",
+                    "github", "claude-in-chrome", "supabase"}
+
+# Share of a model's max_tokens spent on KB context (knowledge_base.context overrides)
+DEFAULT_CONTEXT_SHARE = {"local": 0.25, "paid": 0.03}
+
+# Seconds a hedged request waits for its cancelled loser to report usage
+HEDGE_LOSER_WAIT_SECONDS = 5.0
 
 # Task categories for routing
 TaskCategory = Literal["research", "code", "reasoning", "image", "video", "database", "general"]
 
 
+class StreamCancel(threading.Event):
+    """
+    Cancellation flag for a streaming request. set() also shuts down the
+    socket of the response being read, so a reader blocked on the next
+    chunk returns at once instead of when that chunk arrives.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._guard = threading.Lock()
+        self._response = None
+
+    def watch(self, response) -> None:
+        """Interrupt this (requests, stream=True) response on cancellation."""
+        with self._guard:
+            self._response = response
+        if self.is_set():
+            self._interrupt()
+
+    def set(self) -> None:
+        super().set()
+        self._interrupt()
+
+    def _interrupt(self) -> None:
+        with self._guard:
+            response, self._response = self._response, None
+        connection = getattr(getattr(response, "raw", None), "_connection", None)
+        sock = getattr(connection, "sock", None)
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass  # Already closed
+
+
 class AutomationBrain:
     """
     Full orchestration brain that delegates tasks to the optimal tool/model
     based on task analysis, cost optimization, and capability matching.
     """
 
+    _semantic_lock = threading.Lock()
+
     def __init__(self, verbose: bool = False):
         self.verbose = verbose
         self.config = self._load_config()
         self.tools_config = self._load_tools_config()
+        self._http = None
+        self.usage = get_store(USAGE_DB_PATH, USAGE_LOG_PATH)
+        self._usage_buffer: Optional[list] = None
+        self.cache = ResponseCache.from_config(self.config, RESPONSE_CACHE_PATH)
+        self.health = BackendHealth.from_config(self.config, self.tools_config, BACKEND_HEALTH_PATH)
+        self._semantic_cache = None
+        self._semantic_loaded = False
+        self.router = TaskRouter.from_config(self.config)
+        self.route_model = self._load_route_model()
+        tracing_config = self.config.get("tracing", {})
+        if tracing_config.get("enabled", False):
+            tracing.configure(TRACES_PATH, max_bytes=tracing_config.get("max_mb", 20) * 1024 * 1024)
 
     def _load_config(self) -> dict:
-        """Load main configuration from YAML."""
-        with open(CONFIG_PATH, "r") as f:
-            return yaml.safe_load(f)
+        """Load main configuration from YAML (parsed copy cached by mtime)."""
+        return load_yaml(CONFIG_PATH)
 
     def _load_tools_config(self) -> dict:
-        """Load tools configuration from JSON."""
+        """Load tools configuration from JSON (parsed copy cached by mtime)."""
         if TOOLS_CONFIG_PATH.exists():
-            with open(TOOLS_CONFIG_PATH, "r") as f:
-                return json.load(f)
+            return load_json(TOOLS_CONFIG_PATH)
         return {}
 
+    @property
+    def http(self):
+        """Pooled HTTP session, created on first request."""
+        if self._http is None:
+            from http_pool import get_session
+            self._http = get_session(**self.config.get("http", {}))
+        return self._http
+
+    @http.setter
+    def http(self, session):
+        self._http = session
+
+    @property
+    def semantic_cache(self):
+        """Semantic cache, loaded on first use since it imports numpy."""
+        if not self._semantic_loaded:
+            with self._semantic_lock:  # Request threads may race to load it
+                if not self._semantic_loaded:
+                    self._semantic_cache = self._load_semantic_cache()
+                    self._semantic_loaded = True
+        return self._semantic_cache
+
+    @semantic_cache.setter
+    def semantic_cache(self, cache):
+        self._semantic_cache = cache
+        self._semantic_loaded = True
+
+    def _semantic_tools(self) -> tuple:
+        """Tools the semantic cache covers, from config alone (no numpy import)."""
+        cache_config = self.config.get("cache", {})
+        semantic = cache_config.get("semantic", {})
+        if not cache_config.get("enabled", False) or not semantic.get("enabled", False):
+            return ()
+        return tuple(semantic.get("tools", ["claude", "perplexity"]))
+
+    def _load_semantic_cache(self):
+        """Semantic cache for cloud routes, if enabled and numpy is installed."""
+        try:
+            from semantic_cache import SemanticCache
+        except ImportError:
+            return None
+        return SemanticCache.from_config(self.config, RESPONSE_CACHE_PATH, session=self.http)
+
+    def _load_route_model(self):
+        """Learned routing model, if enabled, numpy is installed and it has been trained."""
+        if not self.config.get("routing", {}).get("model", {}).get("enabled", False):
+            return None
+        try:
+            from route_model import load_route_model
+        except ImportError:
+            return None
+        return load_route_model(ROUTE_MODEL_PATH)
+
     def _log(self, message: str) -> None:
         """Print verbose logging if enabled."""
         if self.verbose:
@@ -67,145 +204,67 @@ class AutomationBrain:
         Analyze task to determine requirements and optimal routing.
         Returns analysis dict with category, complexity, needs_web, etc.
         """
-        query_lower = query.lower()
-
-        analysis = {
-            "query": query,
-            "category": "general",
-            "complexity": "simple",
-            "needs_web": False,
-            "needs_image": False,
-            "needs_video": False,
-            "needs_talking_head": False,
-            "needs_database": False,
-            "needs_code": False,
-            "needs_browser": False,
-            "needs_github": False,
-            "recommended_tool": "local-deepseek",
-        }
-
-        # Detect web research needs
-        web_indicators = [
-            "latest", "current", "2024", "2025", "2026", "news", "today",
-            "recent", "price", "compare prices", "find", "search for",
-            "what are the best", "recommendations for", "reviews"
-        ]
-        if any(indicator in query_lower for indicator in web_indicators):
-            analysis["needs_web"] = True
-            analysis["category"] = "research"
-
-        # Detect video generation needs (check before image)
-        video_indicators = [
-            "generate video", "create video", "animate", "animation",
-            "video clip", "motion", "image to video", "i2v", "video from"
-        ]
-        if any(indicator in query_lower for indicator in video_indicators):
-            analysis["needs_video"] = True
-            analysis["category"] = "video"
-
-        # Detect talking head / avatar needs
-        talking_head_indicators = [
-            "talking head", "avatar", "lip sync", "lipsync", "sadtalker",
-            "speaking video", "face animation", "photo to video with audio"
-        ]
-        if any(indicator in query_lower for indicator in talking_head_indicators):
-            analysis["needs_talking_head"] = True
-            analysis["needs_video"] = True
-            analysis["category"] = "video"
-
-        # Detect image generation needs
-        image_indicators = [
-            "generate image", "create image", "draw", "illustration",
-            "picture of", "visual", "logo", "design image", "artwork"
-        ]
-        if any(indicator in query_lower for indicator in image_indicators):
-            analysis["needs_image"] = True
-            analysis["category"] = "image"
-
-        # Detect code needs
-        code_indicators = [
-            "code", "function", "script", "program", "implement",
-            "debug", "refactor", "write a", "create a class", "api"
-        ]
-        if any(indicator in query_lower for indicator in code_indicators):
-            analysis["needs_code"] = True
-            analysis["category"] = "code"
-
-        # Detect database needs
-        db_indicators = [
-            "database", "supabase", "query", "sql", "store data",
-            "retrieve", "insert", "update record"
-        ]
-        if any(indicator in query_lower for indicator in db_indicators):
-            analysis["needs_database"] = True
-            analysis["category"] = "database"
-
-        # Detect browser automation needs (Claude in Chrome)
-        browser_indicators = [
-            "navigate to", "click on", "fill form", "browser", "website",
-            "fiverr", "post to", "social media", "login to", "sign in",
-            "open page", "web page", "scrape", "automate browser"
-        ]
-        if any(indicator in query_lower for indicator in browser_indicators):
-            analysis["needs_browser"] = True
-            analysis["category"] = "browser"
-
-        # Detect GitHub needs
-        github_indicators = [
-            "github", "repository", "repo", "commit", "pull request", "pr",
-            "issue", "branch", "merge", "fork", "clone", "git "
-        ]
-        if any(indicator in query_lower for indicator in github_indicators):
-            analysis["needs_github"] = True
-            analysis["category"] = "code"
-
-        # Detect complexity
-        complex_indicators = [
-            "complex", "novel", "architecture", "design system",
-            "comprehensive", "multi-step", "analyze deeply"
-        ]
-        medium_indicators = [
-            "analyze", "explain", "generate", "design", "refactor",
-            "create", "implement", "debug"
-        ]
-
-        if any(indicator in query_lower for indicator in complex_indicators):
-            analysis["complexity"] = "complex"
-        elif any(indicator in query_lower for indicator in medium_indicators):
-            analysis["complexity"] = "medium"
-        else:
-            # Length-based fallback
-            word_count = len(query.split())
-            if word_count > 50:
-                analysis["complexity"] = "complex"
-            elif word_count > 15:
-                analysis["complexity"] = "medium"
+        analysis = {"query": query}
+        analysis.update(self.router.analyze(query))
 
         # Determine recommended tool based on analysis
         analysis["recommended_tool"] = self._select_optimal_tool(analysis)
+        analysis["routed_by"] = "rules"
+        if self.route_model is not None:
+            self._apply_route_model(analysis)
 
         return analysis
 
+    def _apply_route_model(self, analysis: dict) -> None:
+        """
+        Let the learned model pick complexity and tool when it is confident.
+        Rule flags listed in routing.model.rule_overrides keep the rule route.
+        """
+        settings = self.config["routing"]["model"]
+        if any(analysis.get(flag) for flag in settings.get("rule_overrides", [])):
+            return
+
+        prediction = self.route_model.predict(analysis["query"])
+        min_confidence = settings.get("min_confidence", 0.6)
+        if prediction["complexity_confidence"] >= min_confidence:
+            analysis["complexity"] = prediction["complexity"]
+
+        tool = prediction["tool"]
+        available = tool.startswith("local-") or self._tool_usable(tool)
+        if (prediction["tool_confidence"] >= min_confidence and available
+                and tool in settings.get("tools", [])):
+            analysis["recommended_tool"] = self._skip_open_circuits(tool)
+            analysis["routed_by"] = "model"
+        self._log(f"Route model: {tool} ({prediction['tool_confidence']:.2f}), "
+                  f"{prediction['complexity']} ({prediction['complexity_confidence']:.2f})")
+
     def _select_optimal_tool(self, analysis: dict) -> str:
         """
-        Select the optimal tool based on task analysis.
+        Select the optimal tool based on task analysis, skipping backends
+        whose circuit is open.
+        """
+        return self._skip_open_circuits(self._rule_tool(analysis))
+
+    def _rule_tool(self, analysis: dict) -> str:
+        """
+        Rule-based tool choice.
         Priority: Local free → Perplexity (cheap) → Claude (expensive)
         """
         # Browser automation → Claude in Chrome
         if analysis.get("needs_browser"):
-            if self.tools_config.get("claude-in-chrome", {}).get("enabled"):
+            if self._tool_usable("claude-in-chrome"):
                 return "claude-in-chrome"
             return "local-qwen"  # Fallback to describe browser steps
 
         # GitHub operations → GitHub CLI/MCP
         if analysis.get("needs_github"):
-            if self.tools_config.get("github", {}).get("enabled"):
+            if self._tool_usable("github"):
                 return "github"
             return "local-qwen"  # Fallback to describe git commands
 
         # Video generation → ComfyUI Video
         if analysis.get("needs_video"):
-            if self.tools_config.get("comfyui", {}).get("enabled"):
+            if self._tool_usable("comfyui"):
                 if analysis.get("needs_talking_head"):
                     return "comfyui-video-talking-head"
                 return "comfyui-video"
@@ -213,19 +272,19 @@ class AutomationBrain:
 
         # Image generation → ComfyUI
         if analysis["needs_image"]:
-            if self.tools_config.get("comfyui", {}).get("enabled"):
+            if self._tool_usable("comfyui"):
                 return "comfyui"
             return "local-qwen"  # Fallback to describe what to generate
 
         # Web research → Perplexity
         if analysis["needs_web"]:
-            if self.tools_config.get("perplexity", {}).get("enabled"):
+            if self._tool_usable("perplexity"):
                 return "perplexity"
             return "local-qwen"  # Fallback (won't have current data)
 
         # Database operations → Supabase
         if analysis["needs_database"]:
-            if self.tools_config.get("supabase", {}).get("enabled"):
+            if self._tool_usable("supabase"):
                 return "supabase"
             return "local-qwen"  # Fallback to generate SQL
 
@@ -243,15 +302,117 @@ class AutomationBrain:
         else:
             return "claude"
 
+    def _tool_usable(self, tool: str) -> bool:
+        """Tool is enabled in tools_config and its backend circuit is not open."""
+        if not self.tools_config.get(tool, {}).get("enabled"):
+            return False
+        return self.health is None or self.health.available(tool)
+
+    def _skip_open_circuits(self, tool: str) -> str:
+        """Walk the fallback chain past LLM routes whose backend is down."""
+        if self.health is None:
+            return tool
+        candidate = tool
+        while candidate in STREAMING_TOOLS:
+            if self.health.available(candidate):
+                return candidate
+            self._log(f"Circuit open for {candidate}; skipping")
+            candidate = self._fallback_tool(candidate)
+        # Nothing healthy on the chain: keep the route and let fallback handle it
+        return tool
+
+    def _check_circuit(self, tool: str) -> None:
+        """Fail fast instead of waiting out a timeout on a backend known to be down."""
+        if self.health is not None and not self.health.admit(tool):
+            raise ConnectionError(f"{tool} skipped: backend circuit is open")
+
+    def _record_health(self, tool: str, error: Optional[Exception] = None) -> None:
+        """Feed a request outcome into the tool's circuit breaker."""
+        if self.health is None:
+            return
+        if error is None:
+            self.health.record_success(tool)
+        else:
+            self.health.record_error(tool, error)
+
     # =========================================================================
     # DELEGATION METHODS
     # =========================================================================
 
+    @staticmethod
+    def _drain(stream: Iterator[str]) -> dict:
+        """Consume a token stream and return its final result dict."""
+        while True:
+            try:
+                next(stream)
+            except StopIteration as stop:
+                return stop.value
+
+    @staticmethod
+    def _estimate_tokens(text: str) -> int:
+        """Rough token count (~4 characters per token) when the API reports none."""
+        return max(1, len(text) // 4)
+
+    @staticmethod
+    def _iter_sse(response) -> Iterator[dict]:
+        """Parse `data:` lines of a server-sent event stream as JSON."""
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                return
+            yield json.loads(data)
+
     def _delegate_to_local(self, query: str, model: str = "deepseek") -> dict:
         """
         Delegate to local Ollama model.
         Returns: {"response": str, "tokens_in": int, "tokens_out": int, "cost": 0.0}
         """
+        return self._drain(self._stream_local(query, model))
+
+    def _stream_local(self, query: str, model: str = "deepseek",
+                      cancel: Optional[StreamCancel] = None) -> Generator[str, None, dict]:
+        """
+        Stream tokens from a local Ollama model.
+        Yields response text as it arrives; returns the result dict with
+        token counts from the final (done) chunk. Setting `cancel` stops the
+        stream and returns what was generated so far.
+        """
+        url, payload, model_config = self._local_request(query, model, stream=True)
+        self._log(f"Querying local {model}: {model_config['name']}")
+
+        parts = []
+        final = {}
+        try:
+            with self.http.post(url, json=payload, timeout=180, stream=True) as response:
+                response.raise_for_status()
+                if cancel is not None:
+                    cancel.watch(response)
+                for line in response.iter_lines(decode_unicode=True):
+                    if cancel is not None and cancel.is_set():
+                        final = {"eval_count": len(parts)}
+                        break
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        raise ConnectionError(f"Ollama error: {chunk['error']}")
+                    if chunk.get("response"):
+                        parts.append(chunk["response"])
+                        yield chunk["response"]
+                    if chunk.get("done"):
+                        final = chunk
+                        break
+        except requests.exceptions.RequestException as e:
+            if cancel is None or not cancel.is_set():
+                raise ConnectionError(f"Ollama connection failed: {e}")
+            final = {"eval_count": len(parts)}  # Interrupted by the cancellation
+
+        return self._local_result(query, model_config, "".join(parts), final)
+
+    def _local_request(self, query: str, model: str, stream: bool) -> tuple[str, dict, dict]:
+        """Ollama /api/generate request: (url, payload, model_config)."""
         if model == "deepseek":
             model_config = self.config["models"]["local"]["deepseek"]
         else:
@@ -261,143 +422,255 @@ class AutomationBrain:
         payload = {
             "model": model_config["name"],
             "prompt": query,
-            "stream": False
+            "stream": stream
         }
+        return url, payload, model_config
 
-        self._log(f"Querying local {model}: {model_config['name']}")
-
-        try:
-            response = requests.post(url, json=payload, timeout=180)
-            response.raise_for_status()
-            data = response.json()
-
-            return {
-                "response": data.get("response", ""),
-                "tokens_in": data.get("prompt_eval_count", len(query.split()) * 2),
-                "tokens_out": data.get("eval_count", 100),
-                "cost": 0.0,
-                "tool": f"local-ollama",
-                "model": model_config["name"]
-            }
-        except requests.exceptions.RequestException as e:
-            raise ConnectionError(f"Ollama connection failed: {e}")
+    @staticmethod
+    def _local_result(query: str, model_config: dict, text: str, final: dict) -> dict:
+        """Result dict from Ollama output and its final (done) chunk."""
+        return {
+            "response": text,
+            "tokens_in": final.get("prompt_eval_count", len(query.split()) * 2),
+            "tokens_out": final.get("eval_count", 100),
+            "cost": 0.0,
+            "tool": f"local-ollama",
+            "model": model_config["name"]
+        }
 
     def _delegate_to_perplexity(self, query: str) -> dict:
         """
         Delegate web research to Perplexity Pro.
         Returns: {"response": str, "tokens_in": int, "tokens_out": int, "cost": float}
         """
+        return self._drain(self._stream_perplexity(query))
+
+    def _stream_perplexity(self, query: str,
+                           cancel: Optional[StreamCancel] = None) -> Generator[str, None, dict]:
+        """
+        Stream a Perplexity answer (OpenAI-style SSE).
+        Usage is taken from the last chunk that carries it; a cancelled
+        stream estimates output tokens from the text received.
+        """
+        url, headers, payload = self._perplexity_request(query, stream=True)
+        self._log(f"Querying Perplexity: {payload['model']}")
+
+        parts = []
+        usage = {}
+        try:
+            with self.http.post(url, headers=headers, json=payload, timeout=60, stream=True) as response:
+                response.raise_for_status()
+                if cancel is not None:
+                    cancel.watch(response)
+                for chunk in self._iter_sse(response):
+                    if cancel is not None and cancel.is_set():
+                        usage = usage or {"completion_tokens": self._estimate_tokens("".join(parts))}
+                        break
+                    if chunk.get("error"):
+                        error = chunk["error"]
+                        raise ConnectionError(f"Perplexity stream error: "
+                                              f"{error.get('message', error) if isinstance(error, dict) else error}")
+                    usage = chunk.get("usage") or usage
+                    choices = chunk.get("choices") or [{}]
+                    text = choices[0].get("delta", {}).get("content")
+                    if text:
+                        parts.append(text)
+                        yield text
+        except requests.exceptions.RequestException as e:
+            if cancel is not None and cancel.is_set():
+                usage = usage or {"completion_tokens": self._estimate_tokens("".join(parts))}
+                return self._perplexity_result(query, "".join(parts), usage)
+            error_msg = str(e)
+            if hasattr(e, 'response') and e.response is not None:
+                try:
+                    error_detail = e.response.json()
+                    error_msg = f"{e.response.status_code}: {error_detail.get('error', {}).get('message', e.response.text)}"
+                except Exception:
+                    error_msg = f"{e.response.status_code}: {e.response.text[:200]}"
+            raise ConnectionError(f"Perplexity API error: {error_msg}. Valid models: sonar, sonar-pro, sonar-reasoning-pro, sonar-deep-research")
+
+        return self._perplexity_result(query, "".join(parts), usage)
+
+    def _perplexity_request(self, query: str, stream: bool) -> tuple[str, dict, dict]:
+        """Perplexity chat completion request: (url, headers, payload)."""
         perplexity_config = self.tools_config.get("perplexity", {})
         api_key = os.environ.get(perplexity_config.get("api_key_env", "PERPLEXITY_API_KEY"))
 
         if not api_key:
             raise ValueError("PERPLEXITY_API_KEY not set")
 
-        model = perplexity_config.get("model", "sonar-pro")
-
-        url = "https://api.perplexity.ai/chat/completions"
+        url = perplexity_config.get("endpoint", "https://api.perplexity.ai/chat/completions")
         headers = {
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
         }
         payload = {
-            "model": model,
-            "messages": [{"role": "user", "content": query}]
+            "model": perplexity_config.get("model", "sonar-pro"),
+            "messages": [{"role": "user", "content": query}],
+            "stream": stream
         }
+        return url, headers, payload
 
-        self._log(f"Querying Perplexity: {model}")
-
-        try:
-            response = requests.post(url, headers=headers, json=payload, timeout=60)
-            response.raise_for_status()
-            data = response.json()
-
-            tokens_in = data.get("usage", {}).get("prompt_tokens", len(query.split()) * 2)
-            tokens_out = data.get("usage", {}).get("completion_tokens", 100)
-            cost_per_1m = perplexity_config.get("cost_per_1m_tokens", 1.0)
-            cost = ((tokens_in + tokens_out) / 1_000_000) * cost_per_1m
+    def _perplexity_result(self, query: str, text: str, usage: dict) -> dict:
+        """Result dict from Perplexity output and its usage block."""
+        perplexity_config = self.tools_config.get("perplexity", {})
+        tokens_in = usage.get("prompt_tokens", len(query.split()) * 2)
+        tokens_out = usage.get("completion_tokens", 100)
+        cost_per_1m = perplexity_config.get("cost_per_1m_tokens", 1.0)
+        cost = ((tokens_in + tokens_out) / 1_000_000) * cost_per_1m
 
-            return {
-                "response": data["choices"][0]["message"]["content"],
-                "tokens_in": tokens_in,
-                "tokens_out": tokens_out,
-                "cost": cost,
-                "tool": "perplexity",
-                "model": model
-            }
-        except requests.exceptions.RequestException as e:
-            error_msg = str(e)
-            if hasattr(e, 'response') and e.response is not None:
-                try:
-                    error_detail = e.response.json()
-                    error_msg = f"{e.response.status_code}: {error_detail.get('error', {}).get('message', e.response.text)}"
-                except Exception:
-                    error_msg = f"{e.response.status_code}: {e.response.text[:200]}"
-            raise ConnectionError(f"Perplexity API error: {error_msg}. Valid models: sonar, sonar-pro, sonar-reasoning-pro, sonar-deep-research")
+        return {
+            "response": text,
+            "tokens_in": tokens_in,
+            "tokens_out": tokens_out,
+            "cost": cost,
+            "tool": "perplexity",
+            "model": perplexity_config.get("model", "sonar-pro")
+        }
 
     def _delegate_to_claude(self, query: str) -> dict:
         """
         Delegate complex tasks to Claude Sonnet 4.
         Returns: {"response": str, "tokens_in": int, "tokens_out": int, "cost": float}
         """
+        return self._drain(self._stream_claude(query))
+
+    def _stream_claude(self, query: str,
+                       cancel: Optional[StreamCancel] = None) -> Generator[str, None, dict]:
+        """
+        Stream a Claude answer (Messages API SSE).
+        Input tokens come from message_start, output tokens from the final
+        message_delta (estimated from the text if cancelled before it).
+        """
+        url, headers, payload = self._claude_request(query, stream=True)
+        self._log(f"Querying Claude: {payload['model']}")
+
+        parts = []
+        tokens_in = tokens_out = 0
+        try:
+            with self.http.post(url, headers=headers, json=payload, timeout=120, stream=True) as response:
+                response.raise_for_status()
+                if cancel is not None:
+                    cancel.watch(response)
+                for event in self._iter_sse(response):
+                    if cancel is not None and cancel.is_set():
+                        tokens_out = tokens_out or self._estimate_tokens("".join(parts))
+                        break
+                    event_type = event.get("type")
+                    if event_type == "message_start":
+                        tokens_in = event["message"]["usage"]["input_tokens"]
+                    elif event_type == "content_block_delta":
+                        text = event["delta"].get("text")
+                        if text:
+                            parts.append(text)
+                            yield text
+                    elif event_type == "message_delta":
+                        tokens_out = event.get("usage", {}).get("output_tokens", tokens_out)
+                    elif event_type == "error":
+                        raise ConnectionError(f"Claude stream error: {event['error'].get('message')}")
+                    elif event_type == "message_stop":
+                        break
+        except requests.exceptions.RequestException as e:
+            if cancel is None or not cancel.is_set():
+                raise ConnectionError(f"Claude connection failed: {e}")
+            tokens_out = tokens_out or self._estimate_tokens("".join(parts))
+
+        return self._claude_result("".join(parts), tokens_in, tokens_out)
+
+    def _claude_request(self, query: str, stream: bool) -> tuple[str, dict, dict]:
+        """Anthropic Messages API request: (url, headers, payload)."""
         api_key = os.environ.get("ANTHROPIC_API_KEY")
         if not api_key:
             raise ValueError("ANTHROPIC_API_KEY not set")
 
-        cloud_config = self.config["models"]["cloud"]["claude"]
-        model = cloud_config["name"]
-
-        url = "https://api.anthropic.com/v1/messages"
+        url = self.config["models"]["cloud"]["claude"].get("endpoint", "https://api.anthropic.com/v1/messages")
         headers = {
             "x-api-key": api_key,
             "anthropic-version": "2023-06-01",
             "content-type": "application/json"
         }
         payload = {
-            "model": model,
+            "model": self.config["models"]["cloud"]["claude"]["name"],
             "max_tokens": 4096,
-            "messages": [{"role": "user", "content": query}]
+            "messages": [{"role": "user", "content": query}],
+            "stream": stream
         }
+        return url, headers, payload
 
-        self._log(f"Querying Claude: {model}")
+    def _claude_result(self, text: str, tokens_in: int, tokens_out: int) -> dict:
+        """Result dict from Claude output and token usage."""
+        cloud_config = self.config["models"]["cloud"]["claude"]
+        cost_in = tokens_in * cloud_config["cost_per_input_token"]
+        cost_out = tokens_out * cloud_config["cost_per_output_token"]
 
-        try:
-            response = requests.post(url, headers=headers, json=payload, timeout=120)
-            response.raise_for_status()
-            data = response.json()
+        return {
+            "response": text,
+            "tokens_in": tokens_in,
+            "tokens_out": tokens_out,
+            "cost": cost_in + cost_out,
+            "tool": "claude",
+            "model": cloud_config["name"]
+        }
 
-            tokens_in = data["usage"]["input_tokens"]
-            tokens_out = data["usage"]["output_tokens"]
-            cost_in = tokens_in * cloud_config["cost_per_input_token"]
-            cost_out = tokens_out * cloud_config["cost_per_output_token"]
+    def _wait_for_comfyui(self, comfy, prompt_id: str, max_wait: float,
+                          label: str) -> tuple[Optional[dict], int]:
+        """
+        Wait for a queued ComfyUI prompt (websocket events, or /history
+        polling with backoff) and return (history entry or None, seconds waited).
+        """
+        from comfyui_client import ComfyUIError
 
-            return {
-                "response": data["content"][0]["text"],
-                "tokens_in": tokens_in,
-                "tokens_out": tokens_out,
-                "cost": cost_in + cost_out,
-                "tool": "claude",
-                "model": model
-            }
-        except requests.exceptions.RequestException as e:
-            raise ConnectionError(f"Claude connection failed: {e}")
+        def on_progress(event):
+            data = event.get("data", {})
+            if event["type"] == "progress":
+                self._log(f"Waiting for {label}... step {data.get('value')}/{data.get('max')}")
 
-    def _delegate_to_comfyui(self, query: str) -> dict:
+        start = time.monotonic()
+        entry = None
+        with tracing.span("comfyui.poll") as poll_span:
+            try:
+                entry = comfy.wait(prompt_id, max_wait, on_progress)
+            except ComfyUIError as e:
+                poll_span.set(error=str(e))
+                self._log(f"ComfyUI {label} failed: {e}")
+            waited = round(time.monotonic() - start)
+            poll_span.set(waited_s=waited, mode=comfy.last_wait_mode)
+        return entry, waited
+
+    def _download_comfyui(self, comfy, entry: Optional[dict], output_path: Path,
+                          kinds: tuple, tag: str) -> list[str]:
+        """Stream a finished prompt's outputs to output_path as <timestamp>_<tag><filename>."""
+        prefix = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{tag}"
+        with tracing.span("comfyui.download") as download_span:
+            saved = comfy.download_outputs(
+                entry, output_path, kinds, prefix,
+                on_error=lambda file, e: self._log(f"Failed to download {file['filename']}: {e}"))
+            download_span.set(files=len(saved))
+        for path in saved:
+            self._log(f"Saved: {path}")
+        return [str(path) for path in saved]
+
+    def _comfyui_client(self, workflow: Optional[dict] = None, workflow_name: Optional[str] = None):
+        """Client for the least-loaded ComfyUI node able to run the workflow (first node if none answers)."""
+        from comfyui_client import ComfyUIError
+        from comfyui_pool import ComfyUIPool
+
+        pool = ComfyUIPool.from_config(self.tools_config, self.http)
+        try:
+            node = pool.select(workflow, workflow_name)
+        except ComfyUIError as e:
+            self._log(f"ComfyUI dispatch: {e}")
+            return pool.client()
+        return pool.client(node["endpoint"])
+
+    def build_comfyui_image_workflow(self, query: str) -> tuple[Optional[dict], dict]:
         """
-        Delegate image generation to ComfyUI on The Machine.
-        Generates prompt with local LLM, then executes workflow via API.
+        Write an SDXL prompt for `query` with the local LLM and inject it into
+        the sdxl_basic.json workflow. Returns (workflow or None if the workflow
+        file is missing, prompt_response).
         """
-        import time
-        import uuid
-
         comfyui_config = self.tools_config.get("comfyui", {})
-        endpoint = comfyui_config.get("endpoint", "http://100.64.130.71:8188")
         workflow_path = Path(comfyui_config.get("workflow_path", "C:/automation-machine/workflows/"))
-        output_path = Path(comfyui_config.get("output_path", "C:/automation-machine/output/"))
-
-        output_path.mkdir(parents=True, exist_ok=True)
-
-        self._log(f"ComfyUI delegation to {endpoint}")
 
         # Step 1: Generate optimized prompt using local LLM
         prompt_instruction = (
@@ -408,7 +681,8 @@ class AutomationBrain:
             "- Keep under 200 words\n"
             "- Output ONLY the prompt, no explanations"
         )
-        prompt_response = self._delegate_to_local(prompt_instruction, model="qwen")
+        with tracing.span("comfyui.prompt"):
+            prompt_response = self._delegate_to_local(prompt_instruction, model="qwen")
         generated_prompt = prompt_response["response"].strip()
 
         self._log(f"Generated prompt: {generated_prompt[:100]}...")
@@ -416,15 +690,8 @@ class AutomationBrain:
         # Step 2: Load and modify workflow
         workflow_file = workflow_path / "sdxl_basic.json"
         if not workflow_file.exists():
-            return {
-                "response": f"**Error:** Workflow not found at {workflow_file}\n\n"
-                           f"Generated prompt for manual use:\n{generated_prompt}",
-                "tokens_in": prompt_response["tokens_in"],
-                "tokens_out": prompt_response["tokens_out"],
-                "cost": 0.0,
-                "tool": "comfyui",
-                "model": "local-qwen"
-            }
+            self._log(f"Workflow not found at {workflow_file}")
+            return None, prompt_response
 
         with open(workflow_file, "r") as f:
             workflow = json.load(f)
@@ -432,21 +699,28 @@ class AutomationBrain:
         # Inject prompt and random seed
         workflow["6"]["inputs"]["text"] = generated_prompt
         workflow["3"]["inputs"]["seed"] = int(time.time()) % (2**32)
+        return workflow, prompt_response
 
-        # Step 3: Queue the prompt
-        client_id = str(uuid.uuid4())
-        try:
-            queue_response = requests.post(
-                f"{endpoint}/prompt",
-                json={"prompt": workflow, "client_id": client_id},
-                timeout=30
-            )
-            queue_response.raise_for_status()
-            prompt_id = queue_response.json().get("prompt_id")
-            self._log(f"Queued prompt: {prompt_id}")
-        except requests.exceptions.RequestException as e:
+    def _delegate_to_comfyui(self, query: str) -> dict:
+        """
+        Delegate image generation to ComfyUI on The Machine.
+        Generates prompt with local LLM, then executes workflow via API.
+        """
+        from comfyui_client import ComfyUIError
+
+        comfyui_config = self.tools_config.get("comfyui", {})
+        workflow_path = Path(comfyui_config.get("workflow_path", "C:/automation-machine/workflows/"))
+        output_path = Path(comfyui_config.get("output_path", "C:/automation-machine/output/"))
+
+        output_path.mkdir(parents=True, exist_ok=True)
+
+        # Steps 1-2: Prompt from the local LLM, injected into the workflow
+        workflow, prompt_response = self.build_comfyui_image_workflow(query)
+        generated_prompt = prompt_response["response"].strip()
+        if workflow is None:
+            workflow_file = workflow_path / "sdxl_basic.json"
             return {
-                "response": f"**ComfyUI Connection Error:** {e}\n\n"
+                "response": f"**Error:** Workflow not found at {workflow_file}\n\n"
                            f"Generated prompt for manual use:\n{generated_prompt}",
                 "tokens_in": prompt_response["tokens_in"],
                 "tokens_out": prompt_response["tokens_out"],
@@ -455,56 +729,33 @@ class AutomationBrain:
                 "model": "local-qwen"
             }
 
-        # Step 4: Poll for completion (max 5 minutes)
-        max_wait = 300
-        poll_interval = 2
-        waited = 0
-        output_images = []
+        comfy = self._comfyui_client(workflow, "sdxl_basic")
+        endpoint = comfy.endpoint
+        self._log(f"ComfyUI delegation to {endpoint}")
 
-        while waited < max_wait:
+        # Step 3: Queue the prompt
+        with tracing.span("comfyui.queue") as queue_span:
             try:
-                history_response = requests.get(
-                    f"{endpoint}/history/{prompt_id}",
-                    timeout=10
-                )
-                history = history_response.json()
-
-                if prompt_id in history:
-                    outputs = history[prompt_id].get("outputs", {})
-                    for node_id, node_output in outputs.items():
-                        if "images" in node_output:
-                            for img in node_output["images"]:
-                                output_images.append(img)
-                    if outputs:
-                        break
-            except Exception as e:
-                self._log(f"Poll error: {e}")
-
-            time.sleep(poll_interval)
-            waited += poll_interval
-            self._log(f"Waiting for generation... {waited}s")
+                prompt_id = comfy.submit(workflow)
+                queue_span.set(prompt_id=prompt_id)
+                self._log(f"Queued prompt: {prompt_id}")
+            except ComfyUIError as e:
+                queue_span.set(error=str(e))
+                return {
+                    "response": f"**ComfyUI Error:** {e}\n\n"
+                               f"Generated prompt for manual use:\n{generated_prompt}",
+                    "tokens_in": prompt_response["tokens_in"],
+                    "tokens_out": prompt_response["tokens_out"],
+                    "cost": 0.0,
+                    "tool": "comfyui",
+                    "model": "local-qwen"
+                }
+
+        # Step 4: Wait for completion (max 5 minutes)
+        entry, waited = self._wait_for_comfyui(comfy, prompt_id, 300, "generation")
 
         # Step 5: Download and save images
-        saved_files = []
-        for img_info in output_images:
-            filename = img_info.get("filename", "output.png")
-            subfolder = img_info.get("subfolder", "")
-            img_type = img_info.get("type", "output")
-
-            try:
-                img_url = f"{endpoint}/view?filename={filename}&subfolder={subfolder}&type={img_type}"
-                img_response = requests.get(img_url, timeout=30)
-                img_response.raise_for_status()
-
-                # Save locally
-                local_filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-                local_path = output_path / local_filename
-                with open(local_path, "wb") as f:
-                    f.write(img_response.content)
-                saved_files.append(str(local_path))
-                self._log(f"Saved: {local_path}")
-            except Exception as e:
-                self._log(f"Failed to download {filename}: {e}")
+        saved_files = self._download_comfyui(comfy, entry, output_path, ("images",), "")
 
         # Step 6: Return result
         if saved_files:
@@ -536,11 +787,11 @@ class AutomationBrain:
         Delegate image-to-video generation to ComfyUI on The Machine.
         Uses Wan2.1 I2V or AnimateDiff workflows.
         """
-        import time
-        import uuid
+        from comfyui_client import ComfyUIClient, ComfyUIError
 
         comfyui_config = self.tools_config.get("comfyui", {})
-        endpoint = comfyui_config.get("endpoint", "http://100.64.130.71:8188")
+        comfy = ComfyUIClient.from_config(self.tools_config, self.http)
+        endpoint = comfy.endpoint
         workflow_path = Path(comfyui_config.get("workflow_path", "C:/automation-machine/workflows/"))
         output_path = Path(comfyui_config.get("output_path", "C:/automation-machine/output/"))
 
@@ -557,7 +808,8 @@ class AutomationBrain:
             "- One sentence, under 20 words\n"
             "- Output ONLY the motion description"
         )
-        prompt_response = self._delegate_to_local(prompt_instruction, model="qwen")
+        with tracing.span("comfyui.prompt"):
+            prompt_response = self._delegate_to_local(prompt_instruction, model="qwen")
         motion_prompt = prompt_response["response"].strip()
 
         self._log(f"Motion prompt: {motion_prompt}")
@@ -606,80 +858,29 @@ class AutomationBrain:
                 workflow["1"]["inputs"]["image"] = image_path
 
         # Step 3: Queue the workflow
-        client_id = str(uuid.uuid4())
-        try:
-            queue_response = requests.post(
-                f"{endpoint}/prompt",
-                json={"prompt": workflow, "client_id": client_id},
-                timeout=30
-            )
-            queue_response.raise_for_status()
-            prompt_id = queue_response.json().get("prompt_id")
-            self._log(f"Queued video prompt: {prompt_id}")
-        except requests.exceptions.RequestException as e:
-            return {
-                "response": f"**ComfyUI Connection Error:** {e}\n\n"
-                           f"**Motion prompt for manual use:**\n{motion_prompt}\n\n"
-                           f"Ensure ComfyUI is running at {endpoint}",
-                "tokens_in": prompt_response["tokens_in"],
-                "tokens_out": prompt_response["tokens_out"],
-                "cost": 0.0,
-                "tool": "comfyui-video",
-                "model": "local-qwen"
-            }
-
-        # Step 4: Poll for completion (max 10 minutes for video)
-        max_wait = 600
-        poll_interval = 5
-        waited = 0
-        output_videos = []
-
-        while waited < max_wait:
+        with tracing.span("comfyui.queue") as queue_span:
             try:
-                history_response = requests.get(
-                    f"{endpoint}/history/{prompt_id}",
-                    timeout=10
-                )
-                history = history_response.json()
-
-                if prompt_id in history:
-                    outputs = history[prompt_id].get("outputs", {})
-                    for node_id, node_output in outputs.items():
-                        if "gifs" in node_output:
-                            for vid in node_output["gifs"]:
-                                output_videos.append(vid)
-                        if "videos" in node_output:
-                            for vid in node_output["videos"]:
-                                output_videos.append(vid)
-                    if outputs:
-                        break
-            except Exception as e:
-                self._log(f"Poll error: {e}")
-
-            time.sleep(poll_interval)
-            waited += poll_interval
-            self._log(f"Waiting for video generation... {waited}s")
+                prompt_id = comfy.submit(workflow)
+                queue_span.set(prompt_id=prompt_id)
+                self._log(f"Queued video prompt: {prompt_id}")
+            except ComfyUIError as e:
+                queue_span.set(error=str(e))
+                return {
+                    "response": f"**ComfyUI Error:** {e}\n\n"
+                               f"**Motion prompt for manual use:**\n{motion_prompt}\n\n"
+                               f"Ensure ComfyUI is running at {endpoint}",
+                    "tokens_in": prompt_response["tokens_in"],
+                    "tokens_out": prompt_response["tokens_out"],
+                    "cost": 0.0,
+                    "tool": "comfyui-video",
+                    "model": "local-qwen"
+                }
+
+        # Step 4: Wait for completion (max 10 minutes for video)
+        entry, waited = self._wait_for_comfyui(comfy, prompt_id, 600, "video generation")
 
         # Step 5: Download and save videos
-        saved_files = []
-        for vid_info in output_videos:
-            filename = vid_info.get("filename", "output.mp4")
-            subfolder = vid_info.get("subfolder", "")
-            vid_type = vid_info.get("type", "output")
-
-            try:
-                vid_url = f"{endpoint}/view?filename={filename}&subfolder={subfolder}&type={vid_type}"
-                vid_response = requests.get(vid_url, timeout=60)
-                vid_response.raise_for_status()
-
-                local_filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_video_{filename}"
-                local_path = output_path / local_filename
-                with open(local_path, "wb") as f:
-                    f.write(vid_response.content)
-                saved_files.append(str(local_path))
-                self._log(f"Saved video: {local_path}")
-            except Exception as e:
-                self._log(f"Failed to download {filename}: {e}")
+        saved_files = self._download_comfyui(comfy, entry, output_path, ("gifs", "videos"), "video_")
 
         # Step 6: Return result
         if saved_files:
@@ -712,11 +913,11 @@ class AutomationBrain:
         Delegate talking head generation to ComfyUI using SadTalker.
         Requires: face image + audio file
         """
-        import time
-        import uuid
+        from comfyui_client import ComfyUIClient, ComfyUIError
 
         comfyui_config = self.tools_config.get("comfyui", {})
-        endpoint = comfyui_config.get("endpoint", "http://100.64.130.71:8188")
+        comfy = ComfyUIClient.from_config(self.tools_config, self.http)
+        endpoint = comfy.endpoint
         workflow_path = Path(comfyui_config.get("workflow_path", "C:/automation-machine/workflows/"))
         output_path = Path(comfyui_config.get("output_path", "C:/automation-machine/output/"))
 
@@ -786,82 +987,31 @@ class AutomationBrain:
             workflow["2"]["inputs"]["audio"] = audio_file
 
         # Queue the workflow
-        client_id = str(uuid.uuid4())
-        try:
-            queue_response = requests.post(
-                f"{endpoint}/prompt",
-                json={"prompt": workflow, "client_id": client_id},
-                timeout=30
-            )
-            queue_response.raise_for_status()
-            prompt_id = queue_response.json().get("prompt_id")
-            self._log(f"Queued talking head prompt: {prompt_id}")
-        except requests.exceptions.RequestException as e:
-            return {
-                "response": f"**ComfyUI Connection Error:** {e}\n\n"
-                           f"Ensure ComfyUI is running at {endpoint}\n\n"
-                           f"**Files to use:**\n"
-                           f"- Face: {face_image}\n"
-                           f"- Audio: {audio_file}",
-                "tokens_in": 0,
-                "tokens_out": 0,
-                "cost": 0.0,
-                "tool": "comfyui-video-talking-head",
-                "model": "sadtalker"
-            }
-
-        # Poll for completion (max 10 minutes)
-        max_wait = 600
-        poll_interval = 5
-        waited = 0
-        output_videos = []
-
-        while waited < max_wait:
+        with tracing.span("comfyui.queue") as queue_span:
             try:
-                history_response = requests.get(
-                    f"{endpoint}/history/{prompt_id}",
-                    timeout=10
-                )
-                history = history_response.json()
-
-                if prompt_id in history:
-                    outputs = history[prompt_id].get("outputs", {})
-                    for node_id, node_output in outputs.items():
-                        if "gifs" in node_output:
-                            for vid in node_output["gifs"]:
-                                output_videos.append(vid)
-                        if "videos" in node_output:
-                            for vid in node_output["videos"]:
-                                output_videos.append(vid)
-                    if outputs:
-                        break
-            except Exception as e:
-                self._log(f"Poll error: {e}")
-
-            time.sleep(poll_interval)
-            waited += poll_interval
-            self._log(f"Waiting for talking head generation... {waited}s")
+                prompt_id = comfy.submit(workflow)
+                queue_span.set(prompt_id=prompt_id)
+                self._log(f"Queued talking head prompt: {prompt_id}")
+            except ComfyUIError as e:
+                queue_span.set(error=str(e))
+                return {
+                    "response": f"**ComfyUI Error:** {e}\n\n"
+                               f"Ensure ComfyUI is running at {endpoint}\n\n"
+                               f"**Files to use:**\n"
+                               f"- Face: {face_image}\n"
+                               f"- Audio: {audio_file}",
+                    "tokens_in": 0,
+                    "tokens_out": 0,
+                    "cost": 0.0,
+                    "tool": "comfyui-video-talking-head",
+                    "model": "sadtalker"
+                }
+
+        # Wait for completion (max 10 minutes)
+        entry, waited = self._wait_for_comfyui(comfy, prompt_id, 600, "talking head generation")
 
         # Download and save videos
-        saved_files = []
-        for vid_info in output_videos:
-            filename = vid_info.get("filename", "output.mp4")
-            subfolder = vid_info.get("subfolder", "")
-            vid_type = vid_info.get("type", "output")
-
-            try:
-                vid_url = f"{endpoint}/view?filename={filename}&subfolder={subfolder}&type={vid_type}"
-                vid_response = requests.get(vid_url, timeout=60)
-                vid_response.raise_for_status()
-
-                local_filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_talking_head_{filename}"
-                local_path = output_path / local_filename
-                with open(local_path, "wb") as f:
-                    f.write(vid_response.content)
-                saved_files.append(str(local_path))
-                self._log(f"Saved talking head video: {local_path}")
-            except Exception as e:
-                self._log(f"Failed to download {filename}: {e}")
+        saved_files = self._download_comfyui(comfy, entry, output_path, ("gifs", "videos"), "talking_head_")
 
         if saved_files:
             response_text = (
@@ -1055,104 +1205,124 @@ Be specific about selectors and actions."""
     # KNOWLEDGE BASE
     # =========================================================================
 
-    def search_knowledge_base(self, query: str) -> list[dict]:
-        """Search knowledge base for relevant context."""
-        results = []
-        query_terms = query.lower().split()
+    def search_knowledge_base(self, query: str, window: int = kb_index.SNIPPET_WINDOW) -> list[dict]:
+        """
+        Search knowledge base for relevant context.
+        Uses embedding retrieval when knowledge_base.retrieval is "semantic",
+        falling back to the keyword index if Ollama or numpy is unavailable
+        or the vector index is still being built in the background.
+        window is the keyword snippet size (lines either side of the best match).
+        Returns [] if the index cannot be opened (e.g. no knowledge base).
+        """
+        kb_config = self.config.get("knowledge_base", {})
+        if kb_config.get("retrieval") == "semantic":
+            from kb_vectors import IndexNotReady
 
-        for md_file in KNOWLEDGE_BASE_PATH.rglob("*.md"):
             try:
-                content = md_file.read_text(encoding="utf-8")
-                content_lower = content.lower()
-
-                matches = sum(1 for term in query_terms if term in content_lower)
-                if matches > 0:
-                    lines = content.split("\n")
-                    snippet_lines = []
-                    for line in lines:
-                        if any(term in line.lower() for term in query_terms):
-                            snippet_lines.append(line.strip())
-                            if len(snippet_lines) >= 3:
-                                break
-
-                    results.append({
-                        "file": str(md_file.relative_to(KNOWLEDGE_BASE_PATH)),
-                        "matches": matches,
-                        "snippet": "\n".join(snippet_lines) if snippet_lines else lines[0][:200]
-                    })
-            except Exception:
-                continue
+                return self._search_knowledge_base_semantic(query, kb_config)
+            except (ImportError, ConnectionError) as e:
+                self._log(f"Semantic retrieval unavailable ({e}), using keyword search")
+            except IndexNotReady as e:
+                self._log(f"{e} (build it ahead with kb_vectors.py --refresh), using keyword search")
+        try:
+            return kb_index.search(query, KNOWLEDGE_BASE_PATH, KB_INDEX_PATH, limit=5, window=window)
+        except (sqlite3.Error, OSError) as e:
+            self._log(f"Knowledge base search unavailable: {e}")
+            return []
 
-        results.sort(key=lambda x: x["matches"], reverse=True)
-        return results[:5]
+    def _context_budget(self, tool: str) -> int:
+        """
+        Tokens of KB context for a tool: a share of its model's max_tokens,
+        small on paid routes, 0 for tools that never see the context.
+        """
+        if tool in NO_CONTEXT_TOOLS:
+            return 0
+        context_config = self.config.get("knowledge_base", {}).get("context", {})
+        models = self.config["models"]
+        if tool == "claude":
+            max_tokens, kind = models["cloud"]["claude"].get("max_tokens", 4096), "paid"
+        elif tool == "perplexity":
+            max_tokens, kind = self.tools_config.get("perplexity", {}).get("max_tokens", 4096), "paid"
+        elif tool == "local-qwen":
+            max_tokens, kind = models["local"]["qwen"].get("max_tokens", 4096), "local"
+        else:
+            # Everything else runs on deepseek (see _run_delegate)
+            max_tokens, kind = models["local"]["deepseek"].get("max_tokens", 4096), "local"
+        share = context_config.get(f"{kind}_share", DEFAULT_CONTEXT_SHARE[kind])
+        return int(max_tokens * share)
+
+    def _search_knowledge_base_semantic(self, query: str, kb_config: dict) -> list[dict]:
+        """Top-k cosine search over embedded knowledge-base chunks."""
+        import kb_vectors
+
+        index = kb_vectors.get_index(
+            KNOWLEDGE_BASE_PATH, KB_VECTORS_DIR,
+            model=kb_config.get("embedding_model", kb_vectors.DEFAULT_EMBEDDING_MODEL),
+            endpoint=self.config["models"]["local"]["deepseek"]["endpoint"],
+            session=self.http,
+        )
+        return index.search(
+            query,
+            limit=kb_config.get("top_k", 3),
+            min_score=kb_config.get("min_similarity", 0.0),
+        )
 
     # =========================================================================
     # LOGGING & TRACKING
     # =========================================================================
 
     def _load_usage_log(self) -> dict:
-        """Load usage log from JSON."""
-        with open(USAGE_LOG_PATH, "r") as f:
-            return json.load(f)
-
-    def _save_usage_log(self, log: dict) -> None:
-        """Save usage log to JSON."""
-        with open(USAGE_LOG_PATH, "w") as f:
-            json.dump(log, f, indent=2)
-
-    def _update_usage(self, result: dict, category: str) -> None:
-        """Update usage statistics with new query result."""
-        log = self._load_usage_log()
-        today = datetime.now().strftime("%Y-%m-%d")
-        month = datetime.now().strftime("%Y-%m")
-
-        tool = result.get("tool", "unknown")
-        model = result.get("model", "unknown")
-
-        # Update summary
-        log["summary"]["total_queries"] += 1
-        log["summary"]["total_cost_usd"] += result["cost"]
-
-        # Update by-tool stats
-        if "by_tool" not in log["summary"]:
-            log["summary"]["by_tool"] = {}
-        if tool not in log["summary"]["by_tool"]:
-            log["summary"]["by_tool"][tool] = {
-                "queries": 0, "cost_usd": 0.0, "tokens_in": 0, "tokens_out": 0
-            }
-        log["summary"]["by_tool"][tool]["queries"] += 1
-        log["summary"]["by_tool"][tool]["cost_usd"] += result["cost"]
-        log["summary"]["by_tool"][tool]["tokens_in"] += result["tokens_in"]
-        log["summary"]["by_tool"][tool]["tokens_out"] += result["tokens_out"]
-
-        # Update daily stats
-        if today not in log["summary"]["daily"]:
-            log["summary"]["daily"][today] = {"queries": 0, "cost_usd": 0.0}
-        log["summary"]["daily"][today]["queries"] += 1
-        log["summary"]["daily"][today]["cost_usd"] += result["cost"]
-
-        # Update monthly stats
-        if month not in log["summary"]["monthly"]:
-            log["summary"]["monthly"][month] = {"queries": 0, "cost_usd": 0.0}
-        log["summary"]["monthly"][month]["queries"] += 1
-        log["summary"]["monthly"][month]["cost_usd"] += result["cost"]
-
-        # Add to history with enhanced schema
-        log["history"].append({
+        """Usage log in the usage_log.json shape, rolled up from the event store."""
+        return self.usage.usage_log()
+
+    def _update_usage(self, result: dict, ctx: dict, fell_back: bool = False) -> None:
+        """Append a usage event and refresh the usage_log.json export if due."""
+        analysis = ctx["analysis"]
+        event = {
             "timestamp": datetime.now().isoformat(),
-            "tool": tool,
-            "model": model,
+            "tool": result.get("tool", "unknown"),
+            "model": result.get("model", "unknown"),
             "tokens_in": result["tokens_in"],
             "tokens_out": result["tokens_out"],
             "cost_usd": result["cost"],
-            "task_category": category
-        })
-
-        # Keep only last 1000 entries
-        if len(log["history"]) > 1000:
-            log["history"] = log["history"][-1000:]
-
-        self._save_usage_log(log)
+            "task_category": analysis["category"],
+            "latency_ms": result.get("latency_ms"),
+            "cache_hit": result.get("cache_hit", False),
+            # Routing context for route_model.py training
+            "query": ctx["query"],
+            "complexity": analysis["complexity"],
+            "routed_tool": self._fallback_tool(ctx["tool"]) if fell_back else ctx["tool"],
+            "routed_by": ctx["routed_by"],
+            "fell_back": fell_back,
+        }
+        if self._usage_buffer is not None:
+            self._usage_buffer.append(event)
+            return
+        self.usage.record(event)
+        self.usage.maybe_export()
+
+    def begin_usage_batch(self) -> None:
+        """Buffer usage events until flush_usage() (batch mode)."""
+        if self._usage_buffer is None:
+            self._usage_buffer = []
+
+    def flush_usage(self) -> int:
+        """Write buffered usage events in one transaction and export once."""
+        events, self._usage_buffer = self._usage_buffer or [], None
+        if events:
+            self.usage.record_many(events)
+            self.usage.export_usage_log()
+        return len(events)
+
+    def record_delegation(self, query: str, result: dict) -> None:
+        """
+        Log usage and conversation for work delegated outside process()
+        (a scheduled ComfyUI batch), as if `query` had been forced to result["tool"].
+        """
+        ctx = {"query": query, "analysis": self._analyze_task(query),
+               "tool": result["tool"], "routed_by": "forced"}
+        self._update_usage(result, ctx)
+        self._log_conversation(query, result["response"], result["tool"], result["model"])
 
     def _log_conversation(self, query: str, response: str, tool: str, model: str) -> None:
         """Append to conversation log."""
@@ -1170,82 +1340,439 @@ Be specific about selectors and actions."""
         with open(CONVERSATION_LOG_PATH, "a", encoding="utf-8") as f:
             f.write(entry)
 
+    def _model_for_tool(self, tool: str) -> str:
+        """Model a tool will run, used to scope cache entries."""
+        if tool == "local-deepseek":
+            return self.config["models"]["local"]["deepseek"]["name"]
+        if tool == "local-qwen":
+            return self.config["models"]["local"]["qwen"]["name"]
+        if tool == "claude":
+            return self.config["models"]["cloud"]["claude"]["name"]
+        if tool == "perplexity":
+            return self.tools_config.get("perplexity", {}).get("model", "sonar-pro")
+        return tool
+
     # =========================================================================
     # MAIN PROCESSING
     # =========================================================================
 
-    def process(self, query: str, force_tool: Optional[str] = None) -> str:
+    def _prepare(self, query: str, force_tool: Optional[str] = None) -> dict:
         """
-        Main processing pipeline:
-        1. Analyze task
-        2. Search knowledge base for context
-        3. Delegate to optimal tool
-        4. Log and track
-        5. Return response
+        Pipeline steps 1-3 plus cache lookup. Returns the request context:
+        {"query", "analysis", "enhanced_query", "tool", "routed_by",
+         "cache_model", "query_vector", "cached"}
         """
         # Step 1: Analyze task
-        analysis = self._analyze_task(query)
+        with tracing.span("analyze") as span:
+            analysis = self._analyze_task(query)
+            span.set(category=analysis["category"], complexity=analysis["complexity"])
         self._log(f"Analysis: category={analysis['category']}, "
                   f"complexity={analysis['complexity']}, "
                   f"recommended={analysis['recommended_tool']}")
 
-        # Step 2: Check knowledge base
-        kb_results = self.search_knowledge_base(query)
-        kb_context = ""
-        if kb_results:
-            kb_context = "\n\nRelevant context from knowledge base:\n"
-            for r in kb_results[:2]:
-                kb_context += f"- {r['file']}: {r['snippet'][:100]}...\n"
-
-        enhanced_query = query + kb_context if kb_context else query
-
-        # Step 3: Select tool (forced or recommended)
+        # Step 2: Select tool (forced or recommended)
         tool = force_tool or analysis["recommended_tool"]
         self._log(f"Using tool: {tool}")
 
-        # Step 4: Delegate
-        try:
-            if tool == "local-deepseek":
-                result = self._delegate_to_local(enhanced_query, "deepseek")
-            elif tool == "local-qwen":
-                result = self._delegate_to_local(enhanced_query, "qwen")
+        # Step 3: Knowledge-base context sized to the tool's token budget
+        budget = self._context_budget(tool)
+        kb_context, context_tokens = "", 0
+        if budget >= context_budget.MIN_BUDGET:  # Else not even one snippet would fit: skip the search
+            with tracing.span("kb_search") as span:
+                # Wider keyword snippets when the budget can hold them (up to 6 lines each side)
+                window = max(kb_index.SNIPPET_WINDOW, min(6, budget // 256))
+                kb_results = self.search_knowledge_base(query, window)
+                kb_context, context_tokens = context_budget.assemble(
+                    kb_results, budget,
+                    self.config.get("knowledge_base", {}).get("context", {}).get("min_score_ratio", 0.0))
+                span.set(results=len(kb_results), budget=budget, context_tokens=context_tokens)
+            self._log(f"KB context: ~{context_tokens}/{budget} tokens from {len(kb_results)} hits")
+
+        enhanced_query = query + kb_context
+
+        # Step 4a: Cache lookup
+        cache_model = self._model_for_tool(tool)
+        with tracing.span("cache_lookup", tool=tool) as span:
+            cached = self.cache.get(tool, cache_model, enhanced_query) if self.cache else None
+
+            # Paraphrase check for expensive cloud routes
+            query_vector = None
+            if (cached is None and tool in self._semantic_tools()
+                    and self.semantic_cache and tool in self.semantic_cache.tools):
+                try:
+                    query_vector = self.semantic_cache.embed(query)
+                    cached = self.semantic_cache.lookup(tool, cache_model, query_vector)
+                except ConnectionError as e:
+                    self._log(f"Semantic cache unavailable: {e}")
+            span.set(hit=cached is not None, semantic=query_vector is not None)
+
+        return {
+            "query": query,
+            "analysis": analysis,
+            "enhanced_query": enhanced_query,
+            "tool": tool,
+            "routed_by": "forced" if force_tool else analysis["routed_by"],
+            "cache_model": cache_model,
+            "query_vector": query_vector,
+            "cached": cached,
+        }
+
+    def _serve_cached(self, ctx: dict) -> dict:
+        """Log a cache hit as a zero-cost, zero-latency usage event."""
+        cached = ctx["cached"]
+        self._log(f"Cache hit for {ctx['tool']}"
+                  + (f" (similarity {cached['similarity']})" if "similarity" in cached else ""))
+        result = dict(cached, tokens_in=0, tokens_out=0, cost=0.0,
+                      latency_ms=0, cache_hit=True)
+        self._update_usage(result, ctx)
+        return result
+
+    def _dispatch(self, tool: str, query: str, enhanced_query: str) -> dict:
+        """Run the delegate for a tool and return its result dict (circuit-breaker tracked)."""
+        with tracing.span("delegate", tool=tool) as span:
+            self._check_circuit(tool)
+            try:
+                result = self._run_delegate(tool, query, enhanced_query)
+            except ConnectionError as e:
+                self._record_health(tool, e)
+                raise
+            self._record_health(tool)
+            span.set(tokens_in=result["tokens_in"], tokens_out=result["tokens_out"])
+            return result
+
+    def _run_delegate(self, tool: str, query: str, enhanced_query: str) -> dict:
+        """Delegate method for each tool."""
+        if tool == "local-deepseek":
+            return self._delegate_to_local(enhanced_query, "deepseek")
+        elif tool == "local-qwen":
+            return self._delegate_to_local(enhanced_query, "qwen")
+        elif tool == "perplexity":
+            return self._delegate_to_perplexity(enhanced_query)
+        elif tool == "claude":
+            return self._delegate_to_claude(enhanced_query)
+        elif tool == "comfyui":
+            return self._delegate_to_comfyui(query)
+        elif tool == "comfyui-video":
+            return self._delegate_to_comfyui_video(query)
+        elif tool == "comfyui-video-talking-head":
+            return self._delegate_to_comfyui_talking_head(query)
+        elif tool == "github":
+            return self._delegate_to_github(query)
+        elif tool == "claude-in-chrome":
+            return self._delegate_to_browser(query)
+        elif tool == "supabase":
+            return self._delegate_to_supabase(query)
+        else:
+            # Default to local deepseek
+            return self._delegate_to_local(enhanced_query, "deepseek")
+
+    def _stream_tool(self, tool: str, enhanced_query: str,
+                     cancel: Optional[StreamCancel] = None) -> Generator[str, None, dict]:
+        """Token stream for a tool in STREAMING_TOOLS (circuit-breaker tracked)."""
+        with tracing.span("delegate", tool=tool, stream=True) as span:
+            self._check_circuit(tool)
+            if tool == "local-qwen":
+                stream = self._stream_local(enhanced_query, "qwen", cancel)
             elif tool == "perplexity":
-                result = self._delegate_to_perplexity(enhanced_query)
+                stream = self._stream_perplexity(enhanced_query, cancel)
             elif tool == "claude":
-                result = self._delegate_to_claude(enhanced_query)
-            elif tool == "comfyui":
-                result = self._delegate_to_comfyui(query)
-            elif tool == "comfyui-video":
-                result = self._delegate_to_comfyui_video(query)
-            elif tool == "comfyui-video-talking-head":
-                result = self._delegate_to_comfyui_talking_head(query)
-            elif tool == "github":
-                result = self._delegate_to_github(query)
-            elif tool == "claude-in-chrome":
-                result = self._delegate_to_browser(query)
-            elif tool == "supabase":
-                result = self._delegate_to_supabase(query)
-            else:
-                # Default to local deepseek
-                result = self._delegate_to_local(enhanced_query, "deepseek")
-        except (ConnectionError, ValueError) as e:
-            # Fallback chain: perplexity → qwen → deepseek
-            self._log(f"Error with {tool}: {e}. Attempting fallback...")
-            if tool in ["claude", "perplexity"]:
-                result = self._delegate_to_local(enhanced_query, "qwen")
-            elif tool == "local-qwen":
-                result = self._delegate_to_local(enhanced_query, "deepseek")
+                stream = self._stream_claude(enhanced_query, cancel)
             else:
+                stream = self._stream_local(enhanced_query, "deepseek", cancel)
+            try:
+                result = yield from stream
+            except ConnectionError as e:
+                self._record_health(tool, e)
                 raise
+            self._record_health(tool)
+            span.set(tokens_in=result["tokens_in"], tokens_out=result["tokens_out"],
+                     cancelled=cancel is not None and cancel.is_set())
+            return result
+
+    @staticmethod
+    def _fallback_tool(tool: str) -> Optional[str]:
+        """Fallback chain: claude/perplexity → qwen → deepseek."""
+        if tool in ["claude", "perplexity"]:
+            return "local-qwen"
+        elif tool == "local-qwen":
+            return "local-deepseek"
+        return None
 
-        # Step 5: Log everything
-        self._update_usage(result, analysis["category"])
-        self._log_conversation(query, result["response"], result["tool"], result["model"])
+    def _hedge_delay(self, tool: str, latency_critical: bool = False) -> Optional[float]:
+        """
+        Seconds to wait for output from `tool` before also starting its
+        fallback, or None if this route is not hedged (routing.hedging).
+        """
+        hedging = self.config.get("routing", {}).get("hedging", {})
+        if (not hedging.get("enabled", False) or tool not in STREAMING_TOOLS
+                or self._fallback_tool(tool) is None):
+            return None
+        if latency_critical:
+            return 0.0
+        delay = hedging.get("delay_seconds", {}).get(tool)
+        return None if delay is None else float(delay)
+
+    def _hedged_stream(self, ctx: dict, delay: float) -> Generator[str, None, tuple[dict, bool]]:
+        """
+        Hedged request: start the routed tool and, if it has produced no
+        output after `delay` seconds (or fails first), start its fallback in
+        parallel. The first attempt to produce output wins and is streamed;
+        the other is cancelled and its partial usage kept in
+        ctx["hedge_losers"] for _finish to log (waiting up to
+        routing.hedging.loser_wait_seconds for it to end).
+        Returns (result, fell_back).
+        """
+        tool = ctx["tool"]
+        fallback = self._fallback_tool(tool)
+        events: queue.Queue = queue.Queue()
+        cancels = {tool: StreamCancel(), fallback: StreamCancel()}
+        lock = threading.Lock()
+        state = {"winner": None, "abandoned": False}
+        launched = []
+        starts: dict[str, float] = {}
+
+        def attempt(name: str) -> None:
+            starts[name] = time.perf_counter()
+            try:
+                stream = self._stream_tool(name, ctx["enhanced_query"], cancels[name])
+                while True:
+                    try:
+                        token = next(stream)
+                    except StopIteration as stop:
+                        result = stop.value
+                        break
+                    events.put(("token", name, token))
+            except Exception as e:
+                events.put(("error", name, e))
+                return
+            with lock:
+                if not state["abandoned"]:
+                    events.put(("done", name, result))
+                    return
+            # The request stopped waiting for this loser: record it late rather than never
+            self._record_hedge_loser(ctx, name, self._hedge_result(result, starts[name]))
+
+        def launch(name: str) -> None:
+            launched.append(name)
+            # Copy the context so the attempt's spans nest under this request
+            threading.Thread(target=contextvars.copy_context().run, args=(attempt, name),
+                             name=f"hedge-{name}", daemon=True).start()
+
+        launch(tool)
+        errors: dict[str, Exception] = {}
+        settled = set()
+        while True:
+            try:
+                kind, name, value = events.get(timeout=delay if len(launched) == 1 else None)
+            except queue.Empty:
+                self._log(f"No output from {tool} after {delay:g}s; hedging with {fallback}")
+                launch(fallback)
+                continue
 
-        self._log(f"Tokens: {result['tokens_in']} in / {result['tokens_out']} out | "
+            winner = state["winner"]
+            if winner is None and kind == "done" and not value["response"].strip():
+                kind, value = "error", ValueError(f"{name} returned an empty response")
+
+            if kind == "error":
+                if name == winner:
+                    self._record_hedge_losers(ctx)  # No _finish for a failed request
+                    raise value
+                errors[name] = value
+                if len(launched) == 1:
+                    self._log(f"Error with {tool}: {value}. Falling back to {fallback}...")
+                    launch(fallback)
+                elif winner is None and len(errors) == len(launched):
+                    raise value
+                continue
+
+            if winner is None:
+                with lock:
+                    state["winner"] = winner = name
+                loser = fallback if name == tool else tool
+                if loser in launched and loser not in errors:
+                    self._log(f"{name} answered first; cancelling {loser}")
+                    cancels[loser].set()
+
+            if name != winner:
+                if kind == "done":
+                    # Finished before it saw the cancellation
+                    ctx.setdefault("hedge_losers", []).append((name, self._hedge_result(value, starts[name])))
+                    settled.add(name)
+                continue
+            if kind == "token":
+                yield value
+                continue
+
+            loser = fallback if name == tool else tool
+            if loser in launched and loser not in errors and loser not in settled:
+                self._await_hedge_loser(ctx, loser, events, lock, state, starts)
+            return value, name != tool
+
+    def _await_hedge_loser(self, ctx: dict, loser: str, events: queue.Queue, lock: threading.Lock,
+                           state: dict, starts: dict) -> None:
+        """
+        Wait (bounded) for a cancelled hedge attempt to finish and keep its
+        usage in ctx["hedge_losers"], so it is logged with the request. A
+        loser that outlives the wait records itself when it ends.
+        """
+        wait = self.config.get("routing", {}).get("hedging", {}).get(
+            "loser_wait_seconds", HEDGE_LOSER_WAIT_SECONDS)
+        deadline = time.monotonic() + wait
+        while True:
+            try:
+                kind, name, value = events.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                with lock:
+                    state["abandoned"] = True
+                try:
+                    kind, name, value = events.get_nowait()  # Queued just before the flag
+                except queue.Empty:
+                    self._log(f"Hedge loser {loser} still running after {wait:g}s; "
+                              f"it will log its usage when it ends")
+                    return
+            if name != loser or kind == "token":
+                continue
+            if kind == "done":
+                ctx.setdefault("hedge_losers", []).append((loser, self._hedge_result(value, starts[loser])))
+            return
+
+    @staticmethod
+    def _hedge_result(result: dict, start: float) -> dict:
+        return dict(result, latency_ms=round((time.perf_counter() - start) * 1000))
+
+    def _record_hedge_losers(self, ctx: dict) -> None:
+        """Log the hedge losers _hedged_stream kept for this request."""
+        for tool, result in ctx.pop("hedge_losers", []):
+            self._record_hedge_loser(ctx, tool, result)
+
+    def _record_hedge_loser(self, ctx: dict, tool: str, result: dict) -> None:
+        """
+        Log the cancelled attempt of a hedged request. Its routed_by "hedge"
+        makes the usage rollups count its cost and tokens, but not a query.
+        """
+        self._log(f"Hedge loser {tool}: {result['tokens_in']} in / {result['tokens_out']} out | "
                   f"Cost: ${result['cost']:.4f}")
+        self._update_usage(result, dict(ctx, tool=tool, routed_by="hedge"))
+
+    def _finish(self, ctx: dict, result: dict, start: float, fell_back: bool) -> None:
+        """Pipeline step 5: cache, log usage and conversation."""
+        tool, query = ctx["tool"], ctx["query"]
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000)
+        with tracing.span("cache_store", tool=tool):
+            if self.cache and not fell_back:
+                self.cache.put(tool, ctx["cache_model"], ctx["enhanced_query"], result)
+            if ctx["query_vector"] is not None and not fell_back:
+                self.semantic_cache.add(tool, ctx["cache_model"], query, ctx["query_vector"], result)
+
+        with tracing.span("usage_log"):
+            self._record_hedge_losers(ctx)
+            self._update_usage(result, ctx, fell_back)
+        with tracing.span("conversation_log"):
+            self._log_conversation(query, result["response"], result["tool"], result["model"])
 
-        return result["response"]
+        self._log(f"Tokens: {result['tokens_in']} in / {result['tokens_out']} out | "
+                  f"Cost: ${result['cost']:.4f} | Latency: {result['latency_ms']}ms")
+
+    def process(self, query: str, force_tool: Optional[str] = None,
+                latency_critical: bool = False) -> str:
+        """
+        Main processing pipeline:
+        1. Analyze task
+        2. Search knowledge base for context (sized to the tool's token budget)
+        3. Delegate to optimal tool (hedged with its fallback if configured;
+           latency_critical starts the fallback immediately)
+        4. Log and track
+        5. Return response
+        """
+        with tracing.span("process", latency_critical=latency_critical) as span:
+            ctx = self._prepare(query, force_tool)
+            span.set(tool=ctx["tool"], routed_by=ctx["routed_by"], cache_hit=ctx["cached"] is not None)
+            if ctx["cached"] is not None:
+                return self._serve_cached(ctx)["response"]
+
+            # Step 4: Delegate
+            tool = ctx["tool"]
+            start = time.perf_counter()
+            fell_back = False
+            delay = self._hedge_delay(tool, latency_critical)
+            if delay is not None:
+                result, fell_back = self._drain(self._hedged_stream(ctx, delay))
+            else:
+                try:
+                    result = self._dispatch(tool, query, ctx["enhanced_query"])
+                except (ConnectionError, ValueError) as e:
+                    fallback = self._fallback_tool(tool)
+                    if fallback is None:
+                        raise
+                    self._log(f"Error with {tool}: {e}. Falling back to {fallback}...")
+                    fell_back = True
+                    result = self._dispatch(fallback, query, ctx["enhanced_query"])
+
+            # Step 5: Log everything
+            self._finish(ctx, result, start, fell_back)
+            span.set(fell_back=fell_back, hedged=delay is not None)
+            return result["response"]
+
+    def process_stream(self, query: str, force_tool: Optional[str] = None,
+                       latency_critical: bool = False) -> Generator[str, None, dict]:
+        """
+        Streaming variant of process(): yields response text as it arrives
+        and returns the final result dict. Tools that cannot stream (ComfyUI,
+        GitHub, ...) and cache hits yield the whole response once. Fallback
+        only happens if the failing tool had not produced any output yet.
+        """
+        with tracing.span("process", stream=True, latency_critical=latency_critical) as span:
+            ctx = self._prepare(query, force_tool)
+            span.set(tool=ctx["tool"], routed_by=ctx["routed_by"], cache_hit=ctx["cached"] is not None)
+            if ctx["cached"] is not None:
+                result = self._serve_cached(ctx)
+                yield result["response"]
+                return result
+
+            tool = ctx["tool"]
+            if tool not in STREAMING_TOOLS:
+                start = time.perf_counter()
+                result = self._dispatch(tool, query, ctx["enhanced_query"])
+                self._finish(ctx, result, start, False)
+                yield result["response"]
+                return result
+
+            start = time.perf_counter()
+            first_token_at = None
+            fell_back = False
+            delay = self._hedge_delay(tool, latency_critical)
+            if delay is not None:
+                result, fell_back = yield from self._hedged_stream(ctx, delay)
+                self._finish(ctx, result, start, fell_back)
+                span.set(fell_back=fell_back, hedged=True)
+                return result
+
+            stream = self._stream_tool(tool, ctx["enhanced_query"])
+            try:
+                while True:
+                    try:
+                        token = next(stream)
+                    except StopIteration as stop:
+                        result = stop.value
+                        break
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    yield token
+            except (ConnectionError, ValueError) as e:
+                fallback = self._fallback_tool(tool)
+                if fallback is None or first_token_at is not None:
+                    raise
+                self._log(f"Error with {tool}: {e}. Falling back to {fallback}...")
+                fell_back = True
+                result = yield from self._stream_tool(fallback, ctx["enhanced_query"])
+
+            if first_token_at is not None:
+                ttft_ms = round((first_token_at - start) * 1000)
+                span.set(first_token_ms=ttft_ms)
+                self._log(f"Time to first token: {ttft_ms}ms")
+            self._finish(ctx, result, start, fell_back)
+            span.set(fell_back=fell_back)
+            return result
 
     # =========================================================================
     # STATS & INFO
@@ -1253,40 +1780,48 @@ Be specific about selectors and actions."""
 
     def show_stats(self) -> None:
         """Display usage statistics."""
-        log = self._load_usage_log()
-        summary = log["summary"]
+        all_time = usage_analytics.totals(self.usage)
+        by_tool = usage_analytics.spend_by_tool(self.usage)
+        percentiles = usage_analytics.token_percentiles(self.usage)
 
         print("\n" + "=" * 60)
         print("AUTOMATION MACHINE - USAGE STATISTICS")
         print("=" * 60)
 
-        print(f"\nTotal Queries: {summary['total_queries']}")
-        print(f"Total Cost: ${summary['total_cost_usd']:.4f}")
+        print(f"\nTotal Queries: {all_time['queries']}")
+        print(f"Total Cost: ${all_time['cost_usd']:.4f}")
+        print(f"Cache Hits: {all_time['cache_hits']}")
+        print(f"Today: ${usage_analytics.spend_today(self.usage):.4f} | "
+              f"Month: ${usage_analytics.spend_this_month(self.usage):.4f}")
 
         # By tool breakdown
-        if summary.get("by_tool"):
+        if by_tool:
             print("\n--- By Tool ---")
-            for tool, stats in summary["by_tool"].items():
+            for tool, stats in by_tool.items():
                 print(f"\n{tool}:")
                 print(f"  Queries: {stats['queries']}")
                 print(f"  Tokens: {stats['tokens_in']:,} in / {stats['tokens_out']:,} out")
+                if tool in percentiles:
+                    p = percentiles[tool]["tokens_out"]
+                    print(f"  Tokens out p50/p95: {p['p50']:,} / {p['p95']:,}")
                 print(f"  Cost: ${stats['cost_usd']:.4f}")
 
         # Legacy model stats (for backwards compatibility)
-        if summary.get("models"):
+        models = usage_analytics.spend_by_model(self.usage)
+        if any(stats["queries"] > 0 for stats in models.values()):
             print("\n--- By Model (Legacy) ---")
-            for model, stats in summary["models"].items():
+            for model, stats in models.items():
                 if stats["queries"] > 0:
                     print(f"\n{model}:")
                     print(f"  Queries: {stats['queries']}")
                     print(f"  Cost: ${stats['cost_usd']:.4f}")
 
         # Recent daily
-        if summary.get("daily"):
+        week_start = (datetime.now() - timedelta(days=6)).strftime("%Y-%m-%d")
+        daily = usage_analytics.spend_by_day(self.usage, week_start)
+        if daily:
             print("\n--- Recent Daily Usage ---")
-            recent = sorted(summary["daily"].keys())[-7:]
-            for day in recent:
-                s = summary["daily"][day]
+            for day, s in daily.items():
                 print(f"  {day}: {s['queries']} queries, ${s['cost_usd']:.4f}")
 
         print("\n" + "=" * 60)
@@ -1521,6 +2056,19 @@ def main():
     ], help="Force specific tool")
     parser.add_argument("-v", "--verbose", action="store_true",
                         help="Show routing decisions")
+    parser.add_argument("--batch", metavar="QUERIES_JSONL", type=Path,
+                        help="Process a JSONL file of {\"query\", \"tool\"?} lines concurrently")
+    parser.add_argument("--output", metavar="RESULTS_JSONL", type=Path,
+                        help="Batch results file (default: <input>.results.jsonl)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Trace this run and print per-stage timings "
+                             "(without a query: summarize traces.jsonl)")
+    parser.add_argument("--import-profile", action="store_true",
+                        help="Report CLI startup cost (imports, config parsing, init)")
+    parser.add_argument("--serve", action="store_true",
+                        help="Run a resident brain daemon that later CLI calls forward to")
+    parser.add_argument("--no-daemon", action="store_true",
+                        help="Process in this process even if a daemon is running")
 
     # Sprint management flags
     parser.add_argument("--sprint", action="store_true",
@@ -1534,7 +2082,53 @@ def main():
 
     args = parser.parse_args()
 
+    if args.import_profile:
+        from startup import import_profile
+        print(import_profile([CONFIG_PATH, TOOLS_CONFIG_PATH], cwd=Path(__file__).resolve().parent))
+        return
+
+    if args.serve:
+        from brain_daemon import serve
+        serve(args.verbose, DAEMON_PATH)
+        return
+
+    # Verbose routing is printed by whichever process routes, so -v runs in-process too
+    if args.query and not (args.no_daemon or args.profile or args.batch or args.verbose):
+        from brain_daemon import DaemonClient, DaemonUnavailable
+        client = DaemonClient.discover(DAEMON_PATH)
+        if client is not None:
+            try:
+                for token in client.process_stream(args.query, args.tool):
+                    print(token, end="", flush=True)
+                print()
+                return
+            except DaemonUnavailable:
+                pass  # Stale daemon.json: run in-process
+            except Exception as e:
+                print(f"Error: {e}", file=sys.stderr)
+                sys.exit(1)
+
+    if args.profile and not (args.query or args.batch):
+        print(tracing.format_summary(tracing.load_traces(TRACES_PATH)))
+        return
+
+    if args.batch:
+        from async_brain import AsyncAutomationBrain
+        output = args.output or args.batch.with_suffix(".results.jsonl")
+        brain = AsyncAutomationBrain(verbose=args.verbose)
+        if args.profile:
+            tracing.configure(TRACES_PATH, enabled=True)
+        totals = brain.run_batch_file(args.batch, output)
+        print(f"Processed {totals['queries']} queries ({totals['errors']} errors) "
+              f"in {totals['elapsed_ms']}ms | Cost: ${totals['cost_usd']:.4f} -> {output}")
+        if args.profile:
+            print()
+            print(tracing.format_summary(tracing.load_traces(TRACES_PATH, last=1)))
+        return
+
     brain = AutomationBrain(verbose=args.verbose)
+    if args.profile:
+        tracing.configure(TRACES_PATH, enabled=True)
 
     if args.stats:
         brain.show_stats()
@@ -1586,8 +2180,10 @@ def main():
                     brain.show_tools()
                     continue
 
-                response = brain.process(query, args.tool)
-                print(f"\n{response}")
+                print()
+                for token in brain.process_stream(query, args.tool):
+                    print(token, end="", flush=True)
+                print()
 
             except KeyboardInterrupt:
                 print("\nExiting...")
@@ -1596,11 +2192,16 @@ def main():
                 print(f"Error: {e}")
     else:
         try:
-            response = brain.process(args.query, args.tool)
-            print(response)
+            for token in brain.process_stream(args.query, args.tool):
+                print(token, end="", flush=True)
+            print()
         except Exception as e:
             print(f"Error: {e}", file=sys.stderr)
             sys.exit(1)
+        finally:
+            if args.profile:
+                for spans in tracing.load_traces(TRACES_PATH, last=1).values():
+                    print(f"\n{tracing.format_trace(spans)}")
 
 
 if __name__ == "__main__":
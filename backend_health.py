@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Backend Health for Automation Machine
+Per-backend circuit breakers so routing skips backends that are down
+instead of paying their full request timeout.
+
+- Closed: requests flow. `failure_threshold` consecutive failures open it.
+  Only outages count: 5xx, timeouts and connection errors. A 4xx means
+  the backend answered (the request was at fault), so it counts as success.
+- Open: the backend is skipped. After `reset_seconds` it is half-open.
+- Half-open: Ollama and ComfyUI get a quick probe (/api/tags, /system_stats
+  on every enabled `comfyui.nodes` entry; one healthy node is enough);
+  the cloud APIs admit one trial request, the rest stay on the fallback
+  until it reports back. Success closes the circuit, failure re-opens it.
+
+Backends with a probe are also re-checked every `probe_interval` seconds
+while closed, so an outage is noticed before the first slow request.
+Probes run on a background thread; checks answer from the cached state.
+State is kept in memory and written through to JSON. Checks only stat the
+file, re-reading it when another process (CLI invocation, agent) replaced it.
+
+Usage:
+    python backend_health.py            # Show circuit states
+    python backend_health.py --probe    # Probe Ollama and ComfyUI now
+    python backend_health.py --reset    # Close all circuits
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+# Paths
+BASE_DIR = Path(__file__).resolve().parent
+BACKEND_HEALTH_PATH = BASE_DIR / "backend_health.json"
+
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_RESET_SECONDS = 60
+DEFAULT_PROBE_INTERVAL = 300
+DEFAULT_PROBE_TIMEOUT = 2.0
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+def backend_for_tool(tool: str) -> str:
+    """Backend a brain tool depends on (local-* share Ollama, comfyui* share ComfyUI)."""
+    if tool.startswith("local-"):
+        return "ollama"
+    if tool.startswith("comfyui"):
+        return "comfyui"
+    return tool
+
+
+def http_status(error: BaseException) -> Optional[int]:
+    """HTTP status behind a (possibly wrapped) request error, or None if the backend never answered."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        status = getattr(getattr(error, "response", None), "status_code", None)
+        if status is not None:
+            return status
+        error = error.__cause__ or error.__context__
+    return None
+
+
+class BackendHealth:
+    """Circuit breaker state for each backend, shared via a JSON file."""
+
+    def __init__(self, path: Path = BACKEND_HEALTH_PATH,
+                 probes: Optional[dict[str, list[str]]] = None,
+                 failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 reset_seconds: float = DEFAULT_RESET_SECONDS,
+                 probe_interval: float = DEFAULT_PROBE_INTERVAL,
+                 probe_timeout: float = DEFAULT_PROBE_TIMEOUT):
+        self.path = Path(path)
+        self.probes = probes or {}
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self._lock = threading.Lock()
+        self._probers: dict[str, threading.Thread] = {}
+        self._stamp = None
+        self.state: dict = {}
+        self._sync()
+
+    @classmethod
+    def from_config(cls, config: dict, tools_config: dict,
+                    path: Path = BACKEND_HEALTH_PATH) -> Optional["BackendHealth"]:
+        """Build from config.yaml `health`, or None if disabled."""
+        health = config.get("health", {})
+        if not health.get("enabled", False):
+            return None
+        probes = {"ollama": [f"{config['models']['local']['deepseek']['endpoint']}/api/tags"]}
+        comfyui = tools_config.get("comfyui", {})
+        if comfyui.get("enabled"):
+            nodes = comfyui.get("nodes") or [{"endpoint": comfyui.get("endpoint")}]
+            urls = [f"{node['endpoint'].rstrip('/')}/system_stats" for node in nodes
+                    if node.get("enabled", True) and node.get("endpoint")]
+            if urls:
+                probes["comfyui"] = urls
+        return cls(
+            path, probes,
+            failure_threshold=health.get("failure_threshold", DEFAULT_FAILURE_THRESHOLD),
+            reset_seconds=health.get("reset_seconds", DEFAULT_RESET_SECONDS),
+            probe_interval=health.get("probe_interval", DEFAULT_PROBE_INTERVAL),
+            probe_timeout=health.get("probe_timeout", DEFAULT_PROBE_TIMEOUT),
+        )
+
+    # =========================================================================
+    # PERSISTENCE
+    # =========================================================================
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def _file_stamp(self) -> Optional[tuple]:
+        # Every save is a rename, so a new inode means someone else wrote
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _sync(self) -> None:
+        """Re-read the file only if another process replaced it since our last load or save."""
+        stamp = self._file_stamp()
+        if stamp != self._stamp:
+            self.state = self._load()
+            self._stamp = stamp
+
+    def _save(self) -> None:
+        """Write state through atomically (temp file + rename); best effort."""
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.state, f, indent=2)
+            os.replace(tmp, self.path)
+        except OSError:
+            return
+        self._stamp = self._file_stamp()
+
+    def _entry(self, backend: str) -> dict:
+        return self.state.setdefault(backend, {
+            "state": CLOSED, "failures": 0, "opened_at": 0.0, "checked_at": 0.0, "last_error": None,
+            "trial_at": 0.0,
+        })
+
+    # =========================================================================
+    # PROBES
+    # =========================================================================
+
+    def _probe_url(self, url: str) -> Optional[str]:
+        """
+        GET a health URL: None if the server is up, else the error.
+        Plain urllib, so the shared session's connect retries don't slow it down.
+        """
+        import urllib.error
+        import urllib.request  # Only probes need it; keeps CLI startup lean
+        try:
+            req = urllib.request.Request(url, method="GET")
+            with urllib.request.urlopen(req, timeout=self.probe_timeout):
+                return None
+        except urllib.error.HTTPError as e:
+            return str(e) if e.code >= 500 else None  # A 4xx still means it answered
+        except Exception as e:
+            return str(e)
+
+    def _probe(self, backend: str) -> tuple[bool, Optional[str]]:
+        """Probe every URL of the backend: (ok, error). One healthy node is enough."""
+        errors = [(url, self._probe_url(url)) for url in self.probes[backend]]
+        failed = [f"{url}: {error}" for url, error in errors if error]
+        return len(failed) < len(errors), "; ".join(failed) or None
+
+    def probe(self, backend: str) -> bool:
+        """Probe now and update the circuit: success closes it, failure opens it."""
+        ok, error = self._probe(backend)
+        with self._lock:
+            self._sync()
+            entry = self._entry(backend)
+            entry["checked_at"] = time.time()
+            if ok:
+                entry.update(state=CLOSED, failures=0, last_error=error)
+            else:
+                entry.update(state=OPEN, opened_at=time.time(), last_error=error)
+            self._save()
+        return ok
+
+    def _probe_in_background(self, backend: str) -> None:
+        """Start probe(backend) on a daemon thread unless one is already running. Call under _lock."""
+        prober = self._probers.get(backend)
+        if prober is not None and prober.is_alive():
+            return
+        prober = threading.Thread(target=self.probe, args=(backend,),
+                                  name=f"health-probe-{backend}", daemon=True)
+        self._probers[backend] = prober
+        prober.start()
+
+    # =========================================================================
+    # BREAKER
+    # =========================================================================
+
+    def _state(self, backend: str, now: float) -> str:
+        """Current state of a backend, moving OPEN to HALF_OPEN once reset_seconds pass. Call under _lock."""
+        entry = self._entry(backend)
+        if entry["state"] == OPEN and now - entry["opened_at"] >= self.reset_seconds:
+            if backend in self.probes:
+                self._probe_in_background(backend)
+                return OPEN  # Until the probe says otherwise
+            entry.update(state=HALF_OPEN, trial_at=0.0)
+            self._save()
+        elif (entry["state"] == CLOSED and backend in self.probes
+              and now - entry["checked_at"] >= self.probe_interval):
+            self._probe_in_background(backend)
+        return entry["state"]
+
+    def _trial_running(self, entry: dict, now: float) -> bool:
+        # A trial that never reported back (crashed caller) expires after reset_seconds
+        return now - entry.get("trial_at", 0.0) < self.reset_seconds
+
+    def available(self, tool: str) -> bool:
+        """Whether `tool` may be routed to right now; never waits on a probe."""
+        backend = backend_for_tool(tool)
+        now = time.time()
+        with self._lock:
+            self._sync()
+            state = self._state(backend, now)
+            if state == HALF_OPEN:
+                return not self._trial_running(self._entry(backend), now)
+            return state == CLOSED
+
+    def admit(self, tool: str) -> bool:
+        """
+        Claim the right to send a request to `tool` now. Like available(), but
+        a half-open backend admits only one trial request until it reports back.
+        """
+        backend = backend_for_tool(tool)
+        now = time.time()
+        with self._lock:
+            self._sync()
+            state = self._state(backend, now)
+            if state != HALF_OPEN:
+                return state == CLOSED
+            entry = self._entry(backend)
+            if self._trial_running(entry, now):
+                return False
+            entry["trial_at"] = now
+            self._save()
+            return True
+
+    def record_success(self, tool: str) -> None:
+        backend = backend_for_tool(tool)
+        with self._lock:
+            self._sync()
+            entry = self._entry(backend)
+            if entry["state"] != CLOSED or entry["failures"]:
+                entry.update(state=CLOSED, failures=0, last_error=None, trial_at=0.0)
+                self._save()
+
+    def record_failure(self, tool: str, error: str = "") -> None:
+        backend = backend_for_tool(tool)
+        with self._lock:
+            self._sync()
+            entry = self._entry(backend)
+            entry["failures"] += 1
+            entry["last_error"] = error[:200] or None
+            if entry["state"] == HALF_OPEN or entry["failures"] >= self.failure_threshold:
+                entry.update(state=OPEN, opened_at=time.time(), trial_at=0.0)
+            self._save()
+
+    def record_error(self, tool: str, error: BaseException) -> None:
+        """Feed a failed request in: outages count against the circuit, a 4xx does not."""
+        status = http_status(error)
+        if status is not None and status < 500:
+            self.record_success(tool)  # The backend answered; the request was at fault
+        else:
+            self.record_failure(tool, str(error))
+
+    def reset(self) -> None:
+        """Close every circuit."""
+        with self._lock:
+            self.state = {}
+            self._save()
+
+    def status(self) -> dict[str, dict]:
+        with self._lock:
+            self._sync()
+            return json.loads(json.dumps(self.state))
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def main():
+    import yaml
+
+    parser = argparse.ArgumentParser(description="Automation Machine Backend Health")
+    parser.add_argument("--probe", action="store_true", help="Probe Ollama and ComfyUI now")
+    parser.add_argument("--reset", action="store_true", help="Close all circuits")
+    args = parser.parse_args()
+
+    with open(BASE_DIR / "config.yaml", encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+    with open(BASE_DIR / "tools_config.json", encoding="utf-8") as f:
+        tools_config = json.load(f)
+    health = BackendHealth.from_config(dict(config, health={**config.get("health", {}), "enabled": True}),
+                                       tools_config)
+
+    if args.reset:
+        health.reset()
+    if args.probe:
+        for backend in health.probes:
+            health.probe(backend)
+
+    status = health.status()
+    if not status:
+        print("All circuits closed (no failures recorded)")
+    for backend, entry in sorted(status.items()):
+        error = f" - {entry['last_error']}" if entry.get("last_error") else ""
+        print(f"  {backend}: {entry['state']} ({entry['failures']} failures){error}")
+
+
+if __name__ == "__main__":
+    main()
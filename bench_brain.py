@@ -0,0 +1,557 @@
+#!/usr/bin/env python3
+"""
+Brain Benchmarks for Automation Machine
+Measures AutomationBrain.process throughput on a local machine. Ollama,
+Anthropic, Perplexity and ComfyUI are replaced by one stub HTTP server
+with configurable latency and jitter. The benchmark runs over synthetic
+knowledge bases and usage databases of increasing size. Per-stage latency
+percentiles come from tracing.py spans.
+
+Each run works in a scratch directory. automation_brain's path constants
+are pointed at that directory, and config.yaml/tools_config.json copies
+point every backend at the stub. Results are written as JSON so a change
+to KB search, usage logging or routing can be compared with --compare.
+
+Usage:
+    python bench_brain.py                                    # Default matrix
+    python bench_brain.py --kb-sizes 100 1000 --usage-sizes 0 100000 --queries 300
+    python bench_brain.py --latency-ms 50 --jitter-ms 20 --comfyui
+    python bench_brain.py --compare bench_results/before.json bench_results/after.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+
+import yaml
+
+import automation_brain
+import tracing
+from usage_store import UsageStore
+
+# Paths
+BASE_DIR = Path(__file__).resolve().parent
+RESULTS_DIR = BASE_DIR / "bench_results"
+
+DEFAULT_KB_SIZES = [100, 1000, 10000]
+DEFAULT_USAGE_SIZES = [1000, 100000]
+
+# Routed by the task router to local-deepseek, local-qwen, perplexity and
+# claude (avoid substrings such as "pr" that trigger other tools); {topic}
+# keeps every query distinct
+QUERY_TEMPLATES = {
+    "simple": "What is {topic}?",
+    "code": "Write a python function to parse {topic} logs",
+    "research": "What are the latest {topic} releases in 2026?",
+    "complex": "Analyze the {topic} architecture tradeoffs in depth",
+}
+COMFYUI_TEMPLATE = "generate image of a {topic} candle"
+
+TOPICS = ["kubernetes", "postgres", "candle", "invoice", "pipeline", "ollama",
+          "webhook", "sdxl", "render", "budget", "trading", "newsletter"]
+
+# 1x1 PNG served by the ComfyUI stub's /view
+PNG_BYTES = bytes.fromhex(
+    "89504e470d0a1a0a0000000d49484452000000010000000108060000001f15c489"
+    "0000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)
+
+
+# =============================================================================
+# STUB BACKENDS
+# =============================================================================
+
+class StubBackends:
+    """
+    One ThreadingHTTPServer answering the Ollama, Anthropic Messages,
+    Perplexity chat and ComfyUI endpoints the brain calls. Model calls wait
+    latency +/- jitter before answering (then, with chunk_ms, stream their
+    chunks chunk_ms apart). ComfyUI behaves like one GPU: queued prompts
+    render one after another, render_ms each, and /queue reports the
+    running and pending ones.
+    """
+
+    def __init__(self, latency_ms: float = 20, jitter_ms: float = 5, tokens: int = 40,
+                 render_ms: float = 500, seed: int = 0, chunk_ms: float = 0):
+        self.latency_ms = latency_ms
+        self.chunk_ms = chunk_ms
+        self.jitter_ms = jitter_ms
+        self.tokens = tokens
+        self.render_ms = render_ms
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._jobs: dict[str, tuple[float, float]] = {}  # prompt_id -> (start, ready)
+        self._gpu_free_at = 0.0
+        self.max_queued = 0  # Most prompts running + pending at once
+        self.inflight = 0
+        self.max_inflight = 0  # Most POSTs being answered at once
+        self.view_status = 200  # Set to an error status to make /view fail
+        self.requests: Counter = Counter()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def start(self) -> "StubBackends":
+        threading.Thread(target=self.server.serve_forever, name="bench-stub", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _wait(self, scale: float = 1.0) -> None:
+        with self._lock:
+            delay = self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)
+        time.sleep(max(0.0, delay * scale) / 1000)
+
+    def _queue(self, now: float) -> tuple[list, list]:
+        """ComfyUI /queue lists: (running, pending) as [number, prompt_id, ...] items."""
+        running, pending = [], []
+        for number, (prompt_id, (start, ready)) in enumerate(self._jobs.items()):
+            if ready > now:
+                (running if start <= now else pending).append([number, prompt_id, {}, {}, []])
+        return running, pending
+
+    def gpu_idle_s(self) -> float:
+        """Seconds the stub GPU sat idle between its first and last render."""
+        spans = sorted(self._jobs.values())
+        if not spans:
+            return 0.0
+        return max(0.0, (spans[-1][1] - spans[0][0]) - len(spans) * self.render_ms / 1000)
+
+    def _words(self) -> list[str]:
+        return [f"tok{i} " for i in range(self.tokens)]
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, like the real backends
+            disable_nagle_algorithm = True  # Headers and body go out as separate writes
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, body, content_type: str = "application/json", status: int = 200):
+                if isinstance(body, (dict, list)):
+                    body = json.dumps(body)
+                if isinstance(body, str):
+                    body = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_stream(self, pieces: list[str], content_type: str):
+                if not stub.chunk_ms:
+                    self._send("".join(pieces), content_type)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for piece in pieces:
+                        time.sleep(stub.chunk_ms / 1000)
+                        data = piece.encode("utf-8")
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                    self.wfile.write(b"0\r\n\r\n")
+                except OSError:
+                    self.close_connection = True  # Client hung up (cancelled stream)
+
+            def _json_body(self) -> dict:
+                length = int(self.headers.get("Content-Length") or 0)
+                return json.loads(self.rfile.read(length) or b"{}")
+
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                stub.requests["/history" if path.startswith("/history/") else path] += 1
+                if path == "/api/tags":
+                    self._send({"models": [{"name": "stub"}]})
+                elif path == "/system_stats":
+                    self._send({"system": {"os": "stub"}, "devices": []})
+                elif path.startswith("/history/"):
+                    prompt_id = path.rsplit("/", 1)[-1]
+                    start, ready_at = stub._jobs.get(prompt_id, (None, None))
+                    if ready_at is None or time.time() < ready_at:
+                        self._send({})
+                    else:
+                        image = {"filename": f"{prompt_id}.png", "subfolder": "", "type": "output"}
+                        self._send({prompt_id: {"outputs": {"9": {"images": [image]}}}})
+                elif path == "/queue":
+                    with stub._lock:
+                        running, pending = stub._queue(time.time())
+                    self._send({"queue_running": running, "queue_pending": pending})
+                elif path == "/view":
+                    if stub.view_status != 200:
+                        self._send({"error": "view failed"}, status=stub.view_status)
+                    else:
+                        self._send(PNG_BYTES, "image/png")
+                else:
+                    self._send({"error": f"unknown path {path}"}, status=404)
+
+            def do_POST(self):
+                with stub._lock:
+                    stub.inflight += 1
+                    stub.max_inflight = max(stub.max_inflight, stub.inflight)
+                try:
+                    self._answer_post()
+                finally:
+                    with stub._lock:
+                        stub.inflight -= 1
+
+            def _answer_post(self):
+                path = self.path.split("?")[0]
+                stub.requests[path] += 1
+                if path == "/upload/image":
+                    length = int(self.headers.get("Content-Length") or 0)
+                    name = self.rfile.read(length).split(b'filename="', 1)[-1].split(b'"', 1)[0]
+                    self._send({"name": name.decode(), "subfolder": "", "type": "input"})
+                    return
+                body = self._json_body()
+                words = stub._words()
+                text = "".join(words)
+                if path == "/api/generate":
+                    stub._wait()
+                    final = {"done": True, "prompt_eval_count": len(body.get("prompt", "").split()),
+                             "eval_count": len(words)}
+                    if body.get("stream"):
+                        lines = [json.dumps({"response": w, "done": False}) for w in words]
+                        self._send_stream([line + "\n" for line in lines + [json.dumps(final)]],
+                                          "application/x-ndjson")
+                    else:
+                        self._send(dict(final, response=text))
+                elif path == "/api/embed":
+                    stub._wait(0.25)
+                    self._send({"embeddings": [_stub_vector(t) for t in body.get("input", [])]})
+                elif path == "/v1/messages":
+                    stub._wait()
+                    usage_in = len(json.dumps(body.get("messages", [])).split())
+                    if body.get("stream"):
+                        events = [{"type": "message_start", "message": {"usage": {"input_tokens": usage_in}}}]
+                        events += [{"type": "content_block_delta", "delta": {"text": w}} for w in words]
+                        events += [{"type": "message_delta", "usage": {"output_tokens": len(words)}},
+                                   {"type": "message_stop"}]
+                        self._send_stream([f"data: {json.dumps(e)}\n\n" for e in events], "text/event-stream")
+                    else:
+                        self._send({"content": [{"text": text}],
+                                    "usage": {"input_tokens": usage_in, "output_tokens": len(words)}})
+                elif path == "/chat/completions":
+                    stub._wait()
+                    usage = {"prompt_tokens": len(json.dumps(body.get("messages", [])).split()),
+                             "completion_tokens": len(words)}
+                    if body.get("stream"):
+                        chunks = [{"choices": [{"delta": {"content": w}}]} for w in words]
+                        chunks.append({"choices": [{"delta": {}}], "usage": usage})
+                        self._send_stream([f"data: {json.dumps(c)}\n\n" for c in chunks] + ["data: [DONE]\n\n"],
+                                          "text/event-stream")
+                    else:
+                        self._send({"choices": [{"message": {"content": text}}], "usage": usage})
+                elif path == "/prompt":
+                    prompt_id = str(uuid.uuid4())
+                    with stub._lock:
+                        now = time.time()
+                        start = max(now, stub._gpu_free_at)
+                        stub._gpu_free_at = start + stub.render_ms / 1000
+                        stub._jobs[prompt_id] = (start, stub._gpu_free_at)
+                        running, pending = stub._queue(now)
+                        stub.max_queued = max(stub.max_queued, len(running) + len(pending))
+                    self._send({"prompt_id": prompt_id, "number": len(stub._jobs)})
+                else:
+                    self._send({"error": f"unknown path {path}"}, status=404)
+
+        return Handler
+
+
+def _stub_vector(text: str, dim: int = 64) -> list[float]:
+    """Deterministic pseudo-embedding so the semantic cache has something to compare."""
+    rng = random.Random(zlib.crc32(text.encode("utf-8")))
+    return [rng.uniform(-1, 1) for _ in range(dim)]
+
+
+# =============================================================================
+# SYNTHETIC DATA
+# =============================================================================
+
+def write_synthetic_kb(kb_path: Path, n_files: int, seed: int = 0) -> None:
+    """Markdown files (100 per folder) of headings and topic-word paragraphs."""
+    rng = random.Random(seed)
+    vocabulary = TOPICS + [f"term{i}" for i in range(3000)]
+    (kb_path / "research").mkdir(parents=True, exist_ok=True)
+    (kb_path / "index.md").write_text("# Knowledge Base Index\n", encoding="utf-8")
+    for i in range(n_files):
+        folder = kb_path / f"section{i // 100:03d}"
+        folder.mkdir(exist_ok=True)
+        sections = []
+        for s in range(rng.randint(2, 5)):
+            words = " ".join(rng.choices(vocabulary, k=rng.randint(40, 120)))
+            sections.append(f"## {rng.choice(TOPICS).title()} notes {s}\n\n{words}\n")
+        (folder / f"note{i:05d}.md").write_text(f"# Note {i}\n\n" + "\n".join(sections), encoding="utf-8")
+
+
+def write_synthetic_usage(db_path: Path, n_events: int, seed: int = 0) -> None:
+    """Usage events spread over the last 90 days, in the brain's event shape."""
+    rng = random.Random(seed)
+    store = UsageStore(db_path, None)
+    tools = [("local-deepseek", "deepseek-r1:latest", 0.0), ("local-qwen", "qwen2.5:32b", 0.0),
+             ("claude", "claude-sonnet-4-20250514", 0.00001), ("perplexity", "sonar-pro", 0.000003)]
+    now = datetime.now()
+    batch = []
+    for i in range(n_events):
+        tool, model, per_token = rng.choice(tools)
+        tokens_in, tokens_out = rng.randint(20, 2000), rng.randint(20, 2000)
+        category = rng.choice(list(QUERY_TEMPLATES))
+        batch.append({
+            "timestamp": (now - timedelta(seconds=rng.uniform(0, 90 * 86400))).isoformat(),
+            "tool": tool, "model": model,
+            "tokens_in": tokens_in, "tokens_out": tokens_out,
+            "cost_usd": (tokens_in + tokens_out) * per_token,
+            "task_category": category, "latency_ms": rng.randint(50, 20000),
+            "cache_hit": rng.random() < 0.1,
+            "query": QUERY_TEMPLATES[category].format(topic=f"{rng.choice(TOPICS)} {i}"),
+            "complexity": rng.choice(["simple", "medium", "complex"]),
+            "routed_tool": tool, "routed_by": "rules", "fell_back": False,
+        })
+        if len(batch) >= 5000:
+            store.record_many(batch)
+            batch = []
+    store.record_many(batch)
+    store.close()
+
+
+def make_queries(n: int, repeat_rate: float = 0.0, comfyui: bool = False, seed: int = 0) -> list[str]:
+    """n queries cycling through the templates; repeat_rate of them repeat an earlier one."""
+    rng = random.Random(seed)
+    templates = list(QUERY_TEMPLATES.values()) + ([COMFYUI_TEMPLATE] if comfyui else [])
+    queries: list[str] = []
+    for i in range(n):
+        if queries and rng.random() < repeat_rate:
+            queries.append(rng.choice(queries))
+        else:
+            topic = f"{rng.choice(TOPICS)} {i}"
+            queries.append(templates[i % len(templates)].format(topic=topic))
+    return queries
+
+
+# =============================================================================
+# SANDBOX
+# =============================================================================
+
+_ORIGINAL_PATHS = {name: value for name, value in vars(automation_brain).items()
+                   if isinstance(value, Path)}
+
+
+def point_brain_at(base: Path, kb_path: Path) -> None:
+    """Rebase automation_brain's path constants onto a scratch directory."""
+    home = _ORIGINAL_PATHS["BASE_DIR"]
+    kb_home = _ORIGINAL_PATHS["KNOWLEDGE_BASE_PATH"]
+    for name, path in _ORIGINAL_PATHS.items():
+        if path == kb_home or kb_home in path.parents:
+            rebased = kb_path / path.relative_to(kb_home)
+        elif path == home or home in path.parents:
+            rebased = base / path.relative_to(home)
+        else:
+            continue
+        setattr(automation_brain, name, rebased)
+
+
+def build_sandbox(base: Path, stub_url: str) -> None:
+    """config.yaml, tools_config.json and workflows pointing at the stub."""
+    with open(BASE_DIR / "config.yaml", encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+    for model in config["models"]["local"].values():
+        model["endpoint"] = stub_url
+    config["models"]["cloud"]["claude"]["endpoint"] = f"{stub_url}/v1/messages"
+    config.setdefault("tracing", {})["enabled"] = False  # Enabled per run below
+    with open(base / "config.yaml", "w", encoding="utf-8") as f:
+        yaml.safe_dump(config, f)
+
+    with open(BASE_DIR / "tools_config.json", encoding="utf-8") as f:
+        tools_config = json.load(f)
+    tools_config["perplexity"]["endpoint"] = f"{stub_url}/chat/completions"
+    tools_config["comfyui"].update(endpoint=stub_url, nodes=[{"name": "stub", "endpoint": stub_url}],
+                                   workflow_path=str(base / "workflows"), output_path=str(base / "output"))
+    with open(base / "tools_config.json", "w", encoding="utf-8") as f:
+        json.dump(tools_config, f, indent=2)
+
+    (base / "workflows").mkdir(exist_ok=True)
+    shutil.copy(BASE_DIR / "workflows" / "sdxl_basic.json", base / "workflows" / "sdxl_basic.json")
+
+
+# =============================================================================
+# BENCHMARK
+# =============================================================================
+
+def run_case(stub: StubBackends, scratch: Path, kb_path: Path, kb_files: int, usage_events: int,
+             queries: list[str]) -> dict:
+    """Benchmark one (knowledge base, usage database) combination."""
+    base = scratch / f"run_kb{kb_files}_usage{usage_events}"
+    base.mkdir()
+    build_sandbox(base, stub.url)
+    point_brain_at(base, kb_path)
+    write_synthetic_usage(automation_brain.USAGE_DB_PATH, usage_events)
+
+    traces_path = base / "traces.jsonl"
+    brain = automation_brain.AutomationBrain()
+    tracing.configure(traces_path, enabled=True)
+
+    # First query builds the KB index: measured apart from the steady state
+    start = time.perf_counter()
+    brain.process("warm up the knowledge base index", "local-deepseek")
+    cold_start_ms = (time.perf_counter() - start) * 1000
+    traces_path.unlink(missing_ok=True)
+
+    errors = 0
+    requests_before = Counter(stub.requests)
+    start = time.perf_counter()
+    for query in queries:
+        try:
+            brain.process(query)
+        except Exception:
+            errors += 1
+    elapsed = time.perf_counter() - start
+    tracing.configure(enabled=False)
+
+    traces = tracing.load_traces(traces_path)
+    tools = Counter(span["attributes"].get("tool") for spans in traces.values()
+                    for span in spans if span["name"] == "process")
+    stages = {row.pop("stage"): {k: round(v, 3) if isinstance(v, float) else v for k, v in row.items()}
+              for row in tracing.summarize(traces)}
+    return {
+        "kb_files": kb_files,
+        "usage_events": usage_events,
+        "queries": len(queries),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "qps": round(len(queries) / elapsed, 2),
+        "cold_start_ms": round(cold_start_ms, 1),
+        "tools": dict(tools),
+        "backend_requests": dict(stub.requests - requests_before),
+        "stages": stages,
+        "traces": traces,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmarks(kb_sizes: list[int], usage_sizes: list[int], n_queries: int,
+                   latency_ms: float, jitter_ms: float, tokens: int, render_ms: float,
+                   repeat_rate: float, comfyui: bool) -> dict:
+    os.environ.setdefault("ANTHROPIC_API_KEY", "bench")
+    os.environ.setdefault("PERPLEXITY_API_KEY", "bench")
+    settings = {"kb_sizes": kb_sizes, "usage_sizes": usage_sizes, "queries": n_queries,
+                "latency_ms": latency_ms, "jitter_ms": jitter_ms, "tokens": tokens,
+                "render_ms": render_ms, "repeat_rate": repeat_rate, "comfyui": comfyui}
+    queries = make_queries(n_queries, repeat_rate, comfyui)
+    stub = StubBackends(latency_ms, jitter_ms, tokens, render_ms).start()
+    scratch = Path(tempfile.mkdtemp(prefix="bench_brain_"))
+    runs = []
+    try:
+        for kb_files in kb_sizes:
+            kb_path = scratch / f"kb{kb_files}"
+            write_synthetic_kb(kb_path, kb_files)
+            for usage_events in usage_sizes:
+                run = run_case(stub, scratch, kb_path, kb_files, usage_events, queries)
+                print(f"\nkb={kb_files} usage={usage_events}: {run['qps']} q/s, "
+                      f"{run['errors']} errors, cold start {run['cold_start_ms']:.0f}ms")
+                print(tracing.format_summary(run.pop("traces")))
+                runs.append(run)
+    finally:
+        stub.stop()
+        shutil.rmtree(scratch, ignore_errors=True)
+        point_brain_at(_ORIGINAL_PATHS["BASE_DIR"], _ORIGINAL_PATHS["KNOWLEDGE_BASE_PATH"])
+
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": settings,
+        "runs": runs,
+    }
+
+
+def compare(before: dict, after: dict) -> str:
+    """qps and per-stage p50/p95 changes for runs present in both result files."""
+    def key(run):
+        return run["kb_files"], run["usage_events"]
+
+    def change(a: float, b: float) -> str:
+        return f"{(b - a) / a:+.0%}" if a else "n/a"
+
+    lines = [f"{before.get('commit') or 'before'} -> {after.get('commit') or 'after'}"]
+    previous = {key(run): run for run in before["runs"]}
+    for run in after["runs"]:
+        old = previous.get(key(run))
+        if old is None:
+            continue
+        lines.append(f"\nkb={run['kb_files']} usage={run['usage_events']}: "
+                     f"{old['qps']} -> {run['qps']} q/s ({change(old['qps'], run['qps'])})")
+        for stage, stats in sorted(run["stages"].items(), key=lambda s: -s[1]["total_ms"]):
+            if stage in old["stages"]:
+                was = old["stages"][stage]
+                lines.append(f"  {stage[:34]:<34} p50 {was['p50_ms']:>8.2f} -> {stats['p50_ms']:>8.2f}ms "
+                             f"({change(was['p50_ms'], stats['p50_ms']):>5})  "
+                             f"p95 {was['p95_ms']:>8.2f} -> {stats['p95_ms']:>8.2f}ms")
+    return "\n".join(lines)
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Automation Machine Brain Benchmarks")
+    parser.add_argument("--kb-sizes", type=int, nargs="+", default=DEFAULT_KB_SIZES,
+                        help="Synthetic knowledge base sizes (files)")
+    parser.add_argument("--usage-sizes", type=int, nargs="+", default=DEFAULT_USAGE_SIZES,
+                        help="Pre-populated usage.db sizes (events)")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per run")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Stub model latency")
+    parser.add_argument("--jitter-ms", type=float, default=5, help="Uniform +/- jitter on the latency")
+    parser.add_argument("--tokens", type=int, default=40, help="Tokens per stub response")
+    parser.add_argument("--render-ms", type=float, default=500, help="Stub ComfyUI job duration")
+    parser.add_argument("--repeat-rate", type=float, default=0.0,
+                        help="Fraction of queries repeating an earlier one (cache hits)")
+    parser.add_argument("--comfyui", action="store_true", help="Include image generation queries")
+    parser.add_argument("--output", type=Path, help="Results JSON (default: bench_results/bench_<time>.json)")
+    parser.add_argument("--compare", type=Path, nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="Compare two results files")
+    args = parser.parse_args()
+
+    if args.compare:
+        before, after = (json.loads(path.read_text(encoding="utf-8")) for path in args.compare)
+        print(compare(before, after))
+        return
+
+    results = run_benchmarks(args.kb_sizes, args.usage_sizes, args.queries, args.latency_ms,
+                             args.jitter_ms, args.tokens, args.render_ms, args.repeat_rate, args.comfyui)
+    output = args.output or RESULTS_DIR / f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"\nResults -> {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,23 +6,30 @@ Local-first approach: deepseek → qwen → claude (fallback)
 """
 
 import argparse
-import json
 import os
 import re
+import sqlite3
 import sys
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Optional
 
 import requests
 import yaml
 
+import kb_index
+from task_router import keyword_complexity
+from usage_store import get_store
+import usage_analytics
+
 # Paths
 BASE_DIR = Path("C:/automation-machine")
 CONFIG_PATH = BASE_DIR / "config.yaml"
 USAGE_LOG_PATH = BASE_DIR / "usage_log.json"
+USAGE_DB_PATH = BASE_DIR / "usage.db"
 KNOWLEDGE_BASE_PATH = BASE_DIR / "knowledge-base"
 CONVERSATION_LOG_PATH = KNOWLEDGE_BASE_PATH / "research" / "conversation-log.md"
+KB_INDEX_PATH = BASE_DIR / "kb_index.db"
 
 
 def load_config() -> dict:
@@ -32,15 +39,8 @@ def load_config() -> dict:
 
 
 def load_usage_log() -> dict:
-    """Load usage statistics from JSON file."""
-    with open(USAGE_LOG_PATH, "r") as f:
-        return json.load(f)
-
-
-def save_usage_log(log: dict) -> None:
-    """Save usage statistics to JSON file."""
-    with open(USAGE_LOG_PATH, "w") as f:
-        json.dump(log, f, indent=2)
+    """Load usage statistics (usage_log.json shape) from the event store."""
+    return get_store(USAGE_DB_PATH, USAGE_LOG_PATH).usage_log()
 
 
 def detect_complexity(query: str, config: dict) -> str:
@@ -48,24 +48,12 @@ def detect_complexity(query: str, config: dict) -> str:
     Detect query complexity based on keywords and length.
     Returns: 'simple', 'medium', or 'complex'
     """
-    query_lower = query.lower()
-    routing = config.get("routing", {})
-    keywords = routing.get("keywords", {})
+    keywords = config.get("routing", {}).get("keywords", {})
 
-    # Check for complex keywords first (highest priority)
-    for keyword in keywords.get("complex", []):
-        if keyword in query_lower:
-            return "complex"
-
-    # Check for medium keywords
-    for keyword in keywords.get("medium", []):
-        if keyword in query_lower:
-            return "medium"
-
-    # Check for simple keywords
-    for keyword in keywords.get("simple", []):
-        if keyword in query_lower:
-            return "simple"
+    # One pass over the query; complex > medium > simple
+    level = keyword_complexity(query, keywords)
+    if level:
+        return level
 
     # Fallback to length-based detection
     word_count = len(query.split())
@@ -169,39 +157,13 @@ def query_claude(prompt: str, model_name: str) -> tuple[str, int, int]:
 def search_knowledge_base(query: str) -> list[dict]:
     """
     Search the knowledge base for relevant content.
-    Returns list of matching files with snippets.
+    Returns list of matching files with snippets ([] if the index cannot be opened).
     """
-    results = []
-    query_terms = query.lower().split()
-
-    for md_file in KNOWLEDGE_BASE_PATH.rglob("*.md"):
-        try:
-            content = md_file.read_text(encoding="utf-8")
-            content_lower = content.lower()
-
-            # Simple keyword matching
-            matches = sum(1 for term in query_terms if term in content_lower)
-            if matches > 0:
-                # Extract relevant snippet
-                lines = content.split("\n")
-                snippet_lines = []
-                for i, line in enumerate(lines):
-                    if any(term in line.lower() for term in query_terms):
-                        snippet_lines.append(line.strip())
-                        if len(snippet_lines) >= 3:
-                            break
-
-                results.append({
-                    "file": str(md_file.relative_to(KNOWLEDGE_BASE_PATH)),
-                    "matches": matches,
-                    "snippet": "\n".join(snippet_lines) if snippet_lines else lines[0][:200]
-                })
-        except Exception:
-            continue
-
-    # Sort by relevance
-    results.sort(key=lambda x: x["matches"], reverse=True)
-    return results[:5]  # Top 5 results
+    try:
+        return kb_index.search(query, KNOWLEDGE_BASE_PATH, KB_INDEX_PATH, limit=5)
+    except (sqlite3.Error, OSError) as e:
+        print(f"Warning: knowledge base search unavailable: {e}", file=sys.stderr)
+        return []
 
 
 def log_conversation(query: str, response: str, model: str) -> None:
@@ -224,11 +186,7 @@ def log_conversation(query: str, response: str, model: str) -> None:
 
 
 def update_usage_stats(model_key: str, tokens_in: int, tokens_out: int, cost: float) -> None:
-    """Update usage statistics in the log file."""
-    log = load_usage_log()
-    today = datetime.now().strftime("%Y-%m-%d")
-    month = datetime.now().strftime("%Y-%m")
-
+    """Append a usage event to the event store."""
     # Map model keys to log keys
     model_map = {
         "deepseek": "deepseek-r1",
@@ -237,43 +195,15 @@ def update_usage_stats(model_key: str, tokens_in: int, tokens_out: int, cost: fl
     }
     log_key = model_map.get(model_key, model_key)
 
-    # Update summary
-    log["summary"]["total_queries"] += 1
-    log["summary"]["total_cost_usd"] += cost
-
-    # Update model stats
-    if log_key in log["summary"]["models"]:
-        log["summary"]["models"][log_key]["queries"] += 1
-        log["summary"]["models"][log_key]["tokens_in"] += tokens_in
-        log["summary"]["models"][log_key]["tokens_out"] += tokens_out
-        log["summary"]["models"][log_key]["cost_usd"] += cost
-
-    # Update daily stats
-    if today not in log["summary"]["daily"]:
-        log["summary"]["daily"][today] = {"queries": 0, "cost_usd": 0.0}
-    log["summary"]["daily"][today]["queries"] += 1
-    log["summary"]["daily"][today]["cost_usd"] += cost
-
-    # Update monthly stats
-    if month not in log["summary"]["monthly"]:
-        log["summary"]["monthly"][month] = {"queries": 0, "cost_usd": 0.0}
-    log["summary"]["monthly"][month]["queries"] += 1
-    log["summary"]["monthly"][month]["cost_usd"] += cost
-
-    # Add to history
-    log["history"].append({
+    store = get_store(USAGE_DB_PATH, USAGE_LOG_PATH)
+    store.record({
         "timestamp": datetime.now().isoformat(),
         "model": log_key,
         "tokens_in": tokens_in,
         "tokens_out": tokens_out,
         "cost_usd": cost
-    })
-
-    # Keep only last 1000 history entries
-    if len(log["history"]) > 1000:
-        log["history"] = log["history"][-1000:]
-
-    save_usage_log(log)
+    }, legacy=True)
+    store.maybe_export()
 
 
 def calculate_cost(model_key: str, tokens_in: int, tokens_out: int, config: dict) -> float:
@@ -292,18 +222,18 @@ def calculate_cost(model_key: str, tokens_in: int, tokens_out: int, config: dict
 
 def show_stats() -> None:
     """Display usage statistics."""
-    log = load_usage_log()
-    summary = log["summary"]
+    store = get_store(USAGE_DB_PATH, USAGE_LOG_PATH)
+    all_time = usage_analytics.totals(store)
 
     print("\n" + "=" * 50)
     print("AUTOMATION MACHINE - USAGE STATISTICS")
     print("=" * 50)
 
-    print(f"\nTotal Queries: {summary['total_queries']}")
-    print(f"Total Cost: ${summary['total_cost_usd']:.4f}")
+    print(f"\nTotal Queries: {all_time['queries']}")
+    print(f"Total Cost: ${all_time['cost_usd']:.4f}")
 
     print("\n--- By Model ---")
-    for model, stats in summary["models"].items():
+    for model, stats in usage_analytics.spend_by_model(store).items():
         print(f"\n{model}:")
         print(f"  Queries: {stats['queries']}")
         print(f"  Tokens In: {stats['tokens_in']:,}")
@@ -311,11 +241,11 @@ def show_stats() -> None:
         print(f"  Cost: ${stats['cost_usd']:.4f}")
 
     # Show recent daily stats
-    if summary.get("daily"):
+    week_start = (datetime.now() - timedelta(days=6)).strftime("%Y-%m-%d")
+    daily = usage_analytics.spend_by_day(store, week_start)
+    if daily:
         print("\n--- Recent Daily Usage ---")
-        recent_days = sorted(summary["daily"].keys())[-7:]
-        for day in recent_days:
-            stats = summary["daily"][day]
+        for day, stats in daily.items():
             print(f"  {day}: {stats['queries']} queries, ${stats['cost_usd']:.4f}")
 
     print("\n" + "=" * 50)
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Brain Daemon for Automation Machine
+Keeps one AutomationBrain resident (warm HTTP pool, caches, KB index,
+routing model) and serves queries over a localhost socket, so agents don't
+pay interpreter start, config parsing and index loading on every query.
+
+Requests are handled on threads. Routing, KB search and cache lookups run
+on the request thread (the caches and indexes lock their own connections),
+so agents are not queued behind each other before delegation. Cache and
+usage writes run on one thread, so while the daemon runs it is the single
+writer of usage.db and usage_log.json.
+
+Discovery: the daemon writes daemon.json (pid, port, auth key). The
+automation_brain.py CLI forwards queries to it when the file exists and
+the daemon answers, and runs them in-process otherwise (and for -v,
+--profile and --batch, whose output comes from the routing process).
+
+Protocol: one JSON request line per connection,
+    {"auth", "op": "process" | "stream" | "health" | "shutdown",
+     "query", "tool"?, "latency_critical"?}
+answered with JSON lines: {"text": ...} chunks for "stream", then
+{"result": ...} or {"error": {"type", "message"}}. Plain TCP on
+127.0.0.1 rather than HTTP or a Unix socket: it works the same on
+Windows, and the client needs neither http.client nor ssl (~30ms of
+imports).
+
+Usage:
+    python automation_brain.py --serve     # Run the daemon
+    python brain_daemon.py --status        # Show the running daemon
+    python brain_daemon.py --stop          # Stop it
+"""
+
+import argparse
+import contextvars
+import json
+import os
+import secrets
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Generator, Optional
+
+# Paths
+BASE_DIR = Path(__file__).resolve().parent
+DAEMON_PATH = BASE_DIR / "daemon.json"
+
+DEFAULT_HOST = "127.0.0.1"
+
+# Connecting to a daemon that is not there should cost the CLI next to nothing
+CONNECT_TIMEOUT = 0.5
+
+
+class DaemonUnavailable(ConnectionError):
+    """No daemon answered; the caller should run the query in-process."""
+
+
+def _error(e: Exception) -> dict:
+    """Wire form of an exception; the client re-raises the same family."""
+    kind = ("ConnectionError" if isinstance(e, ConnectionError)
+            else "ValueError" if isinstance(e, ValueError) else type(e).__name__)
+    return {"type": kind, "message": str(e)}
+
+
+def _raise(error: dict) -> None:
+    exc_type = {"ConnectionError": ConnectionError, "ValueError": ValueError}.get(
+        error.get("type"), RuntimeError)
+    raise exc_type(error.get("message", "brain daemon error"))
+
+
+# =============================================================================
+# CLIENT
+# =============================================================================
+
+class DaemonClient:
+    """Forwards queries to a running daemon found through daemon.json."""
+
+    def __init__(self, host: str, port: int, auth: str):
+        self.host = host
+        self.port = port
+        self.auth = auth
+
+    @classmethod
+    def discover(cls, path: Path = DAEMON_PATH) -> Optional["DaemonClient"]:
+        """Client for the daemon in the discovery file, or None if there is none."""
+        try:
+            with open(path, encoding="utf-8") as f:
+                info = json.load(f)
+            return cls(info.get("host", DEFAULT_HOST), int(info["port"]), info["auth"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _call(self, op: str, timeout: Optional[float] = None, **fields) -> Generator[dict, None, None]:
+        """
+        Send one request and yield the response lines.
+        DaemonUnavailable if nothing accepts the connection.
+        """
+        try:
+            sock = socket.create_connection((self.host, self.port), timeout=CONNECT_TIMEOUT)
+        except OSError as e:
+            raise DaemonUnavailable(f"No brain daemon on {self.host}:{self.port}: {e}")
+        with sock, sock.makefile("rb") as reader:
+            # Delegations (ComfyUI video) can take minutes once connected
+            sock.settimeout(timeout)
+            request = dict(fields, auth=self.auth, op=op)
+            sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+            for line in reader:
+                yield json.loads(line)
+        raise ConnectionError("Brain daemon closed the connection without a result")
+
+    def _result(self, op: str, timeout: Optional[float] = None, **fields) -> dict:
+        for message in self._call(op, timeout, **fields):
+            if "error" in message:
+                _raise(message["error"])
+            if "result" in message:
+                return message["result"]
+
+    def health(self) -> dict:
+        return self._result("health", timeout=5)
+
+    def shutdown(self) -> None:
+        self._result("shutdown", timeout=5)
+
+    def process(self, query: str, force_tool: Optional[str] = None,
+                latency_critical: bool = False) -> dict:
+        """Full result dict of one query, processed by the daemon."""
+        return self._result("process", query=query, tool=force_tool,
+                            latency_critical=latency_critical)
+
+    def process_stream(self, query: str, force_tool: Optional[str] = None,
+                       latency_critical: bool = False) -> Generator[str, None, dict]:
+        """Like AutomationBrain.process_stream(), served by the daemon."""
+        for message in self._call("stream", query=query, tool=force_tool,
+                                  latency_critical=latency_critical):
+            if "text" in message:
+                yield message["text"]
+            elif "error" in message:
+                _raise(message["error"])
+            elif "result" in message:
+                return message["result"]
+
+
+# =============================================================================
+# SERVER
+# =============================================================================
+
+class BrainDaemon:
+    """
+    Serves one resident brain on a localhost socket. The brain's bookkeeping
+    steps are wrapped on the instance (as auto_doc.wrap_brain hooks process)
+    so they run on a single thread whichever request thread calls them.
+    """
+
+    # Pipeline steps that write the SQLite stores and the conversation log
+    SERIAL_STEPS = ("_serve_cached", "_finish", "_update_usage")
+
+    def __init__(self, brain, host: str = DEFAULT_HOST, port: int = 0,
+                 path: Path = DAEMON_PATH):
+        self.brain = brain
+        self.path = Path(path)
+        self.auth = secrets.token_hex(16)
+        self.started = time.time()
+        self.served = 0
+        self.active = 0
+        self._lock = threading.Lock()
+        self._bookkeeping_ident = None
+        self._bookkeeping = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="daemon-bookkeeping",
+            initializer=self._mark_bookkeeping_thread)
+        for name in self.SERIAL_STEPS:
+            setattr(brain, name, self._serialized(getattr(brain, name)))
+
+        self.server = _Server((host, port), _Handler)
+        self.server.brain_daemon = self
+
+    @classmethod
+    def from_config(cls, brain, path: Path = DAEMON_PATH) -> "BrainDaemon":
+        """Build from config.yaml `daemon` (host, port; port 0 picks a free one)."""
+        daemon_config = brain.config.get("daemon", {})
+        return cls(brain, daemon_config.get("host", DEFAULT_HOST),
+                   daemon_config.get("port", 0), path)
+
+    @property
+    def address(self) -> tuple[str, int]:
+        return self.server.server_address[:2]
+
+    def _mark_bookkeeping_thread(self) -> None:
+        self._bookkeeping_ident = threading.get_ident()
+
+    def _serialized(self, step):
+        def run(*args, **kwargs):
+            if threading.get_ident() == self._bookkeeping_ident:
+                return step(*args, **kwargs)  # Nested step (_finish -> _update_usage)
+            context = contextvars.copy_context()
+            return self._bookkeeping.submit(context.run, step, *args, **kwargs).result()
+        return run
+
+    # =========================================================================
+    # LIFECYCLE
+    # =========================================================================
+
+    def _write_discovery(self) -> None:
+        host, port = self.address
+        info = {"pid": os.getpid(), "host": host, "port": port,
+                "auth": self.auth, "started_at": self.started}
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(info, f)
+        try:
+            os.chmod(tmp, 0o600)
+        except OSError:
+            pass
+        os.replace(tmp, self.path)
+
+    def _remove_discovery(self) -> None:
+        """Remove daemon.json unless a newer daemon has replaced it."""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                if json.load(f).get("auth") != self.auth:
+                    return
+            self.path.unlink()
+        except (OSError, ValueError):
+            pass
+
+    def serve_forever(self) -> None:
+        """Publish daemon.json and serve until shutdown() or Ctrl+C."""
+        self._write_discovery()
+        try:
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    def shutdown(self) -> None:
+        """Stop serve_forever() (safe from a request thread)."""
+        threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+    def close(self) -> None:
+        self._remove_discovery()
+        self.server.server_close()
+        # Leave usage_log.json current for tools that read the file
+        self._bookkeeping.submit(self.brain.usage.export_usage_log).result()
+        self._bookkeeping.shutdown()
+
+    def status(self) -> dict:
+        return {"pid": os.getpid(), "uptime_s": round(time.time() - self.started),
+                "served": self.served, "active": self.active}
+
+    # =========================================================================
+    # REQUESTS
+    # =========================================================================
+
+    def process_stream(self, request: dict) -> Generator[str, None, dict]:
+        """The brain's process_stream() for one request, counted in status()."""
+        with self._lock:
+            self.active += 1
+        try:
+            return (yield from self.brain.process_stream(
+                request["query"], request.get("tool"), request.get("latency_critical", False)))
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.served += 1
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    # Agents fan out; a full accept backlog would stall connects past CONNECT_TIMEOUT
+    request_queue_size = 128
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """One connection: a request line in, JSON lines out."""
+
+    def _send(self, message: dict) -> None:
+        self.wfile.write(json.dumps(message).encode("utf-8") + b"\n")
+        self.wfile.flush()
+
+    def handle(self):
+        daemon = self.server.brain_daemon
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError as e:
+            self._send({"error": _error(e)})
+            return
+        if not secrets.compare_digest(str(request.get("auth", "")), daemon.auth):
+            self._send({"error": {"type": "PermissionError", "message": "bad auth key"}})
+            return
+
+        op = request.get("op")
+        if op == "health":
+            self._send({"result": daemon.status()})
+        elif op == "shutdown":
+            self._send({"result": {"stopping": True}})
+            daemon.shutdown()
+        elif op in ("process", "stream"):
+            stream = daemon.process_stream(request)
+            try:
+                while True:
+                    try:
+                        text = next(stream)
+                    except StopIteration as stop:
+                        message = {"result": stop.value}
+                        break
+                    if op == "stream":
+                        self._send({"text": text})
+            except OSError:
+                stream.close()  # Client went away
+                return
+            except Exception as e:
+                message = {"error": _error(e)}
+            self._send(message)
+        else:
+            self._send({"error": {"type": "ValueError", "message": f"unknown op: {op}"}})
+
+
+def serve(verbose: bool = False, path: Path = DAEMON_PATH) -> None:
+    """Run a daemon around a new AutomationBrain until stopped."""
+    from automation_brain import AutomationBrain
+
+    daemon = BrainDaemon.from_config(AutomationBrain(verbose=verbose), path)
+    host, port = daemon.address
+    print(f"Brain daemon listening on {host}:{port} (pid {os.getpid()})", flush=True)
+    daemon.serve_forever()
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Automation Machine Brain Daemon")
+    parser.add_argument("--status", action="store_true", help="Show the running daemon")
+    parser.add_argument("--stop", action="store_true", help="Stop the running daemon")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log pipeline steps")
+    args = parser.parse_args()
+
+    if not (args.status or args.stop):
+        serve(args.verbose)
+        return
+
+    client = DaemonClient.discover()
+    try:
+        if client is None:
+            raise DaemonUnavailable("no daemon.json")
+        if args.stop:
+            client.shutdown()
+            print(f"Stopped brain daemon on {client.host}:{client.port}")
+        else:
+            print(json.dumps(client.health(), indent=2))
+    except DaemonUnavailable as e:
+        print(f"No brain daemon running ({e})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,569 @@
+#!/usr/bin/env python3
+"""
+ComfyUI Client for Automation Machine
+The one way the brain's ComfyUI delegates, comfyui_job.py and the video
+pipeline talk to ComfyUI: submit a workflow, upload inputs, wait for
+completion, download outputs. Requests go through the shared keep-alive
+session (http_pool), downloads are streamed to disk (resumed with HTTP
+Range if the connection drops, several outputs at once), and failures
+raise ComfyUIError subclasses instead of returning None or printing.
+
+The endpoint comes from tools_config.json (`comfyui.endpoint`).
+
+Uploads are deduplicated by content: the sha256 of every file uploaded
+is remembered per endpoint (comfyui_uploads.json), so re-running a job
+or rendering many segments from one photo uploads it once.
+
+ComfyUI pushes execution events for the client_id a prompt was queued
+with on /ws?clientId=<client_id>: `executing`, `progress`, `executed`,
+and `executing` with node null (or `execution_success`) when the prompt
+is done. wait() listens there and returns the moment execution finishes.
+Without the optional websocket-client package, or if the socket cannot be
+opened or drops, it polls /history with exponential backoff instead of a
+fixed interval.
+
+Usage:
+    python comfyui_client.py status                               # Queue and GPU memory
+    python comfyui_client.py upload photo.png                     # Upload (skipped if unchanged)
+    python comfyui_client.py wait <prompt_id> --client-id <id>   # Wait and print outputs
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Optional
+
+try:
+    import websocket  # websocket-client
+except ImportError:
+    websocket = None
+
+# Paths
+BASE_DIR = Path(__file__).resolve().parent
+TOOLS_CONFIG_PATH = BASE_DIR / "tools_config.json"
+UPLOADS_PATH = BASE_DIR / "comfyui_uploads.json"
+
+DEFAULT_ENDPOINT = "http://100.64.130.71:8188"
+
+# Streamed download/hash chunk size
+CHUNK_SIZE = 1024 * 1024
+
+# A dropped download resumes (HTTP Range) from what was written, this many times
+DOWNLOAD_RETRIES = 3
+
+# Outputs of one job downloaded at once
+DOWNLOAD_WORKERS = 4
+
+# Concurrent uploads of one name are serialized on one of this many locks
+UPLOAD_LOCK_STRIPES = 64
+
+# History polling backoff: first interval, growth factor, ceiling (seconds)
+POLL_INITIAL = 0.25
+POLL_FACTOR = 1.5
+POLL_MAX = 10.0
+
+# While listening on the websocket, re-check /history this often in case an
+# event was missed (ComfyUI restarted, socket silently stalled)
+WS_HISTORY_CHECK = 30.0
+
+# ComfyUI writes history just after the final `executing` event
+HISTORY_SETTLE_POLL = 0.05
+
+
+class ComfyUIError(Exception):
+    """A ComfyUI request or prompt failed; `details` holds ComfyUI's own error body."""
+
+    def __init__(self, message: str, details: Optional[dict] = None,
+                 status: Optional[int] = None):
+        super().__init__(message)
+        self.details = details or {}
+        self.status = status  # HTTP status, when ComfyUI answered with an error
+
+
+class ComfyUIConnectionError(ComfyUIError, ConnectionError):
+    """ComfyUI could not be reached or answered with an HTTP error."""
+
+
+class ComfyUIPromptError(ComfyUIError, ValueError):
+    """ComfyUI rejected a workflow (missing model, bad node inputs)."""
+
+
+class ComfyUIExecutionError(ComfyUIError):
+    """The prompt ran and failed (node error, interrupted)."""
+
+
+class ComfyUITimeout(ComfyUIError):
+    """The prompt did not finish within the timeout."""
+
+
+class ComfyUIClient:
+    """
+    One ComfyUI server and client_id. submit() queues prompts under the
+    client_id so wait() receives their events; ComfyUI keeps one event
+    socket per client_id, so jobs waited on concurrently need a client each.
+    """
+
+    def __init__(self, endpoint: str = DEFAULT_ENDPOINT, session=None,
+                 client_id: Optional[str] = None, uploads_path: Path = UPLOADS_PATH):
+        self.endpoint = endpoint.rstrip("/")
+        self.client_id = client_id or str(uuid.uuid4())
+        self.uploads_path = Path(uploads_path)
+        self._session = session
+        self.last_wait_mode = None  # "websocket" or "poll", for logs and traces
+
+    @classmethod
+    def from_config(cls, tools_config: Optional[dict] = None, session=None,
+                    client_id: Optional[str] = None) -> "ComfyUIClient":
+        """Client for tools_config.json's comfyui endpoint (loaded if not given)."""
+        if tools_config is None:
+            from startup import load_json
+            try:
+                tools_config = load_json(TOOLS_CONFIG_PATH)
+            except (OSError, ValueError):
+                tools_config = {}
+        endpoint = tools_config.get("comfyui", {}).get("endpoint", DEFAULT_ENDPOINT)
+        return cls(endpoint, session, client_id)
+
+    @property
+    def session(self):
+        if self._session is None:
+            from http_pool import get_session
+            self._session = get_session()
+        return self._session
+
+    def _request(self, method: str, path: str, **kwargs):
+        """HTTP request to ComfyUI; ComfyUIConnectionError on any failure."""
+        import requests
+
+        kwargs.setdefault("timeout", 30)
+        try:
+            response = self.session.request(method, f"{self.endpoint}{path}", **kwargs)
+        except requests.exceptions.RequestException as e:
+            raise ComfyUIConnectionError(f"ComfyUI at {self.endpoint} unreachable: {e}") from e
+        if response.status_code >= 400:
+            try:
+                details = response.json()
+            except ValueError:
+                details = {"body": response.text[:500]}
+            raise ComfyUIConnectionError(
+                f"ComfyUI {method} {path} failed: HTTP {response.status_code}", details,
+                response.status_code)
+        return response
+
+    # =========================================================================
+    # PROMPTS
+    # =========================================================================
+
+    def submit(self, workflow: dict) -> str:
+        """
+        Queue an API-format workflow and return its prompt_id.
+        ComfyUIPromptError if ComfyUI rejects it (details has node_errors).
+        """
+        try:
+            response = self._request("POST", "/prompt",
+                                     json={"prompt": workflow, "client_id": self.client_id})
+        except ComfyUIConnectionError as e:
+            if "error" in e.details or "node_errors" in e.details:
+                error = e.details.get("error") or {}
+                message = error.get("message") if isinstance(error, dict) else str(error)
+                raise ComfyUIPromptError(f"ComfyUI rejected the workflow: {message}",
+                                         e.details) from None
+            raise
+        prompt_id = response.json().get("prompt_id")
+        if not prompt_id:
+            raise ComfyUIPromptError("ComfyUI returned no prompt_id", response.json())
+        return prompt_id
+
+    def history(self, prompt_id: str) -> Optional[dict]:
+        """The prompt's /history entry, or None while it has none."""
+        response = self._request("GET", f"/history/{prompt_id}", timeout=10)
+        return response.json().get(prompt_id)
+
+    def queue_state(self) -> dict:
+        """/queue: {"queue_running": [...], "queue_pending": [...]}."""
+        return self._request("GET", "/queue", timeout=10).json()
+
+    def system_stats(self) -> dict:
+        """/system_stats: system info and devices (VRAM)."""
+        return self._request("GET", "/system_stats", timeout=10).json()
+
+    @staticmethod
+    def finished(entry: Optional[dict]) -> bool:
+        """
+        Whether a history entry is final; raises ComfyUIExecutionError for
+        a failed prompt.
+        """
+        if not entry:
+            return False
+        status = entry.get("status") or {}
+        if status.get("status_str") == "error":
+            raise ComfyUIExecutionError(_error_message(status.get("messages", [])))
+        if status:
+            return status.get("completed", False) or status.get("status_str") == "success"
+        # Servers that predate the status block: outputs mean done
+        return bool(entry.get("outputs"))
+
+    # =========================================================================
+    # WAITING
+    # =========================================================================
+
+    def wait(self, prompt_id: str, timeout: float = 600,
+             on_progress: Optional[Callable[[dict], None]] = None,
+             poll_max: float = POLL_MAX) -> dict:
+        """
+        Block until the prompt finishes and return its history entry
+        ({"outputs", "status", ...}). Raises ComfyUIExecutionError if it
+        failed and ComfyUITimeout after `timeout` seconds. on_progress
+        gets websocket events ({"type", "data"}) as they arrive.
+        """
+        deadline = time.monotonic() + timeout
+        if websocket is not None:
+            entry = self._wait_websocket(prompt_id, deadline, on_progress)
+            if entry is not None:
+                self.last_wait_mode = "websocket"
+                return entry
+        self.last_wait_mode = "poll"
+        return self._wait_poll(prompt_id, deadline, POLL_INITIAL, poll_max)
+
+    def _wait_poll(self, prompt_id: str, deadline: float, interval: float,
+                   poll_max: float = POLL_MAX) -> dict:
+        """Poll /history, backing off from `interval` to poll_max."""
+        while True:
+            try:
+                entry = self.history(prompt_id)
+                if self.finished(entry):
+                    return entry
+            except ComfyUIExecutionError:
+                raise
+            except Exception:
+                pass  # Transient: ComfyUI busy or restarting
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise ComfyUITimeout(f"Prompt {prompt_id} not finished in time")
+            time.sleep(min(interval, remaining))
+            interval = min(interval * POLL_FACTOR, poll_max)
+
+    def _wait_websocket(self, prompt_id: str, deadline: float,
+                        on_progress: Optional[Callable[[dict], None]]) -> Optional[dict]:
+        """
+        Follow the prompt's events; the history entry once it finishes, or
+        None if the websocket is unavailable so the caller polls instead.
+        """
+        ws_url = "ws" + self.endpoint[len("http"):] + f"/ws?clientId={self.client_id}"
+        try:
+            ws = websocket.create_connection(ws_url, timeout=10)
+        except Exception:
+            return None
+        try:
+            next_check = time.monotonic()
+            while True:
+                now = time.monotonic()
+                if now >= next_check:
+                    # Covers prompts that finished before we connected
+                    try:
+                        entry = self.history(prompt_id)
+                        if self.finished(entry):
+                            return entry
+                    except ComfyUIExecutionError:
+                        raise
+                    except Exception:
+                        pass
+                    next_check = now + WS_HISTORY_CHECK
+                if now >= deadline:
+                    raise ComfyUITimeout(f"Prompt {prompt_id} not finished in time")
+
+                ws.settimeout(max(0.1, min(deadline, next_check) - now))
+                try:
+                    message = ws.recv()
+                except websocket.WebSocketTimeoutException:
+                    continue
+                except Exception:
+                    return None  # Socket dropped: fall back to polling
+                if not isinstance(message, str):
+                    continue  # Binary frames are live previews
+                try:
+                    event = json.loads(message)
+                except ValueError:
+                    continue
+                data = event.get("data") or {}
+                if data.get("prompt_id") not in (None, prompt_id):
+                    continue
+
+                kind = event.get("type")
+                if kind in ("execution_error", "execution_interrupted"):
+                    raise ComfyUIExecutionError(_error_message([[kind, data]]))
+                if (kind == "execution_success"
+                        or (kind == "executing" and data.get("node") is None
+                            and data.get("prompt_id") == prompt_id)):
+                    # History is written just after this event
+                    return self._wait_poll(prompt_id, deadline, HISTORY_SETTLE_POLL, 1.0)
+                if on_progress and kind in ("executing", "progress", "executed"):
+                    on_progress(event)
+        finally:
+            ws.close()
+
+
+    # =========================================================================
+    # FILES
+    # =========================================================================
+
+    def _load_uploads(self) -> dict:
+        try:
+            with open(self.uploads_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_uploads(self, uploads: dict) -> None:
+        tmp = self.uploads_path.with_name(f"{self.uploads_path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(uploads, f, indent=2)
+        os.replace(tmp, self.uploads_path)
+
+    def upload(self, local_path, subfolder: str = "", file_type: str = "input",
+               force: bool = False) -> dict:
+        """
+        Upload a file to ComfyUI's input folder under its own name and
+        return ComfyUI's {"name", "subfolder", "type"}. Skipped when this
+        exact content was already uploaded there (unless force).
+        """
+        local_path = Path(local_path)
+        digest = hashlib.sha256()
+        with open(local_path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+        key = f"{self.endpoint}|{digest.hexdigest()}"
+        target = {"name": local_path.name, "subfolder": subfolder, "type": file_type}
+
+        # Concurrent uploads of one name to one server go one at a time, so
+        # the second sees the first in the index instead of uploading again
+        name_key = f"{self.endpoint}|{subfolder}|{local_path.name}"
+        with _upload_name_locks[hash(name_key) % UPLOAD_LOCK_STRIPES]:
+            with _uploads_lock:
+                if not force and self._load_uploads().get(key) == target:
+                    return dict(target)
+
+            with open(local_path, "rb") as f:
+                response = self._request(
+                    "POST", "/upload/image", timeout=120,
+                    files={"image": (local_path.name, f, "application/octet-stream")},
+                    data={"subfolder": subfolder, "type": file_type, "overwrite": "true"})
+            result = response.json()
+
+            with _uploads_lock:
+                uploads = self._load_uploads()
+                # Overwriting a name invalidates whatever content it held before there
+                for other in [k for k, v in uploads.items()
+                              if v == target and k.startswith(f"{self.endpoint}|")]:
+                    del uploads[other]
+                if result.get("name") == local_path.name:
+                    uploads[key] = target
+                self._save_uploads(uploads)
+        return result
+
+    def download(self, file: dict, dest_dir, filename: Optional[str] = None) -> Path:
+        """
+        Stream one output file record ({"filename", "subfolder", "type"})
+        to dest_dir (as `filename`, default its own name); the local path.
+
+        Chunks go to <name>.part, renamed into place only once its size
+        matches the size the server reported. A dropped connection resumes
+        after the last whole chunk with an HTTP Range request (If-Range
+        guards against the file changing on the server); so does a .part
+        left behind by an earlier, interrupted run.
+
+        Without a Content-Length, a chunked body is complete once its final
+        chunk arrives; otherwise the size is asked for with a one-byte Range
+        request, and if the server won't say, the .part is kept unverified.
+        """
+        import requests
+
+        dest = Path(dest_dir) / (filename or file["filename"])
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        part = dest.with_name(dest.name + ".part")
+        params = {"filename": file["filename"], "subfolder": file.get("subfolder", ""),
+                  "type": file.get("type", "output")}
+        validator = None  # ETag / Last-Modified of the copy being resumed
+        error = None
+
+        for attempt in range(DOWNLOAD_RETRIES + 1):
+            if attempt:
+                time.sleep(min(POLL_MAX, POLL_INITIAL * POLL_FACTOR ** attempt))
+            offset = part.stat().st_size if part.exists() else 0
+            headers = {}
+            if offset:
+                headers["Range"] = f"bytes={offset}-"
+                if validator:
+                    headers["If-Range"] = validator
+            try:
+                response = self._request("GET", "/view", params=params, headers=headers,
+                                         stream=True, timeout=120)
+            except ComfyUIConnectionError as e:
+                error = e
+                if e.status == 416:  # .part is not a prefix of the file: start over
+                    part.unlink(missing_ok=True)
+                elif e.status is not None:
+                    raise
+                continue
+
+            try:
+                resumed = response.status_code == 206
+                if resumed:
+                    # Content-Range: bytes <start>-<end>/<total>
+                    total = response.headers.get("Content-Range", "").rsplit("/", 1)[-1]
+                else:
+                    offset = 0  # Range ignored or the file changed: whole file
+                    total = response.headers.get("Content-Length", "")
+                expected = int(total) if total.isdigit() else None
+                # urllib3 raises if a chunked body ends before its final chunk
+                chunked = "chunked" in response.headers.get("Transfer-Encoding", "").lower()
+                validator = (response.headers.get("ETag")
+                             or response.headers.get("Last-Modified") or validator)
+                with open(part, "ab" if resumed else "wb") as f:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        f.write(chunk)
+            except requests.exceptions.RequestException as e:
+                error = ComfyUIConnectionError(f"Download of {file['filename']} interrupted: {e}")
+                continue
+            finally:
+                response.close()
+
+            size = part.stat().st_size
+            if expected is None and not chunked:
+                expected = self._remote_size(params)
+                if expected is None:
+                    raise ComfyUIConnectionError(
+                        f"Download of {file['filename']} unverified: no size from the server; "
+                        f"kept {part}", {"size": size})
+            if expected is None or size == expected:
+                os.replace(part, dest)
+                return dest
+            error = ComfyUIConnectionError(
+                f"Download of {file['filename']} incomplete: {size} of {expected} bytes",
+                {"size": size, "expected": expected})
+            if size > expected:
+                part.unlink()
+
+        raise ComfyUIConnectionError(
+            f"Download of {file['filename']} failed after {DOWNLOAD_RETRIES + 1} attempts: {error}",
+            getattr(error, "details", {}))
+
+    def _remote_size(self, params: dict) -> Optional[int]:
+        """A /view file's size from a one-byte Range request, or None if the server won't say."""
+        try:
+            response = self._request("GET", "/view", params=params,
+                                     headers={"Range": "bytes=0-0"}, stream=True)
+        except ComfyUIConnectionError:
+            return None
+        with response:
+            if response.status_code == 206:
+                total = response.headers.get("Content-Range", "").rsplit("/", 1)[-1]
+            else:
+                total = response.headers.get("Content-Length", "")
+        return int(total) if total.isdigit() else None
+
+    def download_outputs(self, entry: dict, dest_dir, kinds: tuple = ("images", "gifs", "videos"),
+                         prefix: str = "", on_error: Optional[Callable] = None) -> list[Path]:
+        """
+        Download a history entry's outputs of the given kinds, each saved
+        as prefix + filename, several at once. Files that fail are passed
+        to on_error(file, error) and skipped; the rest keep entry order.
+        """
+        files = output_files(entry, kinds)
+        if not files:
+            return []
+
+        def fetch(file: dict) -> Optional[Path]:
+            try:
+                return self.download(file, dest_dir, prefix + file["filename"])
+            except (ComfyUIError, OSError) as e:
+                if on_error:
+                    on_error(file, e)
+                return None
+
+        if len(files) == 1:
+            saved = [fetch(files[0])]
+        else:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(min(DOWNLOAD_WORKERS, len(files)),
+                                    thread_name_prefix="comfyui-download") as pool:
+                saved = list(pool.map(fetch, files))
+        return [path for path in saved if path is not None]
+
+
+_uploads_lock = threading.Lock()
+_upload_name_locks = [threading.Lock() for _ in range(UPLOAD_LOCK_STRIPES)]
+
+
+def output_files(entry: dict, kinds: tuple = ("images", "gifs", "videos")) -> list[dict]:
+    """File records ({"filename", "subfolder", "type"}) in a history entry's outputs."""
+    files = []
+    for node_output in (entry or {}).get("outputs", {}).values():
+        for kind in kinds:
+            files.extend(node_output.get(kind, []))
+    return files
+
+
+def _error_message(messages: list) -> str:
+    """Readable error from history status messages or an error event."""
+    for message in messages:
+        if isinstance(message, (list, tuple)) and len(message) >= 2:
+            kind, data = message[0], message[1] or {}
+            if kind == "execution_error":
+                node = data.get("node_type") or data.get("node_id")
+                return f"{node}: {data.get('exception_message', 'unknown error')}".strip()
+            if kind == "execution_interrupted":
+                return "Execution interrupted"
+    return "ComfyUI execution failed"
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Automation Machine ComfyUI Client")
+    parser.add_argument("--endpoint", help="ComfyUI URL (default: tools_config.json)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("status", help="Show the queue and GPU memory")
+    upload_parser = subparsers.add_parser("upload", help="Upload input files")
+    upload_parser.add_argument("files", nargs="+")
+    upload_parser.add_argument("--force", action="store_true", help="Upload even if unchanged")
+    wait_parser = subparsers.add_parser("wait", help="Wait for a queued prompt")
+    wait_parser.add_argument("prompt_id")
+    wait_parser.add_argument("--client-id", help="client_id the prompt was queued with")
+    wait_parser.add_argument("--timeout", type=float, default=600)
+    args = parser.parse_args()
+
+    client = (ComfyUIClient(args.endpoint, client_id=getattr(args, "client_id", None))
+              if args.endpoint else
+              ComfyUIClient.from_config(client_id=getattr(args, "client_id", None)))
+    try:
+        if args.command == "status":
+            queue = client.queue_state()
+            print(f"Running: {len(queue.get('queue_running', []))}  "
+                  f"Pending: {len(queue.get('queue_pending', []))}")
+            for device in client.system_stats().get("devices", []):
+                print(f"{device.get('name')}: {device.get('vram_free', 0) / 1024**3:.1f}GB free / "
+                      f"{device.get('vram_total', 0) / 1024**3:.1f}GB")
+        elif args.command == "upload":
+            for path in args.files:
+                print(f"{path} -> {client.upload(path, force=args.force)}")
+        else:
+            start = time.monotonic()
+            entry = client.wait(args.prompt_id, args.timeout,
+                                on_progress=lambda e: print(json.dumps(e)))
+            print(f"Finished in {time.monotonic() - start:.1f}s via {client.last_wait_mode}")
+            for f in output_files(entry):
+                print(f"  {f.get('subfolder', '')}/{f.get('filename')}")
+    except ComfyUIError as e:
+        print(f"{type(e).__name__}: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -27,7 +27,9 @@ import time
 from datetime import datetime
 from pathlib import Path
 
-import requests
+from comfyui_client import ComfyUIClient, ComfyUIError, ComfyUITimeout, output_files
+from comfyui_pool import ComfyUIPool
+from http_pool import get_session
 
 # Paths
 BASE_DIR = Path("C:/automation-machine")
@@ -35,8 +37,16 @@ WORKFLOWS_DIR = BASE_DIR / "workflows"
 OUTPUT_DIR = BASE_DIR / "output"
 JOBS_LOG = BASE_DIR / "comfyui_jobs.json"
 
-# ComfyUI endpoint (The Machine via Tailscale)
-COMFYUI_ENDPOINT = "http://100.64.130.71:8188"
+
+def comfyui_pool() -> ComfyUIPool:
+    """The ComfyUI nodes in tools_config.json (The Machine via Tailscale, plus any others)."""
+    return ComfyUIPool.from_config(session=get_session())
+
+
+def comfyui_client(prompt_id: str = None) -> ComfyUIClient:
+    """Client for the node and client_id a logged job was queued with (first node otherwise)."""
+    job = next((job for job in load_jobs_log()["jobs"] if job["prompt_id"] == prompt_id), {})
+    return comfyui_pool().client(job.get("endpoint"), job.get("client_id"))
 
 
 def load_jobs_log() -> dict:
@@ -94,27 +104,27 @@ def queue_job(workflow_name: str, image_path: str = None, prompt_text: str = Non
         if "seed" in node.get("inputs", {}):
             node["inputs"]["seed"] = int(time.time()) % (2**32)
 
-    # Queue to ComfyUI
-    import uuid
-    client_id = str(uuid.uuid4())
-
+    # Queue on the least-loaded node that can run it; an image path refers to
+    # the first node's input folder, so those jobs stay there. The node and
+    # client_id are logged so `wait` can follow its events and fetch outputs.
+    pool = comfyui_pool()
     try:
-        response = requests.post(
-            f"{COMFYUI_ENDPOINT}/prompt",
-            json={"prompt": workflow, "client_id": client_id},
-            timeout=30
-        )
-        response.raise_for_status()
-        prompt_id = response.json().get("prompt_id")
-    except requests.exceptions.RequestException as e:
+        node = None if image_path else pool.select(workflow, workflow_name)
+        client = pool.client(node["endpoint"] if node else None)
+        prompt_id = client.submit(workflow)
+    except ComfyUIError as e:
         print(f"ERROR: Failed to queue job: {e}")
-        print(f"Is ComfyUI running at {COMFYUI_ENDPOINT}?")
+        for node_id, error in e.details.get("node_errors", {}).items():
+            print(f"  Node {node_id}: {error}")
+        print(f"Is ComfyUI running at {', '.join(node['endpoint'] for node in pool.nodes)}?")
         sys.exit(1)
 
     # Log the job
     log = load_jobs_log()
     log["jobs"].append({
         "prompt_id": prompt_id,
+        "client_id": client.client_id,
+        "endpoint": client.endpoint,
         "workflow": workflow_name,
         "image": image_path,
         "queued_at": datetime.now().isoformat(),
@@ -127,45 +137,39 @@ def queue_job(workflow_name: str, image_path: str = None, prompt_text: str = Non
     return prompt_id
 
 
+def history_status(job_data: dict) -> dict:
+    """Status dict for a job's /history entry."""
+    outputs = job_data.get("outputs", {})
+
+    # Check for video outputs
+    videos = output_files(job_data, ("gifs", "videos"))
+
+    if videos:
+        return {
+            "status": "completed",
+            "videos": videos,
+            "execution_time": job_data.get("status", {}).get("execution_time")
+        }
+    elif outputs:
+        return {"status": "completed", "outputs": outputs}
+    else:
+        return {"status": "processing"}
+
+
 def check_status(prompt_id: str) -> dict:
     """
     Check the status of a job by prompt_id.
     Returns dict with status and output info.
     """
+    client = comfyui_client(prompt_id)
     try:
         # Check history
-        response = requests.get(
-            f"{COMFYUI_ENDPOINT}/history/{prompt_id}",
-            timeout=10
-        )
-        history = response.json()
-
-        if prompt_id in history:
-            job_data = history[prompt_id]
-            outputs = job_data.get("outputs", {})
-
-            # Check for video outputs
-            videos = []
-            for node_id, node_output in outputs.items():
-                if "gifs" in node_output:
-                    videos.extend(node_output["gifs"])
-                if "videos" in node_output:
-                    videos.extend(node_output["videos"])
-
-            if videos:
-                return {
-                    "status": "completed",
-                    "videos": videos,
-                    "execution_time": job_data.get("status", {}).get("execution_time")
-                }
-            elif outputs:
-                return {"status": "completed", "outputs": outputs}
-            else:
-                return {"status": "processing"}
+        job_data = client.history(prompt_id)
+        if job_data:
+            return history_status(job_data)
 
         # Check queue
-        queue_response = requests.get(f"{COMFYUI_ENDPOINT}/queue", timeout=10)
-        queue_data = queue_response.json()
+        queue_data = client.queue_state()
 
         # Check if in running queue
         running = queue_data.get("queue_running", [])
@@ -181,100 +185,80 @@ def check_status(prompt_id: str) -> dict:
 
         return {"status": "unknown"}
 
-    except requests.exceptions.RequestException as e:
+    except ComfyUIError as e:
         return {"status": "error", "message": str(e)}
 
 
 def wait_for_job(prompt_id: str, timeout: int = 7200, poll_interval: int = 30) -> dict:
     """
     Wait for a job to complete with progress updates.
+    Follows ComfyUI's websocket events for the client_id the job was queued
+    with; without them, polls with backoff up to poll_interval seconds.
     Default timeout: 2 hours (7200 seconds)
     """
+    client = comfyui_client(prompt_id)
+
     print(f"Waiting for job {prompt_id}...")
     print(f"Timeout: {timeout}s ({timeout/60:.0f} min)")
-    print(f"Poll interval: {poll_interval}s")
     print("-" * 50)
 
-    start_time = time.time()
-    last_status = None
-
-    while True:
-        elapsed = time.time() - start_time
-
-        if elapsed > timeout:
-            print(f"\nTIMEOUT after {elapsed/60:.1f} minutes")
-            return {"status": "timeout", "elapsed": elapsed}
+    last_node = None
 
-        status = check_status(prompt_id)
-        current_status = status.get("status")
-
-        # Print status update
+    def on_progress(event):
+        nonlocal last_node
+        data = event["data"]
         timestamp = datetime.now().strftime("%H:%M:%S")
-        if current_status != last_status:
-            print(f"[{timestamp}] Status: {current_status}")
-            last_status = current_status
-        else:
-            # Progress dot
-            print(".", end="", flush=True)
-
-        if current_status == "completed":
-            print(f"\n\nJOB COMPLETED in {elapsed/60:.1f} minutes!")
-
-            # Download videos
-            videos = status.get("videos", [])
-            if videos:
-                print(f"Videos generated: {len(videos)}")
-                downloaded = download_outputs(videos)
-                status["downloaded"] = downloaded
-
-            # Update job log
-            log = load_jobs_log()
-            for job in log["jobs"]:
-                if job["prompt_id"] == prompt_id:
-                    job["status"] = "completed"
-                    job["completed_at"] = datetime.now().isoformat()
-                    job["elapsed_seconds"] = elapsed
-                    break
-            save_jobs_log(log)
-
-            return status
-
-        if current_status == "error":
-            print(f"\nERROR: {status.get('message')}")
-            return status
-
-        time.sleep(poll_interval)
-
-
-def download_outputs(videos: list) -> list:
-    """Download video outputs from ComfyUI."""
-    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-    downloaded = []
+        if event["type"] == "executing" and data.get("node") != last_node:
+            print(f"\n[{timestamp}] Running node {data.get('node')}")
+            last_node = data.get("node")
+        elif event["type"] == "progress":
+            print(f"\r[{timestamp}] Step {data.get('value')}/{data.get('max')}", end="", flush=True)
 
-    for vid_info in videos:
-        filename = vid_info.get("filename", "output.mp4")
-        subfolder = vid_info.get("subfolder", "")
-        vid_type = vid_info.get("type", "output")
+    start_time = time.time()
+    try:
+        entry = client.wait(prompt_id, timeout, on_progress, poll_max=poll_interval)
+    except ComfyUITimeout:
+        elapsed = time.time() - start_time
+        print(f"\nTIMEOUT after {elapsed/60:.1f} minutes")
+        return {"status": "timeout", "elapsed": elapsed}
+    except ComfyUIError as e:
+        print(f"\nERROR: {e}")
+        return {"status": "error", "message": str(e)}
+    elapsed = time.time() - start_time
 
-        try:
-            url = f"{COMFYUI_ENDPOINT}/view?filename={filename}&subfolder={subfolder}&type={vid_type}"
-            response = requests.get(url, timeout=120)
-            response.raise_for_status()
+    status = history_status(entry)
+    status["elapsed"] = elapsed
+    print(f"\n\nJOB COMPLETED in {elapsed/60:.1f} minutes! (via {client.last_wait_mode})")
 
-            # Save with timestamp
-            local_filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-            local_path = OUTPUT_DIR / local_filename
+    # Download videos
+    videos = status.get("videos", [])
+    if videos:
+        print(f"Videos generated: {len(videos)}")
+        downloaded = download_outputs(client, entry)
+        status["downloaded"] = downloaded
 
-            with open(local_path, "wb") as f:
-                f.write(response.content)
+    # Update job log
+    log = load_jobs_log()
+    for job in log["jobs"]:
+        if job["prompt_id"] == prompt_id:
+            job["status"] = "completed"
+            job["completed_at"] = datetime.now().isoformat()
+            job["elapsed_seconds"] = elapsed
+            break
+    save_jobs_log(log)
 
-            print(f"  Downloaded: {local_path}")
-            downloaded.append(str(local_path))
+    return status
 
-        except Exception as e:
-            print(f"  Failed to download {filename}: {e}")
 
-    return downloaded
+def download_outputs(client: ComfyUIClient, entry: dict) -> list:
+    """Download a finished job's video outputs from ComfyUI."""
+    prefix = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_"
+    downloaded = client.download_outputs(
+        entry, OUTPUT_DIR, ("gifs", "videos"), prefix,
+        on_error=lambda file, e: print(f"  Failed to download {file['filename']}: {e}"))
+    for local_path in downloaded:
+        print(f"  Downloaded: {local_path}")
+    return [str(local_path) for local_path in downloaded]
 
 
 def list_jobs(limit: int = 10) -> None:
@@ -326,7 +310,8 @@ def main():
     wait_parser.add_argument("--timeout", "-t", type=int, default=7200,
                              help="Timeout in seconds (default: 7200 = 2 hours)")
     wait_parser.add_argument("--poll", type=int, default=30,
-                             help="Poll interval in seconds (default: 30)")
+                             help="Max poll interval in seconds when websocket events "
+                                  "are unavailable (default: 30)")
 
     # List command
     list_parser = subparsers.add_parser("list", help="List recent jobs")
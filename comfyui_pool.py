@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+ComfyUI Pool for Automation Machine
+Several ComfyUI servers (nodes) behind one dispatch call, so batch
+renders scale across GPUs instead of queueing on one.
+
+Nodes come from tools_config.json `comfyui.nodes`:
+
+    {"name": "machine", "endpoint": "http://100.64.130.71:8188",
+     "models": ["sdxl_base_1.0.safetensors", ...],   # optional
+     "workflows": ["sdxl_basic", "fantasytalking"],  # optional
+     "queue_depth": 2,                               # optional
+     "enabled": true}
+
+A node without `models` (or `workflows`) is assumed to have them all.
+Without `nodes`, the pool is the single `comfyui.endpoint`.
+
+select() polls each capable node's /queue and picks the least-loaded
+one (ties go to the node listed first). A workflow's model requirements
+are read from its node inputs (ckpt_name, unet_name, ... values naming
+.safetensors/.ckpt/... files). Nodes that do not answer are skipped.
+
+A job must be uploaded to, waited on and downloaded from the node that
+runs it: keep the client (or its endpoint) select() led to.
+
+Usage:
+    python comfyui_pool.py                          # Nodes, load and capabilities
+    python comfyui_pool.py --workflow flow.json     # Which node would run it
+"""
+
+import argparse
+import json
+from pathlib import Path
+from typing import Optional
+
+from comfyui_client import (DEFAULT_ENDPOINT, TOOLS_CONFIG_PATH, UPLOADS_PATH, ComfyUIClient,
+                            ComfyUIConnectionError, ComfyUIError, ComfyUIPromptError)
+
+# Input values with these extensions name model files
+MODEL_EXTENSIONS = (".safetensors", ".ckpt", ".pt", ".pth", ".bin", ".gguf", ".sft")
+
+
+def required_models(workflow: dict) -> set[str]:
+    """Model filenames an API-format workflow loads (basename, any folder)."""
+    models = set()
+    for node in workflow.values():
+        if not isinstance(node, dict):
+            continue
+        for value in node.get("inputs", {}).values():
+            if isinstance(value, str) and value.lower().endswith(MODEL_EXTENSIONS):
+                models.add(value.replace("\\", "/").rsplit("/", 1)[-1])
+    return models
+
+
+class ComfyUIPool:
+    """The ComfyUI nodes a job can run on, and least-loaded dispatch across them."""
+
+    def __init__(self, nodes: list[dict], session=None, uploads_path: Path = UPLOADS_PATH):
+        self.nodes = [dict(node, endpoint=node["endpoint"].rstrip("/"))
+                      for node in nodes if node.get("enabled", True) and node.get("endpoint")]
+        if not self.nodes:
+            raise ValueError("No enabled ComfyUI nodes")
+        for node in self.nodes:
+            node.setdefault("name", node["endpoint"])
+        self.session = session
+        self.uploads_path = Path(uploads_path)
+
+    @classmethod
+    def from_config(cls, tools_config: Optional[dict] = None, session=None) -> "ComfyUIPool":
+        """Pool of tools_config.json's comfyui nodes (or its single endpoint)."""
+        if tools_config is None:
+            from startup import load_json
+            try:
+                tools_config = load_json(TOOLS_CONFIG_PATH)
+            except (OSError, ValueError):
+                tools_config = {}
+        comfyui = tools_config.get("comfyui", {})
+        nodes = comfyui.get("nodes") or [
+            {"name": "default", "endpoint": comfyui.get("endpoint", DEFAULT_ENDPOINT)}]
+        return cls(nodes, session)
+
+    def client(self, endpoint: Optional[str] = None,
+               client_id: Optional[str] = None) -> ComfyUIClient:
+        """Client for a node (the first node if endpoint is None)."""
+        return ComfyUIClient(endpoint or self.nodes[0]["endpoint"], self.session, client_id,
+                             uploads_path=self.uploads_path)
+
+    # =========================================================================
+    # DISPATCH
+    # =========================================================================
+
+    @staticmethod
+    def capable(node: dict, workflow: Optional[dict] = None,
+                workflow_name: Optional[str] = None) -> bool:
+        """Whether a node has the workflow and every model it loads."""
+        if workflow_name and node.get("workflows") is not None:
+            if workflow_name not in node["workflows"]:
+                return False
+        if workflow and node.get("models") is not None:
+            available = {m.replace("\\", "/").rsplit("/", 1)[-1] for m in node["models"]}
+            if not required_models(workflow) <= available:
+                return False
+        return True
+
+    def load(self, node: dict) -> Optional[int]:
+        """Prompts running + pending on a node; None if it does not answer."""
+        try:
+            queue = self.client(node["endpoint"]).queue_state()
+        except ComfyUIError:
+            return None
+        return len(queue.get("queue_running", [])) + len(queue.get("queue_pending", []))
+
+    def select(self, workflow: Optional[dict] = None, workflow_name: Optional[str] = None,
+               queue_depth: Optional[int] = None, reserved: Optional[dict] = None,
+               exclude=()) -> Optional[dict]:
+        """
+        Least-loaded node that can run the workflow, as the node dict with
+        its current "load" (None if it was the only choice and unpolled).
+        reserved ({endpoint: n}) adds prompts about to be submitted to a
+        node's load. With queue_depth (or the node's own queue_depth),
+        nodes at that load are full; None if all are.
+        Raises ComfyUIPromptError if no node can run the workflow, and
+        ComfyUIConnectionError if none of those that can answer.
+        """
+        reserved = reserved or {}
+        capable = [node for node in self.nodes
+                   if self.capable(node, workflow, workflow_name) and node["endpoint"] not in exclude]
+        if not capable:
+            missing = sorted(required_models(workflow or {}))
+            raise ComfyUIPromptError(
+                f"No ComfyUI node can run {workflow_name or 'this workflow'}"
+                + (f" (models: {', '.join(missing)})" if missing else ""),
+                {"workflow": workflow_name, "models": missing})
+
+        if len(capable) == 1 and queue_depth is None:
+            return dict(capable[0], load=None)  # Nothing to compare: skip the /queue round trip
+
+        loads = []
+        for index, node in enumerate(capable):
+            load = self.load(node)
+            if load is not None:
+                loads.append((load + reserved.get(node["endpoint"], 0), index, node))
+        if not loads:
+            raise ComfyUIConnectionError(
+                "No ComfyUI node reachable: " + ", ".join(node["endpoint"] for node in capable))
+
+        for load, _, node in sorted(loads, key=lambda item: item[:2]):
+            if queue_depth is None or load < node.get("queue_depth", queue_depth):
+                return dict(node, load=load)
+        return None
+
+    def status(self) -> list[dict]:
+        """Every node with its current load (None if unreachable)."""
+        return [dict(node, load=self.load(node)) for node in self.nodes]
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Automation Machine ComfyUI Pool")
+    parser.add_argument("--workflow", help="API-format workflow JSON to dispatch (dry run)")
+    args = parser.parse_args()
+
+    pool = ComfyUIPool.from_config()
+    for node in pool.status():
+        load = "unreachable" if node["load"] is None else f"{node['load']} queued"
+        print(f"  {node['name']:16} {node['endpoint']:32} {load}")
+        for key in ("workflows", "models"):
+            if node.get(key) is not None:
+                print(f"      {key}: {', '.join(node[key])}")
+
+    if args.workflow:
+        with open(args.workflow, encoding="utf-8") as f:
+            workflow = json.load(f)
+        try:
+            node = pool.select(workflow, Path(args.workflow).stem)
+            load = "" if node["load"] is None else f" ({node['load']} queued)"
+            print(f"\n{args.workflow} -> {node['name']}{load}")
+        except ComfyUIError as e:
+            print(f"\n{args.workflow}: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+ComfyUI Scheduler for Automation Machine
+Runs batches of ComfyUI jobs so the GPU never waits on us. Instead of
+submit -> wait -> download -> next, the scheduler:
+
+- keeps ComfyUI's queue fed up to `queue_depth` prompts, counting every
+  prompt on the server (/queue), not just ours, so a busy GPU is not
+  buried under more work;
+- with several ComfyUI nodes (comfyui_pool.py), sends each job to the
+  least-loaded node that has its workflow and models, uploads its inputs
+  there, and downloads its outputs from there;
+- prepares upcoming jobs (uploads, LLM prompt writing, workflow building)
+  on worker threads while the current one renders;
+- downloads outputs as each job finishes, while the next one renders.
+
+Jobs are recorded in a JSON state file as they move through
+pending -> queued -> done/failed. A run that is interrupted resumes
+without redoing work: finished jobs are skipped, and jobs already queued
+on ComfyUI are waited on, on the node and under the client_id they were
+submitted with, instead of being submitted twice.
+
+Usage:
+    python comfyui_scheduler.py --status     # Show scheduled jobs in the state file
+    python comfyui_scheduler.py --clear      # Forget finished and failed jobs
+"""
+
+import argparse
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional
+
+from comfyui_client import ComfyUIClient, ComfyUIError
+from comfyui_pool import ComfyUIPool
+
+# Paths
+BASE_DIR = Path(__file__).resolve().parent
+CONFIG_PATH = BASE_DIR / "config.yaml"
+STATE_PATH = BASE_DIR / "comfyui_schedule.json"
+
+DEFAULT_QUEUE_DEPTH = 2      # Per node: one rendering, one waiting, no idle gap between jobs
+DEFAULT_PREPARE_AHEAD = 2    # Jobs prepared (or preparing) beyond those queued
+DEFAULT_JOB_TIMEOUT = 3600
+DEFAULT_DOWNLOAD_WORKERS = 2
+
+# While every node's queue is full of other clients' work, re-check this often
+QUEUE_RECHECK = 5.0
+
+OUTPUT_KINDS = ("images", "gifs", "videos")
+
+
+class ComfyUIScheduler:
+    """
+    Pipelines a batch of ComfyUI jobs. add() them, then run().
+    A job's prepare() callable returns the API-format workflow to submit;
+    it runs on a worker thread, so it may call an LLM. Input files are
+    given to add() and uploaded to whichever node the job is sent to.
+    """
+
+    def __init__(self, pool: Optional[ComfyUIPool] = None,
+                 queue_depth: int = DEFAULT_QUEUE_DEPTH,
+                 prepare_ahead: int = DEFAULT_PREPARE_AHEAD,
+                 job_timeout: float = DEFAULT_JOB_TIMEOUT,
+                 state_path: Path = STATE_PATH, verbose: bool = False):
+        # ComfyUI keeps one event socket per client_id: one client per job in flight
+        self.pool = pool or ComfyUIPool.from_config()
+        self.queue_depth = max(1, queue_depth)
+        self.prepare_ahead = max(1, prepare_ahead)
+        self.job_timeout = job_timeout
+        self.state_path = Path(state_path)
+        self.verbose = verbose
+        self.jobs: dict[str, dict] = {}
+        self.state = self._load_state()
+
+    @classmethod
+    def from_config(cls, pool: Optional[ComfyUIPool] = None, state_path: Path = STATE_PATH,
+                    verbose: bool = False, config: Optional[dict] = None) -> "ComfyUIScheduler":
+        """Build from config.yaml `comfyui_scheduler` (queue_depth, prepare_ahead, job_timeout)."""
+        if config is None:
+            from startup import load_yaml
+            try:
+                config = load_yaml(CONFIG_PATH)
+            except (OSError, ValueError):
+                config = {}
+        settings = (config or {}).get("comfyui_scheduler", {})
+        return cls(pool,
+                   settings.get("queue_depth", DEFAULT_QUEUE_DEPTH),
+                   settings.get("prepare_ahead", DEFAULT_PREPARE_AHEAD),
+                   settings.get("job_timeout", DEFAULT_JOB_TIMEOUT),
+                   state_path, verbose)
+
+    def _log(self, message: str) -> None:
+        if self.verbose:
+            print(f"[Scheduler] {message}", flush=True)
+
+    # =========================================================================
+    # STATE
+    # =========================================================================
+
+    def _load_state(self) -> dict:
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"jobs": {}}
+
+    def _save_state(self) -> None:
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_name(f"{self.state_path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp, self.state_path)
+
+    def _record(self, name: str, **fields) -> dict:
+        record = self.state["jobs"].setdefault(name, {"status": "pending"})
+        record.update(fields, updated_at=datetime.now().isoformat())
+        self._save_state()
+        return record
+
+    # =========================================================================
+    # JOBS
+    # =========================================================================
+
+    def add(self, name: str, prepare: Callable[[], Optional[dict]], output_dir,
+            kinds: tuple = OUTPUT_KINDS, prefix: str = "", inputs: tuple = (),
+            workflow_name: Optional[str] = None) -> None:
+        """
+        Schedule a job. `name` identifies it across runs (state file);
+        outputs of the given kinds are downloaded to output_dir as
+        prefix + filename. prepare() returning None fails the job.
+        `inputs` are local files the workflow references by filename;
+        `workflow_name` limits the job to nodes listing that workflow.
+        """
+        if name in self.jobs:
+            raise ValueError(f"Job already scheduled: {name}")
+        self.jobs[name] = {"name": name, "prepare": prepare, "output_dir": Path(output_dir),
+                           "kinds": kinds, "prefix": prefix, "inputs": tuple(inputs),
+                           "workflow_name": workflow_name}
+
+    def _result(self, name: str) -> dict:
+        record = self.state["jobs"].get(name, {})
+        return {"name": name, "status": record.get("status", "pending"),
+                "prompt_id": record.get("prompt_id"), "outputs": record.get("outputs", []),
+                "error": record.get("error"), "elapsed_s": record.get("elapsed_s")}
+
+    def _finished_before(self, name: str) -> bool:
+        record = self.state["jobs"].get(name, {})
+        outputs = record.get("outputs") or []
+        return (record.get("status") == "done" and bool(outputs)
+                and all(Path(p).exists() for p in outputs))
+
+    def _still_on_server(self, client: ComfyUIClient, prompt_id: str) -> bool:
+        """Whether ComfyUI still knows a prompt (queued, running or in history)."""
+        try:
+            if client.history(prompt_id):
+                return True
+            queue = client.queue_state()
+        except ComfyUIError:
+            return True  # Can't tell; waiting will time out rather than double-submit
+        return any(item[1] == prompt_id
+                   for item in queue.get("queue_running", []) + queue.get("queue_pending", []))
+
+    def _submit(self, job: dict, client: ComfyUIClient, workflow: dict) -> str:
+        """Worker: upload a job's inputs to its node and queue it; the prompt_id."""
+        for path in job["inputs"]:
+            client.upload(path)
+        return client.submit(workflow)
+
+    def _render(self, job: dict, client: ComfyUIClient, prompt_id: str) -> dict:
+        """Worker: wait for a submitted prompt; its history entry."""
+        # Submitted behind at most queue_depth - 1 prompts, each within job_timeout
+        return client.wait(prompt_id, self.job_timeout * self.queue_depth)
+
+    def _download(self, job: dict, client: ComfyUIClient, entry: dict) -> list[str]:
+        """Worker: fetch a finished job's outputs; ComfyUIError unless every file arrived."""
+        failed = []
+        saved = client.download_outputs(entry, job["output_dir"], job["kinds"], job["prefix"],
+                                        on_error=lambda file, e: failed.append(f"{file['filename']}: {e}"))
+        if failed:
+            raise ComfyUIError("; ".join(failed), {"saved": [str(path) for path in saved]})
+        if not saved:
+            raise ComfyUIError(f"no {'/'.join(job['kinds'])} outputs")
+        return [str(path) for path in saved]
+
+    # =========================================================================
+    # RUN
+    # =========================================================================
+
+    def run(self, on_complete: Optional[Callable[[dict], None]] = None) -> dict[str, dict]:
+        """
+        Run every added job; {name: result} with result {"name", "status"
+        ("done" | "failed"), "prompt_id", "outputs", "error", "elapsed_s" (submit to finish)}.
+        on_complete(result) is called on this thread as each job finishes,
+        in completion order.
+        """
+        results: dict[str, dict] = {}
+
+        def finish(name: str, **fields) -> None:
+            self._record(name, **fields)
+            results[name] = self._result(name)
+            status = results[name]["status"]
+            self._log(f"{name}: {status}" + (f" ({results[name]['error']})" if status == "failed" else ""))
+            if on_complete:
+                on_complete(results[name])
+
+        pending = deque()
+        resumed = []
+        for name, job in self.jobs.items():
+            record = self.state["jobs"].get(name, {})
+            if self._finished_before(name):
+                self._log(f"{name}: done in an earlier run")
+                results[name] = self._result(name)
+                if on_complete:
+                    on_complete(results[name])
+            elif record.get("status") == "queued" and record.get("prompt_id"):
+                client = self.pool.client(record.get("endpoint"), record.get("client_id"))
+                if self._still_on_server(client, record["prompt_id"]):
+                    resumed.append((job, client, record["prompt_id"]))
+                else:
+                    pending.append(job)
+            else:
+                pending.append(job)
+
+        preparing = {}    # future -> job
+        prepared = deque()  # (job, workflow), in add() order
+        submitting = {}   # future -> (job, client)
+        rendering = {}    # future -> (job, client, started)
+        downloading = {}  # future -> (job, elapsed_s)
+
+        def ours(states) -> dict:
+            counts = {}
+            for entry in states.values():
+                counts[entry[1].endpoint] = counts.get(entry[1].endpoint, 0) + 1
+            return counts
+
+        depth = {node["endpoint"]: node.get("queue_depth", self.queue_depth) for node in self.pool.nodes}
+
+        prepare_pool = ThreadPoolExecutor(self.prepare_ahead, thread_name_prefix="comfyui-prepare")
+        render_pool = ThreadPoolExecutor(sum(depth.values()) + len(resumed),
+                                         thread_name_prefix="comfyui-render")
+        download_pool = ThreadPoolExecutor(DEFAULT_DOWNLOAD_WORKERS,
+                                           thread_name_prefix="comfyui-download")
+        try:
+            for job, client, prompt_id in resumed:
+                self._log(f"{job['name']}: resuming queued prompt {prompt_id}")
+                future = render_pool.submit(self._render, job, client, prompt_id)
+                rendering[future] = (job, client, time.monotonic())
+
+            while pending or preparing or prepared or submitting or rendering or downloading:
+                # Prepare ahead of the GPU
+                while pending and len(preparing) + len(prepared) < self.prepare_ahead:
+                    job = pending.popleft()
+                    self._record(job["name"], status="preparing", error=None)
+                    preparing[prepare_pool.submit(job["prepare"])] = job
+
+                # Keep each node's queue fed, least-loaded capable node first; a job
+                # whose nodes are full does not hold back one that can go elsewhere
+                blocked = False
+                held = deque()
+                while prepared:
+                    job, workflow = prepared.popleft()
+                    in_flight = ours(submitting)
+                    for endpoint, count in ours(rendering).items():
+                        in_flight[endpoint] = in_flight.get(endpoint, 0) + count
+                    full = {endpoint for endpoint, count in in_flight.items()
+                            if count >= depth.get(endpoint, self.queue_depth)}
+                    try:
+                        node = self.pool.select(workflow, job["workflow_name"], self.queue_depth,
+                                                reserved=ours(submitting), exclude=full)
+                    except ComfyUIError as e:
+                        if full:  # Only our own jobs are in the way
+                            held.append((job, workflow))
+                        else:
+                            finish(job["name"], status="failed", error=str(e))
+                        continue
+                    if node is None:
+                        blocked = True
+                        held.append((job, workflow))
+                        continue
+                    client = self.pool.client(node["endpoint"])
+                    self._log(f"{job['name']}: sending to {node['name']} ({node['load']} queued)")
+                    submitting[render_pool.submit(self._submit, job, client, workflow)] = (job, client)
+                prepared = held
+
+                futures = list(preparing) + list(submitting) + list(rendering) + list(downloading)
+                if not futures:
+                    if blocked:
+                        time.sleep(QUEUE_RECHECK)
+                    continue
+                done, _ = wait(futures, timeout=QUEUE_RECHECK if blocked else None,
+                               return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    if future in preparing:
+                        job = preparing.pop(future)
+                        try:
+                            workflow = future.result()
+                        except Exception as e:
+                            finish(job["name"], status="failed", error=f"prepare failed: {e}")
+                            continue
+                        if not workflow:
+                            finish(job["name"], status="failed", error="prepare returned no workflow")
+                            continue
+                        prepared.append((job, workflow))
+                    elif future in submitting:
+                        job, client = submitting.pop(future)
+                        try:
+                            prompt_id = future.result()
+                        except (ComfyUIError, OSError) as e:
+                            finish(job["name"], status="failed", error=str(e))
+                            continue
+                        self._record(job["name"], status="queued", prompt_id=prompt_id,
+                                     client_id=client.client_id, endpoint=client.endpoint)
+                        self._log(f"{job['name']}: queued {prompt_id} on {client.endpoint}")
+                        future = render_pool.submit(self._render, job, client, prompt_id)
+                        rendering[future] = (job, client, time.monotonic())
+                    elif future in rendering:
+                        job, client, started = rendering.pop(future)
+                        elapsed_s = round(time.monotonic() - started, 1)
+                        try:
+                            entry = future.result()
+                        except ComfyUIError as e:
+                            finish(job["name"], status="failed", error=str(e), elapsed_s=elapsed_s)
+                            continue
+                        self._record(job["name"], status="downloading", elapsed_s=elapsed_s)
+                        downloading[download_pool.submit(self._download, job, client, entry)] = (job, elapsed_s)
+                    else:
+                        job, elapsed_s = downloading.pop(future)
+                        try:
+                            outputs = future.result()
+                        except (ComfyUIError, OSError) as e:
+                            finish(job["name"], status="failed", error=f"download failed: {e}")
+                            continue
+                        finish(job["name"], status="done", outputs=outputs, error=None)
+        finally:
+            prepare_pool.shutdown(wait=False, cancel_futures=True)
+            render_pool.shutdown(wait=False, cancel_futures=True)
+            download_pool.shutdown(wait=False, cancel_futures=True)
+        return results
+
+    def clear(self) -> None:
+        """Forget finished and failed jobs (queued ones are kept for resume)."""
+        self.state["jobs"] = {name: record for name, record in self.state["jobs"].items()
+                              if record.get("status") not in ("done", "failed")}
+        self._save_state()
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Automation Machine ComfyUI Scheduler")
+    parser.add_argument("--state", default=str(STATE_PATH), help="State file")
+    parser.add_argument("--status", action="store_true", help="Show scheduled jobs")
+    parser.add_argument("--clear", action="store_true", help="Forget finished and failed jobs")
+    args = parser.parse_args()
+
+    scheduler = ComfyUIScheduler(state_path=Path(args.state))
+    if args.clear:
+        scheduler.clear()
+    jobs = scheduler.state.get("jobs", {})
+    if not jobs:
+        print("No scheduled jobs.")
+        return
+    for name, record in jobs.items():
+        render = f"  {record['elapsed_s']}s" if record.get("elapsed_s") else ""
+        error = f"  {record['error']}" if record.get("error") else ""
+        print(f"  {name:40} {record.get('status', '?'):12} {record.get('prompt_id') or '':36}{render}{error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Context Budget for Automation Machine
+Builds the knowledge-base context appended to a query (enhanced_query)
+within a token budget: hits are ordered by score, lines already included
+from a better hit are dropped (overlapping chunks, the same paragraph in
+two files), and snippets are added until the budget is spent, the last
+one cut on a line boundary.
+
+Token counts are a local estimate (word pieces, digit groups and symbols),
+close enough to BPE tokenizers for budgeting without loading one.
+
+Usage:
+    python context_budget.py "model routing" --budget 256   # Show assembled context
+"""
+
+import argparse
+import re
+
+HEADER = "\n\nRelevant context from knowledge base:\n"
+
+# A trailing snippet smaller than this is not worth its file/line header
+MIN_SNIPPET_TOKENS = 16
+
+# Lines shorter than this (fences, rules, bullets) are never deduplicated
+MIN_DEDUP_CHARS = 12
+
+# Letters (long words split every 8 chars), digit groups of 3, single symbols
+_PIECE_RE = re.compile(r"[^\W\d_]+|\d+|[^\w\s]|_")
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate BPE token count of `text`."""
+    tokens = 0
+    for piece in _PIECE_RE.findall(text):
+        if piece.isalpha():
+            tokens += (len(piece) + 7) // 8 if piece.isascii() else len(piece)
+        elif piece.isdigit():
+            tokens += (len(piece) + 2) // 3
+        else:
+            tokens += 1
+    return tokens
+
+
+# Smallest budget that can hold the header and one minimal snippet (with its label)
+MIN_BUDGET = estimate_tokens(HEADER) + estimate_tokens("- a.md (lines 0-0):") + MIN_SNIPPET_TOKENS
+
+
+def _normalize(line: str) -> str:
+    return " ".join(line.lower().split())
+
+
+def _line_numbers(hit: dict, count: int) -> list[int]:
+    """File line number of each snippet line: the hit's line_nos, else counted from line_start."""
+    line_nos = hit.get("line_nos")
+    if line_nos and len(line_nos) == count:
+        return list(line_nos)
+    return list(range(hit["line_start"], hit["line_start"] + count))
+
+
+def _block(hit: dict, lines: list[tuple[int, str]]) -> str:
+    """Snippet block headed by its file and the line range of `lines` (the hit's if empty)."""
+    first, last = (lines[0][0], lines[-1][0]) if lines else (hit["line_start"], hit["line_end"])
+    return f"- {hit['file']} (lines {first}-{last}):\n" + "".join(f"{line}\n" for _, line in lines)
+
+
+def _dedupe_numbered(hits: list[dict]) -> list[tuple[dict, list[tuple[int, str]]]]:
+    """dedupe() with each kept line as (file line number, text)."""
+    seen: set[str] = set()
+    kept = []
+    for hit in sorted(hits, key=lambda h: h.get("score", 0.0), reverse=True):
+        snippet = hit["snippet"].split("\n")
+        lines = []
+        novel = duplicate = False
+        for line_no, line in zip(_line_numbers(hit, len(snippet)), snippet):
+            key = _normalize(line)
+            if len(key) >= MIN_DEDUP_CHARS:
+                if key in seen:
+                    duplicate = True
+                    continue
+                seen.add(key)
+                novel = True
+            elif not key:
+                continue
+            lines.append((line_no, line))
+        # Only short lines left next to repeated ones: nothing worth adding
+        if lines and (novel or not duplicate):
+            kept.append((hit, lines))
+    return kept
+
+
+def dedupe(hits: list[dict]) -> list[tuple[dict, list[str]]]:
+    """
+    (hit, new snippet lines) by descending score, without lines an earlier
+    hit already contributed; hits with nothing new are dropped.
+    """
+    return [(hit, [line for _, line in lines]) for hit, lines in _dedupe_numbered(hits)]
+
+
+def assemble(hits: list[dict], budget: int, min_score_ratio: float = 0.0) -> tuple[str, int]:
+    """
+    KB context for `hits` ([{"file", "score", "snippet", "line_start",
+    "line_end"}, optionally "line_nos" per snippet line]) within `budget`
+    tokens: (text, estimated tokens), or ("", 0) when nothing fits. Each
+    block is labelled with the range of the lines it holds. Hits scoring
+    below min_score_ratio of the best hit are left out.
+    """
+    if budget < MIN_BUDGET or not hits:
+        return "", 0
+    best = max(h.get("score", 0.0) for h in hits)
+    hits = [h for h in hits if h.get("score", 0.0) >= best * min_score_ratio]
+
+    used = estimate_tokens(HEADER)
+    blocks = []
+    for hit, lines in _dedupe_numbered(hits):
+        block = _block(hit, lines)
+        cost = estimate_tokens(block)
+        if used + cost <= budget:
+            blocks.append(block)
+            used += cost
+            continue
+
+        # Partial snippet: as many leading lines as fit
+        header = _block(hit, [(lines[0][0], ""), (lines[-1][0], "")])  # Widest range it could show
+        remaining = budget - used - estimate_tokens(header)
+        if remaining >= MIN_SNIPPET_TOKENS:
+            taken = []
+            for line_no, line in lines:
+                line_cost = estimate_tokens(line) + 1
+                if line_cost > remaining:
+                    break
+                taken.append((line_no, line))
+                remaining -= line_cost
+            if taken:
+                block = _block(hit, taken)
+                blocks.append(block)
+                used += estimate_tokens(block)
+        break
+
+    if not blocks:
+        return "", 0
+    return HEADER + "".join(blocks), used
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def main():
+    import kb_index
+
+    parser = argparse.ArgumentParser(description="Automation Machine Context Budget")
+    parser.add_argument("query", help="Query to retrieve context for")
+    parser.add_argument("--budget", type=int, default=256, help="Token budget")
+    parser.add_argument("--limit", type=int, default=5, help="KB hits to consider")
+    args = parser.parse_args()
+
+    text, tokens = assemble(kb_index.search(args.query, limit=args.limit), args.budget)
+    print(text.strip() or "(no context fits)")
+    print(f"\n~{tokens} tokens of {args.budget}")
+
+
+if __name__ == "__main__":
+    main()
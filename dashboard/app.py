@@ -9,6 +9,7 @@ Run:  streamlit run dashboard/app.py
 import json
 import re
 import shutil
+import sys
 import urllib.request
 from datetime import datetime
 from pathlib import Path
@@ -25,6 +26,7 @@ import yaml
 BASE_PATH = Path(__file__).parent.parent
 REGISTRY_PATH = BASE_PATH / "projects" / "registry.json"
 USAGE_LOG_PATH = BASE_PATH / "usage_log.json"
+USAGE_DB_PATH = BASE_PATH / "usage.db"
 VIDEO_STATE_PATH = BASE_PATH / "video-production" / "state" / "generation_progress.json"
 CONFIG_PATH = BASE_PATH / "config.yaml"
 COMFYUI_URL = "http://100.64.130.71:8188"
@@ -105,6 +107,16 @@ def load_json(path: Path) -> dict | None:
         return None
 
 
+def load_usage_store():
+    """Open the usage event store, return None on any failure."""
+    try:
+        sys.path.insert(0, str(BASE_PATH))
+        from usage_store import get_store
+        return get_store(USAGE_DB_PATH, USAGE_LOG_PATH)
+    except Exception:
+        return None
+
+
 def load_yaml(path: Path) -> dict | None:
     """Load a YAML file, return None on any failure."""
     try:
@@ -114,7 +126,7 @@ def load_yaml(path: Path) -> dict | None:
 
 
 registry = load_json(REGISTRY_PATH)
-usage_log = load_json(USAGE_LOG_PATH)
+usage_store = load_usage_store()
 video_state = load_json(VIDEO_STATE_PATH)
 config = load_yaml(CONFIG_PATH)
 
@@ -408,8 +420,12 @@ st.divider()
 
 st.header("Cost Tracker")
 
-if usage_log and usage_log.get("summary"):
-    summary = usage_log["summary"]
+if usage_store is not None:
+    import usage_analytics
+
+    totals = usage_analytics.totals(usage_store)
+    daily_data = usage_analytics.spend_by_day(usage_store)
+    by_tool = usage_analytics.spend_by_tool(usage_store)
     monthly_budget = 50.00
     daily_budget = 5.00
 
@@ -417,24 +433,15 @@ if usage_log and usage_log.get("summary"):
         monthly_budget = config["cost_tracking"].get("monthly_budget", 50.00)
         daily_budget = config["cost_tracking"].get("daily_budget", 5.00)
 
-    # Determine current month key (e.g., "2026-02")
-    current_month_key = datetime.now().strftime("%Y-%m")
-    monthly_data = summary.get("monthly", {})
-    current_month = monthly_data.get(current_month_key, {"queries": 0, "cost_usd": 0.0})
-    month_spend = current_month.get("cost_usd", 0.0)
-
-    # Today's date key
-    today_key = datetime.now().strftime("%Y-%m-%d")
-    daily_data = summary.get("daily", {})
-    today_data = daily_data.get(today_key, {"queries": 0, "cost_usd": 0.0})
-    today_spend = today_data.get("cost_usd", 0.0)
+    month_spend = usage_analytics.spend_this_month(usage_store)
+    today_spend = usage_analytics.spend_today(usage_store)
 
     # KPI row
     kpi1, kpi2, kpi3, kpi4 = st.columns(4)
     with kpi1:
-        st.metric("Total Queries", summary.get("total_queries", 0))
+        st.metric("Total Queries", totals["queries"])
     with kpi2:
-        st.metric("Total Spend", f"${summary.get('total_cost_usd', 0.0):.4f}")
+        st.metric("Total Spend", f"${totals['cost_usd']:.4f}")
     with kpi3:
         st.metric("Month Spend", f"${month_spend:.4f}")
     with kpi4:
@@ -525,7 +532,6 @@ if usage_log and usage_log.get("summary"):
 
     with chart_left2:
         st.subheader("Queries by Tool")
-        by_tool = summary.get("by_tool", {})
         if by_tool:
             tool_names = []
             tool_queries = []
@@ -554,7 +560,6 @@ if usage_log and usage_log.get("summary"):
 
     with chart_right2:
         st.subheader("Cost by Tool")
-        by_tool = summary.get("by_tool", {})
         if by_tool:
             tool_names_cost = []
             tool_costs = []
@@ -678,7 +683,7 @@ if usage_log and usage_log.get("summary"):
         else:
             st.info("Not enough data to forecast. Spend some first!")
 else:
-    st.warning("Usage log not available. Check usage_log.json.")
+    st.warning("Usage store not available. Check usage.db.")
 
 st.divider()
 
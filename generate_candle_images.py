@@ -4,10 +4,12 @@ Candle Co. Image Generation Script
 Generates branded images from the content calendar using ComfyUI.
 """
 
+import hashlib
 import json
 import sys
 from pathlib import Path
 from automation_brain import AutomationBrain
+from comfyui_scheduler import ComfyUIScheduler
 
 CONTENT_CALENDAR = Path("C:/automation-machine/demo-clients/candle-co/content-calendar.json")
 OUTPUT_DIR = Path("C:/automation-machine/demo-clients/candle-co/images")
@@ -47,32 +49,64 @@ def generate_images(start_day: int = 1, end_day: int = 5, verbose: bool = True):
     generated = []
     errors = []
 
-    for i, day in enumerate(calendar[start_day-1:end_day], start=start_day):
+    days = list(enumerate(calendar[start_day-1:end_day], start=start_day))
+
+    # Each day's prompt is written and queued while the previous image renders,
+    # on whichever ComfyUI node is least loaded. Job names carry a hash of the
+    # calendar prompt, so an edited day is rendered again instead of skipped
+    # as done in an earlier run.
+    scheduler = ComfyUIScheduler.from_config(verbose=verbose)
+    jobs = {}
+    prompt_responses = {}  # Job name -> local LLM prompt response, for jobs prepared this run
+
+    def prepare(name: str, image_prompt: str):
+        workflow, prompt_responses[name] = brain.build_comfyui_image_workflow(image_prompt)
+        return workflow
+
+    for i, day in days:
+        digest = hashlib.sha1(day["image_prompt"].encode("utf-8")).hexdigest()[:8]
+        name = jobs[i] = f"candle_day{i:02d}_{digest}"
+        scheduler.add(name, lambda name=name, day=day: prepare(name, day["image_prompt"]),
+                      OUTPUT_DIR, kinds=("images",), prefix=f"day{i:02d}_",
+                      workflow_name="sdxl_basic")
+    results = scheduler.run()
+
+    for i, day in days:
+        name = jobs[i]
+        result = results[name]
         print(f"\n--- Day {i}: {day['post_type'].upper()} ---")
         print(f"Date: {day['date']}")
         print(f"Prompt: {day['image_prompt'][:80]}...")
 
-        try:
-            # Generate image using ComfyUI via automation_brain
-            result = brain.process(
-                f"generate image of {day['image_prompt']}",
-                force_tool="comfyui"
-            )
-
-            print(f"Result: {result[:200]}...")
+        if result["status"] != "done":
+            print(f"ERROR: {result['error']}")
+            errors.append({
+                "day": i,
+                "date": day["date"],
+                "error": result["error"]
+            })
+        else:
+            print(f"Saved: {', '.join(result['outputs'])}")
             generated.append({
                 "day": i,
                 "date": day["date"],
                 "post_type": day["post_type"],
-                "status": "success"
+                "status": "success",
+                "output_files": result["outputs"]
             })
 
-        except Exception as e:
-            print(f"ERROR: {e}")
-            errors.append({
-                "day": i,
-                "date": day["date"],
-                "error": str(e)
+        # Log usage and conversation as brain.process() would (not for days done earlier)
+        prompt_response = prompt_responses.get(name)
+        if prompt_response is not None:
+            brain.record_delegation(f"generate image of {day['image_prompt']}", {
+                "response": (f"Saved: {', '.join(result['outputs'])}" if result["status"] == "done"
+                             else f"ERROR: {result['error']}"),
+                "tokens_in": prompt_response["tokens_in"],
+                "tokens_out": prompt_response["tokens_out"],
+                "cost": 0.0,
+                "tool": "comfyui",
+                "model": "sdxl_base_1.0",
+                "latency_ms": round(result["elapsed_s"] * 1000) if result["elapsed_s"] else None,
             })
 
     # Summary
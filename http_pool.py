@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Shared HTTP Client for Automation Machine
+One keep-alive requests.Session per process, with per-host connection
+pools, so delegates and ComfyUI polls reuse TCP (and TLS) connections
+instead of opening a new one per call.
+"""
+
+import threading
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Distinct hosts whose pools are kept (Ollama, Anthropic, Perplexity, ComfyUI, ...)
+DEFAULT_POOL_CONNECTIONS = 8
+
+# Idle connections kept per host; should cover the largest per-tool concurrency
+DEFAULT_POOL_MAXSIZE = 16
+
+# Retries for failed connection attempts only (the request was never sent)
+DEFAULT_CONNECT_RETRIES = 2
+
+_session: Optional[requests.Session] = None
+_lock = threading.Lock()
+
+
+def create_session(pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+                   pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+                   connect_retries: int = DEFAULT_CONNECT_RETRIES) -> requests.Session:
+    """Build a Session whose adapters pool connections per host."""
+    retry = Retry(total=connect_retries, connect=connect_retries, read=0, status=0,
+                  backoff_factor=0.3, raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                          max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session(**pool_options) -> requests.Session:
+    """
+    Return the process-wide Session, creating it on first use.
+    pool_options (config.yaml `http` section) only apply to that first call.
+    """
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = create_session(**pool_options)
+    return _session
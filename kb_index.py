@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+"""
+Knowledge Base Index for Automation Machine
+Persistent inverted index (term -> postings with file and line offsets) over
+knowledge-base/**/*.md, stored in SQLite and updated incrementally from file
+mtimes and sizes so queries never rescan the tree. Results are ranked with
+BM25 using document-length statistics kept alongside the postings.
+
+Usage:
+    python kb_index.py --rebuild          # Drop and rebuild the whole index
+    python kb_index.py --refresh          # Re-index changed files only
+    python kb_index.py "model routing"    # Query the index
+"""
+
+import argparse
+import math
+import re
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+# Paths
+BASE_DIR = Path(__file__).resolve().parent
+KNOWLEDGE_BASE_PATH = BASE_DIR / "knowledge-base"
+KB_INDEX_PATH = BASE_DIR / "kb_index.db"
+
+# Minimum seconds between stat walks of the knowledge base
+REFRESH_INTERVAL = 30
+
+# Bump when tokenization or table layout changes; forces a rebuild
+SCHEMA_VERSION = "2"
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Non-blank lines of context either side of the best-matching line
+SNIPPET_WINDOW = 1
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been
+before being below between both but by can could did do does doing down during
+each few for from further had has have having he her here hers herself him
+himself his how i if in into is it its itself just me more most my myself no
+nor not now of off on once only or other our ours ourselves out over own same
+she should so some such than that the their theirs them themselves then there
+these they this those through to too under until up very was we were what when
+where which while who whom why will with would you your yours yourself
+yourselves
+""".split())
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS docs (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lines (
+    doc_id INTEGER NOT NULL,
+    line_no INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (doc_id, line_no)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    doc_id INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    line_nos TEXT NOT NULL,
+    PRIMARY KEY (term, doc_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc_id);
+CREATE TABLE IF NOT EXISTS terms (
+    term TEXT PRIMARY KEY,
+    df INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase, split into alphanumeric terms and drop stopwords."""
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+class KnowledgeIndex:
+    """
+    SQLite-backed inverted index over the markdown knowledge base.
+    Each posting records the term frequency and the line numbers it occurs on;
+    line text is stored alongside so snippets never touch the source files.
+    One connection is shared by the brain's request threads, so every use of
+    it goes through a lock.
+    """
+
+    def __init__(self, kb_path: Path = KNOWLEDGE_BASE_PATH,
+                 index_path: Path = KB_INDEX_PATH,
+                 refresh_interval: float = REFRESH_INTERVAL):
+        self.kb_path = Path(kb_path)
+        self.index_path = Path(index_path)
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(str(self.index_path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        if self._get_meta("schema_version") != SCHEMA_VERSION:
+            self.rebuild()
+        self._load_stats()
+
+    def close(self) -> None:
+        """Close the underlying SQLite connection."""
+        with self._lock:
+            self.conn.close()
+
+    # =========================================================================
+    # INDEXING
+    # =========================================================================
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value)
+        )
+
+    def _load_stats(self) -> None:
+        """Cache corpus statistics used by BM25."""
+        self.doc_count = int(self._get_meta("doc_count") or 0)
+        total_length = int(self._get_meta("total_length") or 0)
+        self.avg_doc_length = total_length / self.doc_count if self.doc_count else 0.0
+
+    def _store_stats(self) -> None:
+        """Recompute corpus statistics after documents changed."""
+        doc_count, total_length = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs"
+        ).fetchone()
+        self._set_meta("doc_count", str(doc_count))
+        self._set_meta("total_length", str(total_length))
+
+    def refresh(self, force: bool = False) -> dict:
+        """
+        Re-index files whose mtime or size changed, add new files and drop
+        deleted ones. Skipped if the last walk was under refresh_interval ago.
+        Returns counts: {"added", "updated", "removed"}.
+        """
+        stats = {"added": 0, "updated": 0, "removed": 0}
+        now = time.time()
+        with self._lock:
+            last = self._get_meta("last_refresh")
+            if not force and last and now - float(last) < self.refresh_interval:
+                return stats
+            self._refresh(stats, now, force)
+            self._load_stats()
+        return stats
+
+    def _refresh(self, stats: dict, now: float, force: bool) -> None:
+        # The write lock is taken before reading what is indexed, so two
+        # processes refreshing at once do not both insert the same new file
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            last = self._get_meta("last_refresh")
+            if not force and last and now - float(last) < self.refresh_interval:
+                return  # Another process just refreshed
+            known = {
+                path: (doc_id, mtime_ns, size)
+                for doc_id, path, mtime_ns, size in self.conn.execute(
+                    "SELECT id, path, mtime_ns, size FROM docs"
+                )
+            }
+            seen = set()
+
+            if self.kb_path.exists():
+                for md_file in self.kb_path.rglob("*.md"):
+                    try:
+                        st = md_file.stat()
+                    except OSError:
+                        continue
+                    rel = md_file.relative_to(self.kb_path).as_posix()
+                    seen.add(rel)
+                    entry = known.get(rel)
+                    if entry and entry[1] == st.st_mtime_ns and entry[2] == st.st_size:
+                        continue
+                    if self._index_file(md_file, rel, st, entry[0] if entry else None):
+                        stats["updated" if entry else "added"] += 1
+
+            for rel, (doc_id, _, _) in known.items():
+                if rel not in seen:
+                    self._remove_doc(doc_id)
+                    stats["removed"] += 1
+
+            if any(stats.values()):
+                self._store_stats()
+            self._set_meta("last_refresh", str(now))
+
+    def index_file(self, md_file: Path) -> bool:
+        """Index (or re-index) a single file, e.g. right after it is written."""
+        md_file = Path(md_file)
+        try:
+            st = md_file.stat()
+            rel = md_file.relative_to(self.kb_path).as_posix()
+        except (OSError, ValueError):
+            return False
+        with self._lock:
+            with self.conn:
+                self.conn.execute("BEGIN IMMEDIATE")
+                row = self.conn.execute("SELECT id FROM docs WHERE path = ?", (rel,)).fetchone()
+                indexed = self._index_file(md_file, rel, st, row[0] if row else None)
+                if indexed:
+                    self._store_stats()
+            self._load_stats()
+        return indexed
+
+    def rebuild(self) -> dict:
+        """Drop every document and index the knowledge base from scratch."""
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM postings")
+            self.conn.execute("DELETE FROM terms")
+            self.conn.execute("DELETE FROM lines")
+            self.conn.execute("DELETE FROM docs")
+            self._set_meta("schema_version", SCHEMA_VERSION)
+            self._store_stats()
+        return self.refresh(force=True)
+
+    def _drop_postings(self, doc_id: int) -> None:
+        """Remove a document's postings and line text, keeping df counts in step."""
+        self.conn.execute(
+            "UPDATE terms SET df = df - 1 WHERE term IN "
+            "(SELECT term FROM postings WHERE doc_id = ?)", (doc_id,)
+        )
+        self.conn.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+        self.conn.execute("DELETE FROM lines WHERE doc_id = ?", (doc_id,))
+
+    def _remove_doc(self, doc_id: int) -> None:
+        self._drop_postings(doc_id)
+        self.conn.execute("DELETE FROM docs WHERE id = ?", (doc_id,))
+
+    def _index_file(self, md_file: Path, rel: str, st, doc_id: Optional[int]) -> bool:
+        """Tokenize one file and replace its postings. Caller owns the transaction."""
+        try:
+            content = md_file.read_text(encoding="utf-8")
+        except (OSError, UnicodeDecodeError):
+            return False
+
+        if doc_id is not None:
+            self._drop_postings(doc_id)
+
+        term_lines: dict[str, list[int]] = {}
+        term_freq: dict[str, int] = {}
+        line_rows = []
+        length = 0
+
+        for line_no, line in enumerate(content.split("\n")):
+            stripped = line.strip()
+            if not stripped:
+                continue
+            line_rows.append((line_no, stripped))
+            for term in tokenize(stripped):
+                length += 1
+                term_freq[term] = term_freq.get(term, 0) + 1
+                line_list = term_lines.setdefault(term, [])
+                if not line_list or line_list[-1] != line_no:
+                    line_list.append(line_no)
+
+        if doc_id is None:
+            cur = self.conn.execute(
+                "INSERT INTO docs (path, mtime_ns, size, length) VALUES (?, ?, ?, ?)",
+                (rel, st.st_mtime_ns, st.st_size, length)
+            )
+            doc_id = cur.lastrowid
+        else:
+            self.conn.execute(
+                "UPDATE docs SET mtime_ns = ?, size = ?, length = ? WHERE id = ?",
+                (st.st_mtime_ns, st.st_size, length, doc_id)
+            )
+
+        self.conn.executemany(
+            "INSERT INTO lines (doc_id, line_no, text) VALUES (?, ?, ?)",
+            [(doc_id, line_no, text) for line_no, text in line_rows]
+        )
+        self.conn.executemany(
+            "INSERT INTO postings (term, doc_id, tf, line_nos) VALUES (?, ?, ?, ?)",
+            [
+                (term, doc_id, term_freq[term], ",".join(map(str, line_nos)))
+                for term, line_nos in term_lines.items()
+            ]
+        )
+        self.conn.executemany(
+            "INSERT INTO terms (term, df) VALUES (?, 1) "
+            "ON CONFLICT (term) DO UPDATE SET df = df + 1",
+            [(term,) for term in term_lines]
+        )
+        return True
+
+    # =========================================================================
+    # QUERYING
+    # =========================================================================
+
+    def search(self, query: str, limit: int = 5, window: int = SNIPPET_WINDOW) -> list[dict]:
+        """
+        Rank files by BM25 over the query terms.
+        Returns [{"file", "score", "matches", "snippet", "line_start", "line_end",
+        "line_nos"}]; the snippet is `window` stored lines either side of the
+        best-matching line, line_nos the file line number of each.
+        """
+        with self._lock:
+            return self._search(query, limit, window)
+
+    def _search(self, query: str, limit: int, window: int) -> list[dict]:
+        self.refresh()
+
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self.doc_count:
+            return []
+
+        # term -> idf, and doc -> [(term, tf, line_nos)]
+        idf: dict[str, float] = {}
+        doc_hits: dict[int, list[tuple[str, int, str]]] = {}
+        for term in terms:
+            row = self.conn.execute("SELECT df FROM terms WHERE term = ?", (term,)).fetchone()
+            if not row or row[0] <= 0:
+                continue
+            df = row[0]
+            idf[term] = math.log(1 + (self.doc_count - df + 0.5) / (df + 0.5))
+            for doc_id, tf, line_nos in self.conn.execute(
+                "SELECT doc_id, tf, line_nos FROM postings WHERE term = ?", (term,)
+            ):
+                doc_hits.setdefault(doc_id, []).append((term, tf, line_nos))
+
+        if not doc_hits:
+            return []
+
+        placeholders = ",".join("?" * len(doc_hits))
+        doc_info = {
+            doc_id: (path, length)
+            for doc_id, path, length in self.conn.execute(
+                f"SELECT id, path, length FROM docs WHERE id IN ({placeholders})",
+                tuple(doc_hits)
+            )
+        }
+
+        avgdl = self.avg_doc_length or 1.0
+        scored = []
+        for doc_id, hits in doc_hits.items():
+            length = doc_info[doc_id][1]
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avgdl)
+            score = sum(
+                idf[term] * tf * (BM25_K1 + 1) / (tf + norm)
+                for term, tf, _ in hits
+            )
+            scored.append((score, doc_id))
+
+        scored.sort(reverse=True)
+
+        results = []
+        for score, doc_id in scored[:limit]:
+            hits = doc_hits[doc_id]
+
+            # Best line = the one carrying the most query-term weight
+            line_weight: dict[int, float] = {}
+            for term, _, line_nos in hits:
+                for n in line_nos.split(","):
+                    line_no = int(n)
+                    line_weight[line_no] = line_weight.get(line_no, 0.0) + idf[term]
+            best_line = min(line_weight, key=lambda n: (-line_weight[n], n))
+
+            # Neighbouring stored (non-blank) lines either side of the best one
+            before = self.conn.execute(
+                "SELECT line_no, text FROM lines WHERE doc_id = ? AND line_no < ? "
+                "ORDER BY line_no DESC LIMIT ?",
+                (doc_id, best_line, window)
+            ).fetchall()
+            after = self.conn.execute(
+                "SELECT line_no, text FROM lines WHERE doc_id = ? AND line_no >= ? "
+                "ORDER BY line_no LIMIT ?",
+                (doc_id, best_line, window + 1)
+            ).fetchall()
+            snippet = before[::-1] + after
+
+            results.append({
+                "file": str(Path(doc_info[doc_id][0])),
+                "score": round(score, 4),
+                "matches": len(hits),
+                "snippet": "\n".join(text for _, text in snippet),
+                "line_start": snippet[0][0],
+                "line_end": snippet[-1][0],
+                "line_nos": [line_no for line_no, _ in snippet],
+            })
+
+        return results
+
+
+# =============================================================================
+# SHARED INSTANCES
+# =============================================================================
+
+_indexes: dict[tuple[str, str], KnowledgeIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(kb_path: Path = KNOWLEDGE_BASE_PATH,
+              index_path: Path = KB_INDEX_PATH) -> KnowledgeIndex:
+    """Return a process-wide KnowledgeIndex for the given paths."""
+    key = (str(kb_path), str(index_path))
+    with _indexes_lock:  # Concurrent first calls must not open two indexes on one store
+        if key not in _indexes:
+            _indexes[key] = KnowledgeIndex(kb_path, index_path)
+        return _indexes[key]
+
+
+def search(query: str, kb_path: Path = KNOWLEDGE_BASE_PATH,
+           index_path: Path = KB_INDEX_PATH, limit: int = 5,
+           window: int = SNIPPET_WINDOW) -> list[dict]:
+    """Query the shared index for kb_path."""
+    return get_index(kb_path, index_path).search(query, limit=limit, window=window)
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Knowledge Base Index")
+    parser.add_argument("query", nargs="*", help="Query to run against the index")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the index from scratch")
+    parser.add_argument("--refresh", action="store_true", help="Re-index changed files")
+    args = parser.parse_args()
+
+    index = get_index()
+
+    if args.rebuild:
+        start = time.perf_counter()
+        stats = index.rebuild()
+        print(f"Rebuilt index: {stats['added']} files in {time.perf_counter() - start:.2f}s")
+        return
+
+    if args.refresh:
+        stats = index.refresh(force=True)
+        print(f"Refreshed index: {stats['added']} added, "
+              f"{stats['updated']} updated, {stats['removed']} removed")
+        return
+
+    if not args.query:
+        parser.print_help()
+        sys.exit(1)
+
+    start = time.perf_counter()
+    results = index.search(" ".join(args.query))
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    for r in results:
+        print(f"\n{r['file']} (score {r['score']:.2f}, lines {r['line_start']}-{r['line_end']})")
+        for line in r["snippet"].split("\n"):
+            print(f"  {line}")
+    print(f"\n[{len(results)} results in {elapsed_ms:.2f}ms]")
+
+
+if __name__ == "__main__":
+    main()
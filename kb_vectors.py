@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+Semantic Knowledge Base Retrieval for Automation Machine
+Chunks knowledge-base/**/*.md, embeds chunks through the local Ollama
+embeddings endpoint and keeps the vectors in a memory-mapped NumPy matrix,
+so a top-k cosine search is a single matrix-vector product.
+
+Only chunks whose content hash changed are re-embedded on refresh.
+Searches never embed the knowledge base themselves: a due refresh runs on
+a background thread, and until the first build finishes search() raises
+IndexNotReady (build ahead of time with --refresh).
+
+Usage:
+    python kb_vectors.py --refresh            # Embed new/changed chunks
+    python kb_vectors.py "how do I render video"
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+import requests
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Paths
+BASE_DIR = Path(__file__).resolve().parent
+KNOWLEDGE_BASE_PATH = BASE_DIR / "knowledge-base"
+KB_VECTORS_DIR = BASE_DIR / "kb_vectors"
+
+# Defaults (overridable via config.yaml knowledge_base section)
+DEFAULT_EMBEDDING_MODEL = "nomic-embed-text"
+DEFAULT_EMBEDDING_ENDPOINT = "http://localhost:11434"
+CHUNK_MAX_LINES = 40
+CHUNK_MAX_CHARS = 1200
+EMBED_BATCH_SIZE = 32
+
+# Minimum seconds between stat walks of the knowledge base
+REFRESH_INTERVAL = 30
+
+HEADING_RE = re.compile(r"^#{1,6}\s")
+
+
+class IndexNotReady(Exception):
+    """The vector index has not been built yet (a background build is running)."""
+
+
+def embed_texts(texts: list[str], model: str = DEFAULT_EMBEDDING_MODEL,
+                endpoint: str = DEFAULT_EMBEDDING_ENDPOINT, timeout: int = 120,
+                session=None) -> list[list[float]]:
+    """
+    Embed texts with Ollama's /api/embed endpoint, batching requests.
+    Raises ConnectionError if Ollama is unreachable.
+    """
+    http = session or requests
+    vectors = []
+    for i in range(0, len(texts), EMBED_BATCH_SIZE):
+        batch = texts[i:i + EMBED_BATCH_SIZE]
+        try:
+            response = http.post(
+                f"{endpoint}/api/embed",
+                json={"model": model, "input": batch},
+                timeout=timeout
+            )
+            response.raise_for_status()
+            vectors.extend(response.json()["embeddings"])
+        except requests.exceptions.RequestException as e:
+            raise ConnectionError(f"Ollama embeddings failed: {e}")
+    return vectors
+
+
+def chunk_markdown(content: str, max_lines: int = CHUNK_MAX_LINES,
+                   max_chars: int = CHUNK_MAX_CHARS) -> list[dict]:
+    """
+    Split markdown into chunks at headings, capped by line count and size.
+    Returns [{"line_start", "line_end", "line_nos", "text"}] using 0-based
+    line numbers (line_nos: one per line of text; blank lines are dropped).
+    """
+    chunks = []
+    current: list[tuple[int, str]] = []
+    size = 0
+
+    def flush():
+        nonlocal current, size
+        if current:
+            chunks.append({
+                "line_start": current[0][0],
+                "line_end": current[-1][0],
+                "line_nos": [line_no for line_no, _ in current],
+                "text": "\n".join(text for _, text in current),
+            })
+        current, size = [], 0
+
+    for line_no, line in enumerate(content.split("\n")):
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if HEADING_RE.match(stripped) or len(current) >= max_lines or size + len(stripped) > max_chars:
+            flush()
+        current.append((line_no, stripped))
+        size += len(stripped) + 1
+
+    flush()
+    return chunks
+
+
+class VectorIndex:
+    """
+    Chunk embeddings for the knowledge base.
+    vectors.npy holds L2-normalised float32 rows; chunks.json holds the
+    matching chunk metadata (file, line range, content hash, text) and the
+    mtime/size of every indexed file. Safe to search while a refresh runs.
+    """
+
+    def __init__(self, kb_path: Path = KNOWLEDGE_BASE_PATH,
+                 store_dir: Path = KB_VECTORS_DIR,
+                 model: str = DEFAULT_EMBEDDING_MODEL,
+                 endpoint: str = DEFAULT_EMBEDDING_ENDPOINT,
+                 refresh_interval: float = REFRESH_INTERVAL,
+                 session=None):
+        if np is None:
+            raise ImportError("numpy not installed. Install with: pip install numpy")
+        self.kb_path = Path(kb_path)
+        self.store_dir = Path(store_dir)
+        self.model = model
+        self.endpoint = endpoint
+        self.refresh_interval = refresh_interval
+        self.session = session
+        self.vectors_path = self.store_dir / "vectors.npy"
+        self.meta_path = self.store_dir / "chunks.json"
+        self._lock = threading.Lock()  # Guards vectors/meta swaps against searches
+        self._refresh_lock = threading.Lock()  # One refresh at a time
+        self._builder: Optional[threading.Thread] = None
+        self._load()
+
+    def _load(self) -> None:
+        """Load metadata and memory-map the vector matrix."""
+        self.meta = {"model": self.model, "last_refresh": 0, "files": {}, "chunks": []}
+        self.vectors = None
+        if self.meta_path.exists() and self.vectors_path.exists():
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            # A different embedding model means every vector is stale
+            if meta.get("model") == self.model:
+                self.meta = meta
+                self.vectors = np.load(self.vectors_path, mmap_mode="r")
+
+    def _chunk_hash(self, text: str) -> str:
+        return hashlib.sha1(f"{self.model}\n{text}".encode("utf-8")).hexdigest()
+
+    # =========================================================================
+    # INDEXING
+    # =========================================================================
+
+    def refresh(self, force: bool = False) -> dict:
+        """
+        Re-chunk files whose mtime or size changed and embed only chunks whose
+        content hash is new. Returns {"files_changed", "embedded", "reused"}.
+        """
+        with self._refresh_lock:
+            return self._refresh(force)
+
+    def refresh_in_background(self, force: bool = False) -> Optional[threading.Thread]:
+        """Start refresh() on a daemon thread if one is due and none is running; that thread or None."""
+        if not force and time.time() - self.meta.get("last_refresh", 0) < self.refresh_interval:
+            return None
+        with self._lock:
+            if self._builder is not None and self._builder.is_alive():
+                return None
+            self._builder = threading.Thread(target=self._refresh_quietly, args=(force,),
+                                             name="kb-vectors-refresh", daemon=True)
+            self._builder.start()
+            return self._builder
+
+    def _refresh_quietly(self, force: bool) -> None:
+        try:
+            self.refresh(force)
+        except Exception as e:  # Including malformed embedding responses; keep the thread quiet
+            print(f"[kb_vectors] Background refresh failed: {type(e).__name__}: {e}", file=sys.stderr)
+
+    def _refresh(self, force: bool) -> dict:
+        stats = {"files_changed": 0, "embedded": 0, "reused": 0}
+        now = time.time()
+        if not force and now - self.meta.get("last_refresh", 0) < self.refresh_interval:
+            return stats
+
+        old_files = self.meta["files"]
+        old_chunks = self.meta["chunks"]
+        by_file: dict[str, list[int]] = {}
+        for row, chunk in enumerate(old_chunks):
+            by_file.setdefault(chunk["file"], []).append(row)
+
+        files = {}
+        new_chunks = []
+        for md_file in sorted(self.kb_path.rglob("*.md")) if self.kb_path.exists() else []:
+            try:
+                st = md_file.stat()
+            except OSError:
+                continue
+            rel = md_file.relative_to(self.kb_path).as_posix()
+            signature = [st.st_mtime_ns, st.st_size]
+            if old_files.get(rel) == signature:
+                files[rel] = signature
+                new_chunks.extend(old_chunks[row] for row in by_file.get(rel, []))
+                continue
+
+            stats["files_changed"] += 1
+            try:
+                content = md_file.read_text(encoding="utf-8")
+            except (OSError, UnicodeDecodeError):
+                continue  # Left out of the manifest, so the next refresh retries it
+            files[rel] = signature
+            for chunk in chunk_markdown(content):
+                chunk["file"] = rel
+                chunk["hash"] = self._chunk_hash(chunk["text"])
+                new_chunks.append(chunk)
+
+        if not stats["files_changed"] and len(files) == len(old_files) and self.vectors is not None:
+            with self._lock:
+                self.meta["last_refresh"] = now
+                self._save_meta()
+            return stats
+
+        # Reuse vectors for unchanged content hashes, embed the rest
+        old_rows = {chunk["hash"]: row for row, chunk in enumerate(old_chunks)}
+        to_embed = [
+            i for i, chunk in enumerate(new_chunks)
+            if self.vectors is None or chunk["hash"] not in old_rows
+        ]
+        embedded = embed_texts(
+            [new_chunks[i]["text"] for i in to_embed],
+            self.model, self.endpoint, session=self.session
+        ) if to_embed else []
+
+        dim = len(embedded[0]) if embedded else (self.vectors.shape[1] if self.vectors is not None else 0)
+        matrix = np.zeros((len(new_chunks), dim), dtype=np.float32)
+        fresh = dict(zip(to_embed, embedded))
+        for i, chunk in enumerate(new_chunks):
+            if i in fresh:
+                vec = np.asarray(fresh[i], dtype=np.float32)
+                norm = np.linalg.norm(vec)
+                matrix[i] = vec / norm if norm else vec
+                stats["embedded"] += 1
+            else:
+                matrix[i] = self.vectors[old_rows[chunk["hash"]]]
+                stats["reused"] += 1
+
+        with self._lock:
+            self._save(matrix, files, new_chunks, now)
+        return stats
+
+    def _save_meta(self) -> None:
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.meta_path.with_suffix(".json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, self.meta_path)
+
+    def _save(self, matrix, files: dict, chunks: list[dict], now: float) -> None:
+        """Write vectors then metadata, each via temp file + atomic rename."""
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        self.vectors = None  # release the old memmap before replacing the file
+        tmp = self.store_dir / "vectors.tmp.npy"
+        out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=matrix.shape)
+        out[:] = matrix
+        out.flush()
+        del out
+        os.replace(tmp, self.vectors_path)
+
+        self.meta = {"model": self.model, "last_refresh": now, "files": files, "chunks": chunks}
+        self._save_meta()
+        self.vectors = np.load(self.vectors_path, mmap_mode="r")
+
+    # =========================================================================
+    # QUERYING
+    # =========================================================================
+
+    def search(self, query: str, limit: int = 3, min_score: float = 0.0) -> list[dict]:
+        """
+        Cosine top-k over all chunks.
+        Returns [{"file", "score", "snippet", "line_start", "line_end", "line_nos"}].
+        Raises IndexNotReady until the index has been built once (a build is
+        started in the background); later refreshes run there too.
+        """
+        if self.vectors is None:
+            self.refresh_in_background(force=True)
+            raise IndexNotReady(f"Vector index for {self.kb_path} is still building")
+        self.refresh_in_background()
+
+        q = np.asarray(embed_texts([query], self.model, self.endpoint, session=self.session)[0],
+                       dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if not norm:
+            return []
+        with self._lock:
+            chunks = self.meta["chunks"]
+            if self.vectors is None or not len(chunks):
+                return []
+            scores = np.asarray(self.vectors @ (q / norm))
+
+        k = min(limit, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        results = []
+        for row in top:
+            score = float(scores[row])
+            if score < min_score:
+                continue
+            chunk = chunks[row]
+            results.append({
+                "file": str(Path(chunk["file"])),
+                "score": round(score, 4),
+                "snippet": chunk["text"],
+                "line_start": chunk["line_start"],
+                "line_end": chunk["line_end"],
+                "line_nos": chunk.get("line_nos"),  # Missing from indexes built before it was stored
+            })
+        return results
+
+
+# =============================================================================
+# SHARED INSTANCES
+# =============================================================================
+
+_indexes: dict[tuple, VectorIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(kb_path: Path = KNOWLEDGE_BASE_PATH, store_dir: Path = KB_VECTORS_DIR,
+              model: str = DEFAULT_EMBEDDING_MODEL,
+              endpoint: str = DEFAULT_EMBEDDING_ENDPOINT, session=None) -> VectorIndex:
+    """Return a process-wide VectorIndex for the given paths and model."""
+    key = (str(kb_path), str(store_dir), model, endpoint)
+    with _indexes_lock:  # Concurrent first calls must not open two indexes on one store
+        if key not in _indexes:
+            _indexes[key] = VectorIndex(kb_path, store_dir, model, endpoint, session=session)
+        return _indexes[key]
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Semantic Knowledge Base Retrieval")
+    parser.add_argument("query", nargs="*", help="Query to run against the vector index")
+    parser.add_argument("--refresh", action="store_true", help="Embed new/changed chunks")
+    parser.add_argument("--model", default=DEFAULT_EMBEDDING_MODEL, help="Ollama embedding model")
+    parser.add_argument("-k", type=int, default=3, help="Number of chunks to return")
+    args = parser.parse_args()
+
+    try:
+        index = get_index(model=args.model)
+    except ImportError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+    if args.refresh:
+        start = time.perf_counter()
+        stats = index.refresh(force=True)
+        print(f"Refreshed: {stats['files_changed']} files changed, "
+              f"{stats['embedded']} chunks embedded, {stats['reused']} reused "
+              f"({time.perf_counter() - start:.1f}s)")
+        return
+
+    if not args.query:
+        parser.print_help()
+        sys.exit(1)
+
+    if index.vectors is None:
+        print("Building the vector index...")
+        index.refresh(force=True)
+
+    start = time.perf_counter()
+    results = index.search(" ".join(args.query), limit=args.k)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    for r in results:
+        print(f"\n{r['file']} (cosine {r['score']:.3f}, lines {r['line_start']}-{r['line_end']})")
+        for line in r["snippet"].split("\n")[:5]:
+            print(f"  {line}")
+    print(f"\n[{len(results)} results in {elapsed_ms:.1f}ms]")
+
+
+if __name__ == "__main__":
+    main()
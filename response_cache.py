@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Response Cache for Automation Machine
+SQLite-backed cache of delegate results keyed on (tool, model, normalized
+prompt), with per-tool TTLs and LRU eviction by entry count.
+
+Usage:
+    python response_cache.py --stats
+    python response_cache.py --clear [--tool perplexity]
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+# Paths
+BASE_DIR = Path(__file__).resolve().parent
+RESPONSE_CACHE_PATH = BASE_DIR / "response_cache.db"
+
+DEFAULT_MAX_ENTRIES = 5000
+
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Casefold and collapse whitespace so trivial variations share a key."""
+    return WHITESPACE_RE.sub(" ", prompt).strip().casefold()
+
+
+def cache_key(tool: str, model: str, prompt: str) -> str:
+    """Stable key for a (tool, model, normalized prompt) triple."""
+    raw = f"{tool}\x00{model}\x00{normalize_prompt(prompt)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Exact-match response cache.
+    Tools without a positive TTL are never cached, so side-effecting
+    delegates (comfyui, github, supabase, ...) always run.
+    """
+
+    def __init__(self, db_path: Path = RESPONSE_CACHE_PATH,
+                 ttl_seconds: Optional[dict] = None,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.db_path = Path(db_path)
+        self.ttl_seconds = ttl_seconds or {}
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.db_path), timeout=10, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                tool TEXT NOT NULL,
+                model TEXT NOT NULL,
+                result TEXT NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_responses_access ON responses(last_access);
+        """)
+        self.conn.commit()
+
+    @classmethod
+    def from_config(cls, config: dict, db_path: Path = RESPONSE_CACHE_PATH) -> Optional["ResponseCache"]:
+        """Build a cache from the config.yaml `cache` section, or None if disabled."""
+        cache_config = config.get("cache", {})
+        if not cache_config.get("enabled", False):
+            return None
+        return cls(
+            db_path,
+            ttl_seconds=cache_config.get("ttl_seconds", {}),
+            max_entries=cache_config.get("max_entries", DEFAULT_MAX_ENTRIES),
+        )
+
+    def ttl_for(self, tool: str) -> int:
+        return int(self.ttl_seconds.get(tool, 0) or 0)
+
+    def get(self, tool: str, model: str, prompt: str) -> Optional[dict]:
+        """Return the cached result dict, or None on miss/expiry."""
+        ttl = self.ttl_for(tool)
+        if ttl <= 0:
+            return None
+
+        key = cache_key(tool, model, prompt)
+        with self._lock, self.conn:
+            row = self.conn.execute(
+                "SELECT result, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            now = time.time()
+            if now - row[1] > ttl:
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+
+            self.conn.execute(
+                "UPDATE responses SET last_access = ?, hits = hits + 1 WHERE key = ?",
+                (now, key)
+            )
+        return json.loads(row[0])
+
+    def put(self, tool: str, model: str, prompt: str, result: dict) -> None:
+        """Store a delegate result and evict least-recently-used overflow."""
+        if self.ttl_for(tool) <= 0:
+            return
+
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, tool, model, result, created, last_access, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, 0)",
+                (cache_key(tool, model, prompt), tool, model, json.dumps(result), now, now)
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        """Drop the least-recently-used entries beyond max_entries."""
+        count = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self.conn.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY last_access LIMIT ?)",
+                (overflow,)
+            )
+
+    def clear(self, tool: Optional[str] = None) -> int:
+        """Delete all entries, or only those for one tool. Returns rows removed."""
+        with self._lock, self.conn:
+            if tool:
+                cursor = self.conn.execute("DELETE FROM responses WHERE tool = ?", (tool,))
+            else:
+                cursor = self.conn.execute("DELETE FROM responses")
+        return cursor.rowcount
+
+    def stats(self) -> dict:
+        """Per-tool entry and hit counts."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT tool, COUNT(*), SUM(hits) FROM responses GROUP BY tool ORDER BY tool"
+            ).fetchall()
+        return {tool: {"entries": entries, "hits": hits or 0} for tool, entries, hits in rows}
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Automation Machine Response Cache")
+    parser.add_argument("--stats", action="store_true", help="Show per-tool entries and hits")
+    parser.add_argument("--clear", action="store_true", help="Delete cached responses")
+    parser.add_argument("--tool", help="Limit --clear to one tool")
+    args = parser.parse_args()
+
+    cache = ResponseCache()
+    try:
+        if args.clear:
+            removed = cache.clear(args.tool)
+            print(f"Removed {removed} cached responses")
+        else:
+            stats = cache.stats()
+            if not stats:
+                print("Cache is empty")
+            for tool, s in stats.items():
+                print(f"  {tool}: {s['entries']} entries, {s['hits']} hits")
+    finally:
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
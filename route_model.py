@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Learned Routing Model for Automation Machine
+Hashed n-gram linear classifier that predicts the serving tool and the
+complexity of a query. Trained offline from routed queries in usage.db and
+stored as a small NumPy weight file (route_model.npz).
+
+Labels come from outcomes: the tool that actually answered (after any
+fallback), so routes that keep falling back are unlearned over time.
+
+Usage:
+    python route_model.py --train                 # Train from usage.db
+    python route_model.py --predict "query text"  # Show a prediction
+"""
+
+import argparse
+import re
+import time
+import zlib
+from pathlib import Path
+from typing import Optional
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from usage_store import get_store, USAGE_DB_PATH
+
+# Paths
+BASE_DIR = Path(__file__).resolve().parent
+ROUTE_MODEL_PATH = BASE_DIR / "route_model.npz"
+
+# Hashed feature space (weights are DIM x labels float32)
+DEFAULT_DIM = 2 ** 13
+
+COMPLEXITY_LABELS = ("simple", "medium", "complex")
+
+WORD_RE = re.compile(r"[a-z0-9+#]+")
+
+
+def featurize(query: str, dim: int = DEFAULT_DIM) -> tuple:
+    """
+    Hashed features for a query: word unigrams and bigrams plus character
+    trigrams within words. Returns (indices, values) with values L2-normalised.
+    """
+    words = WORD_RE.findall(query.lower())
+    grams = [f"w:{w}" for w in words]
+    grams += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+    for w in words:
+        padded = f"^{w}$"
+        grams += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    grams.append(f"n:{min(len(words) // 10, 6)}")  # Length bucket
+
+    counts: dict[int, float] = {}
+    for gram in grams:
+        index = zlib.crc32(gram.encode("utf-8")) % dim
+        counts[index] = counts.get(index, 0.0) + 1.0
+    indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    values = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+    return indices, values / np.linalg.norm(values)
+
+
+def _softmax(logits):
+    logits = logits - logits.max(axis=-1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+def _train_head(rows, cols, vals, labels, n_classes: int, n_examples: int, dim: int,
+                epochs: int, learning_rate: float, l2: float):
+    """
+    Multinomial logistic regression by full-batch gradient descent on sparse
+    features. rows must be sorted (featurize order) and every example has at
+    least one feature, so per-example and per-feature sums are reduceat calls.
+    """
+    weights = np.zeros((dim, n_classes), dtype=np.float32)
+    bias = np.zeros(n_classes, dtype=np.float32)
+    onehot = np.zeros((n_examples, n_classes), dtype=np.float32)
+    onehot[np.arange(n_examples), labels] = 1.0
+
+    row_starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+    order = np.argsort(cols, kind="stable")
+    used, col_starts = np.unique(cols[order], return_index=True)
+    vals = vals[:, None]
+
+    for _ in range(epochs):
+        logits = np.add.reduceat(weights[cols] * vals, row_starts)
+        grad = (_softmax(logits + bias) - onehot) / n_examples
+        grad_weights = np.add.reduceat((grad[rows] * vals)[order], col_starts)
+        # Untouched feature rows stay zero, so L2 only matters on used rows
+        weights[used] -= learning_rate * (grad_weights + l2 * weights[used])
+        bias -= learning_rate * grad.sum(axis=0)
+    return weights, bias
+
+
+class RouteModel:
+    """Tool and complexity heads over one hashed feature space."""
+
+    def __init__(self, tool_labels: list[str], tool_weights, tool_bias,
+                 complexity_weights, complexity_bias, dim: int = DEFAULT_DIM):
+        self.tool_labels = list(tool_labels)
+        self.tool_weights = tool_weights
+        self.tool_bias = tool_bias
+        self.complexity_weights = complexity_weights
+        self.complexity_bias = complexity_bias
+        self.dim = dim
+
+    @classmethod
+    def train(cls, examples: list[dict], dim: int = DEFAULT_DIM, epochs: int = 200,
+              learning_rate: float = 2.0, l2: float = 1e-4) -> "RouteModel":
+        """
+        Fit both heads from {"query", "tool", "complexity"?} examples.
+        Examples without a known complexity only train the tool head.
+        """
+        if np is None:
+            raise ImportError("numpy not installed. Install with: pip install numpy")
+        if not examples:
+            raise ValueError("No routing examples to train on")
+
+        tool_labels = sorted({e["tool"] for e in examples})
+        rows, cols, vals = [], [], []
+        for i, example in enumerate(examples):
+            indices, values = featurize(example["query"], dim)
+            rows.append(np.full(len(indices), i, dtype=np.int64))
+            cols.append(indices)
+            vals.append(values)
+        rows, cols, vals = np.concatenate(rows), np.concatenate(cols), np.concatenate(vals)
+
+        tool_y = np.array([tool_labels.index(e["tool"]) for e in examples])
+        tool_weights, tool_bias = _train_head(rows, cols, vals, tool_y, len(tool_labels),
+                                              len(examples), dim, epochs, learning_rate, l2)
+
+        # Complexity head on the subset with a complexity label
+        keep = np.array([e.get("complexity") in COMPLEXITY_LABELS for e in examples])
+        if keep.any():
+            remap = np.cumsum(keep) - 1
+            mask = keep[rows]
+            complexity_y = np.array([COMPLEXITY_LABELS.index(e["complexity"])
+                                     for e in examples if e.get("complexity") in COMPLEXITY_LABELS])
+            complexity_weights, complexity_bias = _train_head(
+                remap[rows[mask]], cols[mask], vals[mask], complexity_y, len(COMPLEXITY_LABELS),
+                int(keep.sum()), dim, epochs, learning_rate, l2
+            )
+        else:
+            complexity_weights = np.zeros((dim, len(COMPLEXITY_LABELS)), dtype=np.float32)
+            complexity_bias = np.zeros(len(COMPLEXITY_LABELS), dtype=np.float32)
+
+        return cls(tool_labels, tool_weights, tool_bias, complexity_weights, complexity_bias, dim)
+
+    def predict(self, query: str) -> dict:
+        """{"tool", "tool_confidence", "complexity", "complexity_confidence"}"""
+        indices, values = featurize(query, self.dim)
+        tool_p = _softmax(values @ self.tool_weights[indices] + self.tool_bias)
+        complexity_p = _softmax(values @ self.complexity_weights[indices] + self.complexity_bias)
+        tool_i = int(tool_p.argmax())
+        complexity_i = int(complexity_p.argmax())
+        return {
+            "tool": self.tool_labels[tool_i],
+            "tool_confidence": float(tool_p[tool_i]),
+            "complexity": COMPLEXITY_LABELS[complexity_i],
+            "complexity_confidence": float(complexity_p[complexity_i]),
+        }
+
+    def save(self, path: Path = ROUTE_MODEL_PATH) -> Path:
+        """Write the weights as a compressed .npz (float16 weights)."""
+        path = Path(path)
+        with open(path, "wb") as f:
+            np.savez_compressed(
+                f,
+                tool_labels=np.array(self.tool_labels),
+                tool_weights=self.tool_weights.astype(np.float16),
+                tool_bias=self.tool_bias,
+                complexity_weights=self.complexity_weights.astype(np.float16),
+                complexity_bias=self.complexity_bias,
+                dim=np.array(self.dim),
+            )
+        return path
+
+    @classmethod
+    def load(cls, path: Path = ROUTE_MODEL_PATH) -> "RouteModel":
+        if np is None:
+            raise ImportError("numpy not installed. Install with: pip install numpy")
+        with np.load(str(path)) as data:
+            return cls(
+                [str(label) for label in data["tool_labels"]],
+                data["tool_weights"].astype(np.float32), data["tool_bias"],
+                data["complexity_weights"].astype(np.float32), data["complexity_bias"],
+                int(data["dim"]),
+            )
+
+
+def load_route_model(path: Path = ROUTE_MODEL_PATH) -> Optional[RouteModel]:
+    """The trained model, or None if numpy or the weight file is missing."""
+    if np is None or not Path(path).exists():
+        return None
+    return RouteModel.load(path)
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Automation Machine Routing Model")
+    parser.add_argument("--train", action="store_true", help="Train from usage.db routing history")
+    parser.add_argument("--since", help="Only train on events since YYYY-MM-DD")
+    parser.add_argument("--epochs", type=int, default=200, help="Gradient descent epochs")
+    parser.add_argument("--predict", metavar="QUERY", help="Predict tool and complexity")
+    parser.add_argument("--db", type=Path, default=USAGE_DB_PATH, help="Usage database path")
+    parser.add_argument("--model", type=Path, default=ROUTE_MODEL_PATH, help="Weight file path")
+    args = parser.parse_args()
+
+    if args.train:
+        examples = get_store(args.db).routing_examples(args.since)
+        start = time.perf_counter()
+        model = RouteModel.train(examples, epochs=args.epochs)
+        path = model.save(args.model)
+        correct = sum(model.predict(e["query"])["tool"] == e["tool"] for e in examples)
+        print(f"Trained on {len(examples)} queries in {time.perf_counter() - start:.1f}s "
+              f"({correct / len(examples):.0%} training accuracy) -> {path}")
+
+    if args.predict:
+        model = load_route_model(args.model)
+        if model is None:
+            print(f"No model at {args.model} (train with --train)")
+            return
+        start = time.perf_counter()
+        prediction = model.predict(args.predict)
+        elapsed_us = (time.perf_counter() - start) * 1e6
+        print(f"{prediction['tool']} ({prediction['tool_confidence']:.2f}), "
+              f"{prediction['complexity']} ({prediction['complexity_confidence']:.2f}) "
+              f"in {elapsed_us:.0f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Semantic Response Cache for Automation Machine
+Catches paraphrased repeats of expensive cloud queries (claude, perplexity):
+the query is embedded locally via Ollama and a prior response is reused when
+cosine similarity to a cached query clears a threshold.
+
+Vectors live in a bounded per-tool in-memory matrix (one matrix-vector
+product per lookup) and are persisted in SQLite alongside the exact-match
+response cache.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from kb_vectors import embed_texts, DEFAULT_EMBEDDING_MODEL, DEFAULT_EMBEDDING_ENDPOINT
+
+# Paths
+BASE_DIR = Path(__file__).resolve().parent
+RESPONSE_CACHE_PATH = BASE_DIR / "response_cache.db"
+
+DEFAULT_THRESHOLD = 0.92
+DEFAULT_MAX_ENTRIES_PER_TOOL = 2000
+
+
+class SemanticCache:
+    """
+    Near-duplicate cache scoped per tool. Entries older than the tool's TTL
+    are ignored on lookup and pruned on load; each tool keeps at most
+    max_entries vectors, oldest dropped first.
+    """
+
+    def __init__(self, db_path: Path = RESPONSE_CACHE_PATH,
+                 tools: tuple = ("claude", "perplexity"),
+                 ttl_seconds: Optional[dict] = None,
+                 threshold: float = DEFAULT_THRESHOLD,
+                 max_entries: int = DEFAULT_MAX_ENTRIES_PER_TOOL,
+                 model: str = DEFAULT_EMBEDDING_MODEL,
+                 endpoint: str = DEFAULT_EMBEDDING_ENDPOINT,
+                 session=None):
+        if np is None:
+            raise ImportError("numpy not installed. Install with: pip install numpy")
+        self.db_path = Path(db_path)
+        self.tools = set(tools)
+        self.ttl_seconds = ttl_seconds or {}
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.model = model
+        self.endpoint = endpoint
+        self.session = session
+
+        # Guards the connection and the in-memory matrices; embed() runs outside it
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.db_path), timeout=10, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS semantic_entries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                tool TEXT NOT NULL,
+                model TEXT NOT NULL,
+                embed_model TEXT NOT NULL,
+                query TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                result TEXT NOT NULL,
+                created REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_semantic_tool ON semantic_entries(tool, created);
+        """)
+        self.conn.commit()
+
+        # tool -> {"ids": [...], "models": [...], "created": ndarray, "matrix": ndarray}
+        self._entries: dict[str, dict] = {}
+        self._load()
+
+    @classmethod
+    def from_config(cls, config: dict, db_path: Path = RESPONSE_CACHE_PATH,
+                    session=None) -> Optional["SemanticCache"]:
+        """Build from config.yaml cache.semantic, or None if disabled/unavailable."""
+        cache_config = config.get("cache", {})
+        semantic = cache_config.get("semantic", {})
+        if not cache_config.get("enabled", False) or not semantic.get("enabled", False):
+            return None
+        if np is None:
+            return None
+        return cls(
+            db_path,
+            tools=tuple(semantic.get("tools", ["claude", "perplexity"])),
+            ttl_seconds=cache_config.get("ttl_seconds", {}),
+            threshold=semantic.get("threshold", DEFAULT_THRESHOLD),
+            max_entries=semantic.get("max_entries_per_tool", DEFAULT_MAX_ENTRIES_PER_TOOL),
+            model=semantic.get("embedding_model", DEFAULT_EMBEDDING_MODEL),
+            endpoint=config["models"]["local"]["deepseek"]["endpoint"],
+            session=session,
+        )
+
+    def _ttl(self, tool: str) -> int:
+        return int(self.ttl_seconds.get(tool, 0) or 0)
+
+    def _load(self) -> None:
+        """Prune expired/overflow rows and load the survivors into memory."""
+        now = time.time()
+        for tool in self.tools:
+            ttl = self._ttl(tool)
+            if ttl > 0:
+                self.conn.execute(
+                    "DELETE FROM semantic_entries WHERE tool = ? AND created < ?",
+                    (tool, now - ttl)
+                )
+            self.conn.execute(
+                "DELETE FROM semantic_entries WHERE tool = ? AND id NOT IN "
+                "(SELECT id FROM semantic_entries WHERE tool = ? AND embed_model = ? "
+                "ORDER BY created DESC LIMIT ?)",
+                (tool, tool, self.model, self.max_entries)
+            )
+            rows = self.conn.execute(
+                "SELECT id, model, created, vector FROM semantic_entries "
+                "WHERE tool = ? ORDER BY created",
+                (tool,)
+            ).fetchall()
+            self._entries[tool] = {
+                "ids": [r[0] for r in rows],
+                "models": [r[1] for r in rows],
+                "created": np.array([r[2] for r in rows], dtype=np.float64),
+                "matrix": (np.vstack([np.frombuffer(r[3], dtype=np.float32) for r in rows])
+                           if rows else None),
+            }
+        self.conn.commit()
+
+    def embed(self, query: str):
+        """Embed and L2-normalise a query. Raises ConnectionError if Ollama is down."""
+        vec = np.asarray(
+            embed_texts([query], self.model, self.endpoint, timeout=30, session=self.session)[0],
+            dtype=np.float32
+        )
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def lookup(self, tool: str, model: str, vector) -> Optional[dict]:
+        """
+        Return the cached result of the most similar live query for this tool
+        and model, or None if nothing clears the threshold.
+        """
+        with self._lock:
+            entries = self._entries.get(tool)
+            if not entries or entries["matrix"] is None:
+                return None
+
+            scores = entries["matrix"] @ vector
+            ttl = self._ttl(tool)
+            if ttl > 0:
+                scores = np.where(entries["created"] >= time.time() - ttl, scores, -1.0)
+            for i in np.argsort(-scores)[:5]:
+                if scores[i] < self.threshold:
+                    break
+                if entries["models"][i] != model:
+                    continue
+                row = self.conn.execute(
+                    "SELECT result FROM semantic_entries WHERE id = ?", (entries["ids"][i],)
+                ).fetchone()
+                if row:
+                    result = json.loads(row[0])
+                    result["similarity"] = round(float(scores[i]), 4)
+                    return result
+        return None
+
+    def add(self, tool: str, model: str, query: str, vector, result: dict) -> None:
+        """Persist a response and append its vector, evicting the oldest past the bound."""
+        if tool not in self.tools:
+            return
+        with self._lock:
+            now = time.time()
+            cursor = self.conn.execute(
+                "INSERT INTO semantic_entries (tool, model, embed_model, query, vector, result, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (tool, model, self.model, query, np.asarray(vector, dtype=np.float32).tobytes(),
+                 json.dumps(result), now)
+            )
+
+            entries = self._entries.setdefault(
+                tool, {"ids": [], "models": [], "created": np.array([]), "matrix": None}
+            )
+            entries["ids"].append(cursor.lastrowid)
+            entries["models"].append(model)
+            entries["created"] = np.append(entries["created"], now)
+            row = np.asarray(vector, dtype=np.float32)[None, :]
+            entries["matrix"] = row if entries["matrix"] is None else np.vstack([entries["matrix"], row])
+
+            overflow = len(entries["ids"]) - self.max_entries
+            if overflow > 0:
+                dropped = entries["ids"][:overflow]
+                self.conn.executemany("DELETE FROM semantic_entries WHERE id = ?",
+                                      [(i,) for i in dropped])
+                entries["ids"] = entries["ids"][overflow:]
+                entries["models"] = entries["models"][overflow:]
+                entries["created"] = entries["created"][overflow:]
+                entries["matrix"] = entries["matrix"][overflow:]
+            self.conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
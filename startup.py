@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Startup Helpers for Automation Machine
+The CLI is invoked once per query by agents, so import and config parsing
+time is paid on every call.
+
+- lazy_import(): module objects that load on first attribute access, for
+  heavy dependencies (requests) only some code paths need.
+- load_yaml() / load_json(): parsed config files pickled to
+  __pycache__/<name>.pickle next to the source, reused until the source's
+  mtime or size changes, so a warm start never imports PyYAML.
+- import_profile(): startup cost report (python automation_brain.py --import-profile).
+
+Usage:
+    python startup.py                  # Startup profile of automation_brain
+"""
+
+import importlib.util
+import json
+import os
+import pickle
+import sys
+from pathlib import Path
+from typing import Any, Callable
+
+# Paths
+BASE_DIR = Path(__file__).resolve().parent
+
+# Third-party modules a fast start should not import
+HEAVY_MODULES = ("requests", "urllib3", "yaml", "numpy", "httpx")
+
+
+def lazy_import(name: str):
+    """
+    Import `name` lazily: the module is registered now and executed on first
+    attribute access. Returns the already-imported module if there is one.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named '{name}'")
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+# =============================================================================
+# CACHED CONFIG
+# =============================================================================
+
+def cache_path(path: Path) -> Path:
+    """Where the parsed copy of `path` is kept."""
+    return path.parent / "__pycache__" / f"{path.name}.pickle"
+
+
+def load_cached(path: Path, parse: Callable[[Path], Any]) -> Any:
+    """
+    Parsed contents of `path`, from the pickle cache when it matches the
+    source's (mtime, size); otherwise parse() and refresh the cache.
+    """
+    path = Path(path)
+    stat = path.stat()
+    key = (stat.st_mtime_ns, stat.st_size)
+    cache = cache_path(path)
+    try:
+        with open(cache, "rb") as f:
+            cached_key, data = pickle.load(f)
+        if cached_key == key:
+            return data
+    except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError):
+        pass
+
+    data = parse(path)
+    try:
+        cache.parent.mkdir(exist_ok=True)
+        tmp = cache.with_name(f"{cache.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump((key, data), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cache)
+    except OSError:
+        pass  # Read-only install: parse every time
+    return data
+
+
+def _parse_yaml(path: Path) -> Any:
+    import yaml
+    with open(path, "r", encoding="utf-8") as f:
+        # libyaml's C parser when PyYAML was built with it
+        return yaml.load(f, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
+
+
+def _parse_json(path: Path) -> Any:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_yaml(path: Path) -> Any:
+    """yaml.safe_load of a file, cached by mtime."""
+    return load_cached(path, _parse_yaml)
+
+
+def load_json(path: Path) -> Any:
+    """json.load of a file, cached by mtime."""
+    return load_cached(path, _parse_json)
+
+
+# =============================================================================
+# IMPORT PROFILE
+# =============================================================================
+
+# Run in a fresh interpreter: phase timings of a one-shot CLI start
+_PHASES_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import automation_brain
+imported = time.perf_counter()
+result = {"import_ms": (imported - start) * 1000}
+try:
+    automation_brain.AutomationBrain()
+    result["init_ms"] = (time.perf_counter() - imported) * 1000
+except Exception as e:
+    result["init_error"] = f"{type(e).__name__}: {e}"
+result["heavy_modules"] = [m for m in %r if m in sys.modules
+                           and type(sys.modules[m]).__name__ != "_LazyModule"]
+print(json.dumps(result))
+"""
+
+
+def _importtime(module: str, cwd: Path) -> list[tuple[int, int, int, str]]:
+    """(self_us, cumulative_us, depth, name) rows from python -X importtime."""
+    import subprocess
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=cwd, capture_output=True, text=True, timeout=120)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        if not self_us.strip().isdigit():
+            continue  # Header line
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(self_us), int(cumulative_us), depth, name.strip()))
+    return rows
+
+
+def _phases(cwd: Path) -> dict:
+    import subprocess
+    proc = subprocess.run([sys.executable, "-c", _PHASES_SCRIPT % (HEAVY_MODULES,)],
+                          cwd=cwd, capture_output=True, text=True, timeout=120)
+    try:
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+    except (IndexError, json.JSONDecodeError):
+        return {"init_error": proc.stderr.strip()[-300:]}
+
+
+def import_profile(config_paths: list[Path], cwd: Path = BASE_DIR, top: int = 12) -> str:
+    """
+    Report startup cost of automation_brain: heaviest imports, then import
+    and init time in fresh interpreters with a cold and a warm config cache.
+    """
+    rows = _importtime("automation_brain", cwd)
+    lines = []
+    index = next((i for i, r in enumerate(rows) if r[3] == "automation_brain"), None)
+    if index is not None:
+        root = rows[index]
+        lines.append(f"import automation_brain: {root[1] / 1000:.1f}ms cumulative "
+                     f"({root[0] / 1000:.1f}ms in the module itself)")
+        # importtime prints children before their parent; interpreter startup
+        # (site, encodings) comes before that and is not ours to trim
+        direct = []
+        for row in reversed(rows[:index]):
+            if row[2] <= root[2]:
+                break
+            if row[2] == root[2] + 1:
+                direct.append(row)
+        lines.append("\nHeaviest imports (cumulative):")
+        for _, cumulative_us, _, name in sorted(direct, key=lambda r: r[1], reverse=True)[:top]:
+            lines.append(f"  {name:<32} {cumulative_us / 1000:>8.1f}ms")
+
+    for label in ("cold", "warm"):
+        if label == "cold":
+            for path in config_paths:
+                cache_path(Path(path)).unlink(missing_ok=True)
+        phases = _phases(cwd)
+        init = (f"init {phases['init_ms']:.1f}ms" if "init_ms" in phases
+                else f"init failed ({phases.get('init_error')})")
+        lines.append(f"\n{label} config cache: import {phases.get('import_ms', 0):.1f}ms, {init}")
+        heavy = phases.get("heavy_modules", [])
+        lines.append(f"  heavy modules loaded: {', '.join(heavy) if heavy else 'none'}")
+    return "\n".join(lines)
+
+
+def main():
+    print(import_profile([BASE_DIR / "config.yaml", BASE_DIR / "tools_config.json"]))
+
+
+if __name__ == "__main__":
+    main()
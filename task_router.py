@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Keyword Task Router for Automation Machine
+Compiles the routing indicator tables from config.yaml into one
+Aho-Corasick automaton, so every needs_* flag and the complexity level
+are found in a single pass over the query.
+
+Matching is case-insensitive substring matching, the same semantics as
+`phrase in query.lower()`.
+
+Usage:
+    python task_router.py "generate image of a candle"   # Show analysis
+"""
+
+import argparse
+import json
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+# Paths
+BASE_DIR = Path(__file__).resolve().parent
+CONFIG_PATH = BASE_DIR / "config.yaml"
+
+# Built-in tables for a config.yaml without routing.indicators /
+# routing.complexity_indicators (the lists _analyze_task used to hard-code)
+DEFAULT_INDICATORS = {
+    "web": {
+        "category": "research",
+        "phrases": ["latest", "current", "2024", "2025", "2026", "news", "today",
+                    "recent", "price", "compare prices", "find", "search for",
+                    "what are the best", "recommendations for", "reviews"],
+    },
+    "video": {
+        "category": "video",
+        "phrases": ["generate video", "create video", "animate", "animation",
+                    "video clip", "motion", "image to video", "i2v", "video from"],
+    },
+    "talking_head": {
+        "category": "video",
+        "implies": ["video"],
+        "phrases": ["talking head", "avatar", "lip sync", "lipsync", "sadtalker",
+                    "speaking video", "face animation", "photo to video with audio"],
+    },
+    "image": {
+        "category": "image",
+        "phrases": ["generate image", "create image", "draw", "illustration",
+                    "picture of", "visual", "logo", "design image", "artwork"],
+    },
+    "code": {
+        "category": "code",
+        "phrases": ["code", "function", "script", "program", "implement",
+                    "debug", "refactor", "write a", "create a class", "api"],
+    },
+    "database": {
+        "category": "database",
+        "phrases": ["database", "supabase", "query", "sql", "store data",
+                    "retrieve", "insert", "update record"],
+    },
+    "browser": {
+        "category": "browser",
+        "phrases": ["navigate to", "click on", "fill form", "browser", "website",
+                    "fiverr", "post to", "social media", "login to", "sign in",
+                    "open page", "web page", "scrape", "automate browser"],
+    },
+    "github": {
+        "category": "code",
+        "phrases": ["github", "repository", "repo", "commit", "pull request", "pr",
+                    "issue", "branch", "merge", "fork", "clone", "git "],
+    },
+}
+
+DEFAULT_COMPLEXITY_INDICATORS = {
+    "complex": ["complex", "novel", "architecture", "design system",
+                "comprehensive", "multi-step", "analyze deeply"],
+    "medium": ["analyze", "explain", "generate", "design", "refactor",
+               "create", "implement", "debug"],
+}
+
+
+class KeywordAutomaton:
+    """
+    Multi-pattern matcher over labelled phrase lists.
+    match() returns the labels with at least one phrase in the text.
+    """
+
+    def __init__(self, tables: dict[str, list[str]]):
+        self.labels = list(tables)
+        bits = {label: 1 << i for i, label in enumerate(self.labels)}
+
+        # Trie: goto[state] maps char -> state; out[state] is a label bitmask
+        goto: list[dict[str, int]] = [{}]
+        out = [0]
+        for label, phrases in tables.items():
+            for phrase in phrases:
+                phrase = phrase.lower()
+                if not phrase:
+                    continue
+                state = 0
+                for ch in phrase:
+                    if ch not in goto[state]:
+                        goto.append({})
+                        out.append(0)
+                        goto[state][ch] = len(goto) - 1
+                    state = goto[state][ch]
+                out[state] |= bits[label]
+
+        # Breadth-first failure links, folded into a full transition table so
+        # matching never follows failure links. Transitions to the root are
+        # left implicit (missing key -> state 0).
+        fail = [0] * len(goto)
+        delta: list[dict[str, int]] = [dict(goto[0])] + [{} for _ in goto[1:]]
+        queue = list(goto[0].values())
+        for state in queue:
+            out[state] |= out[fail[state]]
+            delta[state] = dict(delta[fail[state]])
+            for ch, child in goto[state].items():
+                fail[child] = delta[fail[state]].get(ch, 0)
+                delta[state][ch] = child
+                queue.append(child)
+
+        self._delta = delta
+        self._out = out
+        self.bits = bits
+
+    def match_mask(self, text: str) -> int:
+        """Bitmask of matched labels (bit i = self.labels[i])."""
+        delta, out = self._delta, self._out
+        state = 0
+        mask = 0
+        for ch in text.lower():
+            state = delta[state].get(ch, 0)
+            mask |= out[state]
+        return mask
+
+    def match(self, text: str) -> set[str]:
+        """Labels with at least one phrase occurring in text."""
+        mask = self.match_mask(text)
+        return {label for label, bit in self.bits.items() if mask & bit}
+
+
+def _freeze(tables: dict) -> tuple:
+    return tuple((label, tuple(phrases or [])) for label, phrases in tables.items())
+
+
+@lru_cache(maxsize=8)
+def _compile(frozen: tuple) -> KeywordAutomaton:
+    return KeywordAutomaton({label: list(phrases) for label, phrases in frozen})
+
+
+def compile_tables(tables: dict[str, list[str]]) -> KeywordAutomaton:
+    """Build (or reuse) the automaton for a set of phrase tables."""
+    return _compile(_freeze(tables))
+
+
+def keyword_complexity(query: str, keywords: dict[str, list[str]]) -> Optional[str]:
+    """
+    Highest complexity level ("complex" > "medium" > "simple") with a
+    keyword in the query, or None if none match.
+    """
+    matched = compile_tables(keywords).match(query)
+    for level in ("complex", "medium", "simple"):
+        if level in matched:
+            return level
+    return None
+
+
+class TaskRouter:
+    """
+    Single-pass analysis for AutomationBrain._analyze_task.
+
+    indicators: {name: {"category": str, "implies": [name, ...], "phrases": [...]}}
+        Each match sets needs_<name> (plus needs_<implied>). When several
+        groups match, the category of the last one in table order wins.
+    complexity: {"complex": [...], "medium": [...]}
+        Queries matching neither fall back to word count.
+    """
+
+    def __init__(self, indicators: dict[str, dict], complexity: dict[str, list[str]]):
+        self.indicators = indicators
+        tables = {f"needs_{name}": spec.get("phrases", []) for name, spec in indicators.items()}
+        for level in ("complex", "medium"):
+            tables[f"complexity_{level}"] = complexity.get(level, [])
+        self.automaton = compile_tables(tables)
+
+        # Per-label (bit, flags to set, category), in table order
+        self._rules = []
+        for name, spec in indicators.items():
+            label = f"needs_{name}"
+            flags = [label] + [f"needs_{implied}" for implied in spec.get("implies", [])]
+            self._rules.append((self.automaton.bits[label], flags, spec.get("category")))
+        self._complex_bit = self.automaton.bits["complexity_complex"]
+        self._medium_bit = self.automaton.bits["complexity_medium"]
+
+    @classmethod
+    def from_config(cls, config: dict) -> "TaskRouter":
+        """Router for config.yaml's routing tables (the built-in ones where missing)."""
+        routing = config.get("routing", {})
+        return cls(routing.get("indicators") or DEFAULT_INDICATORS,
+                   routing.get("complexity_indicators") or DEFAULT_COMPLEXITY_INDICATORS)
+
+    def analyze(self, query: str) -> dict:
+        """{"category", "complexity", "needs_<name>": bool, ...} for a query."""
+        mask = self.automaton.match_mask(query)
+        analysis = {f"needs_{name}": False for name in self.indicators}
+        analysis["category"] = "general"
+
+        for bit, flags, category in self._rules:
+            if mask & bit:
+                for flag in flags:
+                    analysis[flag] = True
+                if category:
+                    analysis["category"] = category
+
+        if mask & self._complex_bit:
+            analysis["complexity"] = "complex"
+        elif mask & self._medium_bit:
+            analysis["complexity"] = "medium"
+        else:
+            # Length-based fallback
+            word_count = len(query.split())
+            if word_count > 50:
+                analysis["complexity"] = "complex"
+            elif word_count > 15:
+                analysis["complexity"] = "medium"
+            else:
+                analysis["complexity"] = "simple"
+        return analysis
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Automation Machine Task Router")
+    parser.add_argument("query", help="Query to analyze")
+    args = parser.parse_args()
+
+    from startup import load_yaml
+    config = load_yaml(CONFIG_PATH)
+    print(json.dumps(TaskRouter.from_config(config).analyze(args.query), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Test suite for the async brain against stub backends
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import yaml
+
+import async_brain
+from async_brain import AsyncAutomationBrain, concurrency_group
+from bench_brain import _ORIGINAL_PATHS, StubBackends, build_sandbox, point_brain_at
+
+
+class TestAsyncBrain(unittest.TestCase):
+    """Test per-backend limits, the sync-delegate fallback and serial bookkeeping."""
+
+    def setUp(self):
+        os.environ.setdefault("ANTHROPIC_API_KEY", "test")
+        os.environ.setdefault("PERPLEXITY_API_KEY", "test")
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = Path(self.tmp.name)
+        (self.base / "knowledge-base" / "research").mkdir(parents=True)
+        self.stub = StubBackends(latency_ms=150, jitter_ms=0, tokens=5).start()
+        build_sandbox(self.base, self.stub.url)
+        config_path = self.base / "config.yaml"
+        config = yaml.safe_load(config_path.read_text(encoding="utf-8"))
+        config["concurrency"] = {"ollama": 2, "claude": 3}
+        config_path.write_text(yaml.safe_dump(config), encoding="utf-8")
+        point_brain_at(self.base, self.base / "knowledge-base")
+        self.brain = AsyncAutomationBrain()
+
+    def tearDown(self):
+        self.brain._bookkeeping.shutdown()
+        self.stub.stop()
+        point_brain_at(_ORIGINAL_PATHS["BASE_DIR"], _ORIGINAL_PATHS["KNOWLEDGE_BASE_PATH"])
+        self.tmp.cleanup()
+
+    def test_concurrency_groups(self):
+        self.assertEqual(concurrency_group("local-qwen"), "ollama")
+        self.assertEqual(concurrency_group("comfyui-video"), "comfyui")
+        self.assertEqual(concurrency_group("claude"), "claude")
+
+    def test_backend_limit_caps_fan_out(self):
+        """Six Ollama queries never have more than the ollama limit in flight."""
+        results = self.brain.run_many([(f"summarize note {i}", "local-deepseek") for i in range(6)])
+        self.assertTrue(all(r["response"].startswith("tok0") for r in results))
+        self.assertEqual(self.stub.requests["/api/generate"], 6)
+        self.assertEqual(self.stub.max_inflight, 2)
+
+    def test_sync_delegates_without_httpx(self):
+        """Without httpx, model calls go through the sync (streaming) delegates in worker threads."""
+        with patch("async_brain.httpx", None), \
+                patch.object(self.brain, "_adelegate_llm", side_effect=AssertionError("used httpx")):
+            results = self.brain.run_many([("summarize A", "local-deepseek"),
+                                           ("explain B", "perplexity")])
+        self.assertEqual([r["tool"] for r in results], ["local-ollama", "perplexity"])
+        self.assertEqual(self.stub.requests["/chat/completions"], 1)
+
+    @unittest.skipIf(async_brain.httpx is None, "httpx not installed")
+    def test_httpx_delegates(self):
+        """With httpx, model calls use the async client (non-streaming requests)."""
+        results = self.brain.run_many([("summarize A", "local-deepseek"), ("explain B", "claude")])
+        self.assertEqual([r["tool"] for r in results], ["local-ollama", "claude"])
+        self.assertIsNone(self.brain._client)  # Closed by the sync wrapper
+
+    def test_bookkeeping_runs_on_one_thread(self):
+        """Routing, cache and usage steps all run on the single bookkeeping thread."""
+        threads = set()
+
+        def spy(name):
+            original = getattr(self.brain, name)
+
+            def wrapper(*args, **kwargs):
+                threads.add(threading.current_thread().name)
+                return original(*args, **kwargs)
+            setattr(self.brain, name, wrapper)
+
+        for name in ("_prepare", "_finish", "_update_usage", "_serve_cached", "flush_usage"):
+            spy(name)
+        items = [{"query": f"summarize note {i}", "tool": tool}
+                 for i, tool in enumerate(["local-deepseek", "local-qwen", "perplexity", "claude"] * 2)]
+        results = self.brain.run_many([(item["query"], item["tool"]) for item in items])
+        self.assertFalse([r for r in results if isinstance(r, Exception)])
+        self.assertEqual(len(threads), 1)
+        self.assertTrue(next(iter(threads)).startswith("brain-bookkeeping"))
+
+        threads.clear()
+        asyncio.run(self.brain._run(self.brain.arun_batch(items[:3])))
+        self.assertEqual(len(threads), 1)
+        self.assertTrue(next(iter(threads)).startswith("brain-bookkeeping"))
+
+    def test_batch_with_failure_flushes_usage_once(self):
+        """A failing query does not stop the others' usage from being written, once, at the end."""
+        self.brain.config["models"]["local"]["deepseek"]["endpoint"] = "http://127.0.0.1:1"
+        (self.base / "queries.jsonl").write_text("\n".join(json.dumps(item) for item in [
+            {"id": "a", "query": "summarize A", "tool": "local-qwen"},
+            {"id": "b", "query": "summarize B", "tool": "local-deepseek"},  # Unreachable, no fallback
+            {"id": "c", "query": "explain C", "tool": "perplexity"},
+        ]) + "\n", encoding="utf-8")
+
+        with patch.object(self.brain.usage, "record", side_effect=AssertionError("unbuffered write")), \
+                patch.object(self.brain.usage, "record_many", wraps=self.brain.usage.record_many) as write:
+            totals = self.brain.run_batch_file(self.base / "queries.jsonl", self.base / "results.jsonl")
+
+        self.assertEqual((totals["queries"], totals["errors"]), (3, 1))
+        write.assert_called_once()
+        self.assertEqual(sorted(e["query"] for e in write.call_args.args[0]), ["explain C", "summarize A"])
+        self.assertIsNone(self.brain._usage_buffer)
+        self.assertEqual(self.brain.usage.query("SELECT COUNT(*) FROM events")[0][0], 2)
+
+        records = [json.loads(line) for line in (self.base / "results.jsonl").read_text().splitlines()]
+        self.assertEqual([r["id"] for r in records], ["a", "b", "c"])
+        self.assertIn("ConnectionError", records[1]["error"])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
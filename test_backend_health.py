@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Test suite for the backend circuit breakers
+"""
+
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from unittest import mock
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import requests
+
+from backend_health import BackendHealth, backend_for_tool, http_status, CLOSED, OPEN, HALF_OPEN
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    status = 200
+
+    def do_GET(self):
+        self.send_response(StubHandler.status)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub(status: int = 200) -> HTTPServer:
+    """Health endpoint answering with `status` (per-server, unlike StubHandler.status)."""
+    handler = type("Handler", (StubHandler,), {"do_GET": lambda self: (
+        self.send_response(status), self.end_headers())})
+    server = HTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def join_probes(health: BackendHealth) -> None:
+    for prober in list(health._probers.values()):
+        prober.join(5)
+
+
+def http_error(status: int) -> Exception:
+    """A ConnectionError wrapping raise_for_status()'s HTTPError, as the delegates raise it."""
+    response = requests.Response()
+    response.status_code = status
+    try:
+        try:
+            raise requests.HTTPError(f"{status} Error", response=response)
+        except requests.HTTPError as e:
+            raise ConnectionError(f"Claude connection failed: {e}")
+    except ConnectionError as wrapped:
+        return wrapped
+
+
+class TestBackendHealth(unittest.TestCase):
+    """Test breaker transitions and shared state."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "backend_health.json"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_backend_for_tool(self):
+        self.assertEqual(backend_for_tool("local-qwen"), "ollama")
+        self.assertEqual(backend_for_tool("comfyui-video"), "comfyui")
+        self.assertEqual(backend_for_tool("claude"), "claude")
+
+    def test_trips_after_threshold_and_half_opens(self):
+        """Consecutive failures open the circuit; after reset_seconds one request is let through."""
+        health = BackendHealth(self.path, failure_threshold=2, reset_seconds=60)
+        health.record_failure("claude", "timeout")
+        self.assertTrue(health.available("claude"))
+        health.record_failure("claude", "timeout")
+        self.assertFalse(health.available("claude"))
+
+        opened_at = health.status()["claude"]["opened_at"]
+        with mock.patch("backend_health.time.time", return_value=opened_at + 61):
+            self.assertTrue(health.available("claude"))
+        self.assertEqual(health.status()["claude"]["state"], HALF_OPEN)
+
+        # One failure while half-open re-opens immediately
+        health.record_failure("claude", "still down")
+        self.assertEqual(health.status()["claude"]["state"], OPEN)
+        health.record_success("claude")
+        self.assertEqual(health.status()["claude"]["state"], CLOSED)
+
+    def test_state_is_shared_through_file(self):
+        BackendHealth(self.path, failure_threshold=1).record_failure("perplexity", "503")
+        self.assertFalse(BackendHealth(self.path).available("perplexity"))
+
+    def test_probe_closes_and_opens(self):
+        server = HTTPServer(("127.0.0.1", 0), StubHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            url = f"http://127.0.0.1:{server.server_port}/api/tags"
+            health = BackendHealth(self.path, probes={"ollama": [url]}, probe_timeout=1)
+            self.assertTrue(health.available("local-qwen"))  # Never probed: checked in the background
+            join_probes(health)
+            self.assertGreater(health.status()["ollama"]["checked_at"], 0)
+
+            StubHandler.status = 404
+            self.assertTrue(health.probe("ollama"))  # Answered, so up
+
+            StubHandler.status = 500
+            self.assertFalse(health.probe("ollama"))
+            self.assertFalse(health.available("local-deepseek"))
+
+            StubHandler.status = 200
+            with mock.patch("backend_health.time.time",
+                            return_value=health.status()["ollama"]["opened_at"] + 3600):
+                # Still open until the background probe reports back
+                self.assertFalse(health.available("local-deepseek"))
+                join_probes(health)
+            self.assertEqual(health.status()["ollama"]["state"], CLOSED)
+            self.assertTrue(health.available("local-deepseek"))
+        finally:
+            StubHandler.status = 200
+            server.shutdown()
+            server.server_close()
+
+    def test_probe_does_not_block_routing(self):
+        """A due probe runs in the background; the check answers from cached state at once."""
+        slow = type("Slow", (StubHandler,), {"do_GET": lambda self: (
+            time.sleep(1), StubHandler.do_GET(self))})
+        server = HTTPServer(("127.0.0.1", 0), slow)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            url = f"http://127.0.0.1:{server.server_port}/system_stats"
+            health = BackendHealth(self.path, probes={"comfyui": [url]}, probe_timeout=3)
+            start = time.monotonic()
+            for _ in range(3):
+                self.assertTrue(health.available("comfyui"))
+            self.assertLess(time.monotonic() - start, 0.5)
+            self.assertEqual(len(health._probers), 1)  # One probe, not one per check
+            join_probes(health)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_half_open_admits_one_trial(self):
+        """Without a probe, a half-open backend lets one request through until it reports back."""
+        health = BackendHealth(self.path, failure_threshold=1, reset_seconds=60)
+        health.record_failure("claude", "timeout")
+        later = health.status()["claude"]["opened_at"] + 61
+        with mock.patch("backend_health.time.time", return_value=later):
+            self.assertTrue(health.available("claude"))
+            self.assertTrue(health.admit("claude"))
+            self.assertFalse(health.admit("claude"))
+            self.assertFalse(health.available("claude"))  # Routed to the fallback meanwhile
+            self.assertFalse(BackendHealth(self.path).admit("claude"))  # Other processes too
+
+        # A trial that never reports back stops blocking after reset_seconds
+        with mock.patch("backend_health.time.time", return_value=later + 61):
+            self.assertTrue(health.admit("claude"))
+        health.record_success("claude")
+        self.assertTrue(health.admit("claude") and health.admit("claude"))
+
+    def test_state_cached_in_memory(self):
+        """Checks read the file once; another process's write is picked up on the next check."""
+        health = BackendHealth(self.path, failure_threshold=1)
+        health.record_failure("claude", "timeout")
+        with mock.patch.object(BackendHealth, "_load", side_effect=AssertionError("re-read")):
+            for _ in range(5):
+                self.assertFalse(health.available("claude"))
+            self.assertTrue(health.available("perplexity"))
+
+        BackendHealth(self.path).record_success("claude")
+        self.assertTrue(health.available("claude"))
+
+    def test_only_outages_count(self):
+        """4xx errors leave the circuit closed; 5xx and connection errors count."""
+        self.assertEqual(http_status(http_error(429)), 429)
+        self.assertIsNone(http_status(ConnectionError("Claude stream error: Overloaded")))
+
+        health = BackendHealth(self.path, failure_threshold=2)
+        for _ in range(3):
+            health.record_error("claude", http_error(400))
+        self.assertEqual(health.status()["claude"]["failures"], 0)
+
+        health.record_error("claude", http_error(503))
+        health.record_error("claude", ConnectionError("Claude connection failed: Read timed out"))
+        self.assertEqual(health.status()["claude"]["state"], OPEN)
+
+        # A 4xx while half-open shows the backend is back
+        with mock.patch("backend_health.time.time",
+                        return_value=health.status()["claude"]["opened_at"] + 3600):
+            self.assertTrue(health.available("claude"))
+        health.record_error("claude", http_error(401))
+        self.assertEqual(health.status()["claude"]["state"], CLOSED)
+
+    def test_probes_every_comfyui_node(self):
+        """Each enabled node is probed; the circuit opens only when none answers."""
+        up, down = start_stub(200), start_stub(503)
+        try:
+            tools_config = {"comfyui": {"enabled": True, "nodes": [
+                {"name": "a", "endpoint": f"http://127.0.0.1:{down.server_port}/"},
+                {"name": "b", "endpoint": f"http://127.0.0.1:{up.server_port}"},
+                {"name": "c", "endpoint": "", "enabled": False},
+            ]}}
+            config = {"health": {"enabled": True, "probe_timeout": 1},
+                      "models": {"local": {"deepseek": {"endpoint": "http://127.0.0.1:1"}}}}
+            health = BackendHealth.from_config(config, tools_config, self.path)
+            self.assertEqual(health.probes["comfyui"], [
+                f"http://127.0.0.1:{down.server_port}/system_stats",
+                f"http://127.0.0.1:{up.server_port}/system_stats"])
+
+            self.assertTrue(health.probe("comfyui"))
+            self.assertIn(str(down.server_port), health.status()["comfyui"]["last_error"])
+
+            health.probes["comfyui"] = health.probes["comfyui"][:1]
+            self.assertFalse(health.probe("comfyui"))
+            self.assertFalse(health.available("comfyui-video"))
+        finally:
+            for server in (up, down):
+                server.shutdown()
+                server.server_close()
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Test suite for the brain daemon and its client
+"""
+
+import json
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from brain_daemon import BrainDaemon, DaemonClient, DaemonUnavailable
+
+
+class FakeUsage:
+    def __init__(self):
+        self.exported = 0
+
+    def export_usage_log(self):
+        self.exported += 1
+
+
+class FakeBrain:
+    """The parts of AutomationBrain the daemon uses, recording bookkeeping threads."""
+
+    def __init__(self):
+        self.config = {}
+        self.usage = FakeUsage()
+        self.threads = set()
+        self.prepare_threads = set()
+        self.overlap = threading.Barrier(2, timeout=5)
+
+    def _prepare(self, query, force_tool=None):
+        self.prepare_threads.add(threading.get_ident())
+        if query.startswith("slow"):
+            self.overlap.wait()  # Breaks unless two _prepare calls run at once
+        if query == "unreachable":
+            raise ConnectionError("Cannot connect to Ollama")
+        return {"query": query, "tool": force_tool or "local-qwen"}
+
+    def _finish(self, ctx, result):
+        self.threads.add(threading.get_ident())
+        self._update_usage(result, ctx)
+
+    def _update_usage(self, result, ctx):
+        self.threads.add(threading.get_ident())
+
+    def _serve_cached(self, ctx):
+        return ctx
+
+    def process_stream(self, query, force_tool=None, latency_critical=False):
+        ctx = self._prepare(query, force_tool)
+        for word in query.split():
+            yield word + " "
+        result = {"response": query + " ", "tool": ctx["tool"], "cost": 0.0}
+        self._finish(ctx, result)
+        return result
+
+
+class TestBrainDaemon(unittest.TestCase):
+    """Test forwarding, error mapping and discovery."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "daemon.json"
+        self.brain = FakeBrain()
+        self.daemon = BrainDaemon(self.brain, port=0, path=self.path)
+        self.thread = threading.Thread(target=self.daemon.serve_forever, daemon=True)
+        self.thread.start()
+        while not self.path.exists():
+            pass
+        self.client = DaemonClient.discover(self.path)
+
+    def tearDown(self):
+        self.daemon.shutdown()
+        self.thread.join(5)
+        self.tmp.cleanup()
+
+    def test_stream_and_result(self):
+        stream = self.client.process_stream("render a candle", "comfyui")
+        tokens = []
+        while True:
+            try:
+                tokens.append(next(stream))
+            except StopIteration as stop:
+                result = stop.value
+                break
+        self.assertEqual(tokens, ["render ", "a ", "candle "])
+        self.assertEqual(result["tool"], "comfyui")
+        self.assertEqual(self.client.process("hello")["response"], "hello ")
+        self.assertEqual(self.client.health()["served"], 2)
+
+    def test_bookkeeping_runs_on_one_thread(self):
+        def query(i):
+            self.client.process(f"query {i}")
+
+        threads = [threading.Thread(target=query, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(self.brain.threads), 1)
+        self.assertNotIn(threading.get_ident(), self.brain.threads)
+
+    def test_prepare_runs_on_request_threads(self):
+        """Routing and KB search are not queued behind the bookkeeping thread."""
+        results = []
+        threads = [threading.Thread(target=lambda i=i: results.append(self.client.process(f"slow {i}")))
+                   for i in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(results), 2)
+        self.assertFalse(self.brain.overlap.broken)
+        self.assertEqual(len(self.brain.prepare_threads), 2)
+        self.assertTrue(self.brain.prepare_threads.isdisjoint(self.brain.threads))
+
+    def test_errors_keep_their_type(self):
+        with self.assertRaises(ConnectionError) as raised:
+            self.client.process("unreachable")
+        self.assertNotIsInstance(raised.exception, DaemonUnavailable)
+
+    def test_bad_auth_is_rejected(self):
+        client = DaemonClient(self.client.host, self.client.port, "wrong")
+        with self.assertRaises(RuntimeError):
+            client.health()
+
+    def test_shutdown_removes_discovery_file(self):
+        self.client.shutdown()
+        self.thread.join(5)
+        self.assertFalse(self.path.exists())
+        self.assertEqual(self.brain.usage.exported, 1)
+
+        # A stale file points at a closed port: the CLI falls back to in-process
+        self.path.write_text(json.dumps({"port": self.client.port, "auth": "x"}))
+        with self.assertRaises(DaemonUnavailable):
+            DaemonClient.discover(self.path).health()
+
+
+class TestCliForwarding(unittest.TestCase):
+    """Test which CLI queries go to the daemon."""
+
+    def test_verbose_runs_in_process(self):
+        """-v output comes from the routing process, so it is not forwarded."""
+        import automation_brain
+        with patch.object(DaemonClient, "discover", side_effect=AssertionError("forwarded")), \
+                patch.object(automation_brain, "AutomationBrain") as brain, \
+                patch.object(sys, "argv", ["automation_brain.py", "-v", "hello"]), \
+                patch("builtins.print"):
+            brain.return_value.process_stream.return_value = iter(["hi"])
+            automation_brain.main()
+        brain.assert_called_once_with(verbose=True)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Test suite for the shared ComfyUI client
+"""
+
+import base64
+import hashlib
+import json
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import comfyui_client
+from comfyui_client import (ComfyUIClient, ComfyUIConnectionError, ComfyUIExecutionError,
+                            ComfyUIPromptError, ComfyUITimeout, output_files)
+
+import requests
+
+WS_MAGIC = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+VIEW_BODY = bytes(range(256)) * 12_000  # ~3MB: several download chunks
+
+DONE = {"status": {"status_str": "success", "completed": True, "messages": []},
+        "outputs": {"9": {"images": [{"filename": "a.png", "subfolder": "", "type": "output"}]},
+                    "12": {"gifs": [{"filename": "b.mp4", "subfolder": "", "type": "output"}]}}}
+
+FAILED = {"status": {"status_str": "error", "completed": False,
+                     "messages": [["execution_error", {"node_type": "KSampler",
+                                                       "exception_message": "CUDA out of memory"}]]},
+          "outputs": {}}
+
+
+class StubComfyUI(BaseHTTPRequestHandler):
+    """
+    /history answers {} until the job is ready; /ws speaks just enough
+    websocket; /prompt, /upload/image and /view behave like ComfyUI's
+    (/view honours Range and can drop the connection part way through).
+    """
+
+    ready_at = 0.0
+    entry = DONE
+    events = []  # Sent on /ws once the handshake is done
+    history_calls = 0
+    uploads = 0
+    views = []  # Range header of each /view request
+    view_delay = 0.0
+    drop_after = 0  # Bytes the next /view sends before dropping the connection
+    full_length = True  # Content-Length on whole-file /view responses
+    range_total = True  # Total size in Content-Range (else "*")
+
+    def _send(self, body, status: int = 200):
+        body = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.startswith("/ws"):
+            self._websocket()
+        elif self.path.startswith("/view"):
+            self._view()
+        elif self.path.startswith("/history/"):
+            StubComfyUI.history_calls += 1
+            prompt_id = self.path.rsplit("/", 1)[-1]
+            ready = time.monotonic() >= StubComfyUI.ready_at
+            self._send({prompt_id: StubComfyUI.entry} if ready else {})
+        else:
+            self._send({"error": "not found"}, 404)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if self.path == "/upload/image":
+            StubComfyUI.uploads += 1
+            name = body.split(b'filename="', 1)[1].split(b'"', 1)[0].decode()
+            self._send({"name": name, "subfolder": "", "type": "input"})
+        elif json.loads(body)["prompt"].get("bad"):
+            self._send({"error": {"type": "prompt_outputs_failed_validation",
+                                  "message": "Prompt outputs failed validation"},
+                        "node_errors": {"4": {"errors": ["ckpt_name not in list"]}}}, 400)
+        else:
+            self._send({"prompt_id": "p1", "number": 0, "node_errors": {}})
+
+    def _view(self):
+        StubComfyUI.views.append(self.headers.get("Range"))
+        drop_after, StubComfyUI.drop_after = StubComfyUI.drop_after, 0
+        time.sleep(StubComfyUI.view_delay)
+        ranged = self.headers.get("Range")
+        start, end = (ranged.split("=")[1].split("-") if ranged else ("0", ""))
+        start, end = int(start), int(end) if end else len(VIEW_BODY) - 1
+        body = VIEW_BODY[start:end + 1]
+        self.send_response(206 if ranged else 200)
+        if ranged:
+            total = len(VIEW_BODY) if StubComfyUI.range_total else "*"
+            self.send_header("Content-Range", f"bytes {start}-{end}/{total}")
+        if ranged or StubComfyUI.full_length:
+            self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", '"v1"')
+        self.end_headers()
+        self.wfile.write(body[:drop_after] if drop_after else body)
+
+    def _websocket(self):
+        accept = base64.b64encode(hashlib.sha1(
+            (self.headers["Sec-WebSocket-Key"] + WS_MAGIC).encode()).digest()).decode()
+        self.send_response(101)
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept)
+        self.end_headers()
+        self.wfile.write(b"\x82\x03png")  # A binary preview frame, ignored
+        for delay, event in StubComfyUI.events:
+            time.sleep(delay)
+            payload = json.dumps(event).encode()
+            self.wfile.write(bytes([0x81, len(payload)]) + payload if len(payload) < 126
+                             else bytes([0x81, 126]) + len(payload).to_bytes(2, "big") + payload)
+            self.wfile.flush()
+        try:
+            self.connection.settimeout(5)
+            self.connection.recv(64)  # Until the client closes
+        except (socket.timeout, OSError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+class TestComfyUIClient(unittest.TestCase):
+    """Test event-driven completion and the polling fallback."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StubComfyUI)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.endpoint = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        StubComfyUI.ready_at = 0.0
+        StubComfyUI.entry = DONE
+        StubComfyUI.events = []
+        StubComfyUI.history_calls = 0
+        StubComfyUI.uploads = 0
+        StubComfyUI.views = []
+        StubComfyUI.view_delay = 0.0
+        StubComfyUI.drop_after = 0
+        StubComfyUI.full_length = StubComfyUI.range_total = True
+        self.tmp = tempfile.TemporaryDirectory()
+        self.uploads_path = Path(self.tmp.name) / "comfyui_uploads.json"
+        self.client = ComfyUIClient(self.endpoint, requests.Session(),
+                                    uploads_path=self.uploads_path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_output_files(self):
+        self.assertEqual([f["filename"] for f in output_files(DONE)], ["a.png", "b.mp4"])
+        self.assertEqual([f["filename"] for f in output_files(DONE, ("images",))], ["a.png"])
+
+    def test_submit_and_structured_errors(self):
+        self.assertEqual(self.client.submit({"3": {}}), "p1")
+        with self.assertRaises(ComfyUIPromptError) as raised:
+            self.client.submit({"bad": True})
+        self.assertIn("4", raised.exception.details["node_errors"])
+        with self.assertRaises(ComfyUIConnectionError):
+            ComfyUIClient("http://127.0.0.1:1", requests.Session()).submit({"3": {}})
+
+    def test_upload_deduplicated_by_content(self):
+        photo = Path(self.tmp.name) / "avatar.png"
+        photo.write_bytes(b"face")
+        self.assertEqual(self.client.upload(photo)["name"], "avatar.png")
+        self.client.upload(photo)
+        ComfyUIClient(self.endpoint, requests.Session(), uploads_path=self.uploads_path).upload(photo)
+        self.assertEqual(StubComfyUI.uploads, 1)
+
+        photo.write_bytes(b"another face")
+        self.client.upload(photo)
+        self.client.upload(photo, force=True)
+        self.assertEqual(StubComfyUI.uploads, 3)
+
+    def test_download_outputs_streams_to_disk(self):
+        saved = self.client.download_outputs(DONE, self.tmp.name, ("gifs",), prefix="run_")
+        self.assertEqual([p.name for p in saved], ["run_b.mp4"])
+        self.assertEqual(saved[0].read_bytes(), VIEW_BODY)
+
+    def test_download_resumes_after_dropped_connection(self):
+        StubComfyUI.drop_after = 1_500_000
+        path = self.client.download({"filename": "b.mp4"}, self.tmp.name)
+        self.assertEqual(path.read_bytes(), VIEW_BODY)
+        # Resumed after the last whole chunk written
+        self.assertEqual(StubComfyUI.views, [None, f"bytes={comfyui_client.CHUNK_SIZE}-"])
+        self.assertFalse(path.with_name("b.mp4.part").exists())
+
+        # A .part left by an interrupted run is picked up too
+        Path(self.tmp.name, "c.mp4.part").write_bytes(VIEW_BODY[:5000])
+        path = self.client.download({"filename": "c.mp4"}, self.tmp.name)
+        self.assertEqual(path.read_bytes(), VIEW_BODY)
+        self.assertEqual(StubComfyUI.views[-1], "bytes=5000-")
+
+    def test_download_without_length_is_verified(self):
+        """A body with no Content-Length is checked against the size from a Range request."""
+        StubComfyUI.full_length = False
+        path = self.client.download({"filename": "d.mp4"}, self.tmp.name)
+        self.assertEqual(path.read_bytes(), VIEW_BODY)
+        self.assertEqual(StubComfyUI.views, [None, "bytes=0-0"])
+
+        # Cut short: the size check catches it and the rest is resumed
+        StubComfyUI.views, StubComfyUI.drop_after = [], 1_500_000
+        path = self.client.download({"filename": "e.mp4"}, self.tmp.name)
+        self.assertEqual(path.read_bytes(), VIEW_BODY)
+        self.assertEqual(StubComfyUI.views, [None, "bytes=0-0", "bytes=1500000-"])
+
+        # No size to check against: kept as .part rather than trusted
+        StubComfyUI.range_total = False
+        with self.assertRaises(ComfyUIConnectionError):
+            self.client.download({"filename": "f.mp4"}, self.tmp.name)
+        self.assertFalse(Path(self.tmp.name, "f.mp4").exists())
+        self.assertEqual(Path(self.tmp.name, "f.mp4.part").read_bytes(), VIEW_BODY)
+
+    def test_upload_locks_are_bounded(self):
+        """Per-name upload locks come from a fixed pool, however many names are uploaded."""
+        for i in range(3):
+            photo = Path(self.tmp.name) / f"frame{i}.png"
+            photo.write_bytes(b"png" * (i + 1))
+            self.client.upload(photo)
+        self.assertEqual(len(comfyui_client._upload_name_locks), comfyui_client.UPLOAD_LOCK_STRIPES)
+
+    def test_download_outputs_in_parallel(self):
+        entry = {"outputs": {"9": {"images": [{"filename": f"{i}.png", "type": "output"}
+                                              for i in range(4)]}}}
+        StubComfyUI.view_delay = 0.3
+        start = time.monotonic()
+        saved = self.client.download_outputs(entry, self.tmp.name)
+        self.assertEqual([p.name for p in saved], ["0.png", "1.png", "2.png", "3.png"])
+        self.assertLess(time.monotonic() - start, 1.0)  # 1.2s one after another
+
+    def test_poll_backs_off(self):
+        StubComfyUI.ready_at = time.monotonic() + 1.0
+        with mock.patch.object(comfyui_client, "websocket", None):
+            start = time.monotonic()
+            entry = self.client.wait("p1", timeout=10, poll_max=2)
+        self.assertEqual(entry, DONE)
+        self.assertEqual(self.client.last_wait_mode, "poll")
+        self.assertLess(time.monotonic() - start, 2.5)
+        # 0.25s growing by 1.5x: a handful of requests, not one every 0.25s
+        self.assertLessEqual(StubComfyUI.history_calls, 5)
+
+    def test_failed_prompt_raises(self):
+        StubComfyUI.entry = FAILED
+        with mock.patch.object(comfyui_client, "websocket", None):
+            with self.assertRaises(ComfyUIExecutionError) as raised:
+                self.client.wait("p2", timeout=5)
+        self.assertIn("CUDA out of memory", str(raised.exception))
+
+    def test_timeout(self):
+        StubComfyUI.ready_at = time.monotonic() + 60
+        with mock.patch.object(comfyui_client, "websocket", None):
+            with self.assertRaises(ComfyUITimeout):
+                self.client.wait("p3", timeout=0.5)
+
+    @unittest.skipIf(comfyui_client.websocket is None, "websocket-client not installed")
+    def test_websocket_completion(self):
+        StubComfyUI.ready_at = time.monotonic() + 0.6
+        StubComfyUI.events = [
+            (0.1, {"type": "executing", "data": {"node": "3", "prompt_id": "other"}}),
+            (0.1, {"type": "progress", "data": {"value": 1, "max": 2, "prompt_id": "p4"}}),
+            (0.4, {"type": "executing", "data": {"node": None, "prompt_id": "p4"}}),
+        ]
+        progress = []
+        entry = self.client.wait("p4", timeout=10, on_progress=progress.append)
+        self.assertEqual(entry, DONE)
+        self.assertEqual(self.client.last_wait_mode, "websocket")
+        self.assertEqual([e["type"] for e in progress], ["progress"])
+        # One check on connect, then history only once execution has finished
+        self.assertLessEqual(StubComfyUI.history_calls, 4)
+
+    @unittest.skipIf(comfyui_client.websocket is None, "websocket-client not installed")
+    def test_websocket_error_event(self):
+        StubComfyUI.ready_at = time.monotonic() + 60
+        StubComfyUI.events = [(0.1, {"type": "execution_error", "data": {
+            "prompt_id": "p5", "node_type": "VAEDecode", "exception_message": "bad latent"}})]
+        with self.assertRaises(ComfyUIExecutionError) as raised:
+            self.client.wait("p5", timeout=5)
+        self.assertIn("VAEDecode", str(raised.exception))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
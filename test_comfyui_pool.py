@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Test suite for the multi-node ComfyUI pool
+"""
+
+import json
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import requests
+
+from bench_brain import StubBackends
+from comfyui_client import ComfyUIConnectionError, ComfyUIPromptError
+from comfyui_pool import ComfyUIPool, required_models
+from comfyui_scheduler import ComfyUIScheduler
+
+SDXL = {"4": {"class_type": "CheckpointLoaderSimple",
+              "inputs": {"ckpt_name": "sdxl\\sdxl_base_1.0.safetensors"}},
+        "10": {"class_type": "LoadImage", "inputs": {"image": "photo.png"}},
+        "3": {"class_type": "KSampler", "inputs": {"seed": 1, "model": ["4", 0]}}}
+
+
+class TestComfyUIPool(unittest.TestCase):
+    """Test capability matching and least-loaded dispatch across stub nodes."""
+
+    def setUp(self):
+        self.stubs = [StubBackends(render_ms=200).start() for _ in range(3)]
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        nodes = [
+            {"name": "a", "endpoint": self.stubs[0].url, "workflows": ["sdxl_basic"]},
+            {"name": "b", "endpoint": self.stubs[1].url,
+             "models": ["sdxl_base_1.0.safetensors", "wan2.1_i2v.safetensors"]},
+            {"name": "c", "endpoint": self.stubs[2].url, "models": ["wan2.1_i2v.safetensors"]},
+            {"name": "off", "endpoint": "http://127.0.0.1:1", "enabled": False},
+        ]
+        self.pool = ComfyUIPool(nodes, requests.Session(), uploads_path=self.dir / "uploads.json")
+
+    def tearDown(self):
+        for stub in self.stubs:
+            stub.stop()
+        self.tmp.cleanup()
+
+    def test_required_models(self):
+        self.assertEqual(required_models(SDXL), {"sdxl_base_1.0.safetensors"})
+        self.assertEqual(len(self.pool.nodes), 3)
+
+    def test_select_least_loaded_capable_node(self):
+        # a and b can run SDXL; a is busier
+        self.pool.client(self.stubs[0].url).submit({"1": {}})
+        self.pool.client(self.stubs[0].url).submit({"2": {}})
+        node = self.pool.select(SDXL)
+        self.assertEqual((node["name"], node["load"]), ("b", 0))
+        self.assertEqual(self.pool.select(SDXL, reserved={self.stubs[1].url: 3})["name"], "a")
+        self.assertIsNone(self.pool.select(SDXL, queue_depth=2, reserved={self.stubs[1].url: 2}))
+
+        # a lists its workflows, without fantasytalking; b and c list none
+        self.assertEqual(self.pool.select(workflow_name="fantasytalking")["name"], "b")
+        with self.assertRaises(ComfyUIPromptError):
+            self.pool.select({"5": {"inputs": {"unet_name": "flux1-dev.gguf"}}}, "flux_dev")
+
+        # Nodes that do not answer are skipped
+        down = {"name": "down", "endpoint": "http://127.0.0.1:1"}
+        pool = ComfyUIPool([down, {"name": "b", "endpoint": self.stubs[1].url}], requests.Session())
+        self.assertEqual(pool.select(SDXL)["name"], "b")
+        with self.assertRaises(ComfyUIConnectionError):
+            ComfyUIPool([down, {"endpoint": "http://127.0.0.1:2"}], requests.Session()).select(SDXL)
+
+    def test_scheduler_spreads_jobs_across_nodes(self):
+        photo = self.dir / "photo.png"
+        photo.write_bytes(b"face")
+        scheduler = ComfyUIScheduler(self.pool, queue_depth=2, state_path=self.dir / "schedule.json")
+        for i in range(6):
+            scheduler.add(f"job{i}", lambda: SDXL, self.dir / "out", prefix=f"job{i}_",
+                          inputs=(photo,), workflow_name="sdxl_basic")
+        results = scheduler.run()
+        self.assertTrue(all(r["status"] == "done" for r in results.values()))
+
+        a, b, c = self.stubs
+        self.assertEqual(len(c._jobs), 0)  # Lacks the SDXL checkpoint
+        self.assertGreater(len(a._jobs), 0)
+        self.assertGreater(len(b._jobs), 0)
+        self.assertEqual(len(a._jobs) + len(b._jobs), 6)
+        for stub in (a, b):
+            self.assertLessEqual(stub.max_queued, 2)
+            # Inputs went to, and outputs came from, the node that ran each job
+            self.assertEqual(stub.requests["/upload/image"], 1)
+            self.assertEqual(stub.requests["/view"], len(stub._jobs))
+
+        state = json.loads((self.dir / "schedule.json").read_text())
+        for name, record in state["jobs"].items():
+            stub = a if record["endpoint"] == a.url else b
+            self.assertIn(record["prompt_id"], stub._jobs)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
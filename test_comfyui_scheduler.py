@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Test suite for the ComfyUI job scheduler
+"""
+
+import json
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import requests
+
+import comfyui_scheduler
+from bench_brain import StubBackends
+from comfyui_pool import ComfyUIPool
+from comfyui_scheduler import ComfyUIScheduler
+
+RENDER_MS = 200
+PREPARE_S = 0.15
+
+
+class TestComfyUIScheduler(unittest.TestCase):
+    """Test pipelining, GPU-aware queue depth and resume against a one-GPU stub."""
+
+    def setUp(self):
+        self.stub = StubBackends(render_ms=RENDER_MS).start()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.state_path = self.dir / "schedule.json"
+        self.pool = ComfyUIPool([{"name": "stub", "endpoint": self.stub.url}], requests.Session(),
+                                uploads_path=self.dir / "uploads.json")
+
+    def tearDown(self):
+        self.stub.stop()
+        self.tmp.cleanup()
+
+    def scheduler(self, n_jobs: int, prepare=None) -> ComfyUIScheduler:
+        def default_prepare(i):
+            time.sleep(PREPARE_S)  # Upload + prompt writing
+            return {"3": {"inputs": {"seed": i}}}
+
+        scheduler = ComfyUIScheduler(self.pool, queue_depth=2, state_path=self.state_path)
+        for i in range(n_jobs):
+            scheduler.add(f"job{i}", lambda i=i: (prepare or default_prepare)(i),
+                          self.dir / "out", prefix=f"job{i}_")
+        return scheduler
+
+    def test_keeps_gpu_busy(self):
+        completed = []
+        results = self.scheduler(4).run(on_complete=lambda r: completed.append(r["name"]))
+        self.assertEqual(sorted(completed), ["job0", "job1", "job2", "job3"])
+        for result in results.values():
+            self.assertEqual(result["status"], "done")
+            self.assertTrue(Path(result["outputs"][0]).exists())
+        # Serially the GPU would idle for every prepare; pipelined only for the first
+        self.assertLess(self.stub.gpu_idle_s(), PREPARE_S)
+        self.assertLessEqual(self.stub.max_queued, 2)
+
+        state = json.loads(self.state_path.read_text())
+        self.assertEqual({r["status"] for r in state["jobs"].values()}, {"done"})
+
+    def test_failed_prepare_does_not_stop_the_batch(self):
+        def prepare(i):
+            if i == 1:
+                raise FileNotFoundError("workflow missing")
+            return None if i == 2 else {"3": {}}
+
+        results = self.scheduler(4, prepare).run()
+        self.assertEqual([results[f"job{i}"]["status"] for i in range(4)],
+                         ["done", "failed", "failed", "done"])
+        self.assertIn("workflow missing", results["job1"]["error"])
+
+    def test_failed_download_fails_the_job(self):
+        self.stub.view_status = 500
+        results = self.scheduler(1).run()
+        self.assertEqual(results["job0"]["status"], "failed")
+        self.assertIn("HTTP 500", results["job0"]["error"])
+
+        # Not skipped as done on the next run
+        self.stub.view_status = 200
+        results = self.scheduler(1).run()
+        self.assertEqual(results["job0"]["status"], "done")
+        self.assertEqual(len(results["job0"]["outputs"]), 1)
+
+    def test_waits_for_room_on_a_busy_server(self):
+        # Another client already has two prompts on the GPU
+        other = self.pool.client()
+        other.submit({"1": {}})
+        other.submit({"2": {}})
+        with mock.patch.object(comfyui_scheduler, "QUEUE_RECHECK", 0.05):
+            results = self.scheduler(2, prepare=lambda i: {"3": {}}).run()
+        self.assertTrue(all(r["status"] == "done" for r in results.values()))
+        self.assertLessEqual(self.stub.max_queued, 2)
+
+    def test_resume_skips_done_and_waits_on_queued(self):
+        self.scheduler(1).run()
+        # Interrupted run: job1 was submitted but never collected
+        client = self.pool.client()
+        prompt_id = client.submit({"3": {}})
+        state = json.loads(self.state_path.read_text())
+        state["jobs"]["job1"] = {"status": "queued", "prompt_id": prompt_id,
+                                 "client_id": client.client_id}
+        self.state_path.write_text(json.dumps(state))
+        submitted = self.stub.requests["/prompt"]
+
+        results = self.scheduler(3).run()
+        self.assertTrue(all(r["status"] == "done" for r in results.values()))
+        self.assertEqual(results["job1"]["prompt_id"], prompt_id)
+        # Only job2 is new
+        self.assertEqual(self.stub.requests["/prompt"], submitted + 1)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Test suite for token-budgeted KB context assembly
+"""
+
+import sys
+import unittest
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from context_budget import HEADER, MIN_BUDGET, assemble, dedupe, estimate_tokens
+
+
+def hit(file, score, *lines, start=1):
+    return {"file": file, "score": score, "snippet": "\n".join(lines),
+            "line_start": start, "line_end": start + len(lines) - 1}
+
+
+class TestEstimateTokens(unittest.TestCase):
+    """Test the local token estimate."""
+
+    def test_english_is_about_one_token_per_word(self):
+        text = "Route simple lookups to the local model and keep Claude for novel work."
+        self.assertTrue(13 <= estimate_tokens(text) <= 18)
+
+    def test_long_words_digits_and_symbols(self):
+        self.assertEqual(estimate_tokens("internationalization"), 3)
+        self.assertEqual(estimate_tokens("20260101"), 3)
+        self.assertEqual(estimate_tokens("a->b"), 4)
+        self.assertEqual(estimate_tokens(""), 0)
+
+
+class TestAssemble(unittest.TestCase):
+    """Test ordering, deduplication and budgeting."""
+
+    def test_orders_by_score(self):
+        hits = [hit("low.md", 1.0, "Low scoring line about routing"),
+                hit("high.md", 5.0, "High scoring line about routing")]
+        text, _ = assemble(hits, 200)
+        self.assertLess(text.index("high.md"), text.index("low.md"))
+
+    def test_overlapping_snippets_are_deduplicated(self):
+        hits = [hit("a.md", 3.0, "ComfyUI runs on port 8188 by default", "Queue jobs with /prompt", start=10),
+                hit("a.md", 2.0, "Queue jobs with /prompt", "Poll /history for outputs", start=11),
+                hit("copy.md", 1.0, "ComfyUI runs on port 8188 by default")]
+        kept = dedupe(hits)
+        self.assertEqual([h["file"] for h, _ in kept], ["a.md", "a.md"])
+        self.assertEqual(kept[1][1], ["Poll /history for outputs"])
+
+    def test_respects_budget(self):
+        hits = [hit(f"note{i}.md", 10 - i, *[f"Line {j} of note {i} about model routing costs" for j in range(6)])
+                for i in range(5)]
+        for budget in (40, 80, 300):
+            text, tokens = assemble(hits, budget)
+            self.assertLessEqual(tokens, budget)
+            self.assertEqual(tokens, estimate_tokens(text))
+        self.assertGreater(len(assemble(hits, 300)[0]), len(assemble(hits, 80)[0]))
+
+    def test_partial_last_snippet_on_line_boundary(self):
+        hits = [hit("a.md", 2.0, "First snippet line about routing"),
+                hit("b.md", 1.0, *[f"Second snippet line {i} about hedging" for i in range(10)])]
+        text, _ = assemble(hits, 60)
+        self.assertIn("b.md", text)
+        self.assertIn("Second snippet line 0 about hedging\n", text)
+        self.assertNotIn("line 9", text)
+
+    def test_partial_snippet_labels_lines_taken(self):
+        lines = [f"Second snippet line {i} about hedging" for i in range(10)]
+        partial = dict(hit("b.md", 1.0, *lines), line_nos=[20 + 2 * i for i in range(10)],
+                       line_start=20, line_end=38)
+        text, _ = assemble([hit("a.md", 2.0, "First snippet line about routing"), partial], 60)
+        taken = text.split("b.md", 1)[1].count("Second snippet line")
+        self.assertTrue(0 < taken < 10)
+        self.assertIn(f"b.md (lines 20-{20 + 2 * (taken - 1)}):", text)
+
+    def test_nothing_fits_or_zero_budget(self):
+        hits = [hit("a.md", 1.0, "Some context line about the knowledge base")]
+        self.assertEqual(assemble(hits, 0), ("", 0))
+        self.assertEqual(assemble(hits, estimate_tokens(HEADER) + 2), ("", 0))
+        self.assertEqual(assemble(hits, MIN_BUDGET - 1), ("", 0))
+        self.assertEqual(assemble([], 500), ("", 0))
+
+    def test_min_score_ratio(self):
+        hits = [hit("strong.md", 10.0, "Strong match about routing"),
+                hit("weak.md", 1.0, "Weak match about something else")]
+        text, _ = assemble(hits, 500, min_score_ratio=0.3)
+        self.assertNotIn("weak.md", text)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Test suite for hedged requests against stub backends
+"""
+
+import os
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import yaml
+
+import automation_brain
+from bench_brain import _ORIGINAL_PATHS, StubBackends, build_sandbox, point_brain_at
+
+
+class TestHedging(unittest.TestCase):
+    """Test winner selection, loser cancellation and loser usage accounting."""
+
+    def setUp(self):
+        os.environ.setdefault("ANTHROPIC_API_KEY", "test")
+        os.environ.setdefault("PERPLEXITY_API_KEY", "test")
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = Path(self.tmp.name)
+        (self.base / "knowledge-base" / "research").mkdir(parents=True)
+        self.stubs = []
+
+    def tearDown(self):
+        for stub in self.stubs:
+            stub.stop()
+        point_brain_at(_ORIGINAL_PATHS["BASE_DIR"], _ORIGINAL_PATHS["KNOWLEDGE_BASE_PATH"])
+        self.tmp.cleanup()
+
+    def brain(self, claude: StubBackends, local: StubBackends, loser_wait: float = 5.0):
+        """Brain whose Claude and Ollama endpoints are separate stubs."""
+        self.stubs += [claude, local]
+        build_sandbox(self.base, local.url)
+        config_path = self.base / "config.yaml"
+        config = yaml.safe_load(config_path.read_text(encoding="utf-8"))
+        config["models"]["cloud"]["claude"]["endpoint"] = f"{claude.url}/v1/messages"
+        config["routing"]["hedging"]["loser_wait_seconds"] = loser_wait
+        config_path.write_text(yaml.safe_dump(config), encoding="utf-8")
+        point_brain_at(self.base, self.base / "knowledge-base")
+        return automation_brain.AutomationBrain()
+
+    @staticmethod
+    def events(brain) -> list[tuple]:
+        return brain.usage.query("SELECT tool, routed_by, fell_back FROM events ORDER BY id")
+
+    def test_first_to_answer_wins(self):
+        """The routed tool answering first is served and the fallback logged as the loser."""
+        brain = self.brain(StubBackends(latency_ms=20, jitter_ms=0).start(),
+                           StubBackends(latency_ms=20, jitter_ms=0, chunk_ms=200).start())
+        answer = brain.process("explain hedged requests", "claude", latency_critical=True)
+        self.assertTrue(answer.startswith("tok0 "))
+        self.assertEqual(self.events(brain), [("local-ollama", "hedge", 0), ("claude", "forced", 0)])
+
+    def test_loser_cancelled_and_recorded_before_return(self):
+        """A loser blocked between chunks is interrupted and logged exactly once, before process() returns."""
+        brain = self.brain(StubBackends(latency_ms=100, jitter_ms=0, chunk_ms=3000).start(),
+                           StubBackends(latency_ms=20, jitter_ms=0).start())
+        start = time.perf_counter()
+        brain.process("explain hedged requests", "claude", latency_critical=True)
+        self.assertLess(time.perf_counter() - start, 2.0)  # Did not wait for the next chunk
+        self.assertEqual(self.events(brain), [("claude", "hedge", 0), ("local-ollama", "forced", 1)])
+
+        time.sleep(0.5)  # Nothing more arrives from the loser's thread
+        self.assertEqual(len(self.events(brain)), 2)
+
+    def test_slow_loser_records_itself_once(self):
+        """A loser outliving loser_wait_seconds still logs its usage, once."""
+        brain = self.brain(StubBackends(latency_ms=1000, jitter_ms=0).start(),
+                           StubBackends(latency_ms=20, jitter_ms=0).start(), loser_wait=0.1)
+        start = time.perf_counter()
+        brain.process("explain hedged requests", "claude", latency_critical=True)
+        self.assertLess(time.perf_counter() - start, 0.8)
+        self.assertEqual(self.events(brain), [("local-ollama", "forced", 1)])
+
+        deadline = time.time() + 5
+        while len(self.events(brain)) < 2 and time.time() < deadline:
+            time.sleep(0.05)
+        time.sleep(0.2)
+        self.assertEqual(self.events(brain), [("local-ollama", "forced", 1), ("claude", "hedge", 0)])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Test suite for the shared HTTP session
+"""
+
+import sys
+import unittest
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import http_pool
+from bench_brain import StubBackends
+
+
+class TestHttpPool(unittest.TestCase):
+    """Test session sharing, adapter configuration and connection reuse."""
+
+    def setUp(self):
+        http_pool._session = None
+
+    def tearDown(self):
+        http_pool._session = None
+
+    def test_calls_share_one_configured_session(self):
+        """Every caller gets the first call's session; later options are ignored."""
+        session = http_pool.get_session(pool_connections=3, pool_maxsize=5, connect_retries=4)
+        self.assertIs(http_pool.get_session(pool_maxsize=99), session)
+
+        for prefix in ("http://", "https://"):
+            adapter = session.get_adapter(prefix + "example.com")
+            self.assertEqual(adapter._pool_connections, 3)
+            self.assertEqual(adapter._pool_maxsize, 5)
+            self.assertEqual(adapter.max_retries.connect, 4)
+            self.assertEqual(adapter.max_retries.read, 0)  # Sent requests are never replayed
+        self.assertIs(session.get_adapter("http://a"), session.get_adapter("https://b"))
+
+    def test_brain_session_from_http_config(self):
+        """The brain's delegates use the shared session built from config.yaml `http`."""
+        from automation_brain import AutomationBrain
+        brain = AutomationBrain.__new__(AutomationBrain)
+        brain._http = None
+        brain.config = {"http": {"pool_maxsize": 7, "connect_retries": 1}}
+        self.assertIs(brain.http, http_pool.get_session())
+        adapter = brain.http.get_adapter("https://api.anthropic.com")
+        self.assertEqual((adapter._pool_maxsize, adapter.max_retries.connect), (7, 1))
+
+    def test_defaults(self):
+        adapter = http_pool.create_session().get_adapter("http://localhost")
+        self.assertEqual(adapter._pool_maxsize, http_pool.DEFAULT_POOL_MAXSIZE)
+        self.assertEqual(adapter.max_retries.connect, http_pool.DEFAULT_CONNECT_RETRIES)
+
+    def test_requests_reuse_one_connection(self):
+        """Sequential calls to a host go over one kept-alive connection."""
+        stub = StubBackends(latency_ms=0, jitter_ms=0).start()
+        try:
+            session = http_pool.get_session()
+            for _ in range(3):
+                session.get(f"{stub.url}/api/tags", timeout=5).raise_for_status()
+            pools = session.get_adapter(stub.url).poolmanager.pools
+            self.assertEqual(len(pools), 1)
+            pool = pools[next(iter(pools.keys()))]
+            self.assertEqual((pool.num_connections, pool.num_requests), (1, 3))
+            self.assertEqual(pool.pool.maxsize, http_pool.DEFAULT_POOL_MAXSIZE)
+        finally:
+            stub.stop()
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Test suite for the persistent knowledge base index
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import kb_index
+from kb_index import KnowledgeIndex, tokenize
+
+
+class TestKnowledgeIndex(unittest.TestCase):
+    """Test indexing, incremental refresh and search."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.kb_path = Path(self.tmp.name) / "knowledge-base"
+        (self.kb_path / "patterns").mkdir(parents=True)
+        (self.kb_path / "index.md").write_text(
+            "# Index\n\nModel routing sends simple queries to deepseek.\n\nOther notes.\n",
+            encoding="utf-8"
+        )
+        (self.kb_path / "patterns" / "video.md").write_text(
+            "# Video\n\nComfyUI renders video on The Machine.\n",
+            encoding="utf-8"
+        )
+        self.index = KnowledgeIndex(self.kb_path, Path(self.tmp.name) / "kb_index.db")
+
+    def tearDown(self):
+        self.index.close()
+        self.tmp.cleanup()
+
+    def test_tokenize(self):
+        """Tokenizer should lowercase and split on punctuation."""
+        self.assertEqual(tokenize("Qwen2.5:32B routing!"), ["qwen2", "5", "32b", "routing"])
+
+    def test_tokenize_drops_stopwords(self):
+        """Stopwords should never reach the index or the query."""
+        self.assertEqual(tokenize("What is the status of the render"), ["status", "render"])
+
+    def test_rebuild_indexes_all_files(self):
+        """Rebuild should add every markdown file and record corpus stats."""
+        stats = self.index.rebuild()
+        self.assertEqual(stats["added"], 2)
+        self.assertEqual(self.index.doc_count, 2)
+        self.assertGreater(self.index.avg_doc_length, 0)
+
+    def test_search_returns_snippets(self):
+        """Search should rank matching files and return matching lines."""
+        results = self.index.search("model routing")
+        self.assertEqual(results[0]["file"], "index.md")
+        self.assertEqual(results[0]["matches"], 2)
+        self.assertIn("deepseek", results[0]["snippet"])
+
+    def test_bm25_prefers_denser_match(self):
+        """A short file focused on a term should outrank a long file mentioning it once."""
+        (self.kb_path / "long.md").write_text(
+            "ComfyUI note.\n" + "\n".join(f"filler line {i} about candles" for i in range(200)),
+            encoding="utf-8"
+        )
+        (self.kb_path / "short.md").write_text("ComfyUI ComfyUI setup.\n", encoding="utf-8")
+        self.index.refresh(force=True)
+        results = self.index.search("comfyui")
+        self.assertEqual(results[0]["file"], "short.md")
+        self.assertGreater(results[0]["score"], results[-1]["score"])
+
+    def test_snippet_window_from_line_offsets(self):
+        """Snippet should be the stored lines around the best-matching line."""
+        result = self.index.search("deepseek")[0]
+        self.assertEqual(result["line_start"], 0)
+        self.assertEqual(result["line_end"], 4)
+        self.assertEqual(result["line_nos"], [0, 2, 4])
+        self.assertEqual(result["snippet"].split("\n"), [
+            "# Index",
+            "Model routing sends simple queries to deepseek.",
+            "Other notes.",
+        ])
+
+    def test_search_no_match(self):
+        """Unknown terms should return no results."""
+        self.assertEqual(self.index.search("kubernetes"), [])
+
+    def test_incremental_update(self):
+        """Changed, new and deleted files should be picked up on refresh."""
+        self.index.refresh(force=True)
+
+        video = self.kb_path / "patterns" / "video.md"
+        video.write_text("# Video\n\nWan2.2 kubernetes renders.\n", encoding="utf-8")
+        future = time.time() + 5
+        os.utime(video, (future, future))
+        (self.kb_path / "new.md").write_text("kubernetes notes\n", encoding="utf-8")
+        (self.kb_path / "index.md").unlink()
+
+        stats = self.index.refresh(force=True)
+        self.assertEqual(stats, {"added": 1, "updated": 1, "removed": 1})
+
+        files = {r["file"] for r in self.index.search("kubernetes")}
+        self.assertEqual(files, {"new.md", str(Path("patterns/video.md"))})
+        self.assertEqual(self.index.search("deepseek"), [])
+
+    def test_unchanged_files_not_reindexed(self):
+        """A second refresh without changes should do no work."""
+        self.index.refresh(force=True)
+        stats = self.index.refresh(force=True)
+        self.assertEqual(stats, {"added": 0, "updated": 0, "removed": 0})
+
+    def test_concurrent_refresh_and_search(self):
+        """Threads sharing an index and a second connection refreshing at once should not clash."""
+        other = KnowledgeIndex(self.kb_path, Path(self.tmp.name) / "kb_index.db")
+        errors = []
+
+        def work(index, n):
+            try:
+                for i in range(10):
+                    (self.kb_path / f"t{n}_{i}.md").write_text(f"note{n} kubernetes {i}\n", encoding="utf-8")
+                    index.refresh(force=True)
+                    index.search("kubernetes")
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=work, args=(index, n))
+                   for n, index in enumerate([self.index, self.index, other, other])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        other.close()
+        self.assertEqual(errors, [])
+        self.index.refresh(force=True)
+        self.assertEqual(self.index.doc_count, 42)
+
+    def test_missing_index_location_is_reported(self):
+        """An index that cannot be opened raises sqlite3.Error for callers to degrade on."""
+        import sqlite3
+        with self.assertRaises(sqlite3.Error):
+            kb_index.search("routing", self.kb_path, Path(self.tmp.name) / "missing" / "kb.db")
+
+    def test_shared_index_created_once(self):
+        """Concurrent first get_index calls share one instance instead of opening two."""
+        created = []
+
+        def slow_index(*args):
+            time.sleep(0.1)
+            created.append(args)
+            return object()
+
+        results = []
+        key_path = Path(self.tmp.name) / "shared.db"
+        with patch("kb_index.KnowledgeIndex", slow_index):
+            threads = [threading.Thread(target=lambda: results.append(
+                kb_index.get_index(self.kb_path, key_path))) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        kb_index._indexes.pop((str(self.kb_path), str(key_path)), None)
+        self.assertEqual(len(created), 1)
+        self.assertEqual(len({id(r) for r in results}), 1)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
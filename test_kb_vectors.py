@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Test suite for semantic knowledge base retrieval
+"""
+
+import os
+import re
+import sys
+import tempfile
+import time
+import unittest
+import zlib
+from pathlib import Path
+from unittest.mock import patch
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from kb_vectors import IndexNotReady, VectorIndex, chunk_markdown
+
+
+class StubEmbeddings:
+    """embed_texts stand-in: hashed bag of words, recording every text it embeds."""
+
+    def __init__(self):
+        self.texts = []
+
+    def __call__(self, texts, model=None, endpoint=None, timeout=120, session=None):
+        self.texts.extend(texts)
+        vectors = []
+        for text in texts:
+            vec = [0.0] * 64
+            for word in re.findall(r"\w+", text.lower()):
+                vec[zlib.crc32(word.encode()) % 64] += 1.0
+            vectors.append(vec)
+        return vectors
+
+
+class TestChunkMarkdown(unittest.TestCase):
+    """Test heading, line-count and size boundaries."""
+
+    def test_splits_at_headings_and_drops_blank_lines(self):
+        chunks = chunk_markdown("# One\n\nfirst body\n\n## Two\nsecond body\n")
+        self.assertEqual([c["text"] for c in chunks], ["# One\nfirst body", "## Two\nsecond body"])
+        self.assertEqual([(c["line_start"], c["line_end"]) for c in chunks], [(0, 2), (4, 5)])
+        self.assertEqual(chunks[0]["line_nos"], [0, 2])
+
+    def test_caps_lines_and_chars(self):
+        self.assertEqual(len(chunk_markdown("\n".join(f"line {i}" for i in range(10)), max_lines=4)), 3)
+        self.assertEqual(len(chunk_markdown("a" * 30 + "\n" + "b" * 30, max_chars=40)), 2)
+
+
+@unittest.skipIf(np is None, "numpy not installed")
+class TestVectorIndex(unittest.TestCase):
+    """Test incremental refresh, ranking and the background first build."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.kb_path = Path(self.tmp.name) / "knowledge-base"
+        (self.kb_path / "patterns").mkdir(parents=True)
+        (self.kb_path / "routing.md").write_text(
+            "# Routing\nSimple queries go to deepseek.\n\n# Costs\nClaude costs money per token.\n",
+            encoding="utf-8")
+        (self.kb_path / "patterns" / "video.md").write_text(
+            "# Video\nComfyUI renders candle video on the GPU.\n", encoding="utf-8")
+        self.embed = StubEmbeddings()
+        patcher = patch("kb_vectors.embed_texts", self.embed)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.index = self.open()
+
+    def tearDown(self):
+        self.index.vectors = None  # Release the memmap before cleanup
+        self.tmp.cleanup()
+
+    def open(self) -> VectorIndex:
+        return VectorIndex(self.kb_path, Path(self.tmp.name) / "vectors", refresh_interval=3600)
+
+    def touch(self, path: Path, text: str) -> None:
+        path.write_text(text, encoding="utf-8")
+        future = time.time() + 5
+        os.utime(path, (future, future))
+
+    def test_refresh_embeds_only_new_content(self):
+        """Changed chunks are embedded, unchanged and renamed ones reused, deleted ones dropped."""
+        self.assertEqual(self.index.refresh(force=True), {"files_changed": 2, "embedded": 3, "reused": 0})
+        self.assertEqual(self.index.refresh(force=True), {"files_changed": 0, "embedded": 0, "reused": 0})
+
+        self.embed.texts.clear()
+        self.touch(self.kb_path / "routing.md",
+                   "# Routing\nSimple queries go to qwen now.\n\n# Costs\nClaude costs money per token.\n")
+        stats = self.index.refresh(force=True)
+        self.assertEqual(stats, {"files_changed": 1, "embedded": 1, "reused": 2})
+        self.assertEqual(self.embed.texts, ["# Routing\nSimple queries go to qwen now."])
+
+        self.embed.texts.clear()
+        (self.kb_path / "patterns" / "video.md").rename(self.kb_path / "video.md")
+        stats = self.index.refresh(force=True)
+        self.assertEqual(stats, {"files_changed": 1, "embedded": 0, "reused": 3})
+        self.assertEqual(self.embed.texts, [])
+        self.assertEqual(sorted({c["file"] for c in self.index.meta["chunks"]}), ["routing.md", "video.md"])
+
+        (self.kb_path / "routing.md").unlink()
+        self.index.refresh(force=True)
+        self.assertEqual([c["file"] for c in self.index.meta["chunks"]], ["video.md"])
+        self.assertEqual(self.index.vectors.shape[0], 1)
+
+    def test_search_ranks_by_cosine(self):
+        """The chunk sharing the query's words ranks first, with its snippet and lines."""
+        self.index.refresh(force=True)
+        results = self.index.search("comfyui candle video", limit=3)
+        self.assertEqual(results[0]["file"], str(Path("patterns/video.md")))
+        self.assertEqual((results[0]["line_start"], results[0]["line_end"]), (0, 1))
+        self.assertEqual([r["score"] for r in results], sorted((r["score"] for r in results), reverse=True))
+        self.assertEqual(self.index.search("claude token costs", limit=1)[0]["snippet"],
+                         "# Costs\nClaude costs money per token.")
+
+        # A restarted index reuses the stored vectors
+        self.embed.texts.clear()
+        reopened = self.open()
+        self.assertEqual(reopened.search("comfyui candle video")[0]["file"], results[0]["file"])
+        self.assertEqual(self.embed.texts, ["comfyui candle video"])
+        reopened.vectors = None
+
+    def test_first_search_builds_in_background(self):
+        """Before the first build, search raises IndexNotReady instead of embedding the KB inline."""
+        with self.assertRaises(IndexNotReady):
+            self.index.search("comfyui")
+        self.index._builder.join(10)
+        self.assertEqual(len(self.index.meta["chunks"]), 3)
+        self.assertEqual(self.index.search("comfyui candle video")[0]["file"], str(Path("patterns/video.md")))
+
+    def test_empty_knowledge_base_builds_empty_index(self):
+        """An empty KB still counts as built, so searches return nothing rather than raising."""
+        for path in self.kb_path.rglob("*.md"):
+            path.unlink()
+        self.index.refresh(force=True)
+        self.assertEqual(self.index.search("anything"), [])
+
+    def test_background_failure_is_contained(self):
+        """A malformed embedding response is logged by the builder thread, not raised from it."""
+        with patch("kb_vectors.embed_texts", side_effect=KeyError("embeddings")), \
+                patch("sys.stderr") as stderr, \
+                patch("threading.excepthook") as excepthook:
+            self.index.refresh_in_background(force=True).join(10)
+        excepthook.assert_not_called()
+        self.assertIn("KeyError", "".join(str(c) for c in stderr.write.call_args_list))
+        self.assertIsNone(self.index.vectors)
+        self.assertEqual(self.index.refresh(force=True)["embedded"], 3)
+
+    def test_undecodable_file_is_retried(self):
+        """A file that fails to decode stays out of the manifest until it reads cleanly."""
+        bad = self.kb_path / "notes.md"
+        bad.write_bytes(b"# Notes\n\xff\xfe broken\n")
+        self.index.refresh(force=True)
+        self.assertNotIn("notes.md", self.index.meta["files"])
+
+        st = bad.stat()
+        bad.write_bytes(b"# Notes\nfixed ok!\n")
+        os.utime(bad, ns=(st.st_atime_ns, st.st_mtime_ns))  # Same mtime and size as the bad copy
+        self.assertEqual(self.index.refresh(force=True)["files_changed"], 1)
+        self.assertIn("notes.md", self.index.meta["files"])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
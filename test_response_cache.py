@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Test suite for the response cache
+"""
+
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from response_cache import ResponseCache, cache_key
+
+
+RESULT = {"response": "42", "tokens_in": 10, "tokens_out": 5, "cost": 0.01,
+          "tool": "claude", "model": "claude-sonnet"}
+
+
+class LockCheckedConnection:
+    """sqlite3 connection stand-in that fails any use made without the cache's lock."""
+
+    def __init__(self, conn, lock):
+        self.conn, self.lock = conn, lock
+
+    def __getattr__(self, name):
+        if not self.lock.locked():
+            raise AssertionError(f"conn.{name} used without the lock")
+        return getattr(self.conn, name)
+
+    def __enter__(self):
+        return self.__getattr__("__enter__")()
+
+    def __exit__(self, *exc):
+        return self.conn.__exit__(*exc)
+
+
+class TestResponseCache(unittest.TestCase):
+    """Test keys, TTLs and LRU eviction."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(
+            Path(self.tmp.name) / "cache.db",
+            ttl_seconds={"claude": 60, "perplexity": 1},
+            max_entries=2,
+        )
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp.cleanup()
+
+    def test_normalized_prompt_shares_key(self):
+        """Whitespace and case differences should map to the same key."""
+        self.assertEqual(cache_key("claude", "m", "What  is\nX? "),
+                         cache_key("claude", "m", "what is x?"))
+        self.assertNotEqual(cache_key("claude", "m", "x"), cache_key("perplexity", "m", "x"))
+
+    def test_hit_and_miss(self):
+        """A stored result should be returned for the same tool/model/prompt only."""
+        self.cache.put("claude", "claude-sonnet", "Explain BM25", RESULT)
+        self.assertEqual(self.cache.get("claude", "claude-sonnet", "explain  bm25"), RESULT)
+        self.assertIsNone(self.cache.get("claude", "other-model", "Explain BM25"))
+
+    def test_uncached_tool(self):
+        """Tools without a TTL should never be stored."""
+        self.cache.put("comfyui", "sdxl", "a candle", RESULT)
+        self.assertIsNone(self.cache.get("comfyui", "sdxl", "a candle"))
+        self.assertEqual(self.cache.stats(), {})
+
+    def test_ttl_expiry(self):
+        """Entries older than the tool's TTL should be dropped."""
+        self.cache.put("perplexity", "sonar-pro", "news", RESULT)
+        with patch("response_cache.time.time", return_value=time.time() + 5):
+            self.assertIsNone(self.cache.get("perplexity", "sonar-pro", "news"))
+
+    def test_lru_eviction(self):
+        """The least recently used entry should be evicted past max_entries."""
+        self.cache.put("claude", "m", "a", RESULT)
+        time.sleep(0.01)
+        self.cache.put("claude", "m", "b", RESULT)
+        time.sleep(0.01)
+        self.cache.get("claude", "m", "a")
+        time.sleep(0.01)
+        self.cache.put("claude", "m", "c", RESULT)
+
+        self.assertIsNotNone(self.cache.get("claude", "m", "a"))
+        self.assertIsNone(self.cache.get("claude", "m", "b"))
+        self.assertIsNotNone(self.cache.get("claude", "m", "c"))
+
+    def test_connection_used_under_lock(self):
+        """Every connection use holds the lock, so threads can share one cache."""
+        self.cache.conn = LockCheckedConnection(self.cache.conn, self.cache._lock)
+        self.cache.put("claude", "m", "q", RESULT)
+        self.assertEqual(self.cache.get("claude", "m", "q")["response"], "42")
+        self.assertEqual(self.cache.stats()["claude"]["entries"], 1)
+        self.assertEqual(self.cache.clear("claude"), 1)
+        self.cache.conn = self.cache.conn.conn
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
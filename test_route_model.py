@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Test suite for the learned routing model
+"""
+
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from route_model import RouteModel, load_route_model, np
+
+
+EXAMPLES = (
+    [{"query": f"open a pull request for the {x} branch", "tool": "github", "complexity": "simple"}
+     for x in ("auth", "cache", "docs", "video")]
+    + [{"query": f"write a python function to parse {x}", "tool": "local-qwen", "complexity": "medium"}
+       for x in ("dates", "prices", "csv files", "json")]
+    + [{"query": f"design a comprehensive architecture for {x}", "tool": "claude", "complexity": "complex"}
+       for x in ("payments", "search", "billing", "chat")]
+)
+
+
+@unittest.skipIf(np is None, "numpy not installed")
+class TestRouteModel(unittest.TestCase):
+    """Test training, prediction and the weight file round trip."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.model = RouteModel.train(EXAMPLES, dim=2 ** 10, epochs=100)
+
+    def test_fits_training_examples(self):
+        for example in EXAMPLES:
+            with self.subTest(query=example["query"]):
+                prediction = self.model.predict(example["query"])
+                self.assertEqual(prediction["tool"], example["tool"])
+                self.assertEqual(prediction["complexity"], example["complexity"])
+
+    def test_generalizes_to_unseen_wording(self):
+        self.assertEqual(self.model.predict("write a function to parse xml")["tool"], "local-qwen")
+        self.assertEqual(self.model.predict("pull request for the api branch")["tool"], "github")
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = self.model.save(Path(tmp) / "route_model.npz")
+            loaded = load_route_model(path)
+        query = "design a comprehensive architecture for search"
+        self.assertEqual(loaded.predict(query)["tool"], self.model.predict(query)["tool"])
+        self.assertAlmostEqual(loaded.predict(query)["tool_confidence"],
+                               self.model.predict(query)["tool_confidence"], places=2)
+
+    def test_missing_weight_file(self):
+        self.assertIsNone(load_route_model(Path(tempfile.gettempdir()) / "missing_route_model.npz"))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Test suite for the semantic (paraphrase) response cache
+"""
+
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from bench_brain import StubBackends
+
+if np is not None:
+    from semantic_cache import SemanticCache
+
+
+RESULT = {"response": "42", "tokens_in": 10, "tokens_out": 5, "cost": 0.01,
+          "tool": "claude", "model": "claude-sonnet"}
+
+
+class LockCheckedConnection:
+    """sqlite3 connection stand-in that fails any use made without the cache's lock."""
+
+    def __init__(self, conn, lock):
+        self.conn, self.lock = conn, lock
+
+    def __getattr__(self, name):
+        if not self.lock.locked():
+            raise AssertionError(f"conn.{name} used without the lock")
+        return getattr(self.conn, name)
+
+    def __enter__(self):
+        return self.__getattr__("__enter__")()
+
+    def __exit__(self, *exc):
+        return self.conn.__exit__(*exc)
+
+
+def unit(*values):
+    vec = np.asarray(values, dtype=np.float32)
+    return vec / np.linalg.norm(vec)
+
+
+@unittest.skipIf(np is None, "numpy not installed")
+class TestSemanticCache(unittest.TestCase):
+    """Test thresholded lookups, TTL and eviction, and reloading from SQLite."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = Path(self.tmp.name) / "cache.db"
+        self.cache = self.open()
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp.cleanup()
+
+    def open(self, **kwargs) -> "SemanticCache":
+        options = dict(ttl_seconds={"claude": 60, "perplexity": 1}, threshold=0.9, max_entries=2)
+        options.update(kwargs)
+        return SemanticCache(self.db_path, **options)
+
+    def test_hit_above_threshold(self):
+        """A close paraphrase returns the cached result with its similarity."""
+        self.cache.add("claude", "claude-sonnet", "explain BM25", unit(1, 0, 0), RESULT)
+        result = self.cache.lookup("claude", "claude-sonnet", unit(1, 0.2, 0))
+        self.assertEqual(result["response"], "42")
+        self.assertGreaterEqual(result["similarity"], 0.9)
+
+    def test_miss_below_threshold_or_other_model(self):
+        """Dissimilar queries, other models and uncached tools miss."""
+        self.cache.add("claude", "claude-sonnet", "explain BM25", unit(1, 0, 0), RESULT)
+        self.assertIsNone(self.cache.lookup("claude", "claude-sonnet", unit(1, 1, 0)))
+        self.assertIsNone(self.cache.lookup("claude", "claude-opus", unit(1, 0, 0)))
+        self.cache.add("local-qwen", "qwen", "explain BM25", unit(1, 0, 0), RESULT)
+        self.assertIsNone(self.cache.lookup("local-qwen", "qwen", unit(1, 0, 0)))
+
+    def test_ttl_expiry(self):
+        """Entries older than the tool's TTL are ignored, then pruned on reload."""
+        self.cache.add("perplexity", "sonar-pro", "news", unit(0, 1, 0), RESULT)
+        later = time.time() + 5
+        with patch("semantic_cache.time.time", return_value=later):
+            self.assertIsNone(self.cache.lookup("perplexity", "sonar-pro", unit(0, 1, 0)))
+            reopened = self.open()
+        self.assertEqual(reopened._entries["perplexity"]["ids"], [])
+        reopened.close()
+
+    def test_oldest_evicted_past_max_entries(self):
+        """Each tool keeps its newest max_entries vectors."""
+        for i, vec in enumerate([unit(1, 0, 0), unit(0, 1, 0), unit(0, 0, 1)]):
+            self.cache.add("claude", "m", f"q{i}", vec, dict(RESULT, response=f"a{i}"))
+        self.assertIsNone(self.cache.lookup("claude", "m", unit(1, 0, 0)))
+        self.assertEqual(self.cache.lookup("claude", "m", unit(0, 0, 1))["response"], "a2")
+        rows = self.cache.conn.execute("SELECT COUNT(*) FROM semantic_entries").fetchone()[0]
+        self.assertEqual(rows, 2)
+
+    def test_entries_reload_after_restart(self):
+        """A new instance on the same database serves what the old one stored."""
+        self.cache.add("claude", "m", "explain BM25", unit(1, 0, 0), RESULT)
+        self.cache.close()
+        self.cache = self.open()
+        self.assertEqual(self.cache.lookup("claude", "m", unit(1, 0, 0))["response"], "42")
+
+        # A smaller bound on restart trims the stored rows too
+        self.cache.add("claude", "m", "q2", unit(0, 1, 0), RESULT)
+        self.cache.close()
+        self.cache = self.open(max_entries=1)
+        self.assertIsNone(self.cache.lookup("claude", "m", unit(1, 0, 0)))
+        self.assertIsNotNone(self.cache.lookup("claude", "m", unit(0, 1, 0)))
+
+    def test_connection_used_under_lock(self):
+        """Lookups and adds hold the lock around the connection and the matrices."""
+        self.cache.conn = LockCheckedConnection(self.cache.conn, self.cache._lock)
+        self.cache.add("claude", "m", "explain BM25", unit(1, 0, 0), RESULT)
+        self.assertEqual(self.cache.lookup("claude", "m", unit(1, 0, 0))["response"], "42")
+        self.cache.conn = self.cache.conn.conn
+
+    def test_embed_via_ollama(self):
+        """embed() returns a unit vector, the same one for the same text."""
+        stub = StubBackends(latency_ms=0, jitter_ms=0).start()
+        try:
+            cache = self.open(endpoint=stub.url)
+            a, b = cache.embed("explain BM25"), cache.embed("explain BM25")
+            cache.close()
+        finally:
+            stub.stop()
+        self.assertAlmostEqual(float(np.linalg.norm(a)), 1.0, places=5)
+        np.testing.assert_array_equal(a, b)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
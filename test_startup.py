@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Test suite for the startup helpers (config cache, lazy imports)
+"""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import startup
+from startup import cache_path, lazy_import, load_cached, load_json, load_yaml
+
+
+class TestConfigCache(unittest.TestCase):
+    """Test the mtime-keyed parsed config cache."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_second_load_skips_parse(self):
+        path = self.dir / "config.yaml"
+        path.write_text("models:\n  local:\n    qwen: {endpoint: 'http://localhost:11434'}\n")
+        first = load_yaml(path)
+        self.assertTrue(cache_path(path).exists())
+
+        with mock.patch.object(startup, "_parse_yaml", side_effect=AssertionError("parsed")):
+            self.assertEqual(load_cached(path, startup._parse_yaml), first)
+
+    def test_changed_source_is_reparsed(self):
+        path = self.dir / "tools_config.json"
+        path.write_text(json.dumps({"tools": {"comfyui": {"port": 8188}}}))
+        self.assertEqual(load_json(path)["tools"]["comfyui"]["port"], 8188)
+
+        path.write_text(json.dumps({"tools": {"comfyui": {"port": 8189}}}))
+        # Same size, so only the mtime tells the versions apart
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        self.assertEqual(load_json(path)["tools"]["comfyui"]["port"], 8189)
+
+    def test_corrupt_cache_is_ignored(self):
+        path = self.dir / "config.yaml"
+        path.write_text("cache: {enabled: true}\n")
+        load_yaml(path)
+        cache_path(path).write_bytes(b"not a pickle")
+        self.assertEqual(load_yaml(path), {"cache": {"enabled": True}})
+
+
+class TestLazyImport(unittest.TestCase):
+    """Test deferred module loading."""
+
+    def test_loads_on_first_attribute(self):
+        sys.modules.pop("colorsys", None)
+        module = lazy_import("colorsys")
+        self.assertIs(sys.modules["colorsys"], module)
+        self.assertEqual(type(module).__name__, "_LazyModule")
+        self.assertEqual(module.rgb_to_hsv(1.0, 0.0, 0.0), (0.0, 1.0, 1.0))
+
+    def test_returns_loaded_module(self):
+        self.assertIs(lazy_import("json"), json)
+
+    def test_missing_module(self):
+        with self.assertRaises(ImportError):
+            lazy_import("no_such_module_for_startup_test")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
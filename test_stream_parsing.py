@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Test suite for parsing streamed model responses (SSE and Ollama NDJSON)
+"""
+
+import json
+import os
+import sys
+import unittest
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import requests
+import yaml
+
+from automation_brain import AutomationBrain
+
+BASE_DIR = Path(__file__).resolve().parent
+
+
+class CannedRaw:
+    """urllib3-like raw body handing out fixed byte chunks."""
+
+    def __init__(self, chunks: list[bytes]):
+        self.chunks = chunks
+
+    def stream(self, chunk_size, decode_content=True):
+        yield from self.chunks
+
+    def close(self):
+        pass
+
+
+def canned_response(chunks: list[bytes]) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response.encoding = "utf-8"
+    response.raw = CannedRaw(chunks)
+    return response
+
+
+def sse(*events) -> bytes:
+    return "".join(f"data: {e if isinstance(e, str) else json.dumps(e)}\n\n" for e in events).encode()
+
+
+def split(data: bytes, size: int) -> list[bytes]:
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class CannedSession:
+    """HTTP session whose every POST answers with the same canned chunks."""
+
+    def __init__(self, chunks: list[bytes]):
+        self.chunks = chunks
+
+    def post(self, url, **kwargs):
+        return canned_response(self.chunks)
+
+
+class TestStreamParsing(unittest.TestCase):
+    """Feed byte chunks split at awkward places through the stream readers."""
+
+    @classmethod
+    def setUpClass(cls):
+        os.environ.setdefault("ANTHROPIC_API_KEY", "test")
+        os.environ.setdefault("PERPLEXITY_API_KEY", "test")
+
+    def brain(self, chunks: list[bytes]) -> AutomationBrain:
+        """Just enough brain for the stream readers, without its stores."""
+        brain = AutomationBrain.__new__(AutomationBrain)
+        brain.verbose = False
+        with open(BASE_DIR / "config.yaml", encoding="utf-8") as f:
+            brain.config = yaml.safe_load(f)
+        with open(BASE_DIR / "tools_config.json", encoding="utf-8") as f:
+            brain.tools_config = json.load(f)
+        brain.http = CannedSession(chunks)
+        return brain
+
+    def run_stream(self, stream) -> tuple[list[str], dict]:
+        tokens = []
+        while True:
+            try:
+                tokens.append(next(stream))
+            except StopIteration as stop:
+                return tokens, stop.value
+
+    def test_data_lines_split_across_chunks(self):
+        body = b": keep-alive\n\nevent: ping\ndata: {\"a\": 1}\r\n\r\n" + sse({"b": 2}, "[DONE]", {"c": 3})
+        for size in (1, 3, 7, len(body)):
+            events = list(AutomationBrain._iter_sse(canned_response(split(body, size))))
+            self.assertEqual(events, [{"a": 1}, {"b": 2}], f"chunk size {size}")
+
+    def test_perplexity_usage_only_in_last_chunk(self):
+        body = sse({"choices": [{"delta": {"content": "Hello"}}]},
+                   {"choices": [{"delta": {"content": " world"}}]},
+                   {"choices": [{"delta": {}}], "usage": {"prompt_tokens": 12, "completion_tokens": 7}},
+                   "[DONE]")
+        tokens, result = self.run_stream(self.brain(split(body, 5))._stream_perplexity("hi"))
+        self.assertEqual(tokens, ["Hello", " world"])
+        self.assertEqual((result["response"], result["tokens_in"], result["tokens_out"]),
+                         ("Hello world", 12, 7))
+        self.assertGreater(result["cost"], 0)
+
+    def test_perplexity_error_event_mid_stream(self):
+        body = sse({"choices": [{"delta": {"content": "Hel"}}]},
+                   {"error": {"message": "overloaded"}}, "[DONE]")
+        stream = self.brain(split(body, 4))._stream_perplexity("hi")
+        self.assertEqual(next(stream), "Hel")
+        with self.assertRaisesRegex(ConnectionError, "overloaded"):
+            next(stream)
+
+    def test_claude_usage_from_start_and_final_delta(self):
+        body = sse({"type": "message_start", "message": {"usage": {"input_tokens": 21}}},
+                   {"type": "content_block_delta", "delta": {"text": "Hi"}},
+                   {"type": "content_block_delta", "delta": {"text": " there"}},
+                   {"type": "message_delta", "usage": {"output_tokens": 4}},
+                   {"type": "message_stop"},
+                   {"type": "content_block_delta", "delta": {"text": "ignored"}})
+        tokens, result = self.run_stream(self.brain(split(body, 9))._stream_claude("hi"))
+        self.assertEqual(tokens, ["Hi", " there"])
+        self.assertEqual((result["tokens_in"], result["tokens_out"]), (21, 4))
+
+    def test_claude_error_event_mid_stream(self):
+        body = sse({"type": "message_start", "message": {"usage": {"input_tokens": 3}}},
+                   {"type": "content_block_delta", "delta": {"text": "Hi"}},
+                   {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}})
+        stream = self.brain([body])._stream_claude("hi")
+        self.assertEqual(next(stream), "Hi")
+        with self.assertRaisesRegex(ConnectionError, "Overloaded"):
+            next(stream)
+
+    def test_ollama_ndjson_split_lines(self):
+        lines = [{"response": "Hel", "done": False}, {"response": "lo", "done": False},
+                 {"done": True, "prompt_eval_count": 5, "eval_count": 2}]
+        body = "".join(json.dumps(line) + "\n" for line in lines).encode()
+        tokens, result = self.run_stream(self.brain(split(body, 6))._stream_local("hi", "qwen"))
+        self.assertEqual(tokens, ["Hel", "lo"])
+        self.assertEqual((result["tokens_in"], result["tokens_out"]), (5, 2))
+
+        error = self.brain([b'{"response": "x"}\n{"error": "model not found"}\n'])
+        with self.assertRaisesRegex(ConnectionError, "model not found"):
+            self.run_stream(error._stream_local("hi", "qwen"))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Test suite for the single-pass keyword task router
+"""
+
+import sys
+import unittest
+from pathlib import Path
+
+import yaml
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from task_router import (DEFAULT_COMPLEXITY_INDICATORS, DEFAULT_INDICATORS, KeywordAutomaton,
+                         TaskRouter, keyword_complexity)
+
+
+def naive_analysis(query: str, indicators: dict, complexity: dict) -> dict:
+    """Reference: one `any(phrase in query_lower ...)` loop per table."""
+    query_lower = query.lower()
+    analysis = {f"needs_{name}": False for name in indicators}
+    analysis["category"] = "general"
+    for name, spec in indicators.items():
+        if any(phrase in query_lower for phrase in spec["phrases"]):
+            analysis[f"needs_{name}"] = True
+            for implied in spec.get("implies", []):
+                analysis[f"needs_{implied}"] = True
+            analysis["category"] = spec["category"]
+    if any(phrase in query_lower for phrase in complexity["complex"]):
+        analysis["complexity"] = "complex"
+    elif any(phrase in query_lower for phrase in complexity["medium"]):
+        analysis["complexity"] = "medium"
+    else:
+        words = len(query.split())
+        analysis["complexity"] = "complex" if words > 50 else "medium" if words > 15 else "simple"
+    return analysis
+
+
+class TestKeywordAutomaton(unittest.TestCase):
+    """Test multi-pattern substring matching."""
+
+    def test_overlapping_and_nested_phrases(self):
+        """Phrases inside or overlapping other phrases should all match."""
+        automaton = KeywordAutomaton({
+            "a": ["generate image"], "b": ["image"], "c": ["he"], "d": ["she"], "e": ["zzz"],
+        })
+        self.assertEqual(automaton.match("Please GENERATE IMAGE"), {"a", "b"})
+        self.assertEqual(automaton.match("ushers"), {"c", "d"})
+        self.assertEqual(automaton.match(""), set())
+
+    def test_failure_links(self):
+        """A partial match that breaks off should still find later phrases."""
+        automaton = KeywordAutomaton({"x": ["abcd"], "y": ["bce"], "z": ["cf"]})
+        self.assertEqual(automaton.match("abcf"), {"z"})
+        self.assertEqual(automaton.match("abce"), {"y"})
+        self.assertEqual(automaton.match("ababcd"), {"x"})
+
+    def test_keyword_complexity_priority(self):
+        """complex beats medium beats simple; no match returns None."""
+        keywords = {"simple": ["list"], "medium": ["code"], "complex": ["architecture"]}
+        self.assertEqual(keyword_complexity("list the code architecture", keywords), "complex")
+        self.assertEqual(keyword_complexity("list code", keywords), "medium")
+        self.assertEqual(keyword_complexity("list", keywords), "simple")
+        self.assertIsNone(keyword_complexity("hello", keywords))
+
+
+class TestTaskRouter(unittest.TestCase):
+    """Test that the compiled router matches per-table loops on config.yaml."""
+
+    @classmethod
+    def setUpClass(cls):
+        with open(Path(__file__).parent / "config.yaml", encoding="utf-8") as f:
+            routing = yaml.safe_load(f)["routing"]
+        cls.indicators = routing["indicators"]
+        cls.complexity = routing["complexity_indicators"]
+        cls.router = TaskRouter(cls.indicators, cls.complexity)
+
+    def test_matches_naive_loops(self):
+        queries = [
+            "What is 2+2?",
+            "Generate an image of a futuristic city",
+            "generate image of a candle on a table",
+            "Create a talking head avatar with lip sync",
+            "Animate this photo into a video clip",
+            "What are the latest AI releases in 2026?",
+            "Refactor this code for better performance",
+            "Insert a row into the Supabase database",
+            "Navigate to fiverr and post to social media",
+            "Open a pull request on GitHub for this branch",
+            "Design a comprehensive multi-step migration strategy",
+            "word " * 20,
+            "word " * 60,
+            "",
+        ]
+        for query in queries:
+            with self.subTest(query=query):
+                self.assertEqual(self.router.analyze(query),
+                                 naive_analysis(query, self.indicators, self.complexity))
+
+    def test_talking_head_implies_video(self):
+        analysis = self.router.analyze("make a sadtalker clip")
+        self.assertTrue(analysis["needs_talking_head"])
+        self.assertTrue(analysis["needs_video"])
+        self.assertEqual(analysis["category"], "video")
+
+    def test_built_in_tables_without_config(self):
+        """A config without routing tables falls back to the built-in ones (same as config.yaml's)."""
+        self.assertEqual((DEFAULT_INDICATORS, DEFAULT_COMPLEXITY_INDICATORS),
+                         (self.indicators, self.complexity))
+        for config in ({}, {"routing": {}}, {"routing": {"indicators": None}}):
+            analysis = TaskRouter.from_config(config).analyze("generate image of a candle")
+            self.assertTrue(analysis["needs_image"])
+            self.assertFalse(analysis["needs_web"])
+            self.assertEqual((analysis["category"], analysis["complexity"]), ("image", "medium"))
+
+    def test_scales_to_large_tables(self):
+        """Hundreds of phrases per table should still match correctly."""
+        indicators = {f"g{i}": {"category": f"c{i}", "phrases": [f"phrase {i} {j}" for j in range(100)]}
+                      for i in range(5)}
+        router = TaskRouter(indicators, {"complex": ["deep"], "medium": []})
+        analysis = router.analyze("please handle phrase 3 42 and phrase 1 99, deeply")
+        self.assertTrue(analysis["needs_g1"] and analysis["needs_g3"])
+        self.assertFalse(analysis["needs_g0"])
+        self.assertEqual(analysis["category"], "c3")
+        self.assertEqual(analysis["complexity"], "complex")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Test suite for pipeline tracing
+"""
+
+import asyncio
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from tracing import Tracer, load_traces, summarize, format_trace
+
+
+class TestTracer(unittest.TestCase):
+    """Test span nesting, trace files and summaries."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "traces.jsonl"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_nesting_and_otlp_shape(self):
+        tracer = Tracer(self.path)
+        with tracer.span("process", tool="claude") as root:
+            with tracer.span("analyze"):
+                pass
+            with tracer.span("delegate", tool="claude") as span:
+                span.set(tokens_out=12)
+            root.set(cache_hit=False)
+
+        lines = self.path.read_text().splitlines()
+        self.assertEqual(len(lines), 3)  # One append per trace
+        traces = load_traces(self.path)
+        self.assertEqual(len(traces), 1)
+        spans = {s["name"]: s for s in next(iter(traces.values()))}
+        self.assertEqual(spans["analyze"]["parent_id"], spans["process"]["span_id"])
+        self.assertEqual(spans["delegate"]["attributes"], {"tool": "claude", "tokens_out": 12})
+        self.assertEqual(spans["process"]["attributes"]["cache_hit"], False)
+        self.assertIn("delegate", format_trace(next(iter(traces.values()))))
+
+    def test_errors_are_recorded(self):
+        tracer = Tracer(self.path)
+        with self.assertRaises(ConnectionError):
+            with tracer.span("process"):
+                with tracer.span("delegate"):
+                    raise ConnectionError("ollama down")
+        spans = next(iter(load_traces(self.path).values()))
+        self.assertTrue(all("ollama down" in s["error"] for s in spans))
+
+    def test_threads_and_tasks_get_separate_traces(self):
+        tracer = Tracer(self.path)
+
+        def worker():
+            with tracer.span("process"):
+                with tracer.span("delegate"):
+                    pass
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        async def task():
+            with tracer.span("process"):
+                await asyncio.to_thread(worker)  # to_thread copies the context
+
+        async def main():
+            await asyncio.gather(task(), task())
+
+        asyncio.run(main())
+        traces = load_traces(self.path)
+        self.assertEqual(len(traces), 6)
+        nested = [t for t in traces.values() if len(t) == 3]
+        self.assertEqual(len(nested), 2)
+
+    def test_disabled_writes_nothing(self):
+        tracer = Tracer(self.path, enabled=False)
+        with tracer.span("process") as span:
+            span.set(tool="x")
+        self.assertFalse(self.path.exists())
+
+    def test_summary_untraced_time(self):
+        traces = {"t": [
+            {"trace_id": "t", "span_id": "a", "parent_id": "", "name": "process",
+             "start_ns": 0, "duration_ms": 100.0, "attributes": {}, "error": None},
+            {"trace_id": "t", "span_id": "b", "parent_id": "a", "name": "delegate",
+             "start_ns": 1, "duration_ms": 70.0, "attributes": {"tool": "claude"}, "error": None},
+        ]}
+        rows = {r["stage"]: r for r in summarize(traces)}
+        self.assertAlmostEqual(rows["delegate [claude]"]["share"], 0.7)
+        self.assertAlmostEqual(rows["(untraced)"]["total_ms"], 30.0)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Test suite for the append-only usage event store
+"""
+
+import json
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import usage_analytics
+from usage_store import UsageStore
+
+
+LEGACY_LOG = {
+    "summary": {
+        "total_queries": 3,
+        "total_cost_usd": 0.5,
+        "models": {
+            "deepseek-r1": {"queries": 2, "tokens_in": 20, "tokens_out": 40, "cost_usd": 0.0},
+            "qwen2.5:32b": {"queries": 0, "tokens_in": 0, "tokens_out": 0, "cost_usd": 0.0},
+            "claude-sonnet-4": {"queries": 1, "tokens_in": 10, "tokens_out": 10, "cost_usd": 0.5},
+        },
+        "by_tool": {"claude": {"queries": 1, "cost_usd": 0.5, "tokens_in": 10, "tokens_out": 10}},
+        "daily": {"2026-01-05": {"queries": 3, "cost_usd": 0.5}},
+        "monthly": {"2026-01": {"queries": 3, "cost_usd": 0.5}},
+    },
+    "history": [
+        {"timestamp": "2026-01-05T10:00:00", "tool": "claude", "model": "claude-sonnet-4",
+         "tokens_in": 10, "tokens_out": 10, "cost_usd": 0.5, "task_category": "reasoning"},
+    ],
+}
+
+
+def event(day: str, tool: str, cost: float, **extra) -> dict:
+    return dict({"timestamp": f"{day}T12:00:00", "tool": tool, "model": "m",
+                 "tokens_in": 5, "tokens_out": 7, "cost_usd": cost}, **extra)
+
+
+class TestUsageStore(unittest.TestCase):
+    """Test migration, appends, rollups and the JSON export."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.legacy_path = Path(self.tmp.name) / "usage_log.json"
+        self.legacy_path.write_text(json.dumps(LEGACY_LOG), encoding="utf-8")
+        self.store = UsageStore(Path(self.tmp.name) / "usage.db", self.legacy_path)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def test_legacy_log_becomes_baseline(self):
+        """Migrated summary should be unchanged and history imported once."""
+        summary = self.store.summary()
+        self.assertEqual(summary["total_queries"], 3)
+        self.assertAlmostEqual(summary["total_cost_usd"], 0.5)
+        self.assertEqual(len(self.store.history()), 1)
+
+        # Reopening must not import again
+        self.store.close()
+        self.store = UsageStore(Path(self.tmp.name) / "usage.db", self.legacy_path)
+        self.assertEqual(self.store.summary()["total_queries"], 3)
+        self.assertEqual(len(self.store.history()), 1)
+
+    def test_concurrent_migration_imports_once(self):
+        """A store that loses the migration race does not import the history again."""
+        db_path = Path(self.tmp.name) / "race.db"
+        get_meta = UsageStore._get_meta
+        other = {}
+
+        def racing_get_meta(store, key):
+            value = get_meta(store, key)
+            if key == "migrated" and not other:
+                # Another process migrates between this check and the import
+                other["store"] = None
+                other["store"] = UsageStore(db_path, self.legacy_path)
+            return value
+
+        with patch.object(UsageStore, "_get_meta", racing_get_meta):
+            store = UsageStore(db_path, self.legacy_path)
+        self.assertEqual(store.query("SELECT COUNT(*) FROM events WHERE imported = 1")[0][0], 1)
+        self.assertEqual(store.summary()["total_queries"], 3)
+        store.close()
+        other["store"].close()
+
+    def test_rollups_computed_on_read(self):
+        """New events should add to totals, tool, daily and monthly rollups."""
+        self.store.record(event("2026-01-05", "claude", 0.25))
+        self.store.record_many([
+            event("2026-02-01", "perplexity", 0.1),
+            event("2026-02-01", "local-ollama", 0.0, cache_hit=True),
+        ])
+        summary = self.store.summary()
+
+        self.assertEqual(summary["total_queries"], 6)
+        self.assertAlmostEqual(summary["total_cost_usd"], 0.85)
+        self.assertEqual(summary["cache_hits"], 1)
+        self.assertEqual(summary["by_tool"]["claude"]["queries"], 2)
+        self.assertEqual(summary["by_tool"]["perplexity"]["tokens_out"], 7)
+        self.assertEqual(summary["daily"]["2026-01-05"]["queries"], 4)
+        self.assertEqual(summary["monthly"]["2026-02"], {"queries": 2, "cost_usd": 0.1})
+
+    def test_legacy_events_update_models(self):
+        """brain.py events roll up into summary['models'] but not by_tool."""
+        self.store.record({"timestamp": "2026-01-06T09:00:00", "model": "deepseek-r1",
+                           "tokens_in": 1, "tokens_out": 2, "cost_usd": 0.0}, legacy=True)
+        summary = self.store.summary()
+        self.assertEqual(summary["models"]["deepseek-r1"]["queries"], 3)
+        self.assertNotIn("unknown", summary["by_tool"])
+
+    def test_history_limit_returns_latest(self):
+        """History should be oldest-first and limited to the newest events."""
+        for i in range(5):
+            self.store.record(event("2026-03-01", f"tool{i}", 0.0))
+        tools = [e["tool"] for e in self.store.history(limit=2)]
+        self.assertEqual(tools, ["tool3", "tool4"])
+
+    def test_export_matches_legacy_shape(self):
+        """Export should write a usage_log.json the dashboard can read."""
+        self.store.record(event("2026-01-07", "claude", 0.2, latency_ms=850))
+        path = self.store.export_usage_log(Path(self.tmp.name) / "export.json")
+        exported = json.loads(path.read_text(encoding="utf-8"))
+
+        self.assertEqual(set(exported), {"summary", "history"})
+        self.assertEqual(exported["summary"]["total_queries"], 4)
+        self.assertEqual(exported["history"][-1]["latency_ms"], 850)
+        self.assertFalse(self.store.maybe_export(interval=3600))
+
+    def test_routing_examples(self):
+        """Routing context is stored per event and labelled with the serving tool."""
+        self.store.record(event("2026-01-08", "local-ollama", 0.0, query="fix printing code",
+                                complexity="medium", routed_tool="local-qwen", routed_by="rules"))
+        self.store.record(event("2026-01-08", "claude", 0.1))
+        self.store.record(event("2026-01-08", "claude", 0.02, query="fix printing code",
+                                routed_tool="claude", routed_by="hedge"))
+        examples = self.store.routing_examples()
+        self.assertEqual(len(examples), 1)
+        self.assertEqual(examples[0]["tool"], "local-qwen")
+        self.assertEqual(examples[0]["complexity"], "medium")
+        self.assertEqual(self.store.routing_examples(since="2026-02-01"), [])
+
+    def test_hedge_losers_count_cost_not_queries(self):
+        """A cancelled hedge attempt adds its cost and tokens but is not a query."""
+        self.store.record(event("2026-01-09", "local-qwen", 0.0))
+        self.store.record(event("2026-01-09", "claude", 0.02, routed_by="hedge"))
+        summary = self.store.summary()
+        self.assertEqual(summary["total_queries"], 4)
+        self.assertAlmostEqual(summary["total_cost_usd"], 0.52)
+        self.assertEqual(summary["by_tool"]["claude"]["queries"], 1)
+        self.assertEqual(summary["by_tool"]["claude"]["tokens_in"], 15)
+
+        # A store whose rollup was built by the old trigger is rebuilt on open
+        with self.store.conn:
+            self.store.conn.execute("UPDATE rollup SET queries = queries + 1 WHERE tool = 'claude'")
+            self.store.conn.execute("DROP TRIGGER trg_events_rollup_v2")
+            self.store.conn.execute("CREATE TRIGGER trg_events_rollup AFTER INSERT ON events BEGIN SELECT 1; END")
+        self.store.close()
+        self.store = UsageStore(Path(self.tmp.name) / "usage.db", self.legacy_path)
+        self.assertEqual(self.store.summary()["by_tool"]["claude"]["queries"], 1)
+        self.assertIsNone(self.store.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'trg_events_rollup'").fetchone())
+
+
+class TestUsageAnalytics(unittest.TestCase):
+    """Test indexed rollup queries over the store."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        legacy_path = Path(self.tmp.name) / "usage_log.json"
+        legacy_path.write_text(json.dumps(LEGACY_LOG), encoding="utf-8")
+        self.store = UsageStore(Path(self.tmp.name) / "usage.db", legacy_path)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def test_spend_by_day_merges_baseline(self):
+        """Daily spend should combine the legacy baseline and new events."""
+        self.store.record(event("2026-01-05", "claude", 0.25))
+        self.store.record(event("2026-01-09", "claude", 0.1))
+        days = usage_analytics.spend_by_day(self.store, "2026-01-01", "2026-01-06")
+        self.assertEqual(list(days), ["2026-01-05"])
+        self.assertEqual(days["2026-01-05"]["queries"], 4)
+        self.assertAlmostEqual(days["2026-01-05"]["cost_usd"], 0.75)
+
+    def test_spend_by_tool_and_category(self):
+        """Tool spend is sorted by cost; category spend covers new events."""
+        self.store.record(event("2026-02-01", "perplexity", 1.0, task_category="research"))
+        tools = usage_analytics.spend_by_tool(self.store)
+        self.assertEqual(list(tools), ["perplexity", "claude"])
+        self.assertEqual(usage_analytics.spend_by_tool(self.store, since="2026-02-01"),
+                         {"perplexity": {"queries": 1, "cost_usd": 1.0,
+                                         "tokens_in": 5, "tokens_out": 7}})
+        self.assertEqual(usage_analytics.spend_by_category(self.store),
+                         {"research": {"queries": 1, "cost_usd": 1.0}})
+
+    def test_token_percentiles(self):
+        """p50/p95 should use nearest rank and ignore cache hits."""
+        for tokens in range(1, 21):
+            self.store.record({"timestamp": "2026-03-01T00:00:00", "tool": "local-ollama",
+                               "tokens_in": tokens, "tokens_out": tokens * 10})
+        self.store.record(event("2026-03-01", "local-ollama", 0.0, cache_hit=True,
+                                tokens_in=0, tokens_out=0))
+        stats = usage_analytics.token_percentiles(self.store)["local-ollama"]
+        self.assertEqual(stats["count"], 20)
+        self.assertEqual(stats["tokens_in"], {"p50": 10, "p95": 19})
+        self.assertEqual(stats["tokens_out"], {"p50": 100, "p95": 190})
+
+    def test_totals(self):
+        """Totals should include baseline and cache hits."""
+        self.store.record(event("2026-01-06", "claude", 0.0, cache_hit=True))
+        self.assertEqual(usage_analytics.totals(self.store),
+                         {"queries": 4, "cost_usd": 0.5, "cache_hits": 1})
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Pipeline Tracing for Automation Machine
+Lightweight spans for the process() stages (analyze, KB search, cache,
+delegate, usage/conversation logging) and delegate sub-stages such as the
+ComfyUI queue, poll and download. No collector is needed: finished traces
+are appended to traces.jsonl, one span per line in the OpenTelemetry (OTLP
+JSON) span shape, and summarized with --profile.
+
+Spans nest through a ContextVar, so asyncio tasks and asyncio.to_thread
+workers attach to the right parent. Tracing is off unless config.yaml
+`tracing.enabled` is set (or --profile is used); disabled spans cost one
+function call.
+
+Usage:
+    python tracing.py                  # Per-stage summary of traces.jsonl
+    python tracing.py --last 20        # Only the 20 most recent traces
+    python tracing.py --trace latest   # Span tree of one trace
+    python tracing.py --clear          # Delete recorded traces
+"""
+
+import argparse
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Iterator, Optional
+
+# Paths
+BASE_DIR = Path(__file__).resolve().parent
+TRACES_PATH = BASE_DIR / "traces.jsonl"
+
+# Rotate traces.jsonl to traces.jsonl.1 beyond this size
+DEFAULT_MAX_BYTES = 20 * 1024 * 1024
+
+# OTLP status codes
+STATUS_OK, STATUS_ERROR = 1, 2
+
+# (trace_id, span_id) of the innermost open span
+_current: ContextVar[Optional[tuple[str, str]]] = ContextVar("trace_span", default=None)
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _plain_value(value: dict):
+    (kind, raw), = value.items()
+    return int(raw) if kind == "intValue" else raw
+
+
+class Span:
+    """An open span; set() adds attributes until it ends."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "attributes", "error")
+
+    def __init__(self, name: str, trace_id: str, span_id: str, parent_id: str, attributes: dict):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.attributes = attributes
+        self.error = None
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def to_otlp(self, end_ns: int) -> dict:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)}
+                           for k, v in self.attributes.items() if v is not None],
+            "status": {"code": STATUS_ERROR, "message": self.error} if self.error
+                      else {"code": STATUS_OK},
+        }
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attributes) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """
+    Records spans and appends each finished trace to a JSONL file.
+    Child spans are buffered until their root ends, so a trace is written
+    in one append; children that outlive the root are written on their own.
+    """
+
+    def __init__(self, path: Path = TRACES_PATH, enabled: bool = True,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = Path(path)
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._pending: dict[str, list[dict]] = {}
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        if not self.enabled:
+            yield NOOP_SPAN
+            return
+
+        parent = _current.get()
+        trace_id = parent[0] if parent else secrets.token_hex(16)
+        span = Span(name, trace_id, secrets.token_hex(8), parent[1] if parent else "", attributes)
+        if parent is None:
+            with self._lock:
+                self._pending[trace_id] = []
+        token = _current.set((trace_id, span.span_id))
+        try:
+            yield span
+        except Exception as e:
+            span.error = f"{type(e).__name__}: {e}"[:300]
+            raise
+        finally:
+            try:
+                _current.reset(token)
+            except ValueError:
+                # Generator closed from another context
+                _current.set(parent)
+            self._end(span)
+
+    def _end(self, span: Span) -> None:
+        record = span.to_otlp(time.time_ns())
+        with self._lock:
+            if not span.parent_id:
+                self._write(self._pending.pop(span.trace_id, []) + [record])
+            elif span.trace_id in self._pending:
+                self._pending[span.trace_id].append(record)
+            else:
+                self._write([record])
+
+    def _write(self, records: list[dict]) -> None:
+        """Append spans (caller holds the lock); tracing never breaks a request."""
+        try:
+            if self.path.exists() and self.path.stat().st_size > self.max_bytes:
+                os.replace(self.path, self.path.with_name(self.path.name + ".1"))
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(r) + "\n" for r in records))
+        except OSError:
+            pass
+
+
+_tracer = Tracer(enabled=False)
+
+
+def configure(path: Path = TRACES_PATH, enabled: bool = True,
+              max_bytes: int = DEFAULT_MAX_BYTES) -> Tracer:
+    """Set the process-wide tracer used by span()."""
+    global _tracer
+    if not (_tracer.enabled == enabled and _tracer.path == Path(path)):
+        _tracer = Tracer(path, enabled, max_bytes)
+    return _tracer
+
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+
+def span(name: str, **attributes):
+    """Context manager for a span on the process-wide tracer."""
+    return _tracer.span(name, **attributes)
+
+
+# =============================================================================
+# ANALYSIS
+# =============================================================================
+
+def load_traces(path: Path = TRACES_PATH, last: Optional[int] = None) -> dict[str, list[dict]]:
+    """
+    Spans grouped by trace id (oldest trace first), with plain attributes
+    and a duration_ms field. last keeps only the most recent N traces.
+    """
+    traces: dict[str, list[dict]] = {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    raw = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                span = {
+                    "trace_id": raw["traceId"],
+                    "span_id": raw["spanId"],
+                    "parent_id": raw.get("parentSpanId", ""),
+                    "name": raw["name"],
+                    "start_ns": int(raw["startTimeUnixNano"]),
+                    "duration_ms": (int(raw["endTimeUnixNano"]) - int(raw["startTimeUnixNano"])) / 1e6,
+                    "attributes": {a["key"]: _plain_value(a["value"]) for a in raw.get("attributes", [])},
+                    "error": raw.get("status", {}).get("message"),
+                }
+                traces.setdefault(span["trace_id"], []).append(span)
+    except OSError:
+        return {}
+    if last is not None:
+        traces = dict(list(traces.items())[-last:])
+    return traces
+
+
+def _percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))]
+
+
+def _stage(span: dict) -> str:
+    tool = span["attributes"].get("tool")
+    return f"{span['name']} [{tool}]" if tool and span["name"] != "process" else span["name"]
+
+
+def summarize(traces: dict[str, list[dict]]) -> list[dict]:
+    """
+    Per-stage timing rows, largest total first. share is relative to root
+    span time, so stages that run in parallel (hedged delegates, batch
+    items) can add up to more than 100%. Each root span also contributes an
+    "(untraced)" row: its time not covered by direct children.
+    """
+    durations: dict[str, list[float]] = {}
+    root_total = 0.0
+    for spans in traces.values():
+        children: dict[str, float] = {}
+        for span in spans:
+            durations.setdefault(_stage(span), []).append(span["duration_ms"])
+            if span["parent_id"]:
+                children[span["parent_id"]] = children.get(span["parent_id"], 0.0) + span["duration_ms"]
+        for span in spans:
+            if not span["parent_id"]:
+                root_total += span["duration_ms"]
+                durations.setdefault("(untraced)", []).append(
+                    max(0.0, span["duration_ms"] - children.get(span["span_id"], 0.0)))
+
+    rows = []
+    for stage, values in durations.items():
+        total = sum(values)
+        rows.append({
+            "stage": stage,
+            "count": len(values),
+            "total_ms": total,
+            "mean_ms": total / len(values),
+            "p50_ms": _percentile(values, 0.5),
+            "p95_ms": _percentile(values, 0.95),
+            "max_ms": max(values),
+            "share": total / root_total if root_total else 0.0,
+        })
+    return sorted(rows, key=lambda r: r["total_ms"], reverse=True)
+
+
+def format_summary(traces: dict[str, list[dict]]) -> str:
+    if not traces:
+        return "No traces recorded (enable tracing in config.yaml or run with --profile)"
+    lines = [f"{len(traces)} traces",
+             f"{'stage':<36} {'count':>6} {'total':>10} {'mean':>9} {'p50':>9} {'p95':>9} {'max':>9} {'share':>6}"]
+    for r in summarize(traces):
+        lines.append(f"{r['stage'][:36]:<36} {r['count']:>6} {r['total_ms']:>8.0f}ms "
+                     f"{r['mean_ms']:>7.1f}ms {r['p50_ms']:>7.1f}ms {r['p95_ms']:>7.1f}ms "
+                     f"{r['max_ms']:>7.1f}ms {r['share']:>6.1%}")
+    return "\n".join(lines)
+
+
+def format_trace(spans: list[dict]) -> str:
+    """Indented span tree of one trace with durations and attributes."""
+    by_parent: dict[str, list[dict]] = {}
+    for span in spans:
+        by_parent.setdefault(span["parent_id"], []).append(span)
+    ids = {span["span_id"] for span in spans}
+    # Roots, plus orphans whose parent was written in an earlier flush
+    roots = [s for s in spans if not s["parent_id"] or s["parent_id"] not in ids]
+
+    lines = []
+
+    def walk(span: dict, depth: int) -> None:
+        attributes = " ".join(f"{k}={v}" for k, v in span["attributes"].items())
+        error = f" ERROR {span['error']}" if span["error"] else ""
+        lines.append(f"{'  ' * depth}{span['name']:<{max(1, 32 - 2 * depth)}} "
+                     f"{span['duration_ms']:>9.1f}ms  {attributes}{error}".rstrip())
+        for child in sorted(by_parent.get(span["span_id"], []), key=lambda s: s["start_ns"]):
+            walk(child, depth + 1)
+
+    for root in sorted(roots, key=lambda s: s["start_ns"]):
+        walk(root, 0)
+    return "\n".join(lines)
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Automation Machine Pipeline Traces")
+    parser.add_argument("--last", type=int, help="Only the N most recent traces")
+    parser.add_argument("--trace", metavar="ID", help="Print one trace as a tree ('latest' for the newest)")
+    parser.add_argument("--clear", action="store_true", help="Delete recorded traces")
+    parser.add_argument("--path", type=Path, default=TRACES_PATH, help="Trace file path")
+    args = parser.parse_args()
+
+    if args.clear:
+        for path in (args.path, args.path.with_name(args.path.name + ".1")):
+            path.unlink(missing_ok=True)
+        print(f"Cleared {args.path}")
+        return
+
+    traces = load_traces(args.path, args.last)
+    if args.trace:
+        trace_id = list(traces)[-1] if args.trace == "latest" and traces else args.trace
+        if trace_id not in traces:
+            print(f"Trace not found: {args.trace}")
+            return
+        print(format_trace(traces[trace_id]))
+    else:
+        print(format_summary(traces))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Usage Analytics for Automation Machine
+Indexed rollup queries over the usage event store (usage.db), so stats
+views and budget checks never re-derive totals from the usage JSON.
+
+Spend figures include the baseline imported from the legacy usage_log.json.
+
+Usage:
+    python usage_analytics.py                 # Today / month / by-tool report
+    python usage_analytics.py --days 30       # Daily spend for the last 30 days
+"""
+
+import argparse
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+from usage_store import UsageStore, get_store, USAGE_DB_PATH
+
+
+def _merge(target: dict, key: str, stats: dict) -> None:
+    """Add numeric stats into target[key], creating it if needed."""
+    current = target.setdefault(key, {k: 0 for k in stats})
+    for k, v in stats.items():
+        current[k] = current.get(k, 0) + v
+
+
+def totals(store: UsageStore) -> dict:
+    """All-time {"queries", "cost_usd", "cache_hits"}."""
+    baseline = store.baseline()
+    queries, cost, hits = store.query(
+        "SELECT COALESCE(SUM(queries), 0), COALESCE(SUM(cost_usd), 0), "
+        "COALESCE(SUM(cache_hits), 0) FROM rollup"
+    )[0]
+    return {
+        "queries": baseline["total_queries"] + queries,
+        "cost_usd": baseline["total_cost_usd"] + cost,
+        "cache_hits": baseline.get("cache_hits", 0) + hits,
+    }
+
+
+def spend_by_day(store: UsageStore, start: Optional[str] = None,
+                 end: Optional[str] = None) -> dict[str, dict]:
+    """{"YYYY-MM-DD": {"queries", "cost_usd"}} for start <= day <= end, sorted by day."""
+    start = start or "0000-00-00"
+    end = end or "9999-99-99"
+    days: dict[str, dict] = {}
+    for day, stats in store.baseline()["daily"].items():
+        if start <= day <= end:
+            _merge(days, day, {"queries": stats.get("queries", 0),
+                               "cost_usd": stats.get("cost_usd", 0.0)})
+    for day, queries, cost in store.query(
+        "SELECT day, SUM(queries), SUM(cost_usd) FROM rollup "
+        "WHERE day BETWEEN ? AND ? GROUP BY day",
+        (start, end)
+    ):
+        _merge(days, day, {"queries": queries, "cost_usd": cost})
+    return dict(sorted(days.items()))
+
+
+def spend_by_month(store: UsageStore) -> dict[str, dict]:
+    """{"YYYY-MM": {"queries", "cost_usd"}} sorted by month."""
+    months: dict[str, dict] = {}
+    for month, stats in store.baseline()["monthly"].items():
+        _merge(months, month, {"queries": stats.get("queries", 0),
+                               "cost_usd": stats.get("cost_usd", 0.0)})
+    for month, queries, cost in store.query(
+        "SELECT substr(day, 1, 7), SUM(queries), SUM(cost_usd) FROM rollup GROUP BY 1"
+    ):
+        _merge(months, month, {"queries": queries, "cost_usd": cost})
+    return dict(sorted(months.items()))
+
+
+def spend_today(store: UsageStore) -> float:
+    """Total spend for the current local day."""
+    today = datetime.now().strftime("%Y-%m-%d")
+    return spend_by_day(store, today, today).get(today, {}).get("cost_usd", 0.0)
+
+
+def spend_this_month(store: UsageStore) -> float:
+    """Total spend for the current calendar month."""
+    month = datetime.now().strftime("%Y-%m")
+    cost = store.query(
+        "SELECT COALESCE(SUM(cost_usd), 0) FROM rollup WHERE day BETWEEN ? AND ?",
+        (f"{month}-01", f"{month}-31")
+    )[0][0]
+    return store.baseline()["monthly"].get(month, {}).get("cost_usd", 0.0) + cost
+
+
+def spend_by_tool(store: UsageStore, since: Optional[str] = None) -> dict[str, dict]:
+    """
+    {tool: {"queries", "cost_usd", "tokens_in", "tokens_out"}}, highest cost first.
+    With `since` ("YYYY-MM-DD") the legacy baseline is skipped, as it has no
+    per-tool dates.
+    """
+    tools: dict[str, dict] = {}
+    if since is None:
+        for tool, stats in store.baseline()["by_tool"].items():
+            _merge(tools, tool, {k: stats.get(k, 0) for k in
+                                 ("queries", "cost_usd", "tokens_in", "tokens_out")})
+    for tool, queries, cost, tokens_in, tokens_out in store.query(
+        "SELECT tool, SUM(queries), SUM(cost_usd), SUM(tokens_in), SUM(tokens_out) "
+        "FROM rollup WHERE legacy = 0 AND day >= ? GROUP BY tool",
+        (since or "",)
+    ):
+        _merge(tools, tool or "unknown", {"queries": queries, "cost_usd": cost,
+                                          "tokens_in": tokens_in, "tokens_out": tokens_out})
+    return dict(sorted(tools.items(), key=lambda kv: -kv[1]["cost_usd"]))
+
+
+def spend_by_category(store: UsageStore, since: Optional[str] = None) -> dict[str, dict]:
+    """{task_category: {"queries", "cost_usd"}} from events since "YYYY-MM-DD"."""
+    rows = store.query(
+        "SELECT task_category, SUM(queries), SUM(cost_usd) FROM rollup "
+        "WHERE task_category != '' AND day >= ? GROUP BY task_category",
+        (since or "",)
+    )
+    return {category: {"queries": queries, "cost_usd": cost} for category, queries, cost in rows}
+
+
+def spend_by_model(store: UsageStore) -> dict[str, dict]:
+    """Legacy per-model stats (brain.py), as in usage_log.json summary['models']."""
+    models = {m: dict(stats) for m, stats in store.baseline()["models"].items()}
+    for model, queries, cost, tokens_in, tokens_out in store.query(
+        "SELECT model, SUM(queries), SUM(cost_usd), SUM(tokens_in), SUM(tokens_out) "
+        "FROM rollup WHERE legacy = 1 GROUP BY model"
+    ):
+        if model in models:
+            _merge(models, model, {"queries": queries, "cost_usd": cost,
+                                   "tokens_in": tokens_in, "tokens_out": tokens_out})
+    return models
+
+
+def _percentile_offset(count: int, pct: float) -> int:
+    """0-based index of the nearest-rank percentile in an ascending list."""
+    return max(1, -(-count * pct // 100)) - 1
+
+
+def token_percentiles(store: UsageStore, percentiles: tuple = (50, 95)) -> dict[str, dict]:
+    """
+    Per-tool token percentiles over all events, cache hits excluded:
+    {tool: {"count", "tokens_in": {"p50", "p95"}, "tokens_out": {...}}}
+    Each percentile is an indexed ORDER BY ... LIMIT 1 OFFSET n lookup.
+    """
+    result = {}
+    for tool, count in store.query(
+        "SELECT tool, COUNT(*) FROM events WHERE tool IS NOT NULL AND cache_hit = 0 GROUP BY tool"
+    ):
+        stats = {"count": count}
+        for column in ("tokens_in", "tokens_out"):
+            stats[column] = {}
+            for p in percentiles:
+                offset = int(_percentile_offset(count, p))
+                # Walk the index from whichever end is closer
+                order = "ASC"
+                if offset > count // 2:
+                    order, offset = "DESC", count - 1 - offset
+                stats[column][f"p{p}"] = store.query(
+                    f"SELECT {column} FROM events WHERE tool = ? AND cache_hit = 0 "
+                    f"ORDER BY {column} {order} LIMIT 1 OFFSET ?",
+                    (tool, offset)
+                )[0][0]
+        result[tool] = stats
+    return result
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Automation Machine Usage Analytics")
+    parser.add_argument("--days", type=int, default=7, help="Days of daily spend to show")
+    parser.add_argument("--db", type=Path, default=USAGE_DB_PATH, help="Usage database path")
+    args = parser.parse_args()
+
+    store = get_store(args.db)
+    all_time = totals(store)
+    print(f"Total: {all_time['queries']} queries, ${all_time['cost_usd']:.4f} "
+          f"({all_time['cache_hits']} cache hits)")
+    print(f"Today: ${spend_today(store):.4f} | Month: ${spend_this_month(store):.4f}")
+
+    start = (datetime.now() - timedelta(days=args.days - 1)).strftime("%Y-%m-%d")
+    print("\n--- Daily ---")
+    for day, stats in spend_by_day(store, start).items():
+        print(f"  {day}: {stats['queries']} queries, ${stats['cost_usd']:.4f}")
+
+    percentiles = token_percentiles(store)
+    print("\n--- By Tool ---")
+    for tool, stats in spend_by_tool(store).items():
+        p = percentiles.get(tool)
+        tokens = (f", out p50/p95 {p['tokens_out']['p50']}/{p['tokens_out']['p95']}"
+                  if p else "")
+        print(f"  {tool}: {stats['queries']} queries, ${stats['cost_usd']:.4f}{tokens}")
+
+
+if __name__ == "__main__":
+    main()
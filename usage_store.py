@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+"""
+Usage Event Store for Automation Machine
+Append-only SQLite (WAL) log of usage events. Each query is one INSERT, so
+concurrent agents never rewrite or clobber each other's updates. Daily,
+monthly, by-tool and by-model rollups are computed on read.
+
+The legacy usage_log.json is imported once as a baseline and can be
+re-exported in the same shape for tools that still read the JSON file.
+
+Usage:
+    python usage_store.py --export           # Write usage_log.json now
+    python usage_store.py --summary          # Print rollups as JSON
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+# Paths
+BASE_DIR = Path(__file__).resolve().parent
+USAGE_DB_PATH = BASE_DIR / "usage.db"
+USAGE_LOG_PATH = BASE_DIR / "usage_log.json"
+
+# Minimum seconds between automatic usage_log.json exports
+EXPORT_INTERVAL = 60
+
+# History entries written to usage_log.json (the store itself keeps everything)
+EXPORT_HISTORY_LIMIT = 1000
+
+# Models tracked in summary["models"] by the legacy router (brain.py)
+DEFAULT_MODELS = ("deepseek-r1", "qwen2.5:32b", "claude-sonnet-4")
+
+EVENT_FIELDS = ("timestamp", "tool", "model", "tokens_in", "tokens_out", "cost_usd",
+                "task_category", "latency_ms", "cache_hit")
+
+# Routing context kept per event for training route_model.py (not exported).
+# routed_tool is the brain tool that served the query, e.g. local-qwen where
+# `tool` only says local-ollama.
+ROUTING_COLUMNS = {
+    "query": "TEXT",
+    "complexity": "TEXT",
+    "routed_tool": "TEXT",
+    "routed_by": "TEXT",
+    "fell_back": "INTEGER NOT NULL DEFAULT 0",
+}
+
+# Query text stored per event is truncated to this many characters
+MAX_QUERY_CHARS = 1000
+
+# Bumped when the rollup trigger changes; the rollup is rebuilt from events
+ROLLUP_TRIGGER = "trg_events_rollup_v2"
+
+
+def empty_summary() -> dict:
+    """Summary in the usage_log.json shape with no usage recorded."""
+    return {
+        "total_queries": 0,
+        "total_cost_usd": 0.0,
+        "cache_hits": 0,
+        "models": {m: {"queries": 0, "tokens_in": 0, "tokens_out": 0, "cost_usd": 0.0}
+                   for m in DEFAULT_MODELS},
+        "by_tool": {},
+        "daily": {},
+        "monthly": {},
+    }
+
+
+class UsageStore:
+    """
+    Append-only usage events with rollups computed on read.
+    Events imported from the legacy JSON are flagged `imported` and are
+    already counted in the stored baseline summary.
+    """
+
+    def __init__(self, db_path: Path = USAGE_DB_PATH,
+                 legacy_path: Optional[Path] = USAGE_LOG_PATH):
+        self.db_path = Path(db_path)
+        self.legacy_path = Path(legacy_path) if legacy_path else None
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts TEXT NOT NULL,
+                day TEXT NOT NULL,
+                month TEXT NOT NULL,
+                tool TEXT,
+                model TEXT,
+                tokens_in INTEGER NOT NULL DEFAULT 0,
+                tokens_out INTEGER NOT NULL DEFAULT 0,
+                cost_usd REAL NOT NULL DEFAULT 0,
+                task_category TEXT,
+                latency_ms INTEGER,
+                cache_hit INTEGER NOT NULL DEFAULT 0,
+                legacy INTEGER NOT NULL DEFAULT 0,
+                imported INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_events_ts ON events(ts);
+            CREATE INDEX IF NOT EXISTS idx_events_tool_in ON events(tool, cache_hit, tokens_in);
+            CREATE INDEX IF NOT EXISTS idx_events_tool_out ON events(tool, cache_hit, tokens_out);
+            CREATE INDEX IF NOT EXISTS idx_events_category ON events(task_category, ts);
+
+            -- Per-day rollup of non-imported events, maintained by trigger so
+            -- spend queries touch at most days x tools x categories rows
+            CREATE TABLE IF NOT EXISTS rollup (
+                day TEXT NOT NULL,
+                tool TEXT NOT NULL,
+                model TEXT NOT NULL,
+                task_category TEXT NOT NULL,
+                legacy INTEGER NOT NULL,
+                queries INTEGER NOT NULL,
+                cost_usd REAL NOT NULL,
+                tokens_in INTEGER NOT NULL,
+                tokens_out INTEGER NOT NULL,
+                cache_hits INTEGER NOT NULL,
+                PRIMARY KEY (day, tool, model, task_category, legacy)
+            );
+        """)
+        self.conn.commit()
+        self._ensure_columns()
+        self._migrate_legacy()
+        self._ensure_rollup()
+
+    # =========================================================================
+    # MIGRATION
+    # =========================================================================
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str) -> None:
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def _ensure_columns(self) -> None:
+        """Add routing columns to events tables created before they existed."""
+        with self._lock, self.conn:
+            existing = {row[1] for row in self.conn.execute("PRAGMA table_info(events)")}
+            for column, decl in ROUTING_COLUMNS.items():
+                if column not in existing:
+                    self.conn.execute(f"ALTER TABLE events ADD COLUMN {column} {decl}")
+
+    def _migrate_legacy(self) -> None:
+        """Import usage_log.json once: its summary becomes the baseline, its history becomes events."""
+        with self._lock:
+            if self._get_meta("migrated") is not None:
+                return
+
+            baseline = empty_summary()
+            history = []
+            if self.legacy_path and self.legacy_path.exists():
+                try:
+                    with open(self.legacy_path, "r", encoding="utf-8") as f:
+                        legacy = json.load(f)
+                    baseline.update(legacy.get("summary", {}))
+                    history = legacy.get("history", [])
+                except (OSError, json.JSONDecodeError):
+                    pass
+
+            # Re-check under the write lock, so two processes opening a fresh
+            # database at once do not both import the history
+            with self.conn:
+                self.conn.execute("BEGIN IMMEDIATE")
+                if self._get_meta("migrated") is not None:
+                    return
+                self._set_meta("baseline", json.dumps(baseline))
+                self.conn.executemany(
+                    "INSERT INTO events (ts, day, month, tool, model, tokens_in, tokens_out, "
+                    "cost_usd, task_category, latency_ms, cache_hit, query, complexity, "
+                    "routed_tool, routed_by, fell_back, legacy, imported) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0, 1)",
+                    [self._row(entry) for entry in history]
+                )
+                self._set_meta("migrated", datetime.now().isoformat())
+
+    def _ensure_rollup(self) -> None:
+        """
+        Create the rollup trigger, backfilling from events the first time (or
+        when an older trigger version is replaced). Cancelled hedge attempts
+        (routed_by "hedge") add cost and tokens but are not counted as queries.
+        """
+        with self._lock, self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            exists = self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?", (ROLLUP_TRIGGER,)
+            ).fetchone()
+            if exists:
+                return
+            self.conn.execute("DROP TRIGGER IF EXISTS trg_events_rollup")
+            self.conn.execute("DELETE FROM rollup")
+            self.conn.execute("""
+                INSERT INTO rollup
+                SELECT day, COALESCE(tool, ''), COALESCE(model, ''), COALESCE(task_category, ''),
+                       legacy, SUM(COALESCE(routed_by, '') != 'hedge'), SUM(cost_usd),
+                       SUM(tokens_in), SUM(tokens_out), SUM(cache_hit)
+                FROM events WHERE imported = 0
+                GROUP BY 1, 2, 3, 4, 5
+            """)
+            self.conn.execute(f"""
+                CREATE TRIGGER {ROLLUP_TRIGGER} AFTER INSERT ON events
+                WHEN NEW.imported = 0
+                BEGIN
+                    INSERT INTO rollup VALUES (
+                        NEW.day, COALESCE(NEW.tool, ''), COALESCE(NEW.model, ''),
+                        COALESCE(NEW.task_category, ''), NEW.legacy,
+                        COALESCE(NEW.routed_by, '') != 'hedge', NEW.cost_usd,
+                        NEW.tokens_in, NEW.tokens_out, NEW.cache_hit
+                    )
+                    ON CONFLICT (day, tool, model, task_category, legacy) DO UPDATE SET
+                        queries = queries + excluded.queries,
+                        cost_usd = cost_usd + excluded.cost_usd,
+                        tokens_in = tokens_in + excluded.tokens_in,
+                        tokens_out = tokens_out + excluded.tokens_out,
+                        cache_hits = cache_hits + excluded.cache_hits;
+                END
+            """)
+
+    # =========================================================================
+    # WRITING
+    # =========================================================================
+
+    @staticmethod
+    def _row(event: dict) -> tuple:
+        ts = event.get("timestamp") or datetime.now().isoformat()
+        return (
+            ts, ts[:10], ts[:7],
+            event.get("tool"), event.get("model"),
+            int(event.get("tokens_in", 0) or 0), int(event.get("tokens_out", 0) or 0),
+            float(event.get("cost_usd", 0.0) or 0.0),
+            event.get("task_category"), event.get("latency_ms"),
+            1 if event.get("cache_hit") else 0,
+            (event.get("query") or "")[:MAX_QUERY_CHARS] or None,
+            event.get("complexity"), event.get("routed_tool"), event.get("routed_by"),
+            1 if event.get("fell_back") else 0,
+        )
+
+    def record(self, event: dict, legacy: bool = False) -> None:
+        """
+        Append one usage event (usage_log.json history-entry fields, plus
+        optional routing context: query, complexity, routed_tool, routed_by,
+        fell_back).
+        legacy=True marks events from brain.py, which also roll up into
+        summary["models"].
+        """
+        self.record_many([event], legacy=legacy)
+
+    def record_many(self, events: list[dict], legacy: bool = False) -> None:
+        """Append several events in a single transaction."""
+        if not events:
+            return
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO events (ts, day, month, tool, model, tokens_in, tokens_out, "
+                "cost_usd, task_category, latency_ms, cache_hit, query, complexity, "
+                "routed_tool, routed_by, fell_back, legacy, imported) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, "
+                f"{1 if legacy else 0}, 0)",
+                [self._row(event) for event in events]
+            )
+
+    # =========================================================================
+    # READING
+    # =========================================================================
+
+    def baseline(self) -> dict:
+        """Summary imported from the legacy usage_log.json (empty if none)."""
+        with self._lock:
+            summary = json.loads(self._get_meta("baseline") or "null") or empty_summary()
+        for key, value in empty_summary().items():
+            summary.setdefault(key, value)
+        return summary
+
+    def query(self, sql: str, params: tuple = ()) -> list[tuple]:
+        """Run a read-only query against the events/rollup tables."""
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def summary(self) -> dict:
+        """Rollups in the usage_log.json summary shape: baseline + new events."""
+        summary = self.baseline()
+        rows = self.query(
+            "SELECT day, tool, model, legacy, queries, cost_usd, tokens_in, tokens_out, cache_hits "
+            "FROM rollup"
+        )
+        for day, tool, model, legacy, n, cost, t_in, t_out, hits in rows:
+            summary["total_queries"] += n
+            summary["total_cost_usd"] += cost
+            summary["cache_hits"] += hits
+
+            if legacy:
+                # brain.py only ever updated models it already tracked
+                stats = summary["models"].get(model)
+            else:
+                stats = summary["by_tool"].setdefault(
+                    tool or "unknown", {"queries": 0, "cost_usd": 0.0, "tokens_in": 0, "tokens_out": 0}
+                )
+            if stats is not None:
+                stats["queries"] += n
+                stats["cost_usd"] += cost
+                stats["tokens_in"] += t_in
+                stats["tokens_out"] += t_out
+
+            for key, period in (("daily", day), ("monthly", day[:7])):
+                stats = summary[key].setdefault(period, {"queries": 0, "cost_usd": 0.0})
+                stats["queries"] += n
+                stats["cost_usd"] += cost
+
+        return summary
+
+    def history(self, limit: Optional[int] = None) -> list[dict]:
+        """Events oldest-first in the usage_log.json history shape (last `limit` if given)."""
+        sql = ("SELECT ts, tool, model, tokens_in, tokens_out, cost_usd, task_category, "
+               "latency_ms, cache_hit FROM events ORDER BY id DESC")
+        params: tuple = ()
+        if limit is not None:
+            sql += " LIMIT ?"
+            params = (limit,)
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+
+        history = []
+        for row in reversed(rows):
+            entry = dict(zip(EVENT_FIELDS, row))
+            entry["cache_hit"] = bool(entry["cache_hit"])
+            history.append({k: v for k, v in entry.items() if v is not None})
+        return history
+
+    def routing_examples(self, since: Optional[str] = None) -> list[dict]:
+        """
+        Events that carry routing context, oldest first:
+        {"query", "tool", "complexity", "routed_by", "fell_back", "cache_hit"}
+        `tool` is the brain tool that served the query (after any fallback).
+        Cancelled hedge attempts (routed_by "hedge") are left out.
+        """
+        rows = self.query(
+            "SELECT query, routed_tool, complexity, routed_by, fell_back, cache_hit FROM events "
+            "WHERE query IS NOT NULL AND routed_tool IS NOT NULL "
+            "AND COALESCE(routed_by, '') != 'hedge' AND ts >= ? ORDER BY id",
+            (since or "",)
+        )
+        fields = ("query", "tool", "complexity", "routed_by", "fell_back", "cache_hit")
+        return [dict(zip(fields, row)) for row in rows]
+
+    def usage_log(self, history_limit: Optional[int] = EXPORT_HISTORY_LIMIT) -> dict:
+        """Full usage_log.json-shaped dict."""
+        return {"summary": self.summary(), "history": self.history(history_limit)}
+
+    # =========================================================================
+    # COMPATIBILITY EXPORT
+    # =========================================================================
+
+    def export_usage_log(self, path: Optional[Path] = None,
+                         history_limit: int = EXPORT_HISTORY_LIMIT) -> Path:
+        """Write usage_log.json atomically (temp file + rename)."""
+        path = Path(path or self.legacy_path or USAGE_LOG_PATH)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.usage_log(history_limit), f, indent=2)
+        os.replace(tmp, path)
+        with self._lock, self.conn:
+            self._set_meta("last_export", str(time.time()))
+        return path
+
+    def maybe_export(self, interval: float = EXPORT_INTERVAL) -> bool:
+        """Export usage_log.json if the last export is older than `interval` seconds."""
+        with self._lock:
+            last = float(self._get_meta("last_export") or 0)
+        if time.time() - last < interval:
+            return False
+        self.export_usage_log()
+        return True
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+# =============================================================================
+# SHARED INSTANCES
+# =============================================================================
+
+_stores: dict[str, UsageStore] = {}
+
+
+def get_store(db_path: Path = USAGE_DB_PATH,
+              legacy_path: Optional[Path] = USAGE_LOG_PATH) -> UsageStore:
+    """Return a process-wide UsageStore for the given database."""
+    key = str(db_path)
+    if key not in _stores:
+        _stores[key] = UsageStore(db_path, legacy_path)
+    return _stores[key]
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Automation Machine Usage Store")
+    parser.add_argument("--export", action="store_true", help="Write usage_log.json now")
+    parser.add_argument("--summary", action="store_true", help="Print rollups as JSON")
+    parser.add_argument("--db", type=Path, default=USAGE_DB_PATH, help="Usage database path")
+    args = parser.parse_args()
+
+    store = get_store(args.db)
+    if args.export:
+        path = store.export_usage_log()
+        print(f"Exported {path}")
+    elif args.summary:
+        print(json.dumps(store.summary(), indent=2))
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
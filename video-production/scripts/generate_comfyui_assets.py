@@ -22,13 +22,18 @@ import subprocess
 import sys
 import time
 from datetime import datetime
-import urllib.request
-import urllib.error
-import urllib.parse
 import wave
 
 REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
-COMFYUI_ENDPOINT = "http://100.64.130.71:8188"
+
+sys.path.insert(0, REPO_ROOT)
+from comfyui_client import ComfyUIClient, ComfyUIError, ComfyUITimeout
+from comfyui_scheduler import ComfyUIScheduler
+
+# Endpoint from tools_config.json; prompts are queued with this client's
+# client_id so its websocket gets their events
+COMFYUI = ComfyUIClient.from_config()
+
 THE_MACHINE_USER = "michael"
 THE_MACHINE_HOST = "100.64.130.71"
 COMFYUI_INPUT_DIR = "C:/ComfyUI/input"  # Remote path on The Machine
@@ -43,8 +48,8 @@ OUTPUT_SADTALKER_DIR = os.path.join(REPO_ROOT, "demo-clients", "candle-co", "vid
 # Workflow templates
 I2V_WORKFLOW = os.path.join(REPO_ROOT, "workflows", "image_to_video.json")
 
-# Poll settings
-POLL_INTERVAL = 30  # seconds
+# Completion wait settings (websocket events; polling with backoff as fallback)
+POLL_INTERVAL = 30  # max seconds between /history polls
 POLL_TIMEOUT = 3600  # 1 hour max per job
 
 
@@ -55,6 +60,8 @@ POLL_TIMEOUT = 3600  # 1 hour max per job
 
 STATE_DIR = os.path.join(REPO_ROOT, "video-production", "state")
 STATE_FILE = os.path.join(STATE_DIR, "generation_progress.json")
+# Per-clip ComfyUI jobs (prompt_id, client_id) so queued renders survive a restart
+SCHEDULE_FILE = os.path.join(STATE_DIR, "comfyui_schedule.json")
 
 
 def load_state():
@@ -141,79 +148,16 @@ def show_resume_status():
             print(f"    [NEW] {job['name']} (not started)")
 
 
-def api_request(path, method="GET", data=None):
-    """Make HTTP request to ComfyUI API."""
-    url = f"{COMFYUI_ENDPOINT}{path}"
-    headers = {}
-    body = None
-    if data is not None:
-        body = json.dumps(data).encode("utf-8")
-        headers["Content-Type"] = "application/json"
-    req = urllib.request.Request(url, data=body, headers=headers, method=method)
-    try:
-        with urllib.request.urlopen(req, timeout=30) as resp:
-            return json.loads(resp.read())
-    except urllib.error.URLError as e:
-        print(f"  API error ({path}): {e}")
-        return None
-    except Exception as e:
-        print(f"  API exception ({path}): {e}")
-        return None
-
-
 def upload_file_to_comfyui(local_path, subfolder="", file_type="input"):
-    """Upload a file to ComfyUI via its upload API."""
+    """Upload a file to ComfyUI (skipped if the same content is already there)."""
     filename = os.path.basename(local_path)
-    url = f"{COMFYUI_ENDPOINT}/upload/image"
-
-    # Build multipart form data manually
-    boundary = f"----PythonBoundary{random.randint(100000, 999999)}"
-    body_parts = []
-
-    # File part
-    with open(local_path, "rb") as f:
-        file_data = f.read()
-
-    body_parts.append(f"--{boundary}\r\n".encode())
-    body_parts.append(f'Content-Disposition: form-data; name="image"; filename="{filename}"\r\n'.encode())
-    body_parts.append(b"Content-Type: application/octet-stream\r\n\r\n")
-    body_parts.append(file_data)
-    body_parts.append(b"\r\n")
-
-    # Subfolder part
-    if subfolder:
-        body_parts.append(f"--{boundary}\r\n".encode())
-        body_parts.append(b'Content-Disposition: form-data; name="subfolder"\r\n\r\n')
-        body_parts.append(subfolder.encode())
-        body_parts.append(b"\r\n")
-
-    # Type part
-    body_parts.append(f"--{boundary}\r\n".encode())
-    body_parts.append(b'Content-Disposition: form-data; name="type"\r\n\r\n')
-    body_parts.append(file_type.encode())
-    body_parts.append(b"\r\n")
-
-    # Overwrite part
-    body_parts.append(f"--{boundary}\r\n".encode())
-    body_parts.append(b'Content-Disposition: form-data; name="overwrite"\r\n\r\n')
-    body_parts.append(b"true")
-    body_parts.append(b"\r\n")
-
-    body_parts.append(f"--{boundary}--\r\n".encode())
-    body = b"".join(body_parts)
-
-    req = urllib.request.Request(
-        url, data=body, method="POST",
-        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"}
-    )
     try:
-        with urllib.request.urlopen(req, timeout=60) as resp:
-            result = json.loads(resp.read())
-            print(f"  Uploaded: {filename}")
-            return result
-    except Exception as e:
+        result = COMFYUI.upload(local_path, subfolder, file_type)
+    except (ComfyUIError, OSError) as e:
         print(f"  Upload failed for {filename}: {e}")
         return None
+    print(f"  Uploaded: {filename}")
+    return result
 
 
 def scp_to_machine(local_path, remote_path):
@@ -233,82 +177,77 @@ def scp_to_machine(local_path, remote_path):
         return False
 
 
+def run_scheduled(scheduler):
+    """Run scheduled ComfyUI jobs, reporting each as it finishes; {name: result}."""
+    def report(result):
+        if result["status"] == "done":
+            print(f"  [OK] {result['name']}: {len(result['outputs'])} file(s)")
+        else:
+            print(f"  [FAIL] {result['name']}: {result['error']}")
+
+    print(f"\n  Running {len(scheduler.jobs)} job(s) on {len(scheduler.pool.nodes)} ComfyUI node(s), "
+          f"up to {scheduler.queue_depth} queued per node...")
+    return scheduler.run(on_complete=report)
+
+
+def schedule_i2v_jobs(images, motion_prompts, build_prompt, workflow_path, output_dir, tag,
+                      test_mode=False):
+    """Submit and collect I2V jobs on the least-loaded capable ComfyUI node(s),
+    preparing the next while one renders. Each image is uploaded to the node that runs it."""
+    scheduler = ComfyUIScheduler.from_config(state_path=SCHEDULE_FILE)
+    for i, img_path in enumerate(images):
+        img_name = os.path.basename(img_path)
+        prompt_text = motion_prompts[i % len(motion_prompts)]
+        print(f"\nJob {i+1}: {img_name}")
+        print(f"  Motion: {prompt_text[:60]}...")
+
+        def prepare(img_name=img_name, prompt_text=prompt_text):
+            return build_prompt(img_name, prompt_text, test_mode=test_mode)
+
+        name = f"{tag}_{os.path.splitext(img_name)[0]}" + ("_test" if test_mode else "")
+        scheduler.add(name, prepare, output_dir, kinds=("gifs", "images"), inputs=(img_path,),
+                      workflow_name=os.path.splitext(os.path.basename(workflow_path))[0])
+    run_scheduled(scheduler)
+
+
 def submit_prompt(prompt_data):
     """Submit a workflow prompt to ComfyUI."""
-    result = api_request("/prompt", method="POST", data={"prompt": prompt_data})
-    if result and "prompt_id" in result:
-        return result["prompt_id"]
-    return None
+    try:
+        return COMFYUI.submit(prompt_data)
+    except ComfyUIError as e:
+        print(f"  Submit failed: {e}")
+        for node_id, error in e.details.get("node_errors", {}).items():
+            print(f"    Node {node_id}: {error}")
+        return None
 
 
 def poll_for_completion(prompt_id):
-    """Poll ComfyUI history until job completes or times out."""
+    """Wait for a job to complete (or fail, or time out); its history entry or None."""
     start = time.time()
-    while time.time() - start < POLL_TIMEOUT:
-        history = api_request(f"/history/{prompt_id}")
-        if history and prompt_id in history:
-            job = history[prompt_id]
-            status = job.get("status", {})
-            if status.get("completed", False) or status.get("status_str") == "success":
-                return job
-            messages = status.get("messages", [])
-            for msg in messages:
-                if isinstance(msg, list) and len(msg) >= 2:
-                    if msg[0] == "execution_error":
-                        print(f"  Job failed: {msg[1].get('exception_message', 'unknown error')}")
-                        return None
-        elapsed = int(time.time() - start)
-        print(f"  Polling... ({elapsed}s elapsed)", end="\r")
-        time.sleep(POLL_INTERVAL)
-
-    print(f"\n  Timed out after {POLL_TIMEOUT}s")
+
+    def on_progress(event):
+        if event["type"] == "progress":
+            data = event["data"]
+            elapsed = int(time.time() - start)
+            print(f"  Step {data.get('value')}/{data.get('max')} ({elapsed}s elapsed)", end="\r")
+
+    try:
+        return COMFYUI.wait(prompt_id, POLL_TIMEOUT, on_progress, poll_max=POLL_INTERVAL)
+    except ComfyUITimeout:
+        print(f"\n  Timed out after {POLL_TIMEOUT}s")
+    except ComfyUIError as e:
+        print(f"  Job failed: {e}")
     return None
 
 
 def download_output(prompt_id, job_data, output_dir):
-    """Download output files from a completed job."""
-    outputs = job_data.get("outputs", {})
-    downloaded = []
-    for node_id, node_output in outputs.items():
-        # Check for video outputs (VHS_VideoCombine)
-        gifs = node_output.get("gifs", [])
-        for item in gifs:
-            filename = item.get("filename", "")
-            subfolder = item.get("subfolder", "")
-            file_type = item.get("type", "output")
-            if filename:
-                url = f"{COMFYUI_ENDPOINT}/view?filename={urllib.parse.quote(filename)}"
-                if subfolder:
-                    url += f"&subfolder={urllib.parse.quote(subfolder)}"
-                url += f"&type={file_type}"
-                local = os.path.join(output_dir, filename)
-                try:
-                    urllib.request.urlretrieve(url, local)
-                    print(f"  Downloaded: {filename}")
-                    downloaded.append(local)
-                except Exception as e:
-                    print(f"  Download failed ({filename}): {e}")
-
-        # Check for image outputs
-        images = node_output.get("images", [])
-        for item in images:
-            filename = item.get("filename", "")
-            subfolder = item.get("subfolder", "")
-            file_type = item.get("type", "output")
-            if filename:
-                url = f"{COMFYUI_ENDPOINT}/view?filename={urllib.parse.quote(filename)}"
-                if subfolder:
-                    url += f"&subfolder={urllib.parse.quote(subfolder)}"
-                url += f"&type={file_type}"
-                local = os.path.join(output_dir, filename)
-                try:
-                    urllib.request.urlretrieve(url, local)
-                    print(f"  Downloaded: {filename}")
-                    downloaded.append(local)
-                except Exception as e:
-                    print(f"  Download failed ({filename}): {e}")
-
-    return downloaded
+    """Download video (VHS_VideoCombine) and image outputs from a completed job."""
+    downloaded = COMFYUI.download_outputs(
+        job_data, output_dir, ("gifs", "images"),
+        on_error=lambda item, e: print(f"  Download failed ({item['filename']}): {e}"))
+    for local in downloaded:
+        print(f"  Downloaded: {os.path.basename(local)}")
+    return [str(local) for local in downloaded]
 
 
 # ─── SadTalker Jobs ──────────────────────────────────────────
@@ -596,44 +535,10 @@ def run_i2v_jobs(max_jobs=3, test_mode=False):
         ),
     ]
 
-    for i, img_path in enumerate(source_images[:max_jobs]):
-        img_name = os.path.basename(img_path)
-        prompt_text = motion_prompts[i % len(motion_prompts)]
-        print(f"\nJob {i+1}: {img_name}")
-        print(f"  Motion: {prompt_text[:60]}...")
-
-        # Upload image to ComfyUI
-        print("  Uploading image...")
-        result = upload_file_to_comfyui(img_path)
-        if not result:
-            print("  [FAIL] Upload failed")
-            continue
-
-        # Submit prompt
-        prompt = build_i2v_prompt(img_name, prompt_text, test_mode=test_mode)
-        print("  Submitting to ComfyUI...")
-        prompt_id = submit_prompt(prompt)
-        if not prompt_id:
-            print("  [FAIL] Could not submit prompt")
-            continue
-        print(f"  Prompt ID: {prompt_id}")
-        time_est = "~25 min (49 frames)" if test_mode else "~42 min (81 frames)"
-        print(f"  NOTE: Wan2.1 I2V takes {time_est} per clip on RTX 5060 Ti")
-
-        # Poll for completion
-        print("  Waiting for generation...")
-        job_data = poll_for_completion(prompt_id)
-        if not job_data:
-            print("  [FAIL] Job did not complete")
-            continue
-
-        # Download results
-        print("  Downloading output...")
-        files = download_output(prompt_id, job_data, OUTPUT_I2V_DIR)
-        if files:
-            print(f"  [OK] I2V job {i+1}: {len(files)} file(s)")
-        else:
-            print("  [WARN] No files downloaded -- check ComfyUI output directory")
+    time_est = "~25 min (49 frames)" if test_mode else "~42 min (81 frames)"
+    print(f"  NOTE: Wan2.1 I2V takes {time_est} per clip on RTX 5060 Ti")
+    schedule_i2v_jobs(source_images[:max_jobs], motion_prompts, build_i2v_prompt, I2V_WORKFLOW,
+                      OUTPUT_I2V_DIR, "i2v", test_mode)
 
 
 # ─── Audio Segmentation Utilities ────────────────────────────
@@ -942,45 +847,23 @@ def build_fantasytalking_prompt(photo_filename, audio_filename, test_mode=False,
     return prompt
 
 
-def run_single_fantasytalking_clip(photo_filename, audio_filename, output_dir, test_mode=False, num_frames=None):
-    """Generate a single FantasyTalking clip (upload, submit, poll, download).
+def schedule_fantasytalking_clip(scheduler, clip, photo_path, photo_filename, test_mode=False):
+    """Add one FantasyTalking clip to the scheduler; returns its job name.
 
     Args:
-        photo_filename: Filename of the photo already uploaded to ComfyUI.
-        audio_filename: Filename of the audio already uploaded to ComfyUI.
-        output_dir: Directory to download the result to.
-        test_mode: Use reduced frames/steps for faster iteration.
-        num_frames: Override frame count (4k+1, max 81).
-
-    Returns:
-        Path to the downloaded clip, or None on failure.
+        clip: {"name", "audio_path", "num_frames", "dir"} for the clip.
+        photo_path: Local photo, uploaded once per node however many clips use it.
+        photo_filename: Filename of the photo on ComfyUI.
     """
-    prompt = build_fantasytalking_prompt(photo_filename, audio_filename,
-                                         test_mode=test_mode, num_frames=num_frames)
-    if not prompt:
-        return None
-
-    print("  Submitting to ComfyUI...")
-    prompt_id = submit_prompt(prompt)
-    if not prompt_id:
-        print("  [FAIL] Could not submit prompt")
-        return None
-    print(f"  Prompt ID: {prompt_id}")
+    def prepare():
+        return build_fantasytalking_prompt(photo_filename, os.path.basename(clip["audio_path"]),
+                                           test_mode=test_mode, num_frames=clip["num_frames"])
 
-    frame_label = num_frames or (49 if test_mode else 81)
-    print(f"  Waiting for generation ({frame_label} frames)...")
-    job_data = poll_for_completion(prompt_id)
-    if not job_data:
-        print("  [FAIL] Job did not complete")
-        return None
-
-    print("  Downloading output...")
-    files = download_output(prompt_id, job_data, output_dir)
-    if files:
-        return files[0]
-    else:
-        print("  [WARN] No files downloaded")
-        return None
+    name = clip["name"] + ("_test" if test_mode else "")
+    scheduler.add(name, prepare, clip["dir"], kinds=("gifs", "images"), prefix=f"{clip['name']}_",
+                  inputs=(photo_path, clip["audio_path"]),
+                  workflow_name=os.path.splitext(os.path.basename(FANTASYTALKING_WORKFLOW))[0])
+    return name
 
 
 def run_fantasytalking_jobs(test_mode=False):
@@ -990,8 +873,13 @@ def run_fantasytalking_jobs(test_mode=False):
     For longer audio, segments the audio, generates a clip per segment, then stitches
     them together with crossfade and the original full-length audio.
 
+    All clips (every segment of every job) go through one ComfyUIScheduler, so the
+    next clip's uploads are done and its prompt is queued while the current one
+    renders; the GPU does not idle between clips or jobs.
+
     Resume: Automatically detects existing output files and skips completed jobs/segments.
-    State tracked in video-production/state/generation_progress.json.
+    State tracked in video-production/state/generation_progress.json; clips queued on
+    ComfyUI when a run was interrupted are collected, not re-rendered.
     Re-run after interruption to pick up where you left off.
     """
     print("\n--- FantasyTalking Jobs (with resume) ---\n")
@@ -1006,6 +894,16 @@ def run_fantasytalking_jobs(test_mode=False):
     state["last_run"] = datetime.now().isoformat()
     save_state(state)
 
+    effective_max = FANTASYTALKING_MAX_DURATION
+    if test_mode:
+        # In test mode, max duration is 49 frames / 23 fps = ~2.13s
+        effective_max = 49 / FANTASYTALKING_FPS
+
+    # Plan every clip first, then render them back to back
+    scheduler = ComfyUIScheduler.from_config(state_path=SCHEDULE_FILE)
+    plans = []  # (job, final_path, audio_path, clips, segmented)
+    clips_by_job_name = {}
+
     for job in FANTASYTALKING_JOBS:
         print(f"\nJob: {job['name']} -- {job['description']}")
 
@@ -1032,19 +930,6 @@ def run_fantasytalking_jobs(test_mode=False):
         audio_duration = get_audio_duration(audio_path)
         print(f"  Audio duration: {audio_duration:.2f}s")
 
-        # Upload photo (needed for all segments)
-        print("  Uploading photo...")
-        photo_result = upload_file_to_comfyui(photo_path)
-        if not photo_result:
-            print("  [FAIL] Photo upload failed, skipping job")
-            continue
-
-        # Determine if segmentation is needed
-        effective_max = FANTASYTALKING_MAX_DURATION
-        if test_mode:
-            # In test mode, max duration is 49 frames / 23 fps = ~2.13s
-            effective_max = 49 / FANTASYTALKING_FPS
-
         if audio_duration <= effective_max:
             # Short audio: single clip, compute exact frame count
             num_frames = calculate_num_frames(audio_duration)
@@ -1052,30 +937,9 @@ def run_fantasytalking_jobs(test_mode=False):
 
             update_job_state(state, job['name'], status="in_progress", job_type="fantasytalking",
                            segments_total=1, segments_completed=[])
-
-            # Upload audio
-            audio_result = upload_file_to_comfyui(audio_path)
-            if not audio_result:
-                print("  [FAIL] Audio upload failed")
-                continue
-
-            clip_path = run_single_fantasytalking_clip(
-                job["photo"], job["audio"], OUTPUT_FANTASYTALKING_DIR,
-                test_mode=test_mode, num_frames=num_frames
-            )
-            if clip_path:
-                # Rename to match job name
-                if clip_path != final_path:
-                    if os.path.exists(final_path):
-                        os.remove(final_path)
-                    os.rename(clip_path, final_path)
-                print(f"  [OK] {job['name']}: {final_path}")
-                update_job_state(state, job['name'], status="completed", stitched=True,
-                               segments_completed=[0],
-                               output_path=os.path.relpath(final_path, REPO_ROOT))
-            else:
-                print(f"  [FAIL] {job['name']}: generation failed")
-                update_job_state(state, job['name'], status="failed")
+            clips = [{"name": job["name"], "audio_path": audio_path, "num_frames": num_frames,
+                      "dir": OUTPUT_FANTASYTALKING_DIR, "path": final_path, "index": 0}]
+            segmented = False
         else:
             # Long audio: segment, generate per-segment, stitch
             print(f"  Audio exceeds {effective_max:.2f}s limit -- segmenting...")
@@ -1086,66 +950,80 @@ def run_fantasytalking_jobs(test_mode=False):
                            segments_total=len(segments),
                            segments_completed=state.get("jobs", {}).get(job['name'], {}).get("segments_completed", []))
 
-            segment_clips = []
             seg_output_dir = os.path.join(OUTPUT_FANTASYTALKING_DIR, f"{job['name']}_segments")
             os.makedirs(seg_output_dir, exist_ok=True)
-
+            clips = []
             for seg_idx, seg_path in enumerate(segments):
-                seg_name = os.path.basename(seg_path)
                 seg_duration = get_audio_duration(seg_path)
-                num_frames = calculate_num_frames(seg_duration)
-
-                # Resume check: see if this segment clip already exists with predictable name
-                expected_clip = os.path.join(seg_output_dir, f"{job['name']}_seg{seg_idx:02d}.mp4")
-                if os.path.isfile(expected_clip) and os.path.getsize(expected_clip) > 50000:
-                    size_mb = os.path.getsize(expected_clip) / (1024 * 1024)
-                    print(f"\n  [RESUME-SKIP] Segment {seg_idx}/{len(segments)-1} exists ({size_mb:.1f}MB)")
-                    segment_clips.append(expected_clip)
-                    continue
-
-                print(f"\n  Segment {seg_idx}/{len(segments)-1}: {seg_name} ({seg_duration:.2f}s, {num_frames} frames)")
-
-                # Upload segment audio
-                seg_result = upload_file_to_comfyui(seg_path)
-                if not seg_result:
-                    print(f"  [FAIL] Segment audio upload failed")
-                    continue
-
-                clip_path = run_single_fantasytalking_clip(
-                    job["photo"], seg_name, seg_output_dir,
-                    test_mode=test_mode, num_frames=num_frames
-                )
-                if clip_path:
-                    # Rename to predictable name for resume detection
-                    if clip_path != expected_clip:
-                        if os.path.exists(expected_clip):
-                            os.remove(expected_clip)
-                        os.rename(clip_path, expected_clip)
-                        clip_path = expected_clip
-                    segment_clips.append(clip_path)
-                    print(f"  [OK] Segment {seg_idx} generated -> {os.path.basename(expected_clip)}")
-
-                    # Update state after each segment (survives interruption)
-                    completed_segs = [i for i in range(len(segments))
-                                      if os.path.isfile(os.path.join(seg_output_dir, f"{job['name']}_seg{i:02d}.mp4"))]
-                    update_job_state(state, job['name'], segments_completed=completed_segs)
-                else:
-                    print(f"  [FAIL] Segment {seg_idx} generation failed")
-
-            # Stitch segments together
-            if segment_clips:
-                print(f"\n  Stitching {len(segment_clips)} segment clips...")
-                result = stitch_segments(segment_clips, final_path, audio_path, crossfade=0.3)
-                if result:
-                    print(f"  [OK] {job['name']}: {final_path}")
-                    update_job_state(state, job['name'], status="completed", stitched=True,
-                                   output_path=os.path.relpath(final_path, REPO_ROOT))
-                else:
-                    print(f"  [FAIL] {job['name']}: stitching failed")
-                    update_job_state(state, job['name'], status="stitch_failed")
+                clips.append({"name": f"{job['name']}_seg{seg_idx:02d}", "audio_path": seg_path,
+                              "num_frames": calculate_num_frames(seg_duration), "dir": seg_output_dir,
+                              "path": os.path.join(seg_output_dir, f"{job['name']}_seg{seg_idx:02d}.mp4"),
+                              "index": seg_idx, "duration": seg_duration})
+            segmented = True
+
+        for clip in clips:
+            # Resume check: see if this clip already exists with its predictable name
+            if segmented and os.path.isfile(clip["path"]) and os.path.getsize(clip["path"]) > 50000:
+                size_mb = os.path.getsize(clip["path"]) / (1024 * 1024)
+                print(f"  [RESUME-SKIP] Segment {clip['index']}/{len(clips)-1} exists ({size_mb:.1f}MB)")
+                continue
+            if segmented:
+                print(f"  Segment {clip['index']}/{len(clips)-1}: {os.path.basename(clip['audio_path'])} "
+                      f"({clip['duration']:.2f}s, {clip['num_frames']} frames)")
+            name = schedule_fantasytalking_clip(scheduler, clip, photo_path, job["photo"], test_mode)
+            clips_by_job_name[name] = (job, clip, len(clips))
+        plans.append((job, final_path, audio_path, clips, segmented))
+
+    def on_clip(result):
+        job, clip, total = clips_by_job_name[result["name"]]
+        if result["status"] != "done" or not result["outputs"]:
+            print(f"  [FAIL] {clip['name']}: {result['error'] or 'no files downloaded'}")
+            return
+        # Rename to predictable name for resume detection
+        clip_path = result["outputs"][0]
+        if clip_path != clip["path"]:
+            if os.path.exists(clip["path"]):
+                os.remove(clip["path"])
+            os.rename(clip_path, clip["path"])
+        print(f"  [OK] {clip['name']} -> {os.path.basename(clip['path'])}")
+        if total > 1:
+            # Update state after each segment (survives interruption)
+            completed_segs = [i for i in range(total)
+                              if os.path.isfile(os.path.join(clip["dir"], f"{job['name']}_seg{i:02d}.mp4"))]
+            update_job_state(state, job['name'], segments_completed=completed_segs)
+
+    if scheduler.jobs:
+        print(f"\n  Rendering {len(scheduler.jobs)} clip(s) on {len(scheduler.pool.nodes)} ComfyUI node(s), "
+              f"up to {scheduler.queue_depth} queued per node...")
+        scheduler.run(on_complete=on_clip)
+
+    for job, final_path, audio_path, clips, segmented in plans:
+        if not segmented:
+            if os.path.isfile(final_path):
+                print(f"  [OK] {job['name']}: {final_path}")
+                update_job_state(state, job['name'], status="completed", stitched=True,
+                               segments_completed=[0],
+                               output_path=os.path.relpath(final_path, REPO_ROOT))
             else:
-                print(f"  [FAIL] {job['name']}: no segments generated successfully")
+                print(f"  [FAIL] {job['name']}: generation failed")
                 update_job_state(state, job['name'], status="failed")
+            continue
+
+        # Stitch segments together
+        segment_clips = [clip["path"] for clip in clips if os.path.isfile(clip["path"])]
+        if segment_clips:
+            print(f"\n  Stitching {len(segment_clips)} segment clips for {job['name']}...")
+            result = stitch_segments(segment_clips, final_path, audio_path, crossfade=0.3)
+            if result:
+                print(f"  [OK] {job['name']}: {final_path}")
+                update_job_state(state, job['name'], status="completed", stitched=True,
+                               output_path=os.path.relpath(final_path, REPO_ROOT))
+            else:
+                print(f"  [FAIL] {job['name']}: stitching failed")
+                update_job_state(state, job['name'], status="stitch_failed")
+        else:
+            print(f"  [FAIL] {job['name']}: no segments generated successfully")
+            update_job_state(state, job['name'], status="failed")
 
     print("\n  FantasyTalking jobs complete.")
 
@@ -1212,43 +1090,8 @@ def run_i2v_wan22_jobs(max_jobs=3, test_mode=False):
     # Reuse the same expanded motion prompts
     motion_prompts = [DEFAULT_MOTION_PROMPT] * max_jobs
 
-    for i, img_path in enumerate(source_images[:max_jobs]):
-        img_name = os.path.basename(img_path)
-        prompt_text = motion_prompts[i % len(motion_prompts)]
-        print(f"\nJob {i+1}: {img_name}")
-
-        # Upload image to ComfyUI
-        print("  Uploading image...")
-        result = upload_file_to_comfyui(img_path)
-        if not result:
-            print("  [FAIL] Upload failed")
-            continue
-
-        # Submit prompt
-        prompt = build_i2v_wan22_prompt(img_name, prompt_text, test_mode=test_mode)
-        if not prompt:
-            continue
-        print("  Submitting to ComfyUI...")
-        prompt_id = submit_prompt(prompt)
-        if not prompt_id:
-            print("  [FAIL] Could not submit prompt")
-            continue
-        print(f"  Prompt ID: {prompt_id}")
-
-        # Poll for completion
-        print("  Waiting for generation...")
-        job_data = poll_for_completion(prompt_id)
-        if not job_data:
-            print("  [FAIL] Job did not complete")
-            continue
-
-        # Download results
-        print("  Downloading output...")
-        files = download_output(prompt_id, job_data, OUTPUT_I2V_WAN22_DIR)
-        if files:
-            print(f"  [OK] Wan2.2 I2V job {i+1}: {len(files)} file(s)")
-        else:
-            print("  [WARN] No files downloaded -- check ComfyUI output directory")
+    schedule_i2v_jobs(source_images[:max_jobs], motion_prompts, build_i2v_wan22_prompt,
+                      I2V_WAN22_WORKFLOW, OUTPUT_I2V_WAN22_DIR, "i2v_wan22", test_mode)
 
 
 # ─── Status Check ───────────────────────────────────────────
@@ -1258,18 +1101,21 @@ def check_status():
     print("\n--- ComfyUI Status ---\n")
 
     # Queue
-    queue = api_request("/queue")
-    if queue:
-        running = queue.get("queue_running", [])
-        pending = queue.get("queue_pending", [])
-        print(f"  Running: {len(running)} job(s)")
-        print(f"  Pending: {len(pending)} job(s)")
-    else:
-        print("  Could not reach ComfyUI API")
+    try:
+        queue = COMFYUI.queue_state()
+    except ComfyUIError as e:
+        print(f"  Could not reach ComfyUI API ({e})")
         return
+    running = queue.get("queue_running", [])
+    pending = queue.get("queue_pending", [])
+    print(f"  Running: {len(running)} job(s)")
+    print(f"  Pending: {len(pending)} job(s)")
 
     # System stats
-    stats = api_request("/system_stats")
+    try:
+        stats = COMFYUI.system_stats()
+    except ComfyUIError:
+        stats = None
     if stats:
         devices = stats.get("devices", [])
         if devices: